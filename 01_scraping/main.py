@@ -3,6 +3,7 @@ import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 import time
+from problem_registry import default_registry_path, load_registry, save_registry, assign_problem_ids
 
 BASE_URL = "https://www.ap-siken.com/"
 
@@ -94,6 +95,14 @@ if __name__ == "__main__":
 
     if all_data:
         final_df = pd.concat(all_data, ignore_index=True)
+
+        # 出典をキーに永続的な問題IDを割り当てる（既存IDは維持）
+        registry_path = default_registry_path()
+        registry = load_registry(registry_path)
+        final_df, new_count = assign_problem_ids(final_df, registry)
+        save_registry(registry, registry_path)
+        print(f"Assigned problem ids ({new_count} new) using {registry_path}")
+
         output_filename = "ap_siken_all_items.csv"
         print(f"Current working directory: {os.getcwd()}")
         print(f"Attempting to save to: {os.path.join(os.getcwd(), output_filename)}")
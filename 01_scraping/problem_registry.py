@@ -0,0 +1,70 @@
+import os
+import json
+import argparse
+import pandas as pd
+
+# 出典（例: "R7秋期 問 1"）は試験回と問番号の組なので、再スクレイピングしても変わらない。
+# 問題番号はサイト上の並び順で、新しい試験回が追加されるとずれるためキーには使わない。
+KEY_COLUMN = '出典'
+ID_COLUMN = '問題ID'
+REGISTRY_FILENAME = 'problem_registry.json'
+
+def default_registry_path():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), REGISTRY_FILENAME)
+
+def load_registry(path):
+    """レジストリを読み込む。存在しない場合は空のレジストリを返す"""
+    if not os.path.exists(path):
+        return {'key': KEY_COLUMN, 'next_id': 0, 'ids': {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_registry(registry, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(registry, f, ensure_ascii=False, indent=2)
+
+def assign_problem_ids(df, registry):
+    """各行に永続的な整数IDを割り当て、ID列を先頭に追加したDataFrameを返す。
+
+    既知の問題はレジストリのIDをそのまま使い、未知の問題には next_id から順に新しいIDを振る。
+    削除された問題のIDは再利用しない。
+    """
+    ids = registry['ids']
+    next_id = registry['next_id']
+    assigned = []
+    new_count = 0
+    for key in df[KEY_COLUMN]:
+        if key not in ids:
+            ids[key] = next_id
+            next_id += 1
+            new_count += 1
+        assigned.append(ids[key])
+    registry['next_id'] = next_id
+
+    df = df.drop(columns=[ID_COLUMN], errors='ignore')
+    df.insert(0, ID_COLUMN, assigned)
+    return df, new_count
+
+def main():
+    parser = argparse.ArgumentParser(description="スクレイピング済みCSVに永続的な問題IDを割り当てます。")
+    parser.add_argument('--csv', type=str, default='ap_siken_all_items.csv', help='対象CSVファイルのパス')
+    parser.add_argument('--registry', type=str, default=REGISTRY_FILENAME, help='レジストリファイルのパス')
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    csv_path = os.path.normpath(os.path.join(script_dir, args.csv))
+    registry_path = os.path.normpath(os.path.join(script_dir, args.registry))
+
+    df = pd.read_csv(csv_path, encoding='utf-8-sig')
+    if df[KEY_COLUMN].duplicated().any():
+        print(f"エラー: {KEY_COLUMN} 列に重複があるためIDを割り当てられません")
+        return
+
+    registry = load_registry(registry_path)
+    df, new_count = assign_problem_ids(df, registry)
+    save_registry(registry, registry_path)
+    df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+    print(f"{len(df)}件にIDを割り当てました（新規: {new_count}件）: {registry_path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+"""類似問題検索の品質とコストを比較するベンチマーク
+
+厳密な近傍（float64 のコサイン類似度、同じ中項目内）を正解として一度だけ計算してキャッシュし、
+設定ごとに recall@k、類似度の誤差（MAE）、構築時間、1問あたりの検索レイテンシ、成果物のサイズを測って比較表を出力する。
+
+    py 03_html_output/benchmark.py
+    py 03_html_output/benchmark.py --setups my_setups.json --min_recall 0.95 --recall_k 5
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from main import (DEFAULT_MODEL, ensure_problem_ids, get_vector_column_name, group_vectors, model_config_from_name,
+                  print_log)
+
+# 現行のビルド（main.py）と同じ「上位5件、または類似度0.9以上」を基準にした比較用の設定
+# dtype はベクトルを保持する精度（float16 は float32 に戻して計算する）、dims は先頭から使う次元数
+DEFAULT_SETUPS = [
+    {"name": "float64 (現行)", "dtype": "float64", "dims": None, "top_k": 5, "min_score": 0.9},
+    {"name": "float32", "dtype": "float32", "dims": None, "top_k": 5, "min_score": 0.9},
+    {"name": "float16", "dtype": "float16", "dims": None, "top_k": 5, "min_score": 0.9},
+    {"name": "int8", "dtype": "int8", "dims": None, "top_k": 5, "min_score": 0.9},
+    {"name": "float32 先頭256次元", "dtype": "float32", "dims": 256, "top_k": 5, "min_score": 0.9},
+    {"name": "float32 上位10件", "dtype": "float32", "dims": None, "top_k": 10, "min_score": 0.9},
+]
+SUPPORTED_DTYPES = ('float64', 'float32', 'float16', 'int8')
+INT8_SCALE = 127
+
+
+def normalize(vectors):
+    """行ごとにL2正規化する（ゼロベクトルはそのまま）"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def ground_truth_cache_key(grouped, vector_column, k_max):
+    digest = hashlib.sha256(f"{vector_column}:{k_max}".encode('utf-8'))
+    for middle_cat in sorted(grouped):
+        ids, vectors = grouped[middle_cat]
+        digest.update(middle_cat.encode('utf-8'))
+        digest.update(np.asarray(ids, dtype=np.int64).tobytes())
+        digest.update(np.ascontiguousarray(vectors, dtype=np.float64).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def compute_ground_truth(grouped, k_max):
+    """問題ID -> (近傍の問題IDの配列, 類似度の配列)。同じ中項目内の厳密な上位 k_max 件"""
+    truth = {}
+    for ids, vectors in grouped.values():
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) < 2:
+            continue
+        normalized = normalize(np.asarray(vectors, dtype=np.float64))
+        sims = normalized @ normalized.T
+        np.fill_diagonal(sims, -np.inf)
+        order = np.argsort(-sims, axis=1, kind='stable')[:, :min(k_max, len(ids) - 1)]
+        for row, problem_id in enumerate(ids):
+            truth[int(problem_id)] = (ids[order[row]], sims[row, order[row]])
+    return truth
+
+
+def load_or_compute_ground_truth(grouped, vector_column, k_max, cache_dir):
+    """正解の近傍をキャッシュから読み込む（入力のベクトルが変わっていなければ再計算しない）"""
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, f"ground_truth_{ground_truth_cache_key(grouped, vector_column, k_max)}.npz")
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            truth = {}
+            for problem_id, count, neighbors, scores in zip(cached['problem_ids'], cached['counts'], cached['neighbors'], cached['scores']):
+                truth[int(problem_id)] = (neighbors[:count], scores[:count])
+        print_log(f"正解の近傍をキャッシュから読み込みました: {cache_path}")
+        return truth, True
+
+    started = time.perf_counter()
+    truth = compute_ground_truth(grouped, k_max)
+    problem_ids = np.array(sorted(truth), dtype=np.int64)
+    neighbors = np.full((len(problem_ids), k_max), -1, dtype=np.int64)
+    scores = np.zeros((len(problem_ids), k_max), dtype=np.float64)
+    counts = np.zeros(len(problem_ids), dtype=np.int64)
+    for row, problem_id in enumerate(problem_ids):
+        ids, sims = truth[int(problem_id)]
+        counts[row] = len(ids)
+        neighbors[row, :len(ids)] = ids
+        scores[row, :len(ids)] = sims
+    np.savez(cache_path, problem_ids=problem_ids, counts=counts, neighbors=neighbors, scores=scores)
+    print_log(f"正解の近傍を計算しました（{time.perf_counter() - started:.2f}秒）: {cache_path}")
+    return truth, False
+
+
+def prepare_vectors(vectors, setup):
+    """設定の精度・次元数でベクトルを保持する形に変換する"""
+    vectors = np.asarray(vectors, dtype=np.float64)
+    if setup.get('dims'):
+        vectors = vectors[:, :setup['dims']]
+    normalized = normalize(vectors)
+    if setup['dtype'] == 'int8':
+        return np.round(normalized * INT8_SCALE).astype(np.int8)
+    return normalized.astype(setup['dtype'])
+
+
+def score(query, matrix, dtype):
+    """保持している形のまま類似度を計算する（float16 は float32、int8 は int32 で計算する）"""
+    if dtype == 'int8':
+        return (matrix.astype(np.int32) @ query.astype(np.int32).T).astype(np.float64) / (INT8_SCALE * INT8_SCALE)
+    if dtype == 'float16':
+        return (matrix.astype(np.float32) @ query.astype(np.float32).T).astype(np.float64)
+    return (matrix @ query.T).astype(np.float64)
+
+
+def select_neighbors(sims_row, self_index, top_k, min_score):
+    """ビルドと同じ規則（上位 top_k 件、または min_score 以上）で近傍を選ぶ"""
+    sims_row = sims_row.copy()
+    sims_row[self_index] = -np.inf
+    order = np.argsort(-sims_row, kind='stable')[:-1]
+    return [int(j) for rank, j in enumerate(order) if rank < top_k or sims_row[j] >= min_score]
+
+
+def build_with_setup(grouped, setup):
+    """設定に従って全問題の近傍リストを作る。(問題ID -> [(近傍ID, 類似度)], 保持するベクトル, 構築秒数)"""
+    started = time.perf_counter()
+    neighbors = {}
+    prepared = {}
+    for middle_cat, (ids, vectors) in grouped.items():
+        if len(ids) < 2:
+            continue
+        matrix = prepare_vectors(vectors, setup)
+        prepared[middle_cat] = matrix
+        sims = score(matrix, matrix, setup['dtype'])
+        for i, problem_id in enumerate(ids):
+            selected = select_neighbors(sims[i], i, setup['top_k'], setup['min_score'])
+            neighbors[int(problem_id)] = [(int(ids[j]), float(sims[i, j])) for j in selected]
+    return neighbors, prepared, time.perf_counter() - started
+
+
+def artifact_size(neighbors):
+    """近傍リストを problem_data と同じ形（カテゴリ別の JSON）で書き出したときのバイト数"""
+    items = [{"main_problem": pid, "similar_problems": [{"id": nid, "similarity": s} for nid, s in sims]}
+             for pid, sims in neighbors.items()]
+    return len(json.dumps(items, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def evaluate_quality(neighbors, truth, ks):
+    """recall@k と、取得した近傍の類似度の誤差（正解の上位に含まれる組について）"""
+    recalls = {k: [] for k in ks}
+    errors = []
+    for problem_id, (true_ids, true_scores) in truth.items():
+        retrieved = neighbors.get(problem_id, [])
+        retrieved_ids = [nid for nid, _ in retrieved]
+        for k in ks:
+            expected = set(int(x) for x in true_ids[:k])
+            if expected:
+                recalls[k].append(len(expected & set(retrieved_ids[:k])) / len(expected))
+        exact = dict(zip((int(x) for x in true_ids), true_scores))
+        errors.extend(abs(s - exact[nid]) for nid, s in retrieved if nid in exact)
+    return ({k: float(np.mean(v)) if v else None for k, v in recalls.items()},
+            float(np.mean(errors)) if errors else None)
+
+
+def measure_query_latency(grouped, prepared, setup, queries, seed=0):
+    """1問の検索（同じ中項目の全問題との類似度計算と上位の選択）にかかる時間のパーセンタイル（ミリ秒）"""
+    candidates = [(middle_cat, i) for middle_cat, (ids, _) in grouped.items() if middle_cat in prepared for i in range(len(ids))]
+    if not candidates:
+        return {}
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(candidates), size=min(queries, len(candidates)), replace=False)
+    latencies = []
+    for index in sample:
+        middle_cat, i = candidates[index]
+        matrix = prepared[middle_cat]
+        started = time.perf_counter()
+        sims = score(matrix[i:i + 1], matrix, setup['dtype'])[:, 0]
+        select_neighbors(sims, i, setup['top_k'], setup['min_score'])
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {f"p{p}": float(np.percentile(latencies, p)) for p in (50, 95, 99)}
+
+
+def run_benchmark(grouped, truth, setups, ks, queries):
+    results = []
+    for setup in setups:
+        if setup['dtype'] not in SUPPORTED_DTYPES:
+            raise ValueError(f"未対応の dtype です: {setup['dtype']}（{', '.join(SUPPORTED_DTYPES)}）")
+        neighbors, prepared, build_seconds = build_with_setup(grouped, setup)
+        recalls, mae = evaluate_quality(neighbors, truth, ks)
+        result = {
+            "name": setup['name'],
+            "setup": setup,
+            "recall": {str(k): v for k, v in recalls.items()},
+            "score_mae": mae,
+            "build_seconds": build_seconds,
+            "query_latency_ms": measure_query_latency(grouped, prepared, setup, queries),
+            "artifact_bytes": artifact_size(neighbors),
+            "vector_bytes": int(sum(matrix.nbytes for matrix in prepared.values())),
+        }
+        results.append(result)
+        print_log(f"{setup['name']}: " + ", ".join(f"recall@{k}={v:.4f}" for k, v in recalls.items() if v is not None)
+                  + f", 構築 {build_seconds:.2f}秒")
+    return results
+
+
+def recommend(results, recall_k, min_recall):
+    """品質の基準（recall@recall_k >= min_recall）を満たす中で、検索が最も速い設定"""
+    passing = [r for r in results
+               if r['recall'].get(str(recall_k)) is not None and r['recall'][str(recall_k)] >= min_recall]
+    if not passing:
+        return None
+    return min(passing, key=lambda r: (r['query_latency_ms'].get('p50', float('inf')), r['artifact_bytes']))['name']
+
+
+def format_table(results, ks, recommended):
+    header = (["設定"] + [f"recall@{k}" for k in ks]
+              + ["MAE", "構築(秒)", "p50(ms)", "p95(ms)", "p99(ms)", "成果物(KB)", "ベクトル(KB)"])
+    lines = ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    fmt = lambda value, spec: '-' if value is None else format(value, spec)
+    for r in results:
+        latency = r['query_latency_ms']
+        name = f"**{r['name']}** (推奨)" if r['name'] == recommended else r['name']
+        row = ([name] + [fmt(r['recall'][str(k)], '.4f') for k in ks]
+               + [fmt(r['score_mae'], '.2e'), f"{r['build_seconds']:.2f}",
+                  fmt(latency.get('p50'), '.3f'), fmt(latency.get('p95'), '.3f'), fmt(latency.get('p99'), '.3f'),
+                  f"{r['artifact_bytes'] / 1024:.1f}", f"{r['vector_bytes'] / 1024:.1f}"])
+        lines.append("| " + " | ".join(row) + " |")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="類似問題検索の品質とコストを設定ごとに比較します。")
+    # デフォルトパスをスクリプトからの相対パスとして定義
+    parser.add_argument('--input_json', type=str, default='gemma_embeddings.json', help='入力JSONファイルのパス')
+    parser.add_argument('--registry', type=str, default='../01_scraping/problem_registry.json',
+                        help='問題IDレジストリのパス（入力に問題ID列が無い場合に使う）')
+    parser.add_argument('--model', type=str, default=DEFAULT_MODEL, help='評価するモデル名（ベクトル列の決定に使う）')
+    parser.add_argument('--setups', type=str, default=None, help='比較する設定の JSON ファイル（省略時は組み込みの設定）')
+    parser.add_argument('--ks', type=str, default='1,5,10', help='recall@k の k（カンマ区切り）')
+    parser.add_argument('--queries', type=int, default=500, help='検索レイテンシを測る問題数')
+    parser.add_argument('--recall_k', type=int, default=5, help='品質の基準に使う recall@k の k')
+    parser.add_argument('--min_recall', type=float, default=0.95, help='品質の基準（recall@recall_k の下限）')
+    parser.add_argument('--cache_dir', type=str, default='benchmark_cache', help='正解の近傍のキャッシュ先')
+    parser.add_argument('--output_dir', type=str, default='.', help='比較表（benchmark_results.md / .json）の出力先')
+    args = parser.parse_args()
+
+    print_log("=== 類似問題検索ベンチマーク開始 ===")
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    resolve = lambda path: os.path.normpath(os.path.join(script_dir, path))
+    ks = sorted({int(k) for k in args.ks.split(',') if k.strip()} | {args.recall_k})
+
+    setups = DEFAULT_SETUPS
+    if args.setups:
+        with open(resolve(args.setups), 'r', encoding='utf-8') as f:
+            setups = json.load(f)
+
+    with open(resolve(args.input_json), 'r', encoding='utf-8') as f:
+        df = pd.DataFrame(json.load(f))
+    vector_column = get_vector_column_name(model_config_from_name(args.model))
+    for column in ('中項目', vector_column):
+        if column not in df.columns:
+            print_log(f"エラー: {column} 列が存在しません")
+            return
+    try:
+        ensure_problem_ids(df, resolve(args.registry))
+    except ValueError as e:
+        print_log(f"エラー: {e}")
+        return
+
+    grouped = group_vectors(df.to_dict('records'), vector_column)
+    truth, _ = load_or_compute_ground_truth(grouped, vector_column, max(ks), resolve(args.cache_dir))
+
+    results = run_benchmark(grouped, truth, setups, ks, args.queries)
+    recommended = recommend(results, args.recall_k, args.min_recall)
+    table = format_table(results, ks, recommended)
+
+    output_dir = resolve(args.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, 'benchmark_results.json'), 'w', encoding='utf-8') as f:
+        json.dump({"model": args.model, "problems": len(truth), "ks": ks,
+                   "quality_bar": {"recall_k": args.recall_k, "min_recall": args.min_recall},
+                   "recommended": recommended, "results": results}, f, ensure_ascii=False, indent=2)
+    with open(os.path.join(output_dir, 'benchmark_results.md'), 'w', encoding='utf-8') as f:
+        f.write(f"# 類似問題検索ベンチマーク（{args.model}, {len(truth)}問）\n\n{table}\n\n"
+                f"品質の基準: recall@{args.recall_k} >= {args.min_recall}\n")
+
+    print(table)
+    if recommended:
+        print_log(f"基準（recall@{args.recall_k} >= {args.min_recall}）を満たす最速の設定: {recommended}")
+    else:
+        print_log(f"基準（recall@{args.recall_k} >= {args.min_recall}）を満たす設定がありません")
+    print_log("=== 完了 ===")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""新しい試験回の問題ごとに、過去問の中から近い問題をまとめて探す
+
+新しい問題（ap_siken_all_items.csv と同じ列のCSV）をバッチでベクトル化し、
+既存の埋め込み（gemma_embeddings.json）との類似度を1回の行列積で計算して、問題ごとの上位k件をレポートに出力する。
+
+    py 03_html_output/classify_new.py --csv new_items.csv
+    py 03_html_output/classify_new.py --csv new_items.csv --same_category --top_k 10
+    py 03_html_output/classify_new.py --query_json new_embeddings.json   # ベクトル化済みの場合
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from main import (DEFAULT_MODEL, ID_COLUMN, ensure_problem_ids, get_vector_column_name, model_config_from_name,
+                  print_log)
+
+CSV_COLUMNS = ['大項目', '中項目', '問題番号', '問題名', 'リンク', '出典']
+DEFAULT_OLLAMA_URL = 'http://localhost:11434'
+# 類似度の行列を一度に作る問い合わせの数（問い合わせ数 × 過去問数 の float32 がメモリに載る範囲）
+QUERY_CHUNK_SIZE = 2048
+
+
+def build_texts(df, text_columns):
+    """ベクトル化する文字列（指定した列を空白でつなぐ）"""
+    return df[text_columns].fillna('').astype(str).agg(' '.join, axis=1).str.strip().tolist()
+
+
+def embed_with_ollama(texts, model_name, ollama_url, batch_size):
+    import requests
+
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        response = requests.post(f"{ollama_url.rstrip('/')}/api/embed", json={'model': model_name, 'input': batch}, timeout=600)
+        response.raise_for_status()
+        embeddings = response.json()['embeddings']
+        if len(embeddings) != len(batch):
+            raise ValueError(f"Ollama の応答の件数が一致しません（{len(batch)}件に対して{len(embeddings)}件）")
+        vectors.extend(embeddings)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def embed_with_sentence_transformers(texts, model_name, batch_size):
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        raise RuntimeError("sentence-transformers がインストールされていません（pip install sentence-transformers）")
+    model = SentenceTransformer(model_name)
+    return np.asarray(model.encode(texts, batch_size=batch_size, show_progress_bar=False), dtype=np.float32)
+
+
+def embed_texts(texts, model_config, batch_size, ollama_url=DEFAULT_OLLAMA_URL):
+    """モデルの種類に応じてバッチでベクトル化する（埋め込み作成時と同じモデルを使うこと）"""
+    if model_config.get('type') == 'sentence-transformers':
+        return embed_with_sentence_transformers(texts, model_config['huggingface_name'], batch_size)
+    return embed_with_ollama(texts, model_config['name'], ollama_url, batch_size)
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def nearest_neighbors(query_vectors, corpus_vectors, top_k, query_categories=None, corpus_categories=None,
+                      query_keys=None, corpus_keys=None):
+    """問い合わせごとの上位 top_k 件 (添字の行列, 類似度の行列) を返す。足りない分は添字 -1
+
+    query_categories / corpus_categories を渡すと同じ中項目の中だけで探す。
+    query_keys / corpus_keys（出典）を渡すと、同じ問題がすでに過去問側にある場合にそれを除く。
+    """
+    queries = normalize_rows(query_vectors)
+    corpus = normalize_rows(corpus_vectors)
+    k = min(top_k, len(corpus))
+    indices = np.full((len(queries), top_k), -1, dtype=np.int64)
+    scores = np.full((len(queries), top_k), np.nan, dtype=np.float32)
+    if k == 0:
+        return indices, scores
+
+    if query_categories is not None:
+        codes = {name: code for code, name in enumerate(pd.unique(np.concatenate([corpus_categories, query_categories])))}
+        corpus_codes = np.array([codes[c] for c in corpus_categories])
+        query_codes = np.array([codes[c] for c in query_categories])
+    if query_keys is not None:
+        corpus_positions = {key: position for position, key in enumerate(corpus_keys)}
+
+    for start in range(0, len(queries), QUERY_CHUNK_SIZE):
+        end = min(start + QUERY_CHUNK_SIZE, len(queries))
+        sims = queries[start:end] @ corpus.T
+        if query_categories is not None:
+            sims[query_codes[start:end, None] != corpus_codes[None, :]] = -np.inf
+        if query_keys is not None:
+            for row, key in enumerate(query_keys[start:end]):
+                position = corpus_positions.get(key)
+                if position is not None:
+                    sims[row, position] = -np.inf
+
+        # 上位k件だけを部分ソートで取り出してから並べる
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        order = np.lexsort((top, -top_sims), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_sims = np.take_along_axis(top_sims, order, axis=1)
+
+        valid = np.isfinite(top_sims)
+        indices[start:end, :k] = np.where(valid, top, -1)
+        scores[start:end, :k] = np.where(valid, top_sims, np.nan)
+    return indices, scores
+
+
+def build_report(queries, corpus, indices, scores):
+    """レポートの行（問い合わせ × 順位）"""
+    rows = []
+    for q, query in enumerate(queries.to_dict('records')):
+        for rank, (index, score) in enumerate(zip(indices[q], scores[q]), start=1):
+            if index < 0:
+                continue
+            match = corpus[index]
+            rows.append({
+                '新問題_出典': query.get('出典'),
+                '新問題_問題名': query.get('問題名'),
+                '新問題_中項目': query.get('中項目'),
+                '順位': rank,
+                '類似度': round(float(score), 6),
+                ID_COLUMN: int(match[ID_COLUMN]),
+                '出典': match.get('出典'),
+                '問題名': match.get('問題名'),
+                '中項目': match.get('中項目'),
+                'リンク': match.get('リンク'),
+            })
+    return rows
+
+
+def write_report(rows, queries, output_path):
+    """CSV（1行 = 問い合わせ × 順位）と JSON（問い合わせごとに近い問題の一覧）を書き出す"""
+    base = os.path.splitext(output_path)[0]
+    pd.DataFrame(rows).to_csv(base + '.csv', index=False, encoding='utf-8-sig')
+
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row['新問題_出典'], []).append(
+            {key: row[key] for key in ('順位', '類似度', ID_COLUMN, '出典', '問題名', '中項目', 'リンク')})
+    report = [{'出典': query.get('出典'), '問題名': query.get('問題名'), '中項目': query.get('中項目'),
+               'neighbors': grouped.get(query.get('出典'), [])}
+              for query in queries.to_dict('records')]
+    with open(base + '.json', 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return base + '.csv', base + '.json'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="新しい問題ごとに、過去問の中から近い問題をまとめて探します。")
+    # デフォルトパスをスクリプトからの相対パスとして定義
+    parser.add_argument('--csv', type=str, default=None, help='新しい問題のCSV（ap_siken_all_items.csv と同じ列）')
+    parser.add_argument('--query_json', type=str, default=None, help='ベクトル化済みの新しい問題のJSON（--csv の代わり）')
+    parser.add_argument('--corpus_json', type=str, default='gemma_embeddings.json', help='過去問の埋め込みJSON')
+    parser.add_argument('--registry', type=str, default='../01_scraping/problem_registry.json',
+                        help='問題IDレジストリのパス（過去問の埋め込みに問題ID列が無い場合に使う）')
+    parser.add_argument('--model', type=str, default=DEFAULT_MODEL, help='モデル名（過去問の埋め込みと同じもの）')
+    parser.add_argument('--text_columns', type=str, default='問題名', help='ベクトル化する列（カンマ区切り。埋め込み作成時と同じにする）')
+    parser.add_argument('--batch_size', type=int, default=64, help='ベクトル化のバッチサイズ')
+    parser.add_argument('--ollama_url', type=str, default=DEFAULT_OLLAMA_URL, help='Ollama のURL')
+    parser.add_argument('--top_k', type=int, default=5, help='問題ごとに出力する件数')
+    parser.add_argument('--same_category', action='store_true', help='同じ中項目の過去問だけから探す')
+    parser.add_argument('--include_same_source', action='store_true', help='出典が同じ過去問（同じ問題）も候補に含める')
+    parser.add_argument('--output', type=str, default='classify_report', help='レポートの出力先（.csv と .json を出力）')
+    args = parser.parse_args()
+
+    print_log("=== 新しい問題の類似問題検索開始 ===")
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    resolve = lambda path: os.path.normpath(os.path.join(script_dir, path))
+    if not args.csv and not args.query_json:
+        print_log("エラー: --csv または --query_json を指定してください")
+        return
+
+    model_config = model_config_from_name(args.model)
+    vector_column = get_vector_column_name(model_config)
+
+    with open(resolve(args.corpus_json), 'r', encoding='utf-8') as f:
+        corpus_df = pd.DataFrame(json.load(f))
+    if vector_column not in corpus_df.columns:
+        print_log(f"エラー: 過去問の埋め込みに {vector_column} 列が存在しません")
+        return
+    try:
+        ensure_problem_ids(corpus_df, resolve(args.registry))
+    except ValueError as e:
+        print_log(f"エラー: {e}")
+        return
+    corpus_df = corpus_df[corpus_df[vector_column].map(lambda v: v is not None and len(v) > 0)].reset_index(drop=True)
+    corpus_vectors = np.asarray(corpus_df[vector_column].tolist(), dtype=np.float32)
+
+    if args.query_json:
+        with open(resolve(args.query_json), 'r', encoding='utf-8') as f:
+            queries = pd.DataFrame(json.load(f))
+        if vector_column not in queries.columns:
+            print_log(f"エラー: {args.query_json} に {vector_column} 列が存在しません")
+            return
+        query_vectors = np.asarray(queries[vector_column].tolist(), dtype=np.float32)
+    else:
+        queries = pd.read_csv(resolve(args.csv), encoding='utf-8-sig')
+        text_columns = [c.strip() for c in args.text_columns.split(',') if c.strip()]
+        for col in CSV_COLUMNS + text_columns:
+            if col not in queries.columns:
+                print_log(f"エラー: {col} 列が存在しません")
+                return
+        started = time.perf_counter()
+        query_vectors = embed_texts(build_texts(queries, text_columns), model_config, args.batch_size, args.ollama_url)
+        print_log(f"{len(queries)}問をベクトル化しました（{time.perf_counter() - started:.2f}秒）")
+
+    if query_vectors.shape[1] != corpus_vectors.shape[1]:
+        print_log(f"エラー: ベクトルの次元数が一致しません（新しい問題: {query_vectors.shape[1]}, 過去問: {corpus_vectors.shape[1]}）")
+        return
+
+    started = time.perf_counter()
+    indices, scores = nearest_neighbors(
+        query_vectors, corpus_vectors, args.top_k,
+        query_categories=queries['中項目'].to_numpy() if args.same_category else None,
+        corpus_categories=corpus_df['中項目'].to_numpy() if args.same_category else None,
+        query_keys=None if args.include_same_source else queries['出典'].tolist(),
+        corpus_keys=None if args.include_same_source else corpus_df['出典'].tolist())
+    print_log(f"{len(queries)}問 × 過去問{len(corpus_df)}問の類似度を計算しました（{time.perf_counter() - started:.2f}秒）")
+
+    rows = build_report(queries, corpus_df.drop(columns=[vector_column]).to_dict('records'), indices, scores)
+    csv_path, json_path = write_report(rows, queries.drop(columns=[vector_column], errors='ignore'), resolve(args.output))
+    print_log(f"レポート出力完了: {csv_path}, {json_path}")
+    print_log("=== 完了 ===")
+
+
+if __name__ == '__main__':
+    main()
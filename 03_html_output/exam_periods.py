@@ -0,0 +1,119 @@
+"""出題回（出典の「R5春期」などの部分）ごとの絞り込みに使う索引
+
+問題には出題回の通し番号 period（古い順に 0, 1, ...）を付け、番号と出題回の対応を periods に出力する。
+
+「ある出題回以降の問題に限った類似度上位k件」を正確に答えられるよう、問題ごとに次の条件を満たす類似問題だけを
+period_neighbors として残す（同じ中項目内、類似度の高い順）:
+
+    問題 j は、出題回が j と同じかそれより新しい候補の中で上位k件に入る
+
+出題回 P 以降の上位k件に入る問題 j は、候補を「j の出題回以降」に狭めても上位k件に入るので必ず残っている。
+したがって similar_problems と period_neighbors を合わせて period >= P で絞り込み、類似度の高い順に先頭k件を取れば、
+全候補から求めた結果と一致する。
+
+アプリは同じ重複グループ（near_duplicates.py）の問題を1件にまとめてから上位k件を表示するので、まとめた場合も正確に
+返せるよう、次の条件を満たす問題も残す（問題と同じグループの候補は数えない）:
+
+    問題 j は、出題回が j と同じかそれより新しい候補の中で自分のグループの先頭であり、かつ
+    それらの候補を重複グループごとに1件と数えて上位k件に入る
+
+絞り込まない場合の上位k件は similar_problems と重なるので、problem_data.js を小さくするため period_neighbors には
+similar_problems に無い候補だけを [問題ID, 類似度（小数4桁）] の組で入れる。これらは similar_problems のどれよりも類似度が
+低いので、使う側は丸めた類似度で並べ直さず、similar_problems の後ろにこの順のままつなぐ。
+"""
+import re
+
+import numpy as np
+
+# 絞り込み後に正確に返せる件数
+PERIOD_TOP_K = 5
+
+PERIOD_PATTERN = re.compile(r'^\s*([HR])\s*(\d+|元)\s*(春期|特別|秋期)')
+ERA_OFFSETS = {'H': 1988, 'R': 2018}
+# H23特別（2011年6月）は春期の代わりに行われたので、同じ年の春期と秋期の間に並べる
+SEASON_ORDER = {'春期': 0, '特別': 1, '秋期': 2}
+
+
+def period_label(source):
+    """出典（例: 'R5春期 問1'）から出題回のラベル（'R5春期'）を取り出す。形式が違えば None"""
+    match = PERIOD_PATTERN.match(str(source or ''))
+    if not match:
+        return None
+    era, year, season = match.groups()
+    return f"{era}{year}{season}"
+
+
+def period_sort_key(label):
+    era, year, season = PERIOD_PATTERN.match(label).groups()
+    return ERA_OFFSETS[era] + (1 if year == '元' else int(year)), SEASON_ORDER[season]
+
+
+def attach_periods(problems):
+    """問題テーブル（欠番は None）に period を付け、出題回のラベルを古い順に並べたリストを返す"""
+    labels = {problem['id']: period_label(problem.get('出典')) for problem in problems if problem is not None}
+    periods = sorted({label for label in labels.values() if label}, key=period_sort_key)
+    index = {label: position for position, label in enumerate(periods)}
+    for problem in problems:
+        if problem is not None and labels[problem['id']] is not None:
+            problem['period'] = index[labels[problem['id']]]
+    return periods
+
+
+def period_skyline(scores, candidate_periods, k=PERIOD_TOP_K, candidate_groups=None, main_group=-1):
+    """1問分の候補（類似度と出題回の配列）から、出題回で絞り込んでも上位k件を正確に返せる候補を選ぶ
+
+    candidate_groups（重複グループ。無い候補は -1）を渡すと、重複をまとめてから上位k件を取る場合の候補も選ぶ。
+    main_group は問題自身の重複グループ（このグループの候補はまとめた結果に含めない）。
+    戻り値は選んだ候補の添字（類似度の高い順）。出題回の無い候補は選ばない。
+    """
+    order = np.argsort(-scores, kind='stable')
+    periods = candidate_periods[order]
+    # 自分より類似度が高く、出題回が同じかそれより新しい候補の数 < k なら残す
+    newer_or_same_and_better = (periods[None, :] >= periods[:, None]) & np.tri(len(order), k=-1, dtype=bool)
+    keep = newer_or_same_and_better.sum(axis=1) < k
+    if candidate_groups is not None:
+        keep |= _collapsed_skyline(periods, candidate_groups[order], main_group, newer_or_same_and_better, k)
+    return order[keep & (periods >= 0)]
+
+
+def _collapsed_skyline(periods, groups, main_group, newer_or_same_and_better, k):
+    """重複グループを1件にまとめてから上位k件を取る場合に残す候補（類似度の高い順に並べた配列で受け取る）"""
+    # 同じグループで自分より類似度が高い候補の出題回の最大値（無ければ -1）。
+    # これが出題回 P より前なら、P 以降に絞り込んだときに自分がグループの先頭になる
+    previous_latest = np.full(len(groups), -1)
+    latest = {}
+    for position, group in enumerate(groups):
+        if group >= 0:
+            previous_latest[position] = latest.get(group, -1)
+            latest[group] = max(latest.get(group, -1), periods[position])
+    counted = (groups < 0) | (groups != main_group)
+    heads = previous_latest[None, :] < periods[:, None]
+    ahead = (newer_or_same_and_better & heads & counted[None, :]).sum(axis=1)
+    return (ahead < k) & (previous_latest < periods) & counted
+
+
+def compute_period_neighbors(grouped, problems, k=PERIOD_TOP_K):
+    """中項目ごとに {問題ID: [{'id', 'similarity'}, ...]} を求める（類似度の高い順）"""
+    neighbors = {}
+    for ids, vectors in grouped.values():
+        if len(ids) < 2:
+            continue
+        normalized = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        sims = normalized @ normalized.T
+        periods = np.array([problems[x].get('period', -1) for x in ids])
+        groups = np.array([-1 if problems[x].get('duplicate_group') is None else problems[x]['duplicate_group'] for x in ids])
+        for row, problem_id in enumerate(ids):
+            others = np.flatnonzero(np.arange(len(ids)) != row)
+            selected = others[period_skyline(sims[row, others], periods[others], k, groups[others], groups[row])]
+            neighbors[problem_id] = [{'id': ids[col], 'similarity': float(sims[row, col])} for col in selected]
+    return neighbors
+
+
+def attach_period_neighbors(results, grouped, k=PERIOD_TOP_K):
+    """categories の各項目に period_neighbors（similar_problems に無い候補の [問題ID, 類似度] のリスト）を付ける"""
+    neighbors = compute_period_neighbors(grouped, results['problems'], k)
+    for items in results['categories'].values():
+        for item in items:
+            listed = {sim['id'] for sim in item['similar_problems']}
+            item['period_neighbors'] = [[sim['id'], round(sim['similarity'], 4)]
+                                        for sim in neighbors.get(item['main_problem'], []) if sim['id'] not in listed]
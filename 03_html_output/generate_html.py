@@ -1,5 +1,134 @@
+import glob
+import gzip
+import hashlib
 import json
 import os
+import struct
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # 無ければ .gz だけを出力する
+
+# Service Worker がキャッシュする静的ファイル（プロジェクトルートからの相対パス）
+STATIC_ASSETS = ['index.html', 'app.js', 'style.css']
+STATIC_ASSET_PATTERNS = ['js/*.js']
+DATA_FILE_PREFIX = 'problem_data.'
+MODEL_DATA_PREFIX = 'problem_data_'
+# main.py --embeddings_binary が problem_data.js と並べて出力する埋め込みベクトル
+EMBEDDINGS_SUFFIX = '.embeddings.bin'
+EMBEDDINGS_FILE_PREFIX = 'problem_embeddings.'
+# start_server.py が Accept-Encoding に応じて返す圧縮済みファイル
+PRECOMPRESSED_SUFFIXES = ['.gz', '.br']
+
+
+def content_hash(data):
+    """ビルド成果物のバージョンに使う、SHA-256 の先頭16桁"""
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def list_static_assets(project_root):
+    assets = list(STATIC_ASSETS)
+    for pattern in STATIC_ASSET_PATTERNS:
+        matched = glob.glob(os.path.join(project_root, pattern))
+        assets.extend(sorted(os.path.relpath(path, project_root).replace(os.sep, '/') for path in matched))
+    return assets
+
+
+def build_version(project_root, assets, data_hashes):
+    """問題データと index.html 以外の静的ファイルの内容から、ビルドのバージョンを決める"""
+    digest = hashlib.sha256(','.join(data_hashes).encode('utf-8'))
+    for asset in assets:
+        if asset == 'index.html':
+            continue
+        digest.update(asset.encode('utf-8'))
+        with open(os.path.join(project_root, asset), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def serialize_data(data):
+    """問題データを出力用のバイト列にし、そのハッシュと組で返す"""
+    data_bytes = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return data_bytes, content_hash(data_bytes)
+
+
+def write_data_file(project_root, data_bytes, data_hash):
+    """ハッシュ付きの問題データを書き出す"""
+    data_file = f"{DATA_FILE_PREFIX}{data_hash}.json"
+    with open(os.path.join(project_root, data_file), 'wb') as f:
+        f.write(data_bytes)
+    return data_file
+
+
+def remove_stale_data_files(project_root, keep):
+    """今回のビルドで使わない（以前のビルドの）データファイルと埋め込みベクトルを削除する"""
+    patterns = [f"{DATA_FILE_PREFIX}*.json", f"{EMBEDDINGS_FILE_PREFIX}*.bin"]
+    for old_path in (path for pattern in patterns for path in glob.glob(os.path.join(project_root, pattern))):
+        if os.path.basename(old_path) not in keep:
+            os.remove(old_path)
+            for suffix in PRECOMPRESSED_SUFFIXES:
+                if os.path.exists(old_path + suffix):
+                    os.remove(old_path + suffix)
+
+
+def precompress(path):
+    """path と並べて圧縮済みのファイル（.gz、brotli があれば .br）を書き出す"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data)
+    for suffix in PRECOMPRESSED_SUFFIXES:
+        if suffix in variants:
+            with open(path + suffix, 'wb') as f:
+                f.write(variants[suffix])
+        elif os.path.exists(path + suffix):
+            # 以前のビルドの圧縮ファイルが古い内容のまま残らないようにする
+            os.remove(path + suffix)
+
+
+def read_embeddings(js_path):
+    """problem_data.js と対になる埋め込みベクトルを読み込む。(バイト列, ハッシュ, 行数, 次元数)、無ければ None"""
+    path = os.path.splitext(js_path)[0] + EMBEDDINGS_SUFFIX
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        data = f.read()
+    # ヘッダー: b'OYOE'、形式のバージョン、行数、次元数（js/embedding-search.js と同じ）
+    _, count, dims = struct.unpack('<III', data[4:16])
+    return data, content_hash(data), count, dims
+
+
+def write_embeddings_file(project_root, embeddings):
+    """ハッシュ付きの埋め込みベクトルを書き出し、ビルド情報に載せる内容を返す"""
+    data, data_hash, count, dims = embeddings
+    embeddings_file = f"{EMBEDDINGS_FILE_PREFIX}{data_hash}.bin"
+    with open(os.path.join(project_root, embeddings_file), 'wb') as f:
+        f.write(data)
+    return {'hash': data_hash, 'url': embeddings_file, 'count': count, 'dims': dims}
+
+
+def read_problem_data_js(path):
+    """main.py が出力した "window.PROBLEM_DATA = {json};" から JSON を取り出す"""
+    with open(path, 'r', encoding='utf-8') as f:
+        js_content = f.read()
+    json_start = js_content.find('{')
+    json_end = js_content.rfind('}') + 1
+    return json.loads(js_content[json_start:json_end])
+
+
+def load_model_variants(script_dir):
+    """main.py --models で出力されたモデル別のデータ（problem_data_<モデル>.js）を読み込む"""
+    variants = []
+    for path in sorted(glob.glob(os.path.join(script_dir, f"{MODEL_DATA_PREFIX}*.js"))):
+        model_id = os.path.basename(path)[len(MODEL_DATA_PREFIX):-len('.js')]
+        data = read_problem_data_js(path)
+        if not data.get('model'):
+            data['model'] = model_id
+        variants.append((model_id, data))
+    return variants
+
 
 def main():
     with open('gen_log.txt', 'w') as log:
@@ -18,15 +147,8 @@ def main():
         return
 
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            js_content = f.read()
-        
         # Extract JSON string from "window.PROBLEM_DATA = {json};"
-        json_start = js_content.find('{')
-        json_end = js_content.rfind('}') + 1
-        json_str = js_content[json_start:json_end]
-        
-        data = json.loads(json_str)
+        data = read_problem_data_js(json_path)
         
         # Add model name explicitly if missing
         if 'model' not in data or not data['model']:
@@ -53,10 +175,73 @@ def main():
         print(f"Error reading template: {e}")
         return
 
-    # Embed data
-    embedding_script = f'<script>window.PROBLEM_DATA = {json_str};</script>'
+    try:
+        model_variants = load_model_variants(script_dir)
+    except Exception as e:
+        print(f"Error reading model data: {e}")
+        return
+
+    # 問題データは内容のハッシュ付きのファイルとして出力し、index.html にはハッシュとURLだけを埋め込む
+    # アプリは同じハッシュのデータを IndexedDB に持っていればダウンロードしない（js/offline-cache.js）
+    data_bytes, data_hash = serialize_data(data)
+    serialized_variants = [(model_id, variant['model'], *serialize_data(variant)) for model_id, variant in model_variants]
+    # 埋め込みベクトル（任意）はクライアントでの類似問題検索に使う（js/embedding-search.js）
+    try:
+        embeddings = read_embeddings(json_path)
+        variant_embeddings = {model_id: read_embeddings(os.path.join(script_dir, f"{MODEL_DATA_PREFIX}{model_id}.js"))
+                              for model_id, _ in model_variants}
+    except Exception as e:
+        print(f"Error reading embeddings: {e}")
+        return
+    embedding_hashes = [entry[1] for entry in [embeddings, *variant_embeddings.values()] if entry]
+    assets = list_static_assets(project_root)
+    version = build_version(project_root, assets, [data_hash] + [variant[3] for variant in serialized_variants] + embedding_hashes)
+
+    try:
+        data_file = write_data_file(project_root, data_bytes, data_hash)
+        print(f"Wrote problem data to: {data_file}")
+        manifest = {'version': version, 'dataHash': data_hash, 'dataUrl': data_file, 'model': data['model']}
+        if embeddings:
+            manifest['embeddings'] = write_embeddings_file(project_root, embeddings)
+            print(f"Wrote embeddings to: {manifest['embeddings']['url']}")
+        # モデル別のデータは切り替え用に一覧として埋め込む（アプリの loadData(modelId) で読み込む）
+        models = []
+        for model_id, model_name, variant_bytes, variant_hash in serialized_variants:
+            variant_file = write_data_file(project_root, variant_bytes, variant_hash)
+            model = {'id': model_id, 'model': model_name, 'dataHash': variant_hash, 'dataUrl': variant_file}
+            if variant_embeddings[model_id]:
+                model['embeddings'] = write_embeddings_file(project_root, variant_embeddings[model_id])
+            models.append(model)
+            print(f"Wrote {model_name} data to: {variant_file}")
+        manifest['models'] = models
+        keep = {data_file} | {model['dataUrl'] for model in models}
+        keep |= {dataset['embeddings']['url'] for dataset in [manifest, *models] if 'embeddings' in dataset}
+        remove_stale_data_files(project_root, keep)
+    except Exception as e:
+        print(f"Error writing problem data: {e}")
+        return
+
+    # "</script>" で途中終了しないよう "</" はエスケープする（JSONとしては同じ値）
+    manifest_json = json.dumps(manifest, ensure_ascii=False).replace('</', '<\\/')
+    embedding_script = f'<script type="application/json" id="build-manifest">{manifest_json}</script>'
     output_content = template_content.replace('<!-- DATA_PLACEHOLDER -->', embedding_script)
-    
+
+    # Service Worker にビルドのバージョンとキャッシュするファイルを埋め込む
+    sw_template_path = os.path.join(project_root, 'sw_template.js')
+    sw_path = os.path.join(project_root, 'sw.js')
+    try:
+        with open(sw_template_path, 'r', encoding='utf-8') as f:
+            sw_content = f.read()
+        precache_urls = ['./'] + assets
+        sw_content = sw_content.replace('__BUILD_VERSION__', version)
+        sw_content = sw_content.replace('__PRECACHE_URLS__', json.dumps(precache_urls, ensure_ascii=False))
+        with open(sw_path, 'w', encoding='utf-8') as f:
+            f.write(sw_content)
+        print(f"Wrote service worker to: {sw_path} (build {version})")
+    except Exception as e:
+        print(f"Error writing service worker: {e}")
+        return
+
     print(f"Writing output to: {output_path}")
     try:
         with open(output_path, 'w', encoding='utf-8') as f:
@@ -64,6 +249,15 @@ def main():
         print("Successfully generated index.html with embedded data.")
     except Exception as e:
         print(f"Error writing output: {e}")
+        return
+
+    # 大きいファイルは圧縮済みのものも用意しておく（start_server.py が Accept-Encoding に応じて返す）
+    try:
+        for path in [os.path.join(project_root, name) for name in sorted(keep)] + [output_path]:
+            precompress(path)
+        print(f"Wrote precompressed files ({'.gz, .br' if brotli else '.gz'})")
+    except Exception as e:
+        print(f"Error writing precompressed files: {e}")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,146 @@
+"""出力済みのデータから1問分の類似問題をすぐに引くコマンド
+
+main.py（pandas・scikit-learn を読み込む）を通さず、problem_data.sqlite3 だけを標準ライブラリで読むので、
+スクリプトから何度呼んでも起動が速い。numpy は --vector（埋め込みベクトルからその場で検索）のときだけ読み込む。
+
+    py 03_html_output/lookup.py 123
+    py 03_html_output/lookup.py --source "R5春期 問 1" --limit 5 --json
+    py 03_html_output/lookup.py 123 --vector --all_categories
+    py 03_html_output/lookup.py 123 --since R5春期
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+
+from neighbor_store import NeighborStore
+
+# main.py の write_embeddings_binary と同じ形式
+EMBEDDINGS_MAGIC = b'OYOE'
+EMBEDDINGS_FORMAT_VERSION = 1
+EMBEDDINGS_HEADER_BYTES = 16
+
+
+def embeddings_path_for_db(db_path):
+    """problem_data.sqlite3 と同じ場所に出力される埋め込みベクトル（problem_data.embeddings.bin）のパス"""
+    return os.path.splitext(db_path)[0] + '.embeddings.bin'
+
+
+def load_embeddings(path):
+    """埋め込みベクトルのバイナリを (行数×次元数の float32 の行列) として読む"""
+    import numpy as np
+
+    with open(path, 'rb') as f:
+        header = f.read(EMBEDDINGS_HEADER_BYTES)
+        if len(header) != EMBEDDINGS_HEADER_BYTES or header[:4] != EMBEDDINGS_MAGIC:
+            raise ValueError(f"埋め込みベクトルのファイル形式が正しくありません: {path}")
+        version, count, dims = struct.unpack('<III', header[4:])
+        if version != EMBEDDINGS_FORMAT_VERSION:
+            raise ValueError(f"未対応の埋め込みベクトルの形式です: {version}")
+        matrix = np.frombuffer(f.read(), dtype='<f2')
+    if matrix.size != count * dims:
+        raise ValueError(f"埋め込みベクトルのサイズが一致しません: {path}")
+    return matrix.reshape(count, dims).astype(np.float32)
+
+
+def vector_neighbors(matrix, problem_id, candidates=None, limit=10, min_score=None):
+    """埋め込みベクトルの内積で近い問題を類似度の高い順に返す [{'id', 'similarity', 'rank'}]"""
+    import numpy as np
+
+    if not 0 <= problem_id < len(matrix):
+        return []
+    norms = np.linalg.norm(matrix, axis=1)
+    if norms[problem_id] == 0:
+        return []
+    ids = np.arange(len(matrix)) if candidates is None else np.asarray(candidates, dtype=np.int64)
+    ids = ids[(ids != problem_id) & (norms[ids] > 0)]
+    # float16 への丸めで長さがずれるので正規化し直してから内積を取る
+    scores = (matrix[ids] / norms[ids, None]) @ (matrix[problem_id] / norms[problem_id])
+    if min_score is not None:
+        keep = scores >= min_score
+        ids, scores = ids[keep], scores[keep]
+    order = np.lexsort((ids, -scores))[:limit]
+    return [{'id': int(ids[i]), 'similarity': round(float(scores[i]), 4), 'rank': rank}
+            for rank, i in enumerate(order, start=1)]
+
+
+def format_text(problem, neighbors):
+    lines = [f"[{problem['id']}] {problem['出典']} {problem['問題名']}（{problem['中項目']}）"]
+    for position, neighbor in enumerate(neighbors, start=1):
+        lines.append(f"  {position:>2}. {neighbor['similarity']:.4f} [{neighbor['id']}] "
+                     f"{neighbor['出典']} {neighbor['問題名']}")
+    if not neighbors:
+        lines.append("  （類似問題はありません）")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="出力済みのデータから問題の類似問題を引きます。")
+    # デフォルトパスをスクリプトからの相対パスとして定義
+    parser.add_argument('problem_id', type=int, nargs='?', help='問題ID')
+    parser.add_argument('--source', type=str, default=None, help='問題IDの代わりに出典で指定する（例: R5春期 問 1）')
+    parser.add_argument('--db', type=str, default='problem_data.sqlite3', help='main.py が出力した SQLite のパス')
+    parser.add_argument('--limit', type=int, default=10, help='表示する類似問題の件数')
+    parser.add_argument('--min_score', type=float, default=None, help='類似度の下限')
+    parser.add_argument('--referrers', action='store_true', help='この問題を類似問題に挙げている問題を表示する')
+    parser.add_argument('--vector', action='store_true', help='埋め込みベクトル（--embeddings_binary の出力）からその場で検索する')
+    parser.add_argument('--all_categories', action='store_true', help='--vector のとき、全分野から探す（既定は同じ中項目）')
+    parser.add_argument('--since', type=str, default=None,
+                        help='この出題回（例: R5春期）以降の問題だけから探す（ビルド時の類似問題は上位5件まで正確）')
+    parser.add_argument('--json', action='store_true', help='JSONで出力する')
+    args = parser.parse_args(argv)
+
+    if args.problem_id is None and args.source is None:
+        parser.error('問題IDまたは --source を指定してください')
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    db_path = os.path.normpath(os.path.join(script_dir, args.db))
+    if not os.path.exists(db_path):
+        print(f"エラー: {db_path} が見つかりません（main.py を --no_sqlite なしで実行してください）", file=sys.stderr)
+        return 1
+
+    with NeighborStore(db_path) as store:
+        problem = store.problem(args.problem_id) if args.source is None else store.problem_by_source(args.source)
+        if problem is None:
+            print(f"エラー: 問題が見つかりません: {args.source or args.problem_id}", file=sys.stderr)
+            return 1
+
+        min_period = None
+        if args.since is not None:
+            min_period = store.period_index(args.since)
+            if min_period is None:
+                print(f"エラー: 出題回が見つかりません: {args.since}（例: {'、'.join(store.periods()[-2:])}）", file=sys.stderr)
+                return 1
+
+        if args.vector:
+            embeddings_path = embeddings_path_for_db(db_path)
+            if not os.path.exists(embeddings_path):
+                print(f"エラー: {embeddings_path} が見つかりません（main.py を --embeddings_binary 付きで実行してください）", file=sys.stderr)
+                return 1
+            candidates = None if args.all_categories else [p['id'] for p in store.problems_in_category(problem['中項目'])]
+            if min_period is not None:
+                candidates = store.problem_ids_since(min_period, candidates)
+            neighbors = vector_neighbors(load_embeddings(embeddings_path), problem['id'], candidates, args.limit, args.min_score)
+        elif args.referrers:
+            neighbors = store.referrers(problem['id'], args.min_score)
+            if min_period is not None:
+                allowed = set(store.problem_ids_since(min_period, [n['id'] for n in neighbors]))
+                neighbors = [n for n in neighbors if n['id'] in allowed]
+            neighbors = neighbors[:args.limit]
+        else:
+            neighbors = store.neighbors(problem['id'], args.limit, args.min_score, min_period)
+
+        details = {p['id']: p for p in store.problems([n['id'] for n in neighbors])}
+        neighbors = [{**details[n['id']], 'similarity': n['similarity'], 'rank': n['rank']}
+                     for n in neighbors if n['id'] in details]
+
+    if args.json:
+        print(json.dumps({'problem': problem, 'neighbors': neighbors}, ensure_ascii=False, indent=2))
+    else:
+        print(format_text(problem, neighbors))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
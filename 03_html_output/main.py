@@ -3,10 +3,32 @@ import numpy as np
 import json
 import os
 import argparse
+import shutil
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
 from sklearn.metrics.pairwise import cosine_similarity
 from collections import defaultdict
 from tqdm import tqdm
 
+from neighbor_store import sqlite_path_for, write_neighbor_store
+from exam_periods import attach_period_neighbors, attach_periods
+from near_duplicates import attach_duplicate_groups
+from similarity_graph import attach_graph_scores
+from title_search import build_search_index
+from topic_clusters import attach_topics
+
+ID_COLUMN = '問題ID'
+# この類似度以上で他の問題の類似リストに現れた回数を「被参照数」とする
+REFERENCE_SIMILARITY_THRESHOLD = 0.80
+DEFAULT_MODEL = 'embeddinggemma'
+# モデル間の一致度は、各問題の類似度上位この件数の重なりで比べる
+AGREEMENT_TOP_K = 5
+VECTOR_COLUMN_PREFIX = 'vector_'
+# 埋め込みベクトルのバイナリ（js/embedding-search.js が読む形式）
+EMBEDDINGS_MAGIC = b'OYOE'
+EMBEDDINGS_FORMAT_VERSION = 1
+
 def print_log(message):
     print(f"[{pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}")
 
@@ -26,61 +48,330 @@ def select_output_data(data_dict):
     """JSONに出力するデータを選択する"""
     # ベクトル列を除いた、表示に必要なデータだけを返す
     required_keys = ['大項目', '中項目', '問題番号', '問題名', 'リンク', '出典']
-    return {key: data_dict.get(key) for key in required_keys}
+    output = {'id': int(data_dict[ID_COLUMN])}
+    output.update({key: data_dict.get(key) for key in required_keys})
+    return output
+
+def load_problem_ids(registry_path):
+    """01_scraping で作成した問題IDレジストリ（出典 -> ID）を読み込む"""
+    with open(registry_path, 'r', encoding='utf-8') as f:
+        registry = json.load(f)
+    return registry['key'], registry['ids']
+
+def ensure_problem_ids(df, registry_path):
+    """問題ID列をそろえる。ベクトル化前のCSVに問題IDが無い古い埋め込みはレジストリから補完する
+
+    未登録の問題がある場合やレジストリが無い場合は ValueError（メッセージはそのままログに出せる形）。
+    """
+    if ID_COLUMN not in df.columns:
+        if not os.path.exists(registry_path):
+            raise ValueError(f"{ID_COLUMN} 列が無く、問題IDレジストリ {registry_path} も見つかりません。"
+                             "01_scraping/problem_registry.py を実行してください")
+        key_column, problem_ids = load_problem_ids(registry_path)
+        df[ID_COLUMN] = df[key_column].map(problem_ids)
+    if df[ID_COLUMN].isna().any():
+        missing = df.loc[df[ID_COLUMN].isna(), '出典'].tolist() if '出典' in df.columns else []
+        example = f"、例: {missing[0]}" if missing else ''
+        raise ValueError(f"問題IDが未登録の問題があります（{int(df[ID_COLUMN].isna().sum())}件{example}）。"
+                         "01_scraping/problem_registry.py を実行してください")
+    df[ID_COLUMN] = df[ID_COLUMN].astype(int)
+    return df
+
+
+def build_problem_table(records):
+    """問題IDをそのまま添字として引ける問題テーブルを作る（欠番は None）"""
+    size = max((int(r[ID_COLUMN]) for r in records), default=-1) + 1
+    problems = [None] * size
+    for record in records:
+        problems[int(record[ID_COLUMN])] = select_output_data(record)
+    # 問題名がほぼ同じ問題（再出題）はモデルに依らないので、ここで重複グループを付けておく
+    group_count = attach_duplicate_groups(problems)
+    print_log(f"問題名の重複グループ: {group_count}個")
+    return problems
 
-def compute_similarities(df, vector_column):
+def model_config_from_name(model_name):
+    """モデル名からモデル設定を作る（"/" を含む名前は sentence-transformers の Hugging Face 名とみなす）"""
+    if model_name == DEFAULT_MODEL:
+        return {"name": model_name, "type": "ollama"}
+    if '/' in model_name:
+        return {"name": model_name, "type": "sentence-transformers", "huggingface_name": model_name}
+    return {"name": model_name, "type": "ollama"}
+
+def discover_models(df):
+    """入力に含まれるベクトル列からモデル設定を推定する"""
+    models = []
+    if 'embedding' in df.columns:
+        models.append(model_config_from_name(DEFAULT_MODEL))
+    for column in df.columns:
+        if column.startswith(VECTOR_COLUMN_PREFIX):
+            models.append({"name": column[len(VECTOR_COLUMN_PREFIX):], "type": "ollama"})
+    return models
+
+def model_file_id(model_config):
+    """成果物のファイル名に使うモデルの識別子（ベクトル列名と同じ規則で記号を置き換える）"""
+    column = get_vector_column_name(model_config)
+    return model_config['name'] if column == 'embedding' else column[len(VECTOR_COLUMN_PREFIX):]
+
+def group_vectors(records, vector_column):
+    """中項目ごとに (問題IDのリスト, ベクトルの行列) をまとめる。ベクトルの無い問題は除く"""
     grouped = defaultdict(list)
-    for idx, row in df.iterrows():
-        mid = row['中項目']
-        vector = row[vector_column]
+    for record in records:
+        vector = record.get(vector_column)
         if vector is not None and len(vector) > 0:
-            grouped[mid].append({'index': idx, 'vector': np.array(vector), 'data': row.to_dict()})
-
-    # 結果を格納する辞書を準備
-    results = {
-        "model": None, # 後でモデル名を設定
-        "categories": {}
+            grouped[record['中項目']].append(record)
+    return {
+        middle_cat: ([int(x[ID_COLUMN]) for x in items], np.array([x[vector_column] for x in items]))
+        for middle_cat, items in grouped.items()
     }
 
-    for middle_cat, items in tqdm(grouped.items(), desc="類似度計算中"):
-        if len(items) < 2:
+def duplicate_groups_of(problems):
+    """問題ID -> duplicate_group（重複グループのある問題だけ）"""
+    return {problem['id']: problem['duplicate_group'] for problem in problems
+            if problem is not None and problem.get('duplicate_group') is not None}
+
+def compute_neighbors(grouped, show_progress=True, duplicate_groups=None):
+    """中項目ごとに類似度を計算し、カテゴリ別の類似問題リストを返す
+
+    duplicate_groups（duplicate_groups_of の結果）を渡すと、上位5件は同じ重複グループの問題を1件として数える
+    （アプリは重複をまとめてから上位5件を表示するので、まとめた後も5件そろうように残す）。
+    """
+    duplicate_groups = duplicate_groups or {}
+    categories = {}
+    for middle_cat, (ids, vectors) in tqdm(grouped.items(), desc="類似度計算中", disable=not show_progress):
+        if len(ids) < 2:
             continue
-        vectors = np.array([x['vector'] for x in items])
         sim_matrix = cosine_similarity(vectors)
         category_results = []
 
-        for i, item in enumerate(items):
+        for i in range(len(ids)):
             sims = []
             for j, score in enumerate(sim_matrix[i]):
                 if i != j:
                     sims.append({
-                        "similarity": float(score),
-                        "data": select_output_data(items[j]['data'])
+                        "id": ids[j],
+                        "similarity": float(score)
                     })
             
             # Sort by similarity descending
             sims.sort(key=lambda x: x['similarity'], reverse=True)
             
-            # Filter: Top 5 OR Similarity >= 0.9
+            # Filter: Top 5 OR Similarity >= 0.9（重複グループは1件、自分と同じグループの問題は0件と数える）
+            main_group = duplicate_groups.get(ids[i])
+            counted = set()
             filtered_sims = []
-            for idx, sim in enumerate(sims):
-                if idx < 5 or sim['similarity'] >= 0.9:
+            for sim in sims:
+                if len(counted) < 5 or sim['similarity'] >= 0.9:
                     filtered_sims.append(sim)
+                group = duplicate_groups.get(sim['id'], ('id', sim['id']))
+                if main_group is None or group != main_group:
+                    counted.add(group)
             
             category_results.append({
-                "main_problem": select_output_data(item['data']),
+                "main_problem": ids[i],
                 "similar_problems": filtered_sims
             })
-        results["categories"][middle_cat] = category_results
+        categories[middle_cat] = category_results
+    return categories
 
+def compute_similarities(df, vector_column, grouped=None):
+    """grouped（group_vectors の結果）を渡すと、ベクトルをまとめ直さずにそれを使う"""
+    records = df.to_dict('records')
+    if grouped is None:
+        grouped = group_vectors(records, vector_column)
+
+    # 結果を格納する辞書を準備
+    # 問題の表示データは problems に一度だけ持ち、カテゴリ側は問題IDで参照する
+    problems = build_problem_table(records)
+    results = {
+        "model": None, # 後でモデル名を設定
+        "periods": attach_periods(problems),
+        "problems": problems,
+        "categories": compute_neighbors(grouped, duplicate_groups=duplicate_groups_of(problems)),
+        "search_index": build_search_index(problems)
+    }
     return results
 
+def attach_reference_counts(results, threshold=REFERENCE_SIMILARITY_THRESHOLD):
+    """各問題の被参照数を問題テーブルに付与する（クライアントでの再集計を不要にする）"""
+    counts = defaultdict(int)
+    for items in results['categories'].values():
+        for item in items:
+            for sim in item['similar_problems']:
+                if sim['similarity'] >= threshold:
+                    counts[sim['id']] += 1
+
+    for problem in results['problems']:
+        if problem is not None:
+            problem['reference_count'] = counts[problem['id']]
+
+def attach_problem_scores(results, threshold=REFERENCE_SIMILARITY_THRESHOLD):
+    """被参照数と、類似グラフから求めた代表度・成分を問題テーブルに付与する"""
+    attach_reference_counts(results, threshold)
+    summary = attach_graph_scores(results, threshold)
+    print_log(f"類似グラフ: 辺{summary['edges']}本、連結成分{summary['components']}個（最大{summary['largest_component']}問）")
+
+def _compute_model_neighbors(task, duplicate_groups=None):
+    """ProcessPoolExecutor から呼ぶ（モデル1つ分の類似度計算）"""
+    model_name, grouped = task
+    return model_name, compute_neighbors(grouped, show_progress=False, duplicate_groups=duplicate_groups)
+
+def top_neighbors(categories, k):
+    """問題ID -> 類似度上位k件の問題IDのリスト"""
+    return {
+        item['main_problem']: [sim['id'] for sim in item['similar_problems'][:k]]
+        for items in categories.values()
+        for item in items
+    }
+
+def compute_agreement(categories_by_model, k=AGREEMENT_TOP_K):
+    """モデルの組ごとに、類似度上位k件の重なり（Jaccard係数の平均）と1位の一致率を求める"""
+    tops = {model: top_neighbors(categories, k) for model, categories in categories_by_model.items()}
+    pairs = []
+    for model_a, model_b in combinations(tops, 2):
+        shared = [pid for pid in tops[model_a] if pid in tops[model_b]]
+        jaccards = []
+        top1_matches = 0
+        for pid in shared:
+            a, b = tops[model_a][pid], tops[model_b][pid]
+            union = set(a) | set(b)
+            jaccards.append(len(set(a) & set(b)) / len(union) if union else 1.0)
+            if a and b and a[0] == b[0]:
+                top1_matches += 1
+        pairs.append({
+            "models": [model_a, model_b],
+            "problems": len(shared),
+            f"jaccard_at_{k}": float(np.mean(jaccards)) if jaccards else None,
+            "top1_agreement": top1_matches / len(shared) if shared else None
+        })
+    return {"k": k, "pairs": pairs}
+
+def write_problem_data_js(path, results):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("window.PROBLEM_DATA = ")
+        json.dump(results, f, ensure_ascii=False, indent=2)
+        f.write(";")
+
+def embeddings_path_for(js_path):
+    """problem_data.js に対応する埋め込みベクトルのパス（problem_data.embeddings.bin）"""
+    return os.path.splitext(js_path)[0] + '.embeddings.bin'
+
+def write_embeddings_binary(path, grouped, size):
+    """L2正規化した float16 のベクトルを、問題IDを行番号として書き出す（ベクトルの無い問題は0の行）
+
+    ヘッダー16バイト: b'OYOE'、形式のバージョン、行数、次元数（リトルエンディアンの uint32）
+    """
+    dims = next((vectors.shape[1] for _, vectors in grouped.values()), 0)
+    matrix = np.zeros((size, dims), dtype='<f2')
+    for ids, vectors in grouped.values():
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix[ids] = (vectors / norms).astype('<f2')
+    with open(path, 'wb') as f:
+        f.write(EMBEDDINGS_MAGIC + struct.pack('<III', EMBEDDINGS_FORMAT_VERSION, size, dims))
+        f.write(matrix.tobytes())
+
+def write_outputs(js_path, results, write_sqlite=True, grouped=None, topic_centroids=None):
+    """problem_data.js と、同じ内容を1問ずつ引ける SQLite（neighbor_store.py）を出力する
+
+    grouped（group_vectors の結果）を渡すと、クライアントで検索するための埋め込みベクトルも出力する。
+    話題の中心ベクトル（attach_topics の戻り値）は JS には含めず、SQLite にだけ書き出す。
+    """
+    write_problem_data_js(js_path, results)
+    print_log(f"JS出力完了: {js_path}")
+    if write_sqlite:
+        db_path = sqlite_path_for(js_path)
+        write_neighbor_store(db_path, results, topic_centroids)
+        print_log(f"SQLite出力完了: {db_path}")
+    embeddings_path = embeddings_path_for(js_path)
+    if grouped is not None:
+        write_embeddings_binary(embeddings_path, grouped, len(results['problems']))
+        print_log(f"埋め込みベクトル出力完了: {embeddings_path}")
+    elif os.path.exists(embeddings_path):
+        # 以前のビルドのベクトルが別のデータと組み合わされないよう削除する
+        os.remove(embeddings_path)
+
+def copy_outputs(js_path, copy_path, write_sqlite=True):
+    """write_outputs で出力した成果物一式を別の名前に複製する（同じ内容を2回書き出さない）"""
+    pairs = [(js_path, copy_path), (embeddings_path_for(js_path), embeddings_path_for(copy_path))]
+    if write_sqlite:
+        pairs.append((sqlite_path_for(js_path), sqlite_path_for(copy_path)))
+    for source, destination in pairs:
+        if os.path.exists(source):
+            shutil.copyfile(source, destination)
+        elif os.path.exists(destination):
+            # 以前のビルドの成果物が別のデータと組み合わされないよう削除する
+            os.remove(destination)
+
+def run_multi_model(df, model_configs, output_dir, default_output_path, workers, write_sqlite=True, write_embeddings=False):
+    """共通の問題データは1回だけ作り、モデルごとの類似度計算を並列に行う"""
+    records = df.to_dict('records')
+    problems = build_problem_table(records)
+    periods = attach_periods(problems)
+    search_index = build_search_index(problems)
+
+    tasks = []
+    for model_config in model_configs:
+        vector_column = get_vector_column_name(model_config)
+        if vector_column not in df.columns:
+            print_log(f"警告: {model_config['name']} のベクトル列 {vector_column} が無いためスキップします")
+            continue
+        tasks.append((model_config['name'], group_vectors(records, vector_column)))
+    if not tasks:
+        print_log("エラー: 計算できるモデルがありません")
+        return
+
+    print_log(f"{len(tasks)}モデルの類似度を並列に計算します（workers={workers}）: {', '.join(name for name, _ in tasks)}")
+    duplicate_groups = [duplicate_groups_of(problems)] * len(tasks)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        categories_by_model = dict(tqdm(executor.map(_compute_model_neighbors, tasks, duplicate_groups),
+                                        total=len(tasks), desc="モデル別計算"))
+
+    configs_by_name = {config['name']: config for config in model_configs}
+    for index, (model_name, grouped) in enumerate(tasks):
+        # 被参照数はモデルごとに異なるので、問題テーブルはモデルごとに複製する
+        results = {
+            "model": model_name,
+            "periods": periods,
+            "problems": [dict(problem) if problem is not None else None for problem in problems],
+            "categories": categories_by_model[model_name],
+            "search_index": search_index
+        }
+        attach_problem_scores(results)
+        topic_centroids = attach_topics(results, grouped)
+        attach_period_neighbors(results, grouped)
+        model_path = os.path.join(output_dir, f"problem_data_{model_file_id(configs_by_name[model_name])}.js")
+        embeddings = grouped if write_embeddings else None
+        write_outputs(model_path, results, write_sqlite, embeddings, topic_centroids)
+        # 最初のモデルを既定のデータ（generate_html.py の入力）にする
+        if index == 0:
+            copy_outputs(model_path, default_output_path, write_sqlite)
+            print_log(f"既定モデル（{model_name}）を {default_output_path} に出力しました")
+
+    report = compute_agreement(categories_by_model)
+    report_path = os.path.join(output_dir, 'model_agreement.json')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    for pair in report['pairs']:
+        jaccard = pair[f"jaccard_at_{report['k']}"]
+        top1 = pair['top1_agreement']
+        print_log(f"一致度 {pair['models'][0]} vs {pair['models'][1]}: "
+                  f"Jaccard@{report['k']}={jaccard if jaccard is None else f'{jaccard:.3f}'}, "
+                  f"1位一致率={top1 if top1 is None else f'{top1:.3f}'}（{pair['problems']}問）")
+    print_log(f"モデル間一致度レポート出力完了: {report_path}")
+
 def main():
     parser = argparse.ArgumentParser(description="類似度JSONを生成します。")
     # デフォルトパスをスクリプトからの相対パスとして定義
     parser.add_argument('--input_json', type=str, default='gemma_embeddings.json', help='入力JSONファイルのパス')
     parser.add_argument('--output_dir', type=str, default='../03_html_output', help='JSONの出力先ディレクトリ')
     parser.add_argument('--output_filename', type=str, default='problem_data.js', help='出力JSファイル名')
+    parser.add_argument('--registry', type=str, default='../01_scraping/problem_registry.json', help='問題IDレジストリのパス')
+    parser.add_argument('--models', type=str, default=None,
+                        help='複数モデルをまとめて計算する（カンマ区切りのモデル名、または入力のベクトル列から検出する auto）')
+    parser.add_argument('--workers', type=int, default=None, help='複数モデル計算時の並列プロセス数（既定: CPU数）')
+    parser.add_argument('--no_sqlite', action='store_true', help='SQLite版（problem_data.sqlite3）を出力しない')
+    parser.add_argument('--embeddings_binary', action='store_true',
+                        help='クライアントでの類似問題検索用に、正規化した float16 の埋め込みベクトル（problem_data.embeddings.bin）を出力する')
     args = parser.parse_args()
 
     print_log("=== 類似問題JS生成開始 ===")
@@ -90,9 +381,9 @@ def main():
     output_dir = os.path.normpath(os.path.join(script_dir, args.output_dir))
     os.makedirs(output_dir, exist_ok=True)
     output_path = os.path.join(output_dir, args.output_filename)
+    registry_path = os.path.normpath(os.path.join(script_dir, args.registry))
 
-    # Hardcode the model configuration for embeddinggemma
-    # Since we are standardizing on gemma and not using multiple models
+    # --models を指定しない場合は DEFAULT_MODEL（embeddinggemma）の1モデルだけでビルドする
     models_config = [
         {
             "name": "embeddinggemma",
@@ -111,7 +402,23 @@ def main():
             print_log(f"エラー: {col} 列が存在しません")
             return
 
-    model_config = next((m for m in models_config if m['name'] == 'embeddinggemma'), None)
+    try:
+        ensure_problem_ids(df, registry_path)
+    except ValueError as e:
+        print_log(f"エラー: {e}")
+        return
+
+    if args.models:
+        if args.models == 'auto':
+            model_configs = discover_models(df)
+        else:
+            model_configs = [model_config_from_name(name.strip()) for name in args.models.split(',') if name.strip()]
+        run_multi_model(df, model_configs, output_dir, output_path, args.workers,
+                        write_sqlite=not args.no_sqlite, write_embeddings=args.embeddings_binary)
+        print_log("=== 完了 ===")
+        return
+
+    model_config = next((m for m in models_config if m['name'] == DEFAULT_MODEL), None)
     if not model_config:
         print_log("config.yamlにembeddinggemmaモデルが見つかりません。")
         return
@@ -121,15 +428,17 @@ def main():
 
     print_log(f"使用モデル: {model_name}")
 
-    results = compute_similarities(df, vector_column)
+    # 類似問題は同じ中項目内でのみ計算するため、中項目による絞り込みはここで完了している
+    grouped = group_vectors(df.to_dict('records'), vector_column)
+    results = compute_similarities(df, vector_column, grouped)
+    attach_problem_scores(results)
     results['model'] = model_name # 結果に使用したモデル名を追加
 
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write("window.PROBLEM_DATA = ")
-        json.dump(results, f, ensure_ascii=False, indent=2)
-        f.write(";")
-
-    print_log(f"JS出力完了: {output_path}")
+    topic_centroids = attach_topics(results, grouped)
+    print_log(f"話題（中項目内のクラスタ）: {len(results['topics'])}個")
+    attach_period_neighbors(results, grouped)
+    write_outputs(output_path, results, write_sqlite=not args.no_sqlite,
+                  grouped=grouped if args.embeddings_binary else None, topic_centroids=topic_centroids)
     print_log("=== 完了 ===")
 
 if __name__ == '__main__':
@@ -0,0 +1,113 @@
+"""問題名がほぼ同じ問題（別の試験回で再出題された問題など）を MinHash と LSH でまとめる
+
+全問題の組を比べる代わりに、問題名の文字 n-gram の集合から MinHash の署名を作り、
+署名を帯（band）に分けて同じ帯の値を持つ問題だけを候補の組にする（問題数にほぼ比例する時間で済む）。
+候補の組は n-gram 集合の Jaccard 係数で確かめ、閾値以上の組を union-find でグループにまとめる。
+
+main.py が problem_data.js の problems に duplicate_group（グループ内で最小の問題ID。重複の無い問題には付けない）を付ける。
+"""
+import re
+import unicodedata
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 128
+# 帯の数 × 帯あたりの行数 = NUM_PERMUTATIONS。候補になりやすさが半々になる Jaccard 係数は (1/帯の数)^(1/行数) ≒ 0.71
+LSH_BANDS = 16
+DUPLICATE_THRESHOLD = 0.8
+MERSENNE_PRIME = (1 << 61) - 1
+HASH_SEED = 1
+
+_IGNORED_CHARACTERS = re.compile(r'[\s、。，．,.・:：;；!！?？「」『』()（）\[\]【】"\'“”‘’]')
+
+
+def normalize_title(title):
+    """表記ゆれ（全角・半角、空白、句読点）を吸収した問題名"""
+    return _IGNORED_CHARACTERS.sub('', unicodedata.normalize('NFKC', str(title or ''))).lower()
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """文字 n-gram の集合（n より短い文字列は全体を1つの要素とする）"""
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def minhash_signatures(shingle_sets, num_permutations=NUM_PERMUTATIONS, seed=HASH_SEED):
+    """各集合の MinHash 署名（集合の数 × num_permutations の uint32。空の集合の行はすべて最大値）"""
+    rng = np.random.default_rng(seed)
+    # h(x) = (a * x + b) mod p を順列の代わりに使う（x は32ビットのハッシュなので uint64 で溢れない）
+    a = rng.integers(1, 1 << 32, size=num_permutations, dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, size=num_permutations, dtype=np.uint64)
+    signatures = np.full((len(shingle_sets), num_permutations), np.iinfo(np.uint32).max, dtype=np.uint32)
+    for row, items in enumerate(shingle_sets):
+        if not items:
+            continue
+        hashes = np.fromiter((zlib.crc32(item.encode('utf-8')) for item in items), dtype=np.uint64, count=len(items))
+        permuted = (hashes[:, None] * a[None, :] + b[None, :]) % np.uint64(MERSENNE_PRIME)
+        signatures[row] = (permuted & np.uint64(0xFFFFFFFF)).min(axis=0).astype(np.uint32)
+    return signatures
+
+
+def lsh_candidate_pairs(signatures, bands=LSH_BANDS):
+    """同じ帯の署名がすべて一致する組を候補として返す {(i, j), ...}（i < j、行番号）"""
+    rows_per_band = signatures.shape[1] // bands
+    pairs = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        chunk = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        for row, key in enumerate(map(bytes, chunk)):
+            buckets[key].append(row)
+        for members in buckets.values():
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    pairs.add((members[x], members[y]))
+    return pairs
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def find_duplicate_groups(titles, threshold=DUPLICATE_THRESHOLD, bands=LSH_BANDS, num_permutations=NUM_PERMUTATIONS):
+    """問題名のリストから、Jaccard 係数が threshold 以上でつながる組をまとめたグループ（行番号のリスト）を返す"""
+    shingle_sets = [shingles(normalize_title(title)) for title in titles]
+    signatures = minhash_signatures(shingle_sets, num_permutations)
+    empty = [not items for items in shingle_sets]
+
+    parent = list(range(len(titles)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j in lsh_candidate_pairs(signatures, bands):
+        if empty[i] or empty[j]:
+            continue
+        if jaccard(shingle_sets[i], shingle_sets[j]) >= threshold:
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    groups = defaultdict(list)
+    for row in range(len(titles)):
+        groups[find(row)].append(row)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def attach_duplicate_groups(problems, threshold=DUPLICATE_THRESHOLD):
+    """問題テーブル（欠番は None）に duplicate_group を付け、グループの数を返す"""
+    present = [problem for problem in problems if problem is not None]
+    groups = find_duplicate_groups([problem.get('問題名') for problem in present], threshold)
+    for members in groups:
+        group_id = min(present[row]['id'] for row in members)
+        for row in members:
+            present[row]['duplicate_group'] = group_id
+    return len(groups)
@@ -0,0 +1,352 @@
+"""類似問題データの SQLite 版（problem_data.js と同じ内容を索引付きのテーブルで持つ）
+
+スクリプトやサーバーから1問だけ引きたい場合に、巨大な JS を全部読み込まなくて済むようにする。
+main.py が problem_data.js と同じ場所に problem_data.sqlite3 を出力する。
+
+    from neighbor_store import NeighborStore
+    with NeighborStore('problem_data.sqlite3') as store:
+        store.problem(123)
+        store.neighbors(123, limit=5)
+"""
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE categories (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    large_category TEXT
+);
+CREATE TABLE problems (
+    id INTEGER PRIMARY KEY,
+    category_id INTEGER REFERENCES categories(id),
+    problem_number,
+    title TEXT,
+    link TEXT,
+    source TEXT,
+    reference_count INTEGER,
+    centrality REAL,
+    component INTEGER,
+    component_size INTEGER,
+    duplicate_group INTEGER,
+    topic INTEGER,
+    period INTEGER REFERENCES periods(id)
+);
+CREATE TABLE periods (
+    id INTEGER PRIMARY KEY,
+    label TEXT NOT NULL UNIQUE
+);
+CREATE TABLE topics (
+    id INTEGER PRIMARY KEY,
+    category_id INTEGER REFERENCES categories(id),
+    size INTEGER,
+    label TEXT,
+    representative INTEGER REFERENCES problems(id),
+    centroid BLOB
+);
+CREATE TABLE neighbors (
+    id INTEGER NOT NULL REFERENCES problems(id),
+    neighbor_id INTEGER NOT NULL REFERENCES problems(id),
+    score REAL NOT NULL,
+    rank INTEGER NOT NULL,
+    PRIMARY KEY (id, rank)
+) WITHOUT ROWID;
+-- 出題回で絞り込んでも上位k件を正確に返せるよう残した類似問題（exam_periods.py）
+CREATE TABLE period_neighbors (
+    id INTEGER NOT NULL REFERENCES problems(id),
+    neighbor_id INTEGER NOT NULL REFERENCES problems(id),
+    score REAL NOT NULL,
+    period INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    PRIMARY KEY (id, rank)
+) WITHOUT ROWID;
+"""
+
+# 索引はデータを入れ終えてから作る（1行ずつ索引を更新するより速い）
+INDEXES = """
+CREATE INDEX idx_problems_category ON problems(category_id);
+CREATE INDEX idx_problems_source ON problems(source);
+CREATE INDEX idx_problems_duplicate_group ON problems(duplicate_group);
+CREATE INDEX idx_problems_topic ON problems(topic);
+CREATE INDEX idx_period_neighbors_period ON period_neighbors(id, period, rank);
+CREATE INDEX idx_neighbors_neighbor ON neighbors(neighbor_id, score);
+CREATE INDEX idx_neighbors_score ON neighbors(score);
+"""
+
+PROBLEM_COLUMNS = """
+    SELECT p.id, c.large_category, c.name, p.problem_number, p.title, p.link, p.source, p.reference_count,
+           p.centrality, p.component, p.component_size, p.duplicate_group, p.topic, p.period
+    FROM problems p LEFT JOIN categories c ON c.id = p.category_id
+"""
+
+
+def sqlite_path_for(js_path):
+    """problem_data.js に対応する SQLite のパス（problem_data.sqlite3）"""
+    return os.path.splitext(js_path)[0] + '.sqlite3'
+
+
+def write_neighbor_store(db_path, results, topic_centroids=None):
+    """compute_similarities の結果（problems / categories / model / topics）を SQLite に書き出す
+
+    topic_centroids（話題番号を行とする float32 の行列）を渡すと、話題の中心ベクトルも保存する。
+
+    一時ファイルに書いてから置き換えるので、読み込み中の利用者が書きかけのデータを見ることはない。
+    """
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    problems = [p for p in results['problems'] if p is not None]
+    category_names = sorted({p['中項目'] for p in problems if p['中項目'] is not None} | set(results['categories']))
+    large_by_middle = {p['中項目']: p['大項目'] for p in problems}
+    category_ids = {name: index + 1 for index, name in enumerate(category_names)}
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        # 新しいファイルに一度書くだけなので、ジャーナルと同期は不要
+        conn.execute('PRAGMA journal_mode=OFF')
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.executescript(SCHEMA)
+        with conn:
+            conn.executemany('INSERT INTO meta (key, value) VALUES (?, ?)', [
+                ('model', results.get('model')),
+                ('problem_count', str(len(problems))),
+            ])
+            conn.executemany('INSERT INTO categories (id, name, large_category) VALUES (?, ?, ?)',
+                             ((category_ids[name], name, large_by_middle.get(name)) for name in category_names))
+            conn.executemany(
+                'INSERT INTO problems (id, category_id, problem_number, title, link, source, reference_count, '
+                'centrality, component, component_size, duplicate_group, topic, period) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                ((p['id'], category_ids.get(p['中項目']), p.get('問題番号'), p.get('問題名'), p.get('リンク'), p.get('出典'),
+                  p.get('reference_count'), p.get('centrality'), p.get('component'), p.get('component_size'),
+                  p.get('duplicate_group'), p.get('topic'), p.get('period'))
+                 for p in problems))
+            conn.executemany('INSERT INTO periods (id, label) VALUES (?, ?)', enumerate(results.get('periods', [])))
+            conn.executemany(
+                'INSERT INTO topics (id, category_id, size, label, representative, centroid) VALUES (?, ?, ?, ?, ?, ?)',
+                ((t['id'], category_ids.get(t['中項目']), t['size'], t['label'], t['representative'],
+                  topic_centroids[t['id']].astype('<f4').tobytes() if topic_centroids is not None else None)
+                 for t in results.get('topics', [])))
+            conn.executemany(
+                'INSERT INTO neighbors (id, neighbor_id, score, rank) VALUES (?, ?, ?, ?)',
+                ((item['main_problem'], sim['id'], sim['similarity'], rank)
+                 for items in results['categories'].values()
+                 for item in items
+                 for rank, sim in enumerate(item['similar_problems'], start=1)))
+            # 出題回で絞り込む候補は similar_problems の後ろに period_neighbors（[問題ID, 類似度] の組）をつないだもの。
+            # period_neighbors の類似度は丸めてあるので、並びは類似度ではなく rank で持つ
+            periods = {p['id']: p.get('period') for p in problems}
+            conn.executemany(
+                'INSERT INTO period_neighbors (id, neighbor_id, score, period, rank) VALUES (?, ?, ?, ?, ?)',
+                ((item['main_problem'], neighbor_id, score, periods[neighbor_id], rank)
+                 for items in results['categories'].values()
+                 for item in items if 'period_neighbors' in item
+                 for rank, (neighbor_id, score) in enumerate(
+                     [(sim['id'], sim['similarity'])
+                      for sim in sorted(item['similar_problems'], key=lambda s: -s['similarity'])]
+                     + [tuple(pair) for pair in item['period_neighbors']], start=1)
+                 if periods.get(neighbor_id) is not None))
+        conn.executescript(INDEXES)
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+
+
+def _problem_from_row(row):
+    # problem_data.js の problems と同じキーで返す（duplicate_group・topic・period は値のある問題にだけ付く）
+    problem = {
+        'id': row[0], '大項目': row[1], '中項目': row[2], '問題番号': row[3],
+        '問題名': row[4], 'リンク': row[5], '出典': row[6], 'reference_count': row[7],
+        'centrality': row[8], 'component': row[9], 'component_size': row[10],
+    }
+    if row[11] is not None:
+        problem['duplicate_group'] = row[11]
+    if row[12] is not None:
+        problem['topic'] = row[12]
+    if row[13] is not None:
+        problem['period'] = row[13]
+    return problem
+
+
+class NeighborStore:
+    """write_neighbor_store で作った SQLite を読み取り専用で引く。
+
+    接続はスレッドごとに1つ作って使い回す（sqlite3 の接続はスレッド間で共有しない）。
+    """
+
+    def __init__(self, db_path):
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(db_path)
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            uri = Path(os.path.abspath(self.db_path)).as_uri() + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.execute('PRAGMA query_only=ON')
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def metadata(self):
+        return dict(self.conn.execute('SELECT key, value FROM meta'))
+
+    def categories(self):
+        """中項目の一覧 [{'id', 'name', '大項目', 'problem_count'}]"""
+        rows = self.conn.execute(
+            'SELECT c.id, c.name, c.large_category, COUNT(p.id) FROM categories c '
+            'LEFT JOIN problems p ON p.category_id = c.id GROUP BY c.id ORDER BY c.id')
+        return [{'id': r[0], 'name': r[1], '大項目': r[2], 'problem_count': r[3]} for r in rows]
+
+    def problem(self, problem_id):
+        row = self.conn.execute(PROBLEM_COLUMNS + ' WHERE p.id = ?', (problem_id,)).fetchone()
+        return _problem_from_row(row) if row else None
+
+    def problem_by_source(self, source):
+        """出典（例: R5春期 問 1）から問題を引く（表記が完全に一致するものだけ）"""
+        row = self.conn.execute(PROBLEM_COLUMNS + ' WHERE p.source = ? ORDER BY p.id LIMIT 1', (source,)).fetchone()
+        return _problem_from_row(row) if row else None
+
+    def problems(self, problem_ids):
+        """複数の問題をまとめて引く（見つからないIDは除き、指定した順に返す）"""
+        ids = [int(x) for x in problem_ids]
+        if not ids:
+            return []
+        placeholders = ','.join('?' * len(ids))
+        found = {row[0]: _problem_from_row(row)
+                 for row in self.conn.execute(PROBLEM_COLUMNS + f' WHERE p.id IN ({placeholders})', ids)}
+        return [found[x] for x in ids if x in found]
+
+    def problems_in_id_range(self, start, end):
+        """start <= 問題ID < end の問題を ID 順に返す"""
+        rows = self.conn.execute(PROBLEM_COLUMNS + ' WHERE p.id >= ? AND p.id < ? ORDER BY p.id', (start, end))
+        return [_problem_from_row(row) for row in rows]
+
+    def problems_in_category(self, middle_category):
+        rows = self.conn.execute(PROBLEM_COLUMNS + ' WHERE c.name = ? ORDER BY p.id', (middle_category,))
+        return [_problem_from_row(row) for row in rows]
+
+    def duplicates(self, problem_id):
+        """問題名がほぼ同じ問題（同じ重複グループ。自分自身を除く）を問題ID順に返す"""
+        rows = self.conn.execute(
+            PROBLEM_COLUMNS + ' WHERE p.duplicate_group = (SELECT duplicate_group FROM problems WHERE id = ?) '
+            'AND p.id != ? ORDER BY p.id', (problem_id, problem_id))
+        return [_problem_from_row(row) for row in rows]
+
+    def topics(self, middle_category=None):
+        """話題の一覧 [{'id', '中項目', 'size', 'label', 'representative', 'centroid'（float32 の bytes）}]"""
+        sql = ('SELECT t.id, c.name, t.size, t.label, t.representative, t.centroid '
+               'FROM topics t LEFT JOIN categories c ON c.id = t.category_id')
+        params = []
+        if middle_category is not None:
+            sql += ' WHERE c.name = ?'
+            params.append(middle_category)
+        rows = self.conn.execute(sql + ' ORDER BY t.id', params)
+        return [{'id': r[0], '中項目': r[1], 'size': r[2], 'label': r[3], 'representative': r[4], 'centroid': r[5]}
+                for r in rows]
+
+    def problems_in_topic(self, topic_id):
+        rows = self.conn.execute(PROBLEM_COLUMNS + ' WHERE p.topic = ? ORDER BY p.id', (topic_id,))
+        return [_problem_from_row(row) for row in rows]
+
+    def representative_problems(self, middle_category, limit=None):
+        """中項目の問題を代表度（centrality）の高い順に返す"""
+        sql = PROBLEM_COLUMNS + ' WHERE c.name = ? ORDER BY p.centrality DESC, p.id'
+        params = [middle_category]
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [_problem_from_row(row) for row in self.conn.execute(sql, params)]
+
+    def periods(self):
+        """出題回のラベルを古い順に返す（添字が problems の period）"""
+        return [row[0] for row in self.conn.execute('SELECT label FROM periods ORDER BY id')]
+
+    def period_index(self, label):
+        """出題回のラベル（例: R5春期）から period の番号を引く。無ければ None"""
+        row = self.conn.execute('SELECT id FROM periods WHERE label = ?', (label,)).fetchone()
+        return row[0] if row else None
+
+    def problem_ids_since(self, min_period, problem_ids=None):
+        """出題回が min_period 以降の問題IDを ID 順に返す（problem_ids を指定するとその中から選ぶ）"""
+        if problem_ids is None:
+            rows = self.conn.execute('SELECT id FROM problems WHERE period >= ? ORDER BY id', (min_period,))
+            return [row[0] for row in rows]
+        periods = dict(self.conn.execute('SELECT id, period FROM problems WHERE period IS NOT NULL'))
+        return sorted(int(x) for x in problem_ids if periods.get(int(x), -1) >= min_period)
+
+    def neighbors(self, problem_id, limit=None, min_score=None, min_period=None):
+        """類似問題を順位順に返す [{'id', 'similarity', 'rank'}]
+
+        min_period を指定すると、その出題回以降の問題だけから類似度の高い順に返す
+        （exam_periods.PERIOD_TOP_K 件までは、全問題から絞り込んだ場合と一致する）。
+        """
+        if min_period is not None:
+            return self._neighbors_since(problem_id, min_period, limit, min_score)
+        sql = 'SELECT neighbor_id, score, rank FROM neighbors WHERE id = ?'
+        params = [problem_id]
+        if min_score is not None:
+            sql += ' AND score >= ?'
+            params.append(min_score)
+        sql += ' ORDER BY rank'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [{'id': r[0], 'similarity': r[1], 'rank': r[2]} for r in self.conn.execute(sql, params)]
+
+    def _neighbors_since(self, problem_id, min_period, limit, min_score):
+        sql = 'SELECT neighbor_id, score FROM period_neighbors WHERE id = ? AND period >= ?'
+        params = [problem_id, min_period]
+        if min_score is not None:
+            sql += ' AND score >= ?'
+            params.append(min_score)
+        sql += ' ORDER BY rank'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        rows = self.conn.execute(sql, params)
+        return [{'id': r[0], 'similarity': r[1], 'rank': rank} for rank, r in enumerate(rows, start=1)]
+
+    def referrers(self, problem_id, min_score=None):
+        """この問題を類似問題に挙げている問題を類似度の高い順に返す [{'id', 'similarity', 'rank'}]"""
+        rows = self.conn.execute(
+            'SELECT id, score, rank FROM neighbors WHERE neighbor_id = ? AND score >= ? ORDER BY score DESC, id',
+            (problem_id, -1.0 if min_score is None else min_score))
+        return [{'id': r[0], 'similarity': r[1], 'rank': r[2]} for r in rows]
+
+    def pairs_in_score_range(self, min_score, max_score=1.0, limit=None):
+        """min_score <= 類似度 <= max_score の組を類似度の高い順に返す [{'id', 'neighbor_id', 'similarity', 'rank'}]"""
+        sql = 'SELECT id, neighbor_id, score, rank FROM neighbors WHERE score >= ? AND score <= ? ORDER BY score DESC, id, rank'
+        params = [min_score, max_score]
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [{'id': r[0], 'neighbor_id': r[1], 'similarity': r[2], 'rank': r[3]} for r in self.conn.execute(sql, params)]
@@ -0,0 +1,96 @@
+"""類似問題リストを疎行列のグラフとして扱い、問題ごとの代表度とまとまりを求める
+
+辺は「問題 i の類似リストに問題 j が類似度 threshold 以上で載っている」ことを表す（重みは類似度）。
+main.py が problem_data.js の problems に次の値を付ける。
+
+    centrality      PageRank（全問題の平均が1になるよう定数倍したもの）。多くの問題から近いと参照される問題ほど大きい
+    component       弱連結成分の番号（大きい成分から 0, 1, ...）。同じ番号の問題は類似の連鎖でつながっている
+    component_size  その成分に含まれる問題数
+"""
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+from scipy.sparse.csgraph import connected_components
+
+PAGERANK_DAMPING = 0.85
+PAGERANK_TOLERANCE = 1e-10
+PAGERANK_MAX_ITER = 200
+
+
+def build_similarity_graph(results, threshold):
+    """問題ID × 問題ID の疎行列（行 = 類似リストの持ち主、列 = 載っている問題、値 = 類似度）"""
+    size = len(results['problems'])
+    rows, cols, weights = [], [], []
+    for items in results['categories'].values():
+        for item in items:
+            for sim in item['similar_problems']:
+                if sim['similarity'] >= threshold:
+                    rows.append(item['main_problem'])
+                    cols.append(sim['id'])
+                    weights.append(sim['similarity'])
+    return csr_matrix((np.asarray(weights, dtype=np.float64), (rows, cols)), shape=(size, size))
+
+
+def pagerank(graph, nodes, damping=PAGERANK_DAMPING, tol=PAGERANK_TOLERANCE, max_iter=PAGERANK_MAX_ITER):
+    """重み付き PageRank をべき乗法で求める（nodes は実在する問題の真偽値の配列。欠番には値を配らない）
+
+    外向きの辺が無い問題の持ち分と、ランダムジャンプの分は実在する問題に均等に配る。
+    """
+    size = graph.shape[0]
+    count = int(nodes.sum())
+    if count == 0:
+        return np.zeros(size)
+    teleport = nodes / count
+    out_weight = np.asarray(graph.sum(axis=1)).ravel()
+    dangling = nodes & (out_weight == 0)
+    inverse = np.divide(1.0, out_weight, out=np.zeros(size), where=out_weight > 0)
+    # 行を重みの合計で割った遷移行列の転置（rank @ P を P.T @ rank として計算する）
+    transition_t = (diags(inverse) @ graph).T.tocsr()
+
+    rank = teleport.copy()
+    for _ in range(max_iter):
+        updated = damping * (transition_t @ rank + rank[dangling].sum() * teleport) + (1 - damping) * teleport
+        converged = np.abs(updated - rank).sum() < tol
+        rank = updated
+        if converged:
+            break
+    return rank
+
+
+def graph_components(graph, nodes):
+    """弱連結成分の番号を、大きい成分から順に振り直して返す（欠番は -1）"""
+    _, labels = connected_components(graph, directed=True, connection='weak')
+    sizes = np.bincount(labels[nodes], minlength=labels.max() + 1)
+    # 大きい順、同じ大きさなら最小の問題IDが小さい順
+    first_id = np.full(len(sizes), len(labels))
+    np.minimum.at(first_id, labels[nodes], np.flatnonzero(nodes))
+    order = np.lexsort((first_id, -sizes))
+    renumber = np.empty(len(order), dtype=np.int64)
+    renumber[order] = np.arange(len(order))
+    components = renumber[labels]
+    components[~nodes] = -1
+    return components, sizes[order]
+
+
+def attach_graph_scores(results, threshold):
+    """problems に centrality / component / component_size を付け、グラフの概要を返す"""
+    problems = results['problems']
+    nodes = np.array([problem is not None for problem in problems], dtype=bool)
+    graph = build_similarity_graph(results, threshold)
+    rank = pagerank(graph, nodes)
+    components, component_sizes = graph_components(graph, nodes)
+    scale = nodes.sum()
+
+    for problem in problems:
+        if problem is None:
+            continue
+        index = problem['id']
+        problem['centrality'] = round(float(rank[index] * scale), 4)
+        problem['component'] = int(components[index])
+        problem['component_size'] = int(component_sizes[components[index]])
+
+    return {
+        'threshold': threshold,
+        'edges': int(graph.nnz),
+        'components': int((component_sizes > 0).sum()),
+        'largest_component': int(component_sizes[0]) if len(component_sizes) else 0,
+    }
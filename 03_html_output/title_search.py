@@ -0,0 +1,97 @@
+"""問題名の検索に使う文字 bigram の転置索引
+
+problem_data.js の search_index に次の形で出力し、アプリ（js/title-search.js）が入力のたびに引く。
+
+    {"gram_size": 2, "grams": ["ab", "bc", ...], "postings": "<base64>"}
+
+postings は grams の順に、各 bigram を含む問題IDのリストを「件数、1件目の ID + 1、以降は前の ID との差」の
+LEB128 可変長整数（7ビットずつ、続きがあれば最上位ビットを立てる）で並べたバイト列。
+問題名は near_duplicates.normalize_title で表記ゆれを吸収してから n-gram にする（アプリ側も同じ正規化をする）。
+
+2文字以上の検索語は、含まれる bigram のリストの共通部分を取ってから問題名に含まれるかを確かめる。
+1文字の検索語は、その文字を含む bigram のリストの和を取る（bigram より短い問題名はそれ自体を1つの n-gram にする）。
+中項目の名前は数十件しかないので索引には入れず、アプリ側で直接照合する。
+"""
+import base64
+from collections import defaultdict
+
+from near_duplicates import normalize_title, shingles
+
+SEARCH_GRAM_SIZE = 2
+
+
+def encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data, pos):
+    """(値, 次の位置) を返す"""
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_postings(ids, out):
+    """昇順の問題IDのリストを件数と差分の可変長整数で out に追記する"""
+    encode_varint(len(ids), out)
+    previous = -1
+    for problem_id in ids:
+        encode_varint(problem_id - previous, out)
+        previous = problem_id
+
+
+def build_search_index(problems, gram_size=SEARCH_GRAM_SIZE):
+    """問題テーブル（欠番は None）から search_index を作る"""
+    postings = defaultdict(list)
+    for problem in problems:
+        if problem is None:
+            continue
+        for gram in shingles(normalize_title(problem.get('問題名')), gram_size):
+            postings[gram].append(problem['id'])
+
+    grams = sorted(postings)
+    data = bytearray()
+    for gram in grams:
+        encode_postings(sorted(postings[gram]), data)
+    return {
+        'gram_size': gram_size,
+        'grams': grams,
+        'postings': base64.b64encode(bytes(data)).decode('ascii'),
+    }
+
+
+def decode_search_index(index):
+    """search_index を {bigram: [問題ID, ...]} に戻す"""
+    data = base64.b64decode(index['postings'])
+    postings = {}
+    pos = 0
+    for gram in index['grams']:
+        count, pos = decode_varint(data, pos)
+        ids = []
+        previous = -1
+        for _ in range(count):
+            delta, pos = decode_varint(data, pos)
+            previous += delta
+            ids.append(previous)
+        postings[gram] = ids
+    return postings
+
+
+def search_titles(postings, problems, query, gram_size=SEARCH_GRAM_SIZE):
+    """問題名に検索語を含む問題IDを昇順で返す（js/title-search.js と同じ手順）"""
+    query = normalize_title(query)
+    if not query:
+        return []
+    if len(query) < gram_size:
+        return sorted({x for gram, ids in postings.items() if query in gram for x in ids})
+    lists = sorted((postings.get(gram, []) for gram in shingles(query, gram_size)), key=len)
+    candidates = set(lists[0]).intersection(*lists[1:])
+    return sorted(x for x in candidates if query in normalize_title(problems[x].get('問題名')))
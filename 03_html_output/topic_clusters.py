@@ -0,0 +1,249 @@
+"""中項目の中をさらに小さな話題（サブトピック）に分ける mini-batch k-means
+
+埋め込みベクトルを L2 正規化し、中項目ごとに球面 k-means（中心との内積 = コサイン類似度で割り当てる）を
+ミニバッチで学習する。main.py が problem_data.js の problems に topic（話題の番号）を付け、
+topics に話題の一覧（中項目、問題数、中心に最も近い問題）を、SQLite に中心ベクトルを出力する。
+
+中心ベクトルは類似問題の候補の絞り込みにも使える（近い中心 probe 個の話題に属する問題だけと比べる）。
+このスクリプトを直接実行すると、全組比較と比べた速度と recall を測る。
+
+    py 03_html_output/topic_clusters.py
+    py 03_html_output/topic_clusters.py --probe 3 --top_k 5
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+# 話題1つあたりの問題数の目安（中項目の問題数 / この値 を話題の数にする）
+TARGET_TOPIC_SIZE = 25
+BATCH_SIZE = 256
+MAX_ITER = 100
+TOLERANCE = 1e-4
+SEED = 0
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def topic_count(size, target=TARGET_TOPIC_SIZE):
+    return max(1, min(size, int(round(size / target))))
+
+
+def kmeans_plus_plus(vectors, k, rng):
+    """greedy k-means++ で初期の中心を選ぶ
+
+    既に選んだ中心からのコサイン距離（1 - 内積）の2乗に比例する確率で候補を数個引き、
+    距離の2乗の合計が最も小さくなる候補を次の中心にする。
+    """
+    trials = 2 + int(np.log(k))
+    centers = [int(rng.integers(len(vectors)))]
+    distance = np.clip(1.0 - vectors @ vectors[centers[0]], 0, None) ** 2
+    for _ in range(1, k):
+        total = distance.sum()
+        if total <= 0:
+            centers.append(int(rng.integers(len(vectors))))
+            continue
+        candidates = rng.choice(len(vectors), size=trials, p=distance / total)
+        candidate_distance = np.minimum(distance, np.clip(1.0 - vectors[candidates] @ vectors.T, 0, None) ** 2)
+        best = int(np.argmin(candidate_distance.sum(axis=1)))
+        centers.append(int(candidates[best]))
+        distance = candidate_distance[best]
+    return vectors[centers].copy()
+
+
+def minibatch_kmeans(vectors, k, batch_size=BATCH_SIZE, max_iter=MAX_ITER, tol=TOLERANCE, seed=SEED):
+    """正規化済みのベクトルを k 個に分ける。(中心の行列, 各ベクトルの話題番号) を返す
+
+    ミニバッチごとに、割り当てられた点の数に反比例する学習率で中心を動かし（Sculley 2010）、正規化し直す。
+    """
+    rng = np.random.default_rng(seed)
+    centroids = kmeans_plus_plus(vectors, k, rng)
+    counts = np.zeros(k)
+    for _ in range(max_iter):
+        batch = vectors[rng.choice(len(vectors), size=min(batch_size, len(vectors)), replace=False)]
+        assigned = np.argmax(batch @ centroids.T, axis=1)
+        previous = centroids.copy()
+        batch_counts = np.bincount(assigned, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assigned, batch)
+        counts += batch_counts
+        moved = batch_counts > 0
+        # c <- c + (バッチ内の点の和 - 点の数 * c) / 累計の点の数
+        centroids[moved] += (sums[moved] - batch_counts[moved, None] * centroids[moved]) / counts[moved, None]
+        centroids = normalize_rows(centroids)
+        if np.abs(centroids - previous).max() < tol:
+            break
+    labels = np.argmax(vectors @ centroids.T, axis=1)
+    return centroids, labels
+
+
+def cluster_category(vectors, seed=SEED):
+    """中項目1つ分を話題に分ける。空の話題は除き、番号を問題数の多い順に振り直す"""
+    normalized = normalize_rows(vectors)
+    centroids, labels = minibatch_kmeans(normalized, topic_count(len(normalized)), seed=seed)
+    sizes = np.bincount(labels, minlength=len(centroids))
+    order = [int(t) for t in np.argsort(-sizes, kind='stable') if sizes[t] > 0]
+    renumber = {old: new for new, old in enumerate(order)}
+    return centroids[order], np.array([renumber[int(label)] for label in labels])
+
+
+def attach_topics(results, grouped, seed=SEED):
+    """problems に topic を付け、results['topics'] に話題の一覧を入れる。中心ベクトルの行列（行 = 話題番号）を返す
+
+    話題の label は中心に最も近い問題の問題名、representative はその問題ID。
+    """
+    topics = []
+    centroid_rows = []
+    problems = results['problems']
+    for middle_cat in sorted(grouped):
+        ids, vectors = grouped[middle_cat]
+        centroids, labels = cluster_category(vectors, seed)
+        normalized = normalize_rows(vectors)
+        for local, centroid in enumerate(centroids):
+            members = np.flatnonzero(labels == local)
+            representative = ids[members[np.argmax(normalized[members] @ centroid)]]
+            topic_id = len(topics)
+            topics.append({
+                'id': topic_id,
+                '中項目': middle_cat,
+                'size': int(len(members)),
+                'label': problems[representative].get('問題名'),
+                'representative': int(representative),
+            })
+            centroid_rows.append(centroid)
+            for member in members:
+                problems[ids[member]]['topic'] = topic_id
+    results['topics'] = topics
+    dims = next((vectors.shape[1] for _, vectors in grouped.values()), 0)
+    return np.array(centroid_rows, dtype=np.float32).reshape(len(topics), dims)
+
+
+def exact_neighbors(vectors, k):
+    """全組比較での上位k件（自分自身を除く）"""
+    normalized = normalize_rows(vectors)
+    sims = normalized @ normalized.T
+    np.fill_diagonal(sims, -np.inf)
+    k = min(k, len(normalized) - 1)
+    top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(sims, top, axis=1), axis=1), axis=1)
+
+
+def prefiltered_neighbors(vectors, centroids, labels, k, probe):
+    """近い中心 probe 個の話題に属する問題だけを候補にした上位k件（候補が足りない分は -1）
+
+    同じ話題の組を調べる問い合わせをまとめ、組ごとに1回の行列積で計算する。
+    """
+    normalized = normalize_rows(vectors)
+    probe = min(probe, len(centroids))
+    nearest_topics = np.sort(np.argsort(-(normalized @ centroids.T), axis=1)[:, :probe], axis=1)
+    members = [np.flatnonzero(labels == topic) for topic in range(len(centroids))]
+    result = np.full((len(normalized), k), -1, dtype=np.int64)
+    probe_sets, inverse = np.unique(nearest_topics, axis=0, return_inverse=True)
+    for set_index, topics in enumerate(probe_sets):
+        queries = np.flatnonzero(inverse.ravel() == set_index)
+        candidates = np.concatenate([members[topic] for topic in topics])
+        sims = normalized[queries] @ normalized[candidates].T
+        sims[queries[:, None] == candidates[None, :]] = -np.inf
+        width = min(k, len(candidates))
+        order = np.argsort(-sims, axis=1, kind='stable')[:, :width]
+        found = np.where(np.isfinite(np.take_along_axis(sims, order, axis=1)), candidates[order], -1)
+        result[queries, :width] = found
+    return result
+
+
+def recall_at_k(approximate, exact):
+    hits = sum(len(set(a[a >= 0]) & set(e)) for a, e in zip(approximate, exact))
+    return hits / max(1, exact.size)
+
+
+def compare_with_exact(grouped, k, probe, repeat=3):
+    """中項目ごとに、全組比較と話題による絞り込みの速度・recall を測る"""
+    rows = []
+    for middle_cat, (ids, vectors) in sorted(grouped.items()):
+        if len(ids) <= k:
+            continue
+        exact_times, cluster_times, query_times = [], [], []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            exact = exact_neighbors(vectors, k)
+            exact_times.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            centroids, labels = cluster_category(vectors)
+            cluster_times.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            approximate = prefiltered_neighbors(vectors, centroids, labels, k, probe)
+            query_times.append(time.perf_counter() - started)
+        rows.append({
+            '中項目': middle_cat,
+            'problems': len(ids),
+            'topics': len(centroids),
+            'exact_seconds': min(exact_times),
+            'cluster_seconds': min(cluster_times),
+            'prefiltered_seconds': min(query_times),
+            f'recall_at_{k}': recall_at_k(approximate, exact),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="中項目を話題に分け、話題による候補の絞り込みを全組比較と比べます。")
+    # デフォルトパスをスクリプトからの相対パスとして定義
+    parser.add_argument('--input_json', type=str, default='gemma_embeddings.json', help='入力JSONファイルのパス')
+    parser.add_argument('--vector_column', type=str, default='embedding', help='ベクトルの列名')
+    parser.add_argument('--top_k', type=int, default=5, help='比べる類似問題の件数')
+    parser.add_argument('--probe', type=int, default=2, help='候補にする話題の数（近い中心から）')
+    parser.add_argument('--output', type=str, default='topic_clusters_report.json', help='結果の出力先')
+    args = parser.parse_args()
+
+    # main.py はこのモジュールを import するので、ここで読み込む
+    from main import group_vectors, print_log
+
+    print_log("=== 話題クラスタリングの比較開始 ===")
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.normpath(os.path.join(script_dir, args.input_json)), 'r', encoding='utf-8') as f:
+        records = json.load(f)
+
+    grouped = group_vectors(records, args.vector_column)
+    if not grouped:
+        print_log(f"エラー: {args.vector_column} 列のベクトルがありません")
+        return
+
+    rows = compare_with_exact(grouped, args.top_k, args.probe)
+    total_problems = sum(row['problems'] for row in rows)
+    exact_seconds = sum(row['exact_seconds'] for row in rows)
+    prefiltered_seconds = sum(row['prefiltered_seconds'] for row in rows)
+    cluster_seconds = sum(row['cluster_seconds'] for row in rows)
+    recall_key = f'recall_at_{args.top_k}'
+    recall = sum(row[recall_key] * row['problems'] for row in rows) / max(1, total_problems)
+    summary = {
+        'problems': total_problems,
+        'top_k': args.top_k,
+        'probe': args.probe,
+        'exact_queries_per_second': total_problems / exact_seconds if exact_seconds else None,
+        'prefiltered_queries_per_second': total_problems / prefiltered_seconds if prefiltered_seconds else None,
+        'cluster_seconds': cluster_seconds,
+        recall_key: recall,
+    }
+    for row in sorted(rows, key=lambda r: -r['problems'])[:10]:
+        print_log(f"{row['中項目']}: {row['problems']}問・{row['topics']}話題 "
+                  f"全組 {row['exact_seconds'] * 1000:.1f}ms / 絞り込み {row['prefiltered_seconds'] * 1000:.1f}ms"
+                  f"（クラスタリング {row['cluster_seconds'] * 1000:.1f}ms）recall@{args.top_k}={row[recall_key]:.3f}")
+    print_log(f"全体: 全組 {summary['exact_queries_per_second']:.0f}問/秒、"
+              f"絞り込み {summary['prefiltered_queries_per_second']:.0f}問/秒、recall@{args.top_k}={recall:.3f}")
+
+    output_path = os.path.normpath(os.path.join(script_dir, args.output))
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({'summary': summary, 'categories': rows}, f, ensure_ascii=False, indent=2)
+    print_log(f"結果出力完了: {output_path}")
+    print_log("=== 完了 ===")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,9 @@ import { renderTotalReactions, renderTotalProgress, renderTotalReviewCount, rend
 import { renderIndex, showIndex } from './js/ui-index.js';
 import { showDetail, renderProblemList } from './js/ui-detail.js';
 import { storage } from './js/storage.js';
+import { hydrateProblemData } from './js/problem-data.js';
+import { startProblemWorker } from './js/problem-worker-client.js';
+import { readBuildManifest, loadProblemDataset, manifestDataHashes, registerServiceWorker } from './js/offline-cache.js';
 
 // Helper function to format sync time
 function formatSyncTime(isoString) {
@@ -34,27 +37,27 @@ window.addEventListener('DOMContentLoaded', async () => {
     async function loadCoreData() {
         loadingStatusText.textContent = 'データを準備中...';
         try {
-            // Use embedded data
-            if (window.PROBLEM_DATA) {
-                state.data = window.PROBLEM_DATA;
-
-                // Filter similar problems to same middle category
-                for (const middleCat in state.data.categories) {
-                    state.data.categories[middleCat].forEach(item => {
-                        item.similar_problems = item.similar_problems.filter(sim => {
-                            return sim.data.中分類 === item.main_problem.中分類;
-                        });
-                    });
-                }
-
-                // Calculate reference counts (function is defined in api.js but imported via loadData... wait, loadData is imported but calculateReferenceCounts is not exported from api.js? 
-                // Actually calculateReferenceCounts is internal to api.js. I need to move it here or export it.
-                // Let's check api.js again. It's not exported. I should copy it here or export it.
-                // Since I'm simplifying, I'll copy the logic here or import it if I modify api.js.
-                // For now, I'll implement the logic here directly as it's simple.
-
-                calculateReferenceCounts(state.data.categories);
-
+            // index.html にはビルド情報（問題データのハッシュとURL）が埋め込まれており、
+            // 同じハッシュのデータが IndexedDB にあればダウンロードせずに使う
+            const manifest = readBuildManifest();
+            // 別のモデルを選んでいて、そのデータがビルドに含まれていればそちらを使う
+            const selectedModel = manifest && (manifest.models || []).find(model => model.id === storage.loadSelectedModel());
+            // ビルド情報の無い index.html では JSON として直接埋め込まれている
+            const datasetJson = manifest
+                ? await loadProblemDataset(selectedModel || manifest, manifestDataHashes(manifest))
+                : document.getElementById('problem-data')?.textContent;
+            registerServiceWorker(manifest);
+            if (datasetJson) {
+                // 問題IDで参照されている問題データを展開する（JSON.parse の方がスクリプトとして評価するより速い）
+                state.data = hydrateProblemData(JSON.parse(datasetJson));
+                // 一覧の絞り込み・並べ替えとベクトルでの類似問題検索は同じデータを持つ Worker で行う
+                startProblemWorker(datasetJson, manifest ? (selectedModel || manifest).embeddings || null : null);
+
+                // 同じ中項目への絞り込みと被参照数の集計はビルド時（03_html_output/main.py）に済んでいる
+
+            } else if (window.PROBLEM_DATA) {
+                // 旧形式の index.html（window.PROBLEM_DATA として埋め込み）
+                state.data = hydrateProblemData(window.PROBLEM_DATA);
             } else {
                 throw new Error('データが埋め込まれていません。');
             }
@@ -65,23 +68,6 @@ window.addEventListener('DOMContentLoaded', async () => {
         }
     }
 
-    function calculateReferenceCounts(categories) {
-        state.referenceCounts = {};
-        for (const middleCat in categories) {
-            const problemsInCat = categories[middleCat];
-            const countsInCat = {};
-            problemsInCat.forEach(item => {
-                item.similar_problems.forEach(sim => {
-                    if (sim.similarity >= 0.9) {
-                        const problemId = sim.data.問題番号;
-                        countsInCat[problemId] = (countsInCat[problemId] || 0) + 1;
-                    }
-                });
-            });
-            state.referenceCounts[middleCat] = countsInCat;
-        }
-    }
-
     // --- Step 2b: Initialize user session and load user-specific data ---
     async function initializeUserSession() {
         let isAuthenticated = false;
@@ -115,18 +101,7 @@ window.addEventListener('DOMContentLoaded', async () => {
             console.log("Session authenticated.");
             try {
                 await storage.loadFromCloud();
-                // Re-initialize state with cloud data
-                initState();
-                // Re-render UI to reflect cloud data
-                const currentHash = location.hash.substring(1);
-                if (currentHash) {
-                    renderProblemList(decodeURIComponent(currentHash));
-                } else {
-                    renderIndex(state.data.categories);
-                }
-                renderTotalReactions();
-                renderTotalReviewCount();
-                renderTotalProgress();
+                reloadStateFromStorage();
             } catch (e) {
                 console.error('Cloud data loading failed:', e.message);
             }
@@ -139,6 +114,20 @@ window.addEventListener('DOMContentLoaded', async () => {
         return { isAuthenticated };
     }
 
+    // Re-initialize state with the data in local storage and re-render UI to reflect it
+    function reloadStateFromStorage() {
+        initState();
+        const currentHash = location.hash.substring(1);
+        if (currentHash) {
+            renderProblemList(decodeURIComponent(currentHash));
+        } else {
+            renderIndex(state.data.categories);
+        }
+        renderTotalReactions();
+        renderTotalReviewCount();
+        renderTotalProgress();
+    }
+
     // --- Step 3: Render the final UI after all data is loaded ---
     function renderFinalUI() {
         loadingStatusText.textContent = 'UIを更新中...';
@@ -207,6 +196,7 @@ window.addEventListener('DOMContentLoaded', async () => {
             // 3. Render UI immediately in read-only mode
             window.isReadOnlyMode = true;
             renderFinalUI();
+            prepareModelSelector();
             loadingOverlay.classList.remove('visible');
 
             // Add read-only class to all interactive elements
@@ -331,7 +321,40 @@ window.addEventListener('DOMContentLoaded', async () => {
         }
     });
 
-    // Removed modelSelector event listener
+    // --- モデルの切り替え（ビルドに複数のモデルのデータが含まれる場合のみ表示） ---
+    function prepareModelSelector() {
+        const modelSelector = document.getElementById('model-selector');
+        const manifest = readBuildManifest();
+        const models = (manifest && manifest.models) || [];
+        if (models.length < 2) return;
+
+        modelSelector.innerHTML = models.map(model => `<option value="${model.id}">${model.model}</option>`).join('');
+        const current = models.find(model => model.model === state.data.model);
+        // 読み込み済みのモデル（切り替えに失敗したときはこれに戻す）
+        let currentModelId = current ? current.id : null;
+        if (currentModelId) modelSelector.value = currentModelId;
+        modelSelector.style.display = '';
+
+        modelSelector.addEventListener('change', async () => {
+            const modelId = modelSelector.value;
+            loadingStatusText.textContent = 'モデルのデータを読み込み中...';
+            loadingOverlay.classList.add('visible');
+            try {
+                await loadData(modelId);
+                currentModelId = modelId;
+                storage.saveSelectedModel(modelId);
+                // ユーザーデータは問題キーで保存されているので、そのまま新しいデータに対応付ける
+                reloadStateFromStorage();
+                modelInfo.textContent = `使用モデル: ${state.data.model || 'N/A'}`;
+                showNotification(`モデルを「${state.data.model}」に切り替えました`);
+            } catch (e) {
+                showNotification('モデルの切り替えに失敗しました: ' + e.message, 5000, 'error');
+                if (currentModelId) modelSelector.value = currentModelId;
+            } finally {
+                loadingOverlay.classList.remove('visible');
+            }
+        });
+    }
 
     document.getElementById('back-button').addEventListener('click', e => {
         e.preventDefault();
@@ -408,7 +431,8 @@ window.addEventListener('DOMContentLoaded', async () => {
         syncStatus.textContent = 'アップロード中...';
         syncStatus.style.color = 'blue';
         try {
-            await storage.syncWithCloud();
+            const result = await storage.syncWithCloud();
+            if (result.merged) reloadStateFromStorage(); // 他端末の変更を取り込んだ
             syncStatus.textContent = 'アップロード完了！';
             syncStatus.style.color = 'green';
         } catch (e) {
@@ -511,7 +535,15 @@ window.addEventListener('DOMContentLoaded', async () => {
 
 
 
-            await storage.syncWithCloud();
+            const result = await storage.syncWithCloud();
+
+
+
+
+
+
+
+            if (result.merged) reloadStateFromStorage(); // 他端末の変更を取り込んだ
 
 
 
@@ -12,6 +12,8 @@ HEADLESS_MODE = False
 
 # GAS Web App URL for testing
 # IMPORTANT: Use a separate deployment for testing, not production!
+# Leave empty to run against the local SQLite backend (local_gas_server.py),
+# which the test fixtures start automatically.
 TEST_GAS_URL = ""
 
 # Base URL for the local server
@@ -12,7 +12,7 @@ function doPost(e) {
     }
 
     try {
-        const params = JSON.parse(e.postData.contents);
+        const params = decodeRequest(JSON.parse(e.postData.contents));
         const action = params.action;
 
         let result = {};
@@ -34,7 +34,10 @@ function doPost(e) {
                 result = saveDataWithAuth(params.accessToken, params.data, params.version);
                 break;
             case 'load':
-                result = loadDataWithAuth(params.accessToken);
+                result = loadDataWithAuth(params.accessToken, params.sinceVersion);
+                break;
+            case 'sync':
+                result = syncDataWithAuth(params.accessToken, params.ops, params.version);
                 break;
             case 'clear': // ★追加: clearアクションのハンドラ
                 result = clearUserData(params.accessToken);
@@ -43,7 +46,12 @@ function doPost(e) {
                 result = { error: 'Invalid action' };
         }
 
-        return ContentService.createTextOutput(JSON.stringify(result)).setMimeType(ContentService.MimeType.JSON);
+        // 認証系の応答で対応している圧縮形式を知らせ、以降のリクエストで使えるようにする
+        if (['login', 'validate', 'refresh'].indexOf(action) !== -1 && !result.error) {
+            result.encodings = SUPPORTED_ENCODINGS;
+        }
+
+        return ContentService.createTextOutput(JSON.stringify(encodeResponse(result, params.acceptEncoding))).setMimeType(ContentService.MimeType.JSON);
 
     } catch (error) {
         return ContentService.createTextOutput(JSON.stringify({ error: error.toString() })).setMimeType(ContentService.MimeType.JSON);
@@ -52,6 +60,88 @@ function doPost(e) {
     }
 }
 
+// --- Payload Encoding ---
+// 大きなペイロードは gzip（deflate）+ base64 に圧縮し、encoding タグを付けて送受信する。
+//   リクエスト: { action, accessToken, encoding: 'gzip+base64', payload: '<base64>' }（payload を展開すると残りのパラメータ）
+//   レスポンス: acceptEncoding が指定されていれば { encoding: 'gzip+base64', payload: '<base64>' }
+// JSON_Data セルにも同じ形式で保存し、1セルの文字数上限を超える場合は行の右側の列に分割する。
+const PAYLOAD_ENCODING = 'gzip+base64';
+const SUPPORTED_ENCODINGS = [PAYLOAD_ENCODING];
+const RESPONSE_COMPRESSION_THRESHOLD = 2048; // これより小さい応答は圧縮しない
+const CELL_ENCODING_PREFIX = 'gz64:'; // 'gz64:<分割数>:<base64>'（接頭辞が無ければ旧形式の JSON）
+const CELL_CHUNK_SIZE = 45000; // 1セル50,000文字の上限に余裕を持たせる
+
+function decodeRequest(params) {
+    if (!params.encoding) return params;
+    if (SUPPORTED_ENCODINGS.indexOf(params.encoding) === -1) {
+        throw new Error('Unsupported encoding: ' + params.encoding);
+    }
+    const decoded = JSON.parse(gunzipBase64(params.payload));
+    delete params.encoding;
+    delete params.payload;
+    return Object.assign(params, decoded);
+}
+
+function encodeResponse(result, acceptEncoding) {
+    const text = JSON.stringify(result);
+    if (acceptEncoding !== PAYLOAD_ENCODING || text.length < RESPONSE_COMPRESSION_THRESHOLD) return result;
+    return { encoding: PAYLOAD_ENCODING, payload: gzipBase64(text) };
+}
+
+function gzipBase64(text) {
+    const blob = Utilities.newBlob(text, 'application/json');
+    return Utilities.base64Encode(Utilities.gzip(blob).getBytes());
+}
+
+function gunzipBase64(encoded) {
+    const blob = Utilities.newBlob(Utilities.base64Decode(encoded), 'application/x-gzip');
+    return Utilities.ungzip(blob).getDataAsString('UTF-8');
+}
+
+// 分割したデータを書く列の位置（ヘッダーの右隣の最初の空き列）
+function chunkColumnIndex(headers) {
+    const blank = headers.indexOf('');
+    return blank === -1 ? headers.length : blank;
+}
+
+function cellChunkCount(cellValue) {
+    const text = String(cellValue || '');
+    if (text.indexOf(CELL_ENCODING_PREFIX) !== 0) return 1;
+    return parseInt(text.slice(CELL_ENCODING_PREFIX.length));
+}
+
+// Data シートの行から JSON_Data を復元する（旧形式の非圧縮 JSON もそのまま読む）
+function readCellData(row, jsonDataColIdx, chunkColIdx) {
+    const text = String(row[jsonDataColIdx] || '');
+    if (text.indexOf(CELL_ENCODING_PREFIX) !== 0) return JSON.parse(text || '{}');
+
+    const body = text.slice(CELL_ENCODING_PREFIX.length);
+    const separator = body.indexOf(':');
+    const count = parseInt(body.slice(0, separator));
+    let encoded = body.slice(separator + 1);
+    for (let i = 1; i < count; i++) {
+        encoded += row[chunkColIdx + i - 1];
+    }
+    return JSON.parse(gunzipBase64(encoded));
+}
+
+// JSON_Data を圧縮して書き込む。previousCell より分割数が減った場合は残った列を空にする
+function writeCellData(dataSheet, rowNumber, jsonDataColIdx, chunkColIdx, jsonData, previousCell) {
+    const encoded = gzipBase64(JSON.stringify(jsonData));
+    const chunks = [];
+    for (let i = 0; i < encoded.length; i += CELL_CHUNK_SIZE) {
+        chunks.push(encoded.slice(i, i + CELL_CHUNK_SIZE));
+    }
+    if (chunks.length === 0) chunks.push('');
+
+    dataSheet.getRange(rowNumber, jsonDataColIdx + 1).setValue(CELL_ENCODING_PREFIX + chunks.length + ':' + chunks[0]);
+    const rest = chunks.slice(1);
+    while (rest.length < cellChunkCount(previousCell) - 1) rest.push('');
+    if (rest.length > 0) {
+        dataSheet.getRange(rowNumber, chunkColIdx + 1, 1, rest.length).setValues([rest]);
+    }
+}
+
 // --- Configuration ---
 // スプレッドシートIDを自動取得（スクリプトがスプレッドシートにバインドされている場合）
 function getSpreadsheetId() {
@@ -93,17 +183,15 @@ function registerUser(userId, password) {
         usersSheet.appendRow(['UserId', 'PasswordHash', 'AccessToken', 'AccessTokenExpiry', 'RefreshTokens']);
     }
 
-    const data = usersSheet.getDataRange().getValues();
     // Check if user exists
-    for (let i = 1; i < data.length; i++) {
-        if (data[i][0] === userId) {
-            return { error: 'User already exists' };
-        }
+    if (findUserRow(usersSheet, userId)) {
+        return { error: 'User already exists' };
     }
 
     const passwordHash = hashPassword(password);
     // RefreshTokens column is initialized with an empty JSON array string
     usersSheet.appendRow([userId, passwordHash, '', '', '[]']);
+    putIndexEntries({ ['user:' + userId]: usersSheet.getLastRow() });
 
     return { success: true, message: 'User registered successfully' };
 }
@@ -115,8 +203,7 @@ function loginUser(userId, password) {
     const usersSheet = ss.getSheetByName('Users');
     if (!usersSheet) return { error: 'User sheet not found' };
 
-    const data = usersSheet.getDataRange().getValues();
-    const headers = data[0];
+    const headers = readHeaders(usersSheet);
     const userIdColIdx = headers.indexOf('UserId');
     const hashColIdx = headers.indexOf('PasswordHash');
     const accessTokenColIdx = headers.indexOf('AccessToken');
@@ -127,18 +214,9 @@ function loginUser(userId, password) {
         return { error: 'Users sheet is not initialized correctly for multi-device support.' };
     }
 
-    let userRow = null;
-    let rowIndex = -1;
-
-    for (let i = 1; i < data.length; i++) {
-        if (data[i][userIdColIdx] === userId) {
-            userRow = data[i];
-            rowIndex = i;
-            break;
-        }
-    }
-
-    if (!userRow) return { error: 'User not found' };
+    const found = findUserRow(usersSheet, userId);
+    if (!found) return { error: 'User not found' };
+    const userRow = found.row;
 
     const storedHash = userRow[hashColIdx];
     const inputHash = hashPassword(password);
@@ -177,9 +255,14 @@ function loginUser(userId, password) {
     });
 
     // 4. Update the sheet
-    usersSheet.getRange(rowIndex + 1, accessTokenColIdx + 1).setValue(newAccessToken);
-    usersSheet.getRange(rowIndex + 1, accessTokenExpiryColIdx + 1).setValue(newAccessTokenExpiry.toISOString());
-    usersSheet.getRange(rowIndex + 1, refreshTokensColIdx + 1).setValue(JSON.stringify(validRefreshTokens));
+    usersSheet.getRange(found.rowNumber, accessTokenColIdx + 1).setValue(newAccessToken);
+    usersSheet.getRange(found.rowNumber, accessTokenExpiryColIdx + 1).setValue(newAccessTokenExpiry.toISOString());
+    usersSheet.getRange(found.rowNumber, refreshTokensColIdx + 1).setValue(JSON.stringify(validRefreshTokens));
+    putIndexEntries({
+        ...supersededTokenEntry(userRow[accessTokenColIdx]),
+        ['token:' + newAccessToken]: found.rowNumber,
+        ['refresh:' + newRefreshToken]: found.rowNumber
+    });
 
     return {
         success: true,
@@ -206,8 +289,7 @@ function refreshTokenFlow(providedRefreshToken) {
     const usersSheet = ss.getSheetByName('Users');
     if (!usersSheet) return { error: 'User sheet not found.' };
 
-    const data = usersSheet.getDataRange().getValues();
-    const headers = data[0];
+    const headers = readHeaders(usersSheet);
     const refreshTokensColIdx = headers.indexOf('RefreshTokens');
     const accessTokenColIdx = headers.indexOf('AccessToken');
     const accessTokenExpiryColIdx = headers.indexOf('AccessTokenExpiry');
@@ -218,41 +300,25 @@ function refreshTokenFlow(providedRefreshToken) {
     }
 
     const now = new Date();
-    let targetUserRowIndex = -1;
-    let userId = '';
-
-    // Find the user and the valid refresh token
-    for (let i = 1; i < data.length; i++) {
-        const userRow = data[i];
-        let refreshTokens = [];
-        try {
-            const existingTokens = userRow[refreshTokensColIdx];
-            if (existingTokens && typeof existingTokens === 'string' && existingTokens.startsWith('[')) {
-                refreshTokens = JSON.parse(existingTokens);
-            }
-        } catch (e) {
-            continue; // Skip row if JSON is invalid
-        }
+    // Find the user holding the valid refresh token
+    const found = lookupIndexedRow(usersSheet, 'refresh:' + providedRefreshToken, (row, rowHeaders) => {
+        const refreshTokens = parseRefreshTokens(row[rowHeaders.indexOf('RefreshTokens')]);
+        return refreshTokens.some(rt => rt.token === providedRefreshToken && new Date(rt.expiry) > now);
+    }, indexUsersSheet);
 
-        const foundToken = refreshTokens.find(rt => rt.token === providedRefreshToken && new Date(rt.expiry) > now);
-
-        if (foundToken) {
-            targetUserRowIndex = i;
-            userId = userRow[userIdColIdx];
-            break; // Found the user, exit loop
-        }
-    }
-
-    if (targetUserRowIndex === -1) {
+    if (!found) {
         return { error: 'Invalid or expired refresh token.' };
     }
+    const targetRowNumber = found.rowNumber;
+    const userId = found.row[userIdColIdx];
 
     // Generate and save a new access token
     const newAccessToken = Utilities.getUuid();
     const newAccessTokenExpiry = new Date(now.getTime() + 60 * 60 * 1000); // 1 hour from now
 
-    usersSheet.getRange(targetUserRowIndex + 1, accessTokenColIdx + 1).setValue(newAccessToken);
-    usersSheet.getRange(targetUserRowIndex + 1, accessTokenExpiryColIdx + 1).setValue(newAccessTokenExpiry.toISOString());
+    usersSheet.getRange(targetRowNumber, accessTokenColIdx + 1).setValue(newAccessToken);
+    usersSheet.getRange(targetRowNumber, accessTokenExpiryColIdx + 1).setValue(newAccessTokenExpiry.toISOString());
+    putIndexEntries({ ...supersededTokenEntry(found.row[accessTokenColIdx]), ['token:' + newAccessToken]: targetRowNumber });
 
     return { success: true, accessToken: newAccessToken, userId: userId };
 }
@@ -271,8 +337,7 @@ function saveDataWithAuth(accessToken, jsonData, clientVersion) {
         dataSheet.appendRow(['UserId', 'JSON_Data', 'LastUpdated', 'Version', 'LastEditedBy']);
     }
 
-    const data = dataSheet.getDataRange().getValues();
-    const headers = data[0];
+    const headers = readHeaders(dataSheet);
     const userIdColIdx = headers.indexOf('UserId');
     const jsonDataColIdx = headers.indexOf('JSON_Data');
     const lastUpdatedColIdx = headers.indexOf('LastUpdated');
@@ -283,20 +348,10 @@ function saveDataWithAuth(accessToken, jsonData, clientVersion) {
         return { error: 'Data sheet is not initialized correctly. Missing required headers for optimistic locking.' };
     }
 
-    let found = false;
-    let currentRowIndex = -1;
-    let storedVersion = 0;
-    let lastEditedBy = '';
-
-    for (let i = 1; i < data.length; i++) {
-        if (data[i][userIdColIdx] === user.userId) {
-            currentRowIndex = i;
-            storedVersion = parseInt(data[i][versionColIdx] || 0); // Parse existing version, default to 0
-            lastEditedBy = data[i][lastEditedByColIdx] || '';
-            found = true;
-            break;
-        }
-    }
+    const dataRow = findDataRow(dataSheet, user.userId);
+    const found = !!dataRow;
+    const storedVersion = found ? parseInt(dataRow.row[versionColIdx] || 0) : 0; // Parse existing version, default to 0
+    const lastEditedBy = found ? dataRow.row[lastEditedByColIdx] || '' : '';
 
     // Check for optimistic lock conflict - skip if last editor is the same user
     if (found && clientVersion !== undefined && lastEditedBy !== user.userId && clientVersion !== storedVersion) {
@@ -306,21 +361,35 @@ function saveDataWithAuth(accessToken, jsonData, clientVersion) {
     const newVersion = storedVersion + 1;
     const now = new Date().toISOString();
 
+    let rowNumber;
+    let previousCell = '';
     if (found) {
-        // Update existing
-        dataSheet.getRange(currentRowIndex + 1, jsonDataColIdx + 1).setValue(JSON.stringify(jsonData));
-        dataSheet.getRange(currentRowIndex + 1, lastUpdatedColIdx + 1).setValue(now);
-        dataSheet.getRange(currentRowIndex + 1, versionColIdx + 1).setValue(newVersion);
-        dataSheet.getRange(currentRowIndex + 1, lastEditedByColIdx + 1).setValue(user.userId);
+        rowNumber = dataRow.rowNumber;
+        previousCell = dataRow.row[jsonDataColIdx];
     } else {
-        // Append new row
-        dataSheet.appendRow([user.userId, JSON.stringify(jsonData), now, newVersion, user.userId]);
+        // Append new row (JSON_Data is written below)
+        dataSheet.appendRow([user.userId, '', now, newVersion, user.userId]);
+        rowNumber = dataSheet.getLastRow();
+        putIndexEntries({ ['data:' + user.userId]: rowNumber });
+    }
+    writeCellData(dataSheet, rowNumber, jsonDataColIdx, chunkColumnIndex(headers), jsonData, previousCell);
+    if (found) {
+        // Update existing
+        dataSheet.getRange(rowNumber, lastUpdatedColIdx + 1).setValue(now);
+        dataSheet.getRange(rowNumber, versionColIdx + 1).setValue(newVersion);
+        dataSheet.getRange(rowNumber, lastEditedByColIdx + 1).setValue(user.userId);
+    }
+
+    // 全体を保存したので、それまでの操作ログは不要
+    const opsSheet = ss.getSheetByName('Ops');
+    if (opsSheet) {
+        deleteRows(opsSheet, readUserOps(opsSheet, user.userId).map(entry => entry.rowNumber));
     }
 
     return { success: true, version: newVersion };
 }
 
-function loadDataWithAuth(accessToken) {
+function loadDataWithAuth(accessToken, sinceVersion) {
     const user = getUserByAccessToken(accessToken);
     if (!user) return { error: 'Unauthorized or Access Token Expired' };
 
@@ -328,8 +397,7 @@ function loadDataWithAuth(accessToken) {
     const dataSheet = ss.getSheetByName('Data');
     if (!dataSheet) return { data: {}, version: 0 }; // Return empty data and version 0 if no sheet
 
-    const data = dataSheet.getDataRange().getValues();
-    const headers = data[0];
+    const headers = readHeaders(dataSheet);
     const userIdColIdx = headers.indexOf('UserId');
     const jsonDataColIdx = headers.indexOf('JSON_Data');
     const versionColIdx = headers.indexOf('Version');
@@ -339,13 +407,169 @@ function loadDataWithAuth(accessToken) {
         return { error: 'Data sheet is not initialized correctly. Missing required headers for optimistic locking.' };
     }
 
-    for (let i = 1; i < data.length; i++) {
-        if (data[i][userIdColIdx] === user.userId) {
-            const storedVersion = parseInt(data[i][versionColIdx] || 0);
-            return { data: JSON.parse(data[i][jsonDataColIdx]), version: storedVersion };
+    const dataRow = findDataRow(dataSheet, user.userId);
+    if (!dataRow) return { data: {}, version: 0 }; // Return empty data and version 0 if no data found for user
+
+    const storedVersion = parseInt(dataRow.row[versionColIdx] || 0);
+    const opsSheet = ss.getSheetByName('Ops');
+    const entries = opsSheet ? readUserOps(opsSheet, user.userId) : [];
+
+    // クライアントの版以降の操作ログが揃っていれば差分だけを返す
+    if (typeof sinceVersion === 'number' && sinceVersion <= storedVersion) {
+        const missed = replayableOps(entries, sinceVersion, storedVersion);
+        if (missed) return { ops: missed, version: storedVersion, delta: true };
+    }
+
+    const snapshot = readCellData(dataRow.row, jsonDataColIdx, chunkColumnIndex(headers));
+    return { data: applyOps(snapshot, flattenOps(entries)), version: storedVersion };
+}
+
+// --- Delta Sync ---
+// クライアントは前回の同期以降に変更されたエントリだけを操作（ops）として送る。
+//   { t: 'checks' | 'oshi' | 'like' | 'fear', k: 問題キー, v: 値（null で削除） }
+//   { t: 'favorites' | 'archived', k: 問題キー, v: true（追加） / false（削除） }
+//   { t: 'examDate', v: 日付文字列 }
+// Data シートの JSON_Data は最後に圧縮した時点のスナップショット、Version は最新の版を表し、
+// それ以降の操作は Ops シートに1版1行で追記する。行数がしきい値に達したらスナップショットへ畳み込む。
+
+const OPS_COMPACTION_THRESHOLD = 20;
+const MAP_FIELDS = ['checks', 'oshi', 'like', 'fear'];
+const SET_FIELDS = ['favorites', 'archived'];
+
+function syncDataWithAuth(accessToken, ops, clientVersion) {
+    const user = getUserByAccessToken(accessToken);
+    if (!user) return { error: 'Unauthorized or Access Token Expired' };
+    if (!Array.isArray(ops)) return { error: 'Missing ops' };
+
+    const ss = getSpreadsheet();
+    const dataSheet = ss.getSheetByName('Data');
+    if (!dataSheet) return { error: 'ResyncRequired' };
+
+    const headers = readHeaders(dataSheet);
+    const userIdColIdx = headers.indexOf('UserId');
+    const jsonDataColIdx = headers.indexOf('JSON_Data');
+    const lastUpdatedColIdx = headers.indexOf('LastUpdated');
+    const versionColIdx = headers.indexOf('Version');
+    const lastEditedByColIdx = headers.indexOf('LastEditedBy');
+
+    if ([userIdColIdx, jsonDataColIdx, lastUpdatedColIdx, versionColIdx, lastEditedByColIdx].some(idx => idx === -1)) {
+        return { error: 'Data sheet is not initialized correctly. Missing required headers for optimistic locking.' };
+    }
+
+    // サーバー側に基準となるスナップショットが無い、またはクライアントの版の方が新しい場合は全体の送り直しを求める
+    const dataRow = findDataRow(dataSheet, user.userId);
+    const storedVersion = dataRow ? parseInt(dataRow.row[versionColIdx] || 0) : 0;
+    if (!dataRow || clientVersion === undefined || clientVersion > storedVersion) {
+        return { error: 'ResyncRequired' };
+    }
+
+    // Check for optimistic lock conflict - same rule as saveDataWithAuth
+    const lastEditedBy = dataRow.row[lastEditedByColIdx] || '';
+    if (lastEditedBy !== user.userId && clientVersion !== storedVersion) {
+        return { error: 'ConflictError', currentVersion: storedVersion, lastEditedBy: lastEditedBy };
+    }
+
+    const opsSheet = getOpsSheet(ss);
+    const entries = readUserOps(opsSheet, user.userId);
+    // このクライアントがまだ受け取っていない他端末の変更
+    const missed = replayableOps(entries, clientVersion, storedVersion);
+
+    let newVersion = storedVersion;
+    if (ops.length > 0) {
+        newVersion = storedVersion + 1;
+        const now = new Date().toISOString();
+        opsSheet.appendRow([user.userId, newVersion, JSON.stringify(ops), now]);
+        entries.push({ rowNumber: opsSheet.getLastRow(), version: newVersion, ops: ops });
+
+        const rowNumber = dataRow.rowNumber;
+        dataSheet.getRange(rowNumber, lastUpdatedColIdx + 1).setValue(now);
+        dataSheet.getRange(rowNumber, versionColIdx + 1).setValue(newVersion);
+        dataSheet.getRange(rowNumber, lastEditedByColIdx + 1).setValue(user.userId);
+    }
+
+    let snapshot = null;
+    if (entries.length >= OPS_COMPACTION_THRESHOLD || !missed) {
+        const chunkColIdx = chunkColumnIndex(headers);
+        snapshot = applyOps(readCellData(dataRow.row, jsonDataColIdx, chunkColIdx), flattenOps(entries));
+    }
+    if (entries.length >= OPS_COMPACTION_THRESHOLD) {
+        writeCellData(dataSheet, dataRow.rowNumber, jsonDataColIdx, chunkColumnIndex(headers), snapshot,
+            dataRow.row[jsonDataColIdx]);
+        deleteRows(opsSheet, entries.map(entry => entry.rowNumber));
+    }
+
+    if (missed) {
+        return { success: true, version: newVersion, ops: missed };
+    }
+    // 圧縮や全体保存で途中の操作ログが残っていない場合は、最新の状態をまるごと返す
+    return { success: true, version: newVersion, data: snapshot };
+}
+
+function applyOps(data, ops) {
+    ops.forEach(op => {
+        if (op.t === 'examDate') {
+            data.examDate = op.v;
+        } else if (MAP_FIELDS.indexOf(op.t) !== -1) {
+            const map = data[op.t] || {};
+            if (op.v === null) {
+                delete map[op.k];
+            } else {
+                map[op.k] = op.v;
+            }
+            data[op.t] = map;
+        } else if (SET_FIELDS.indexOf(op.t) !== -1) {
+            const list = data[op.t] || [];
+            const index = list.indexOf(op.k);
+            if (op.v && index === -1) list.push(op.k);
+            if (!op.v && index !== -1) list.splice(index, 1);
+            data[op.t] = list;
         }
+    });
+    return data;
+}
+
+function flattenOps(entries) {
+    return entries.reduce((all, entry) => all.concat(entry.ops), []);
+}
+
+// fromVersion より後、toVersion までの操作がすべて残っていればそれを返す（欠けていれば null）
+function replayableOps(entries, fromVersion, toVersion) {
+    const missed = entries.filter(entry => entry.version > fromVersion && entry.version <= toVersion);
+    if (missed.length !== toVersion - fromVersion) return null;
+    return flattenOps(missed);
+}
+
+function getOpsSheet(ss) {
+    let opsSheet = ss.getSheetByName('Ops');
+    if (!opsSheet) {
+        opsSheet = ss.insertSheet('Ops');
+        opsSheet.appendRow(['UserId', 'Version', 'Ops', 'CreatedAt']);
     }
-    return { data: {}, version: 0 }; // Return empty data and version 0 if no data found for user
+    return opsSheet;
+}
+
+// ユーザーの操作ログを版の昇順で返す（rowNumber はシート上の行番号）
+// シート全体を読み込まず、TextFinder で UserId 列から該当行だけを探す
+function readUserOps(opsSheet, userId) {
+    const lastRow = opsSheet.getLastRow();
+    if (lastRow < 2) return [];
+    // TextFinder は既定で大文字・小文字を区別しないので、matchCase を付けたうえで値も照合する
+    // （"Alice" と "alice" の操作ログを取り違えると、他のユーザーの行を返したり削除したりしてしまう）
+    const matches = opsSheet.getRange(2, 1, lastRow - 1, 1).createTextFinder(userId)
+        .matchCase(true).matchEntireCell(true).findAll();
+    const entries = [];
+    matches.forEach(range => {
+        const row = opsSheet.getRange(range.getRow(), 1, 1, 4).getValues()[0];
+        if (String(row[0]) !== userId) return;
+        entries.push({ rowNumber: range.getRow(), version: parseInt(row[1]), ops: JSON.parse(row[2]) });
+    });
+    entries.sort((a, b) => a.version - b.version);
+    return entries;
+}
+
+// 後ろの行から削除することで行番号のずれを防ぐ
+function deleteRows(sheet, rowNumbers) {
+    rowNumbers.sort((a, b) => b - a).forEach(rowNumber => sheet.deleteRow(rowNumber));
 }
 
 // ★追加: ユーザーデータをクリアする関数
@@ -376,6 +600,13 @@ function clearUserData(accessToken) {
     for (let i = rowsToDelete.length - 1; i >= 0; i--) {
         dataSheet.deleteRow(rowsToDelete[i]);
     }
+    // 後続の行の索引はずれるが、参照時の照合で外れて作り直される
+    getIndexCache().remove('data:' + user.userId);
+
+    const opsSheet = ss.getSheetByName('Ops');
+    if (opsSheet) {
+        deleteRows(opsSheet, readUserOps(opsSheet, user.userId).map(entry => entry.rowNumber));
+    }
 
     return { success: true, message: `Data for user ${user.userId} cleared.` };
 }
@@ -383,12 +614,13 @@ function clearUserData(accessToken) {
 // --- Helpers ---
 
 function getUserByAccessToken(token) {
+    if (!token) return null;
+
     const ss = getSpreadsheet();
     const usersSheet = ss.getSheetByName('Users');
     if (!usersSheet) return null;
 
-    const data = usersSheet.getDataRange().getValues();
-    const headers = data[0];
+    const headers = readHeaders(usersSheet);
     const accessTokenColIdx = headers.indexOf('AccessToken');
     const accessTokenExpiryColIdx = headers.indexOf('AccessTokenExpiry');
     const userIdColIdx = headers.indexOf('UserId');
@@ -397,20 +629,137 @@ function getUserByAccessToken(token) {
         return null; // Sheet not initialized correctly
     }
 
-    for (let i = 1; i < data.length; i++) {
-        const storedToken = data[i][accessTokenColIdx];
-        const expiryStr = data[i][accessTokenExpiryColIdx];
+    const found = lookupIndexedRow(usersSheet, 'token:' + token,
+        (row, rowHeaders) => row[rowHeaders.indexOf('AccessToken')] === token, indexUsersSheet);
+    if (found) {
+        const expiry = new Date(found.row[accessTokenExpiryColIdx]);
+        if (expiry > new Date()) {
+            return { userId: found.row[userIdColIdx] };
+        }
+    }
+    return null;
+}
 
-        if (storedToken === token) {
-            const expiry = new Date(expiryStr);
-            if (expiry > new Date()) {
-                return { userId: data[i][userIdColIdx] };
-            }
+// --- Row Index ---
+// アクセストークン・リフレッシュトークン → Users シートの行、ユーザーID → Users / Data シートの行 の対応を
+// CacheService に持ち、認証とデータの読み書きでシート全体を走査しないようにする。
+// キャッシュの行番号は必ずその行の内容と照合し、一致しなければ（期限切れ、行削除によるずれなど）
+// シートを1回走査して索引を作り直す。
+// シートに無いキー（置き換えられた古いトークン、不正なトークンなど）は INDEX_MISSING を入れておき、
+// 同じキーで何度も走査しないようにする。索引全体の作り直しは、照合が外れたとき以外は TTL の間に1回まで。
+const INDEX_CACHE_TTL = 6 * 60 * 60; // CacheService の最大保持期間（秒）
+const INDEX_MISSING = 0; // シートに存在しないことを表す行番号
+const INDEX_PUT_BATCH = 500;
+
+function getIndexCache() {
+    return CacheService.getScriptCache();
+}
+
+function putIndexEntries(entries) {
+    const cache = getIndexCache();
+    const keys = Object.keys(entries);
+    for (let i = 0; i < keys.length; i += INDEX_PUT_BATCH) {
+        const batch = {};
+        keys.slice(i, i + INDEX_PUT_BATCH).forEach(key => {
+            batch[key] = String(entries[key]);
+        });
+        cache.putAll(batch, INDEX_CACHE_TTL);
+    }
+}
+
+function readHeaders(sheet) {
+    return sheet.getRange(1, 1, 1, Math.max(sheet.getLastColumn(), 1)).getValues()[0];
+}
+
+// 索引から行を引き、matches(row, headers) で照合する。索引に無ければ全体を読んで探す。
+// 索引の行番号が外れた（行がずれた）場合と、TTL の間に一度も作っていない場合は rebuildIndex で索引全体を作り直し、
+// それ以外は引いたキーの行番号（見つからなければ INDEX_MISSING）だけを書き込む
+function lookupIndexedRow(sheet, cacheKey, matches, rebuildIndex) {
+    const cache = getIndexCache();
+    const cachedValue = cache.get(cacheKey);
+    const cached = parseInt(cachedValue);
+    if (cached === INDEX_MISSING) return null;
+
+    const lastRow = sheet.getLastRow();
+    const headers = readHeaders(sheet);
+    if (cached >= 2 && cached <= lastRow) {
+        const row = sheet.getRange(cached, 1, 1, headers.length).getValues()[0];
+        if (matches(row, headers)) return { rowNumber: cached, row: row };
+    }
+
+    const data = sheet.getDataRange().getValues();
+    const builtKey = 'index:' + sheet.getName();
+    const rebuild = cachedValue !== null || !cache.get(builtKey);
+    if (rebuild) {
+        rebuildIndex(data);
+        cache.put(builtKey, '1', INDEX_CACHE_TTL);
+    }
+    for (let i = 1; i < data.length; i++) {
+        if (matches(data[i], data[0])) {
+            if (!rebuild) putIndexEntries({ [cacheKey]: i + 1 });
+            return { rowNumber: i + 1, row: data[i] };
         }
     }
+    putIndexEntries({ [cacheKey]: INDEX_MISSING });
     return null;
 }
 
+// 新しいアクセストークンに置き換えられたトークンは、以降シートを走査せずに拒否する
+function supersededTokenEntry(oldAccessToken) {
+    return oldAccessToken ? { ['token:' + oldAccessToken]: INDEX_MISSING } : {};
+}
+
+function parseRefreshTokens(value) {
+    try {
+        if (value && typeof value === 'string' && value.startsWith('[')) {
+            return JSON.parse(value);
+        }
+    } catch (e) {
+        // Ignore rows whose JSON is invalid
+    }
+    return [];
+}
+
+function indexUsersSheet(data) {
+    const headers = data[0];
+    const userIdColIdx = headers.indexOf('UserId');
+    const accessTokenColIdx = headers.indexOf('AccessToken');
+    const refreshTokensColIdx = headers.indexOf('RefreshTokens');
+    const entries = {};
+    for (let i = 1; i < data.length; i++) {
+        const rowNumber = i + 1;
+        entries['user:' + data[i][userIdColIdx]] = rowNumber;
+        if (accessTokenColIdx !== -1 && data[i][accessTokenColIdx]) {
+            entries['token:' + data[i][accessTokenColIdx]] = rowNumber;
+        }
+        if (refreshTokensColIdx !== -1) {
+            parseRefreshTokens(data[i][refreshTokensColIdx]).forEach(rt => {
+                entries['refresh:' + rt.token] = rowNumber;
+            });
+        }
+    }
+    putIndexEntries(entries);
+}
+
+function indexDataSheet(data) {
+    const userIdColIdx = data[0].indexOf('UserId');
+    const entries = {};
+    for (let i = 1; i < data.length; i++) {
+        entries['data:' + data[i][userIdColIdx]] = i + 1;
+    }
+    putIndexEntries(entries);
+}
+
+function findUserRow(usersSheet, userId) {
+    return lookupIndexedRow(usersSheet, 'user:' + userId,
+        (row, headers) => row[headers.indexOf('UserId')] === userId, indexUsersSheet);
+}
+
+function findDataRow(dataSheet, userId) {
+    return lookupIndexedRow(dataSheet, 'data:' + userId,
+        (row, headers) => row[headers.indexOf('UserId')] === userId, indexDataSheet);
+}
+
 function hashPassword(password) {
     const rawHash = Utilities.computeDigest(Utilities.DigestAlgorithm.SHA_256, password);
     let txtHash = '';
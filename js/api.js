@@ -1,5 +1,8 @@
 import { state } from './state.js';
 import { storage } from './storage.js';
+import { hydrateProblemData } from './problem-data.js';
+import { readBuildManifest, loadProblemDataset, manifestDataHashes } from './offline-cache.js';
+import { startProblemWorker } from './problem-worker-client.js';
 
 // GAS Web App URL
 function getGasUrl() {
@@ -7,12 +10,59 @@ function getGasUrl() {
     return config.url;
 }
 
+// --- Payload Encoding ---
+// バックエンドが認証系の応答（login / validate / refresh）で gzip+base64 に対応していると知らせてきたら、
+// 大きなリクエストは圧縮して送る。応答は acceptEncoding を付けておけば、対応しているバックエンドだけが圧縮して返す。
+const PAYLOAD_ENCODING = 'gzip+base64';
+const COMPRESSION_THRESHOLD = 2048; // これより小さいリクエストは圧縮しない
+const canCompress = typeof CompressionStream !== 'undefined' && typeof DecompressionStream !== 'undefined';
+
+async function gzipBase64(text) {
+    const stream = new Blob([text]).stream().pipeThrough(new CompressionStream('gzip'));
+    const bytes = new Uint8Array(await new Response(stream).arrayBuffer());
+    let binary = '';
+    for (let i = 0; i < bytes.length; i += 0x8000) {
+        binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+    }
+    return btoa(binary);
+}
+
+async function gunzipBase64(encoded) {
+    const bytes = Uint8Array.from(atob(encoded), c => c.charCodeAt(0));
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+    return await new Response(stream).text();
+}
+
+async function encodeBody(body) {
+    if (!canCompress) return body;
+    const { action, accessToken, ...params } = body;
+    const encoded = { action, acceptEncoding: PAYLOAD_ENCODING };
+    if (accessToken) encoded.accessToken = accessToken;
+
+    const text = JSON.stringify(params);
+    if (storage.gasEncoding !== PAYLOAD_ENCODING || text.length < COMPRESSION_THRESHOLD) {
+        return { ...encoded, ...params };
+    }
+    return { ...encoded, encoding: PAYLOAD_ENCODING, payload: await gzipBase64(text) };
+}
+
+async function decodeResult(result) {
+    if (result.encoding === PAYLOAD_ENCODING) {
+        result = JSON.parse(await gunzipBase64(result.payload));
+    }
+    if (result.encodings) {
+        storage.gasEncoding = result.encodings.includes(PAYLOAD_ENCODING) ? PAYLOAD_ENCODING : '';
+    }
+    return result;
+}
+
 async function postToGas(action, payload = {}, authRequired = false, isRetry = false) {
     const url = getGasUrl();
     if (!url) {
         throw new Error('GAS URL is not configured.');
     }
 
+    let sentToken = null; // このリクエストで送ったアクセストークン
     const buildBody = () => {
         const body = {
             action: action,
@@ -24,12 +74,13 @@ async function postToGas(action, payload = {}, authRequired = false, isRetry = f
                 throw new Error('Authentication required, but access token is missing.');
             }
             body.accessToken = token;
+            sentToken = token;
         }
         return body;
     };
 
     const makeRequest = async () => {
-        const body = buildBody();
+        const body = await encodeBody(buildBody());
         try {
             const response = await fetch(url, {
                 method: 'POST',
@@ -44,7 +95,7 @@ async function postToGas(action, payload = {}, authRequired = false, isRetry = f
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
 
-            const result = await response.json();
+            const result = await decodeResult(await response.json());
 
             if (result.error) {
                 throw new Error(result.error);
@@ -65,16 +116,16 @@ async function postToGas(action, payload = {}, authRequired = false, isRetry = f
         );
 
         if (isAuthError && !isRetry) {
-            try {
-                const refreshResult = await refreshAccessToken();
-                if (refreshResult) {
-                    return await postToGas(action, payload, authRequired, true);
-                } else {
-                    throw new Error('Session expired. Please log in again.');
-                }
-            } catch (refreshError) {
-                throw refreshError;
+            // 送った後に他のリクエストがトークンを更新済みなら、更新し直さずに新しいトークンで送り直す
+            const currentToken = storage.accessToken;
+            if (currentToken && sentToken && currentToken !== sentToken) {
+                return await postToGas(action, payload, authRequired, true);
+            }
+            const refreshResult = await refreshAccessToken();
+            if (refreshResult) {
+                return await postToGas(action, payload, authRequired, true);
             }
+            throw new Error('Session expired. Please log in again.');
         }
 
         throw error;
@@ -90,7 +141,20 @@ export async function login(userId, password) {
     return await postToGas('login', { userId, password });
 }
 
-export async function refreshAccessToken() {
+// 実行中のトークン更新。同時に期限切れになった複数のリクエストは、この1回の更新の結果を待つ
+// （バックエンドは更新のたびに Users シートを走査し、別々に更新すると後の応答が先のトークンを上書きする）
+let refreshInFlight = null;
+
+export function refreshAccessToken() {
+    if (!refreshInFlight) {
+        refreshInFlight = requestAccessToken().finally(() => {
+            refreshInFlight = null;
+        });
+    }
+    return refreshInFlight;
+}
+
+async function requestAccessToken() {
     const refreshToken = storage.refreshToken;
     if (!refreshToken) {
         throw new Error('No refresh token available.');
@@ -124,29 +188,42 @@ export async function saveUserData(data, version) {
     return await postToGas('save', { data, version }, true);
 }
 
-export async function loadUserData() {
-    return await postToGas('load', {}, true);
+// sinceVersion を渡すと、サーバーに操作ログが残っていればその版以降の差分（ops）だけが返る
+// 同じユーザー・同じ sinceVersion の load が実行中なら、新しく送らずにその応答を共有する
+// （呼び出し側が応答を書き換えても互いに影響しないよう、それぞれに複製を返す）
+const loadsInFlight = new Map();
+
+export function loadUserData(sinceVersion) {
+    const key = `${storage.getCurrentUserId()}:${sinceVersion || ''}`;
+    if (!loadsInFlight.has(key)) {
+        loadsInFlight.set(key, postToGas('load', sinceVersion ? { sinceVersion } : {}, true).finally(() => {
+            loadsInFlight.delete(key);
+        }));
+    }
+    return loadsInFlight.get(key).then(result => structuredClone(result));
+}
+
+// 前回の同期以降に変更されたエントリ（ops）だけを送る
+export async function syncUserData(ops, version) {
+    return await postToGas('sync', { ops, version }, true);
 }
 
 export async function clearUserData() {
     return await postToGas('clear', {}, true);
 }
 
-export async function loadData(modelId = 'similar_results.json') {
+// ビルドに含まれるモデル別のデータ（03_html_output/main.py --models）に切り替える
+// 同じハッシュのデータが IndexedDB にあればダウンロードしない
+export async function loadData(modelId) {
     try {
-        const res = await fetch(`03_html_output/${modelId}`);
-        state.data = await res.json();
-
-        // **類似問題を同じ中分類のものだけにフィルタリングする**
-        for (const middleCat in state.data.categories) {
-            state.data.categories[middleCat].forEach(item => {
-                item.similar_problems = item.similar_problems.filter(sim => {
-                    return sim.data.中分類 === item.main_problem.中分類;
-                });
-            });
-        }
+        const manifest = readBuildManifest();
+        const dataset = manifest && (manifest.models || []).find(model => model.id === modelId);
+        if (!dataset) throw new Error(`モデル「${modelId}」のデータがビルドに含まれていません。`);
 
-        calculateReferenceCounts(state.data.categories);
+        const json = await loadProblemDataset(dataset, manifestDataHashes(manifest));
+        state.data = hydrateProblemData(JSON.parse(json));
+        startProblemWorker(json, dataset.embeddings || null);
+        // 同じ中項目への絞り込みと被参照数（problem.reference_count）はビルド時に計算済み
 
         return state.data;
     } catch (e) {
@@ -154,27 +231,3 @@ export async function loadData(modelId = 'similar_results.json') {
         throw e;
     }
 }
-
-function calculateReferenceCounts(categories) {
-    state.referenceCounts = {}; // カウント結果を格納するオブジェクトを初期化
-
-    // 中分類ごとにループ
-    for (const middleCat in categories) {
-        const problemsInCat = categories[middleCat];
-        const countsInCat = {}; // この中分類内でのカウント用
-
-        // この中分類内の各問題が持つ「類似問題リスト」をチェック
-        problemsInCat.forEach(item => {
-            item.similar_problems.forEach(sim => {
-                // 類似度が80%以上のものだけをカウント対象にする
-                if (sim.similarity >= 0.80) {
-                    const problemId = sim.data.問題番号;
-                    countsInCat[problemId] = (countsInCat[problemId] || 0) + 1;
-                }
-            });
-        });
-
-        // この中分類のカウント結果を保存
-        state.referenceCounts[middleCat] = countsInCat;
-    }
-}
\ No newline at end of file
@@ -0,0 +1,111 @@
+// 埋め込みベクトルによる類似問題の検索（ビルド時に固定された類似リストの代わりに、その場で上位k件を求める）
+// ベクトルは 03_html_output/main.py --embeddings_binary が出力するバイナリ:
+//   ヘッダー16バイト（'OYOE'、形式のバージョン、行数、次元数。いずれもリトルエンディアンの uint32）
+//   続いて行数×次元数の float16（L2正規化済み。行番号 = 問題ID、ベクトルの無い問題は0の行）
+// DOM に依存しないので Web Worker（js/problem-worker.js）とメインスレッドの両方から使う。
+
+const MAGIC = 'OYOE';
+const FORMAT_VERSION = 1;
+const HEADER_BYTES = 16;
+
+let halfTable = null;
+
+// float16 のビット列 -> 値 の表（65536通りなので一度作って使い回す）
+function getHalfTable() {
+    if (halfTable) return halfTable;
+    halfTable = new Float32Array(65536);
+    for (let h = 0; h < 65536; h++) {
+        const sign = h & 0x8000 ? -1 : 1;
+        const exponent = (h >> 10) & 0x1f;
+        const fraction = h & 0x3ff;
+        if (exponent === 0) {
+            halfTable[h] = sign * fraction * 2 ** -24;
+        } else if (exponent === 31) {
+            halfTable[h] = fraction ? NaN : sign * Infinity;
+        } else {
+            halfTable[h] = sign * (1 + fraction / 1024) * 2 ** (exponent - 15);
+        }
+    }
+    return halfTable;
+}
+
+// ArrayBuffer -> { count, dims, vectors: Float32Array（行ごとに正規化し直したもの）, valid: Uint8Array }
+export function parseEmbeddings(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== MAGIC) throw new Error('埋め込みベクトルのファイル形式が正しくありません。');
+    const version = view.getUint32(4, true);
+    if (version !== FORMAT_VERSION) throw new Error(`未対応の埋め込みベクトルの形式です: ${version}`);
+    const count = view.getUint32(8, true);
+    const dims = view.getUint32(12, true);
+    if (buffer.byteLength !== HEADER_BYTES + count * dims * 2) throw new Error('埋め込みベクトルのサイズが一致しません。');
+
+    const table = getHalfTable();
+    const halves = new Uint16Array(buffer, HEADER_BYTES, count * dims);
+    const vectors = new Float32Array(count * dims);
+    const valid = new Uint8Array(count);
+    for (let row = 0; row < count; row++) {
+        const offset = row * dims;
+        let norm = 0;
+        for (let d = 0; d < dims; d++) {
+            const value = table[halves[offset + d]];
+            vectors[offset + d] = value;
+            norm += value * value;
+        }
+        if (norm === 0) continue;
+        // float16 への丸めで長さがわずかにずれるので、内積がコサイン類似度になるよう正規化し直す
+        const scale = 1 / Math.sqrt(norm);
+        for (let d = 0; d < dims; d++) vectors[offset + d] *= scale;
+        valid[row] = 1;
+    }
+    return { count, dims, vectors, valid };
+}
+
+// problemId に近い問題を類似度の高い順に返す { ids: Int32Array, scores: Float32Array }
+// options: { k（上位何件か、Infinity で minScore 以上をすべて）, minScore, candidates（問題IDの配列。省略時は全問題） }
+export function searchSimilar(embeddings, problemId, { k = 10, minScore = -Infinity, candidates = null } = {}) {
+    const { count, dims, vectors, valid } = embeddings;
+    if (problemId < 0 || problemId >= count || !valid[problemId]) {
+        return { ids: new Int32Array(0), scores: new Float32Array(0) };
+    }
+
+    const queryOffset = problemId * dims;
+    const bounded = Number.isFinite(k);
+    const topIds = [];
+    const topScores = [];
+    const consider = id => {
+        if (id === problemId || id < 0 || id >= count || !valid[id]) return;
+        const offset = id * dims;
+        let score = 0;
+        for (let d = 0; d < dims; d++) score += vectors[queryOffset + d] * vectors[offset + d];
+        if (score < minScore) return;
+        if (!bounded) {
+            topIds.push(id);
+            topScores.push(score);
+            return;
+        }
+        if (topIds.length >= k && score <= topScores[topScores.length - 1]) return;
+
+        // 上位k件を類似度の降順に保つ（k は小さいので挿入位置は線形に探す）
+        let position = topScores.length;
+        while (position > 0 && topScores[position - 1] < score) position--;
+        topIds.splice(position, 0, id);
+        topScores.splice(position, 0, score);
+        if (topIds.length > k) {
+            topIds.pop();
+            topScores.pop();
+        }
+    };
+
+    if (candidates) {
+        for (let i = 0; i < candidates.length; i++) consider(candidates[i]);
+    } else {
+        for (let id = 0; id < count; id++) consider(id);
+    }
+    if (!bounded) {
+        // 件数の上限が無い場合は、最後にまとめて並べ替える
+        const order = topIds.map((_, i) => i).sort((a, b) => topScores[b] - topScores[a] || topIds[a] - topIds[b]);
+        return { ids: Int32Array.from(order, i => topIds[i]), scores: Float32Array.from(order, i => topScores[i]) };
+    }
+    return { ids: Int32Array.from(topIds), scores: Float32Array.from(topScores) };
+}
@@ -0,0 +1,172 @@
+// オフライン対応: 問題データの IndexedDB キャッシュと Service Worker の登録
+// 問題データはビルドごとに内容のハッシュ付きのファイル（problem_data.<hash>.json）として出力され、
+// index.html にはそのハッシュとURLだけが埋め込まれる（03_html_output/generate_html.py）。
+// 同じハッシュのデータが IndexedDB にあればダウンロードせずにそれを使う。
+
+const DB_NAME = 'oyo_problem_data';
+const DB_VERSION = 1;
+const STORE_NAME = 'datasets';
+
+let datasetSource = null; // 'indexeddb' | 'network'（テストや表示用）
+
+export function getDatasetSource() {
+    return datasetSource;
+}
+
+// index.html に埋め込まれたビルド情報 { version, dataHash, dataUrl, model, embeddings, models: [{ id, model, dataHash, dataUrl, embeddings }] }
+// embeddings（任意）: { hash, url, count, dims } 埋め込みベクトルのバイナリ（js/embedding-search.js）
+export function readBuildManifest() {
+    const element = document.getElementById('build-manifest');
+    if (!element) return null;
+    try {
+        return JSON.parse(element.textContent);
+    } catch (e) {
+        console.warn('[オフライン] ビルド情報を読み込めませんでした。', e);
+        return null;
+    }
+}
+
+function requestToPromise(request) {
+    return new Promise((resolve, reject) => {
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function openDatabase() {
+    const request = indexedDB.open(DB_NAME, DB_VERSION);
+    request.onupgradeneeded = () => {
+        request.result.createObjectStore(STORE_NAME, { keyPath: 'hash' });
+    };
+    return requestToPromise(request);
+}
+
+function readRecord(db, hash) {
+    return requestToPromise(db.transaction(STORE_NAME, 'readonly').objectStore(STORE_NAME).get(hash));
+}
+
+async function readDataset(db, hash) {
+    const record = await readRecord(db, hash);
+    return record ? record.json : null;
+}
+
+// 今のビルドで使われない（以前のビルドの）データは残しても使われないので、削除する
+function writeRecord(db, record, keepHashes) {
+    return new Promise((resolve, reject) => {
+        const tx = db.transaction(STORE_NAME, 'readwrite');
+        const store = tx.objectStore(STORE_NAME);
+        const keys = store.getAllKeys();
+        keys.onsuccess = () => {
+            keys.result.filter(key => !keepHashes.includes(key)).forEach(key => store.delete(key));
+        };
+        store.put({ ...record, savedAt: Date.now() });
+        tx.oncomplete = () => resolve();
+        tx.onerror = () => reject(tx.error);
+        tx.onabort = () => reject(tx.error);
+    });
+}
+
+// ビルド時と同じく、UTF-8 のバイト列（バイナリはそのまま）の SHA-256 の先頭16桁
+async function contentHash(data) {
+    if (!(window.crypto && crypto.subtle)) return null;
+    const bytes = typeof data === 'string' ? new TextEncoder().encode(data) : data;
+    const digest = await crypto.subtle.digest('SHA-256', bytes);
+    return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('').slice(0, 16);
+}
+
+// ビルドに含まれる全データ（既定のデータとモデル別のデータ、それぞれの埋め込みベクトル）のハッシュ
+export function manifestDataHashes(manifest) {
+    const datasets = [manifest, ...(manifest.models || [])];
+    return [
+        ...datasets.map(dataset => dataset.dataHash),
+        ...datasets.filter(dataset => dataset.embeddings).map(dataset => dataset.embeddings.hash)
+    ];
+}
+
+// 問題データの JSON 文字列を返す。IndexedDB に同じハッシュのものがあればそれを、無ければ取得して保存する
+// dataset: { dataHash, dataUrl }（ビルド情報そのもの、またはその models の要素）
+export async function loadProblemDataset(dataset, keepHashes = [dataset.dataHash]) {
+    let db = null;
+    if (typeof indexedDB !== 'undefined') {
+        try {
+            db = await openDatabase();
+            const cached = await readDataset(db, dataset.dataHash);
+            if (cached) {
+                datasetSource = 'indexeddb';
+                console.log(`[オフライン] 問題データ（${dataset.dataHash}）をIndexedDBから読み込みました。`);
+                db.close();
+                return cached;
+            }
+        } catch (e) {
+            console.warn('[オフライン] IndexedDBを利用できません。', e);
+        }
+    }
+
+    try {
+        const res = await fetch(dataset.dataUrl);
+        if (!res.ok) throw new Error(`問題データの取得に失敗しました: HTTP ${res.status}`);
+        const json = await res.text();
+        datasetSource = 'network';
+        console.log(`[オフライン] 問題データ（${dataset.dataHash}）をダウンロードしました。`);
+
+        if (db) {
+            const hash = await contentHash(json);
+            if (hash && hash !== dataset.dataHash) {
+                // 途中で切れた応答などを次回以降に使わないよう、保存しない
+                console.warn(`[オフライン] 問題データのハッシュが一致しないため保存しません（期待値: ${dataset.dataHash}, 実際: ${hash}）。`);
+            } else {
+                await writeRecord(db, { hash: dataset.dataHash, json }, keepHashes).catch(e => console.warn('[オフライン] 問題データを保存できませんでした。', e));
+            }
+        }
+        return json;
+    } finally {
+        if (db) db.close();
+    }
+}
+
+// 埋め込みベクトルのバイナリ（ArrayBuffer）を返す。問題データと同じく IndexedDB にハッシュで保存する
+// embeddings: ビルド情報の embeddings（{ hash, url }）
+export async function loadEmbeddingDataset(embeddings, keepHashes = [embeddings.hash]) {
+    let db = null;
+    if (typeof indexedDB !== 'undefined') {
+        try {
+            db = await openDatabase();
+            const record = await readRecord(db, embeddings.hash);
+            if (record && record.buffer) {
+                db.close();
+                return record.buffer;
+            }
+        } catch (e) {
+            console.warn('[オフライン] IndexedDBを利用できません。', e);
+        }
+    }
+
+    try {
+        const res = await fetch(embeddings.url);
+        if (!res.ok) throw new Error(`埋め込みベクトルの取得に失敗しました: HTTP ${res.status}`);
+        const buffer = await res.arrayBuffer();
+        console.log(`[オフライン] 埋め込みベクトル（${embeddings.hash}）をダウンロードしました。`);
+
+        if (db) {
+            const hash = await contentHash(buffer);
+            if (hash && hash !== embeddings.hash) {
+                console.warn(`[オフライン] 埋め込みベクトルのハッシュが一致しないため保存しません（期待値: ${embeddings.hash}, 実際: ${hash}）。`);
+            } else {
+                await writeRecord(db, { hash: embeddings.hash, buffer }, keepHashes).catch(e => console.warn('[オフライン] 埋め込みベクトルを保存できませんでした。', e));
+            }
+        }
+        return buffer;
+    } finally {
+        if (db) db.close();
+    }
+}
+
+// 静的ファイルをキャッシュする Service Worker（ビルド時に sw_template.js から生成される sw.js）を登録する
+export function registerServiceWorker(manifest) {
+    if (!manifest || !('serviceWorker' in navigator)) return;
+    navigator.serviceWorker.register('sw.js').then(registration => {
+        console.log(`[オフライン] Service Workerを登録しました（ビルド: ${manifest.version}, スコープ: ${registration.scope}）。`);
+    }).catch(e => {
+        console.warn('[オフライン] Service Workerを登録できませんでした。', e);
+    });
+}
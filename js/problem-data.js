@@ -0,0 +1,110 @@
+// ビルド成果物を UI が扱う形に展開する
+// 新形式では問題の表示データが data.problems[問題ID] に一度だけ入っており、
+// カテゴリ側の main_problem / similar_problems は問題IDで参照している。
+
+// ユーザーデータ（チェック・リアクション等）のキーとして使われている従来の問題キー
+export function problemKey(problem) {
+    return `${problem.出典}-${problem.問題番号}`;
+}
+
+export function hydrateProblemData(data) {
+    const problems = data.problems || [];
+    problems.forEach(problem => {
+        if (problem && !problem.key) problem.key = problemKey(problem);
+    });
+
+    // 旧形式（問題データが直接埋め込まれている）の場合はそのまま使う
+    const resolve = ref => (typeof ref === 'number' ? problems[ref] : ref);
+
+    for (const middleCat in data.categories) {
+        data.categories[middleCat].forEach(item => {
+            item.main_problem = resolve(item.main_problem);
+            const main = item.main_problem;
+            if (!main.key) main.key = problemKey(main);
+            // 旧形式には問題IDが無いので、ここで連番を振って問題テーブルに載せる
+            if (main.id === undefined) {
+                main.id = problems.length;
+                problems.push(main);
+            }
+        });
+    }
+
+    const idByKey = new Map();
+    problems.forEach(problem => {
+        if (problem) idByKey.set(problem.key, problem.id);
+    });
+
+    for (const middleCat in data.categories) {
+        data.categories[middleCat].forEach(item => {
+            item.similar_problems = (item.similar_problems || []).map(sim => {
+                if (!sim.data) return { ...sim, data: problems[sim.id] };
+                if (!sim.data.key) sim.data.key = problemKey(sim.data);
+                if (sim.id === undefined) sim.id = idByKey.get(sim.data.key);
+                return sim;
+            });
+            // 出題回で絞り込むときだけ使う追加の候補（[問題ID, 類似度] の組）
+            item.period_neighbors = (item.period_neighbors || []).map(([id, similarity]) => ({ id, similarity, data: problems[id] }));
+        });
+    }
+
+    data.problems = problems;
+    data.duplicateGroups = buildDuplicateGroups(problems);
+    return data;
+}
+
+// 類似問題を、同じ重複グループの問題を1件にまとめてから上位5件（と類似度 0.9 以上のもの）に絞って返す
+// ビルド時の similar_problems は重複グループを1件と数えて5件分を残しているので、まとめた後も5件そろう
+export function topSimilarProblems(item, main = null) {
+    const sorted = [...item.similar_problems].sort((a, b) => b.similarity - a.similarity);
+    return collapseDuplicates(sorted, main).filter((sim, index) => index < 5 || sim.similarity >= 0.9);
+}
+
+// 出題回（data.periods の添字）が minPeriod 以降の類似問題を、重複をまとめてから類似度の高い順に返す
+// ビルド時に exam_periods.py が残した候補から選ぶので、上位 PERIOD_TOP_K 件までは全問題から絞り込んだ結果と一致する
+export const PERIOD_TOP_K = 5;
+
+// period_neighbors は similar_problems のどれよりも類似度が低く、類似度の高い順に並んでいるので、
+// 丸めた類似度で並べ直さず similar_problems の後ろにそのままつなぐ
+export function similarProblemsSince(item, minPeriod, main = null, k = PERIOD_TOP_K) {
+    const since = sim => sim.data && sim.data.period !== undefined && sim.data.period >= minPeriod;
+    const candidates = [...item.similar_problems].sort((a, b) => b.similarity - a.similarity)
+        .concat(item.period_neighbors || [])
+        .filter(since);
+    return collapseDuplicates(candidates, main).slice(0, k);
+}
+
+// 重複グループ（問題名がほぼ同じ問題。ビルド時に near_duplicates.py が duplicate_group を付ける）ごとの問題の一覧
+function buildDuplicateGroups(problems) {
+    const groups = new Map();
+    problems.forEach(problem => {
+        if (!problem || problem.duplicate_group === undefined || problem.duplicate_group === null) return;
+        if (!groups.has(problem.duplicate_group)) groups.set(problem.duplicate_group, []);
+        groups.get(problem.duplicate_group).push(problem);
+    });
+    return groups;
+}
+
+// 類似問題のうち同じ重複グループのものを、類似度が最も高い1件にまとめる
+// 戻り値の各要素は元の要素に duplicates（まとめた問題の一覧）を加えたもの。main と同じグループの問題もまとめる
+export function collapseDuplicates(similars, main = null) {
+    const hasGroup = problem => problem && problem.duplicate_group !== undefined && problem.duplicate_group !== null;
+    const shown = new Map();
+    const collapsed = [];
+    similars.forEach(sim => {
+        const problem = sim.data;
+        if (!hasGroup(problem)) {
+            collapsed.push({ ...sim, duplicates: [] });
+            return;
+        }
+        if (hasGroup(main) && problem.duplicate_group === main.duplicate_group) return;
+        const first = shown.get(problem.duplicate_group);
+        if (first) {
+            first.duplicates.push(problem);
+            return;
+        }
+        const entry = { ...sim, duplicates: [] };
+        shown.set(problem.duplicate_group, entry);
+        collapsed.push(entry);
+    });
+    return collapsed;
+}
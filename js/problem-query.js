@@ -0,0 +1,83 @@
+// 問題一覧の絞り込み・並べ替えを問題ID（data.problems の添字）の型付き配列で行う。
+// Web Worker（js/problem-worker.js）と、Worker が使えない場合のメインスレッドの両方から使うため、
+// 他のモジュールには依存しない。
+
+// hydrateProblemData で展開済みのデータから検索用の列を作る
+export function buildQueryIndex(data) {
+    const size = data.problems.length;
+    const problemNumber = new Float64Array(size);
+    const referenceCount = new Int32Array(size);
+    const centrality = new Float64Array(size);
+    const period = new Int32Array(size).fill(-1); // 出題回（data.periods の添字）。不明は -1
+    const categoryIds = new Map();
+    for (const middleCat in data.categories) {
+        const items = data.categories[middleCat];
+        const ids = new Int32Array(items.length);
+        items.forEach((item, i) => {
+            const main = item.main_problem;
+            ids[i] = main.id;
+            problemNumber[main.id] = Number(main.問題番号);
+            referenceCount[main.id] = main.reference_count || 0;
+            centrality[main.id] = main.centrality || 0;
+            if (main.period !== undefined) period[main.id] = main.period;
+        });
+        categoryIds.set(middleCat, ids);
+    }
+
+    return { size, categoryIds, problemNumber, referenceCount, centrality, period };
+}
+
+// 出題回が minPeriod 以降の問題だけを残す（ids を省略した場合は全問題から選ぶ）
+export function filterByPeriod(index, ids, minPeriod) {
+    const source = ids || Int32Array.from({ length: index.size }, (_, i) => i);
+    return source.filter(id => index.period[id] >= minPeriod);
+}
+
+// userState: 問題ID で引く型付き配列
+//   archived / favorite / checkCount / reviewDue (Uint8Array), oshi / like / fear (Int32Array)
+// query: { middleCat, archivedOnly, untouchedOnly, favoritesOnly, sortOrder }
+// 戻り値は表示順に並べた問題IDの Int32Array
+export function queryProblemList(index, userState, query) {
+    const ids = index.categoryIds.get(query.middleCat);
+    if (!ids) return new Int32Array(0);
+
+    const archivedFlag = query.archivedOnly ? 1 : 0;
+    const selected = [];
+    for (let i = 0; i < ids.length; i++) {
+        const id = ids[i];
+        if (userState.archived[id] !== archivedFlag) continue;
+        if (query.untouchedOnly && userState.checkCount[id] !== 0) continue;
+        if (query.favoritesOnly && userState.favorite[id] !== 1) continue;
+        selected.push(id);
+    }
+
+    // Array.prototype.sort は安定なので、同順位は元の（中項目内の）並びを保つ
+    const { problemNumber, referenceCount, centrality } = index;
+    const byNumber = (a, b) => problemNumber[a] - problemNumber[b];
+    const descending = values => (a, b) => values[b] - values[a];
+
+    switch (query.sortOrder) {
+        case 'review-first':
+            selected.sort((a, b) => (userState.reviewDue[b] - userState.reviewDue[a]) || byNumber(a, b));
+            break;
+        case 'ref-desc':
+            selected.sort(descending(referenceCount));
+            break;
+        case 'central-desc':
+            // 代表度（類似グラフの PageRank）はビルド時に計算済み。同点は問題順
+            selected.sort((a, b) => (centrality[b] - centrality[a]) || byNumber(a, b));
+            break;
+        case 'oshi-desc':
+            selected.sort(descending(userState.oshi));
+            break;
+        case 'like-desc':
+            selected.sort(descending(userState.like));
+            break;
+        case 'fear-desc':
+            selected.sort(descending(userState.fear));
+            break;
+        default:
+            selected.sort(byNumber);
+    }
+    return Int32Array.from(selected);
+}
@@ -0,0 +1,206 @@
+// 問題一覧の絞り込み・並べ替えと、埋め込みベクトルによる類似問題の検索を Web Worker（js/problem-worker.js）に依頼する。
+// Worker が使えない環境（file:// で開いた場合など）や起動に失敗した場合は、同じ処理をメインスレッドで行う。
+import { state, progress } from './state.js';
+import { shouldHighlightProblem } from './utils.js';
+import { buildQueryIndex, filterByPeriod, queryProblemList } from './problem-query.js';
+import { parseEmbeddings, searchSimilar } from './embedding-search.js';
+import { readBuildManifest, manifestDataHashes, loadEmbeddingDataset } from './offline-cache.js';
+
+let worker = null;
+let workerData = null; // Worker に渡したデータ（state.data が差し替えられたら Worker は使わない）
+let nextRequestId = 1;
+const pendingRequests = new Map();
+
+let localIndex = null;
+let localIndexData = null;
+
+// 埋め込みベクトル（ビルド情報の embeddings）。初めて検索するときに読み込む
+let embeddingsInfo = null;
+let embeddingsBuffer = null; // 読み込み済みのバイナリ（Worker へはコピーを渡し、こちらはフォールバック用に残す）
+let embeddingsLoading = null;
+let workerHasEmbeddings = false;
+let localEmbeddings = null;
+
+// json: 埋め込みデータの JSON 文字列。Worker が自分で解析して保持する
+// embeddings: このデータに対応する埋め込みベクトルのビルド情報（無ければ null）
+export function startProblemWorker(json, embeddings = null) {
+    stopProblemWorker();
+    if (!embeddings || !embeddingsInfo || embeddings.hash !== embeddingsInfo.hash) {
+        embeddingsBuffer = null;
+        embeddingsLoading = null;
+        localEmbeddings = null;
+    }
+    embeddingsInfo = embeddings;
+    if (typeof Worker === 'undefined' || !json) return false;
+
+    try {
+        worker = new Worker(new URL('./problem-worker.js', import.meta.url), { type: 'module' });
+    } catch (e) {
+        console.warn('[Worker] 起動できないため、メインスレッドで処理します。', e);
+        worker = null;
+        return false;
+    }
+    workerData = state.data;
+
+    worker.addEventListener('message', e => {
+        const message = e.data;
+        if (message.type === 'ready') {
+            console.log(`[Worker] 問題データを読み込みました（${message.size}問）。`);
+            return;
+        }
+        if (message.type === 'embeddings-ready') {
+            console.log(`[Worker] 埋め込みベクトルを読み込みました（${message.count}問 × ${message.dims}次元）。`);
+            return;
+        }
+        const request = pendingRequests.get(message.requestId);
+        if (!request) return;
+        pendingRequests.delete(message.requestId);
+        if (message.type === 'result') {
+            request.resolve(request.read(message));
+        } else {
+            console.warn(`[Worker] 問い合わせに失敗したため、メインスレッドで処理します: ${message.message}`);
+            runFallback(request);
+        }
+    });
+    worker.addEventListener('error', e => {
+        console.warn('[Worker] エラーが発生したため、以降はメインスレッドで処理します。', e.message);
+        stopProblemWorker();
+    });
+
+    worker.postMessage({ type: 'init', json });
+    return true;
+}
+
+export function stopProblemWorker() {
+    if (worker) worker.terminate();
+    worker = null;
+    workerData = null;
+    workerHasEmbeddings = false;
+    // 応答を待っていた問い合わせはメインスレッドでやり直す
+    pendingRequests.forEach(runFallback);
+    pendingRequests.clear();
+}
+
+function runFallback(request) {
+    try {
+        request.resolve(request.fallback());
+    } catch (e) {
+        request.reject(e);
+    }
+}
+
+function postRequest(message, transfer, read, fallback) {
+    const requestId = nextRequestId++;
+    return new Promise((resolve, reject) => {
+        pendingRequests.set(requestId, { resolve, reject, read, fallback });
+        worker.postMessage({ ...message, requestId }, transfer);
+    });
+}
+
+// 現在のユーザーデータを問題IDで引く型付き配列にまとめる（Worker へは transfer で渡す）
+function snapshotUserState() {
+    const size = progress.size;
+    const oshi = new Int32Array(size);
+    const like = new Int32Array(size);
+    const fear = new Int32Array(size);
+    const reviewDue = new Uint8Array(size);
+
+    const fillCounts = (counts, target) => {
+        for (const key in counts) {
+            const id = progress.idByKey.get(key);
+            if (id !== undefined) target[id] = counts[key] || 0;
+        }
+    };
+    fillCounts(state.oshiCounts, oshi);
+    fillCounts(state.likeCounts, like);
+    fillCounts(state.fearCounts, fear);
+
+    // 復習の要否は現在時刻で決まるので、問い合わせのたびに評価する
+    for (const key in state.problemChecks) {
+        const id = progress.idByKey.get(key);
+        if (id !== undefined && shouldHighlightProblem(key, state.problemChecks)) reviewDue[id] = 1;
+    }
+
+    return {
+        archived: progress.archived.slice(),
+        favorite: progress.favorite.slice(),
+        checkCount: progress.checkCount.slice(),
+        oshi,
+        like,
+        fear,
+        reviewDue
+    };
+}
+
+function queryLocally(query) {
+    if (localIndexData !== state.data) {
+        localIndex = buildQueryIndex(state.data);
+        localIndexData = state.data;
+    }
+    return queryProblemList(localIndex, snapshotUserState(), query);
+}
+
+// query: { middleCat, archivedOnly, untouchedOnly, favoritesOnly, sortOrder }
+// 表示順に並べた問題IDの Int32Array を返す
+export function queryProblems(query) {
+    if (!worker || workerData !== state.data) {
+        return Promise.resolve(queryLocally(query));
+    }
+
+    const userState = snapshotUserState();
+    return postRequest({ type: 'list', query, userState }, Object.values(userState).map(values => values.buffer),
+        message => message.ids, () => queryLocally(query));
+}
+
+// 現在のデータに埋め込みベクトルがビルドされているか（03_html_output/main.py --embeddings_binary）
+export function hasEmbeddings() {
+    return !!embeddingsInfo;
+}
+
+function loadEmbeddings() {
+    if (!embeddingsLoading) {
+        const manifest = readBuildManifest();
+        const info = embeddingsInfo;
+        embeddingsLoading = loadEmbeddingDataset(info, manifest ? manifestDataHashes(manifest) : [info.hash])
+            .then(buffer => {
+                if (info === embeddingsInfo) embeddingsBuffer = buffer;
+                return buffer;
+            })
+            .catch(e => {
+                embeddingsLoading = null;
+                throw e;
+            });
+    }
+    return embeddingsLoading;
+}
+
+function searchLocally(problemId, options) {
+    if (!localEmbeddings) localEmbeddings = parseEmbeddings(embeddingsBuffer);
+    const { middleCat, minPeriod, ...rest } = options;
+    const byPeriod = minPeriod !== undefined && minPeriod !== null;
+    if ((middleCat || byPeriod) && localIndexData !== state.data) {
+        localIndex = buildQueryIndex(state.data);
+        localIndexData = state.data;
+    }
+    let candidates = middleCat ? (localIndex.categoryIds.get(middleCat) || new Int32Array(0)) : null;
+    if (byPeriod) candidates = filterByPeriod(localIndex, candidates, minPeriod);
+    return searchSimilar(localEmbeddings, problemId, { ...rest, candidates });
+}
+
+// problemId にベクトルの近い問題を返す { ids: Int32Array, scores: Float32Array }
+// options: { k, minScore, middleCat（指定するとその中項目の中だけを探す）, minPeriod（指定するとその出題回以降だけを探す） }
+export async function findSimilarByEmbedding(problemId, options = {}) {
+    if (!embeddingsInfo) throw new Error('埋め込みベクトルがビルドに含まれていません。');
+    await loadEmbeddings();
+
+    if (!worker || workerData !== state.data) {
+        return searchLocally(problemId, options);
+    }
+    if (!workerHasEmbeddings) {
+        // Worker にはコピーを渡す（Worker が止まった場合にメインスレッドで検索できるよう、元のバイナリは残す）
+        worker.postMessage({ type: 'embeddings', buffer: embeddingsBuffer });
+        workerHasEmbeddings = true;
+    }
+    return postRequest({ type: 'similar', problemId, options }, [],
+        message => ({ ids: message.ids, scores: message.scores }), () => searchLocally(problemId, options));
+}
@@ -0,0 +1,40 @@
+// 問題データを保持し、一覧の絞り込み・並べ替えを UI スレッドの外で行う Web Worker
+// メッセージ:
+//   { type: 'init', json }                        埋め込みデータ（JSON文字列）を解析して索引を作る
+//   { type: 'list', requestId, query, userState } 問題IDの Int32Array を transfer で返す
+//   { type: 'embeddings', buffer }                埋め込みベクトルのバイナリを展開して保持する
+//   { type: 'similar', requestId, problemId, options } ベクトルの近い問題の ID と類似度を transfer で返す
+import { hydrateProblemData } from './problem-data.js';
+import { buildQueryIndex, filterByPeriod, queryProblemList } from './problem-query.js';
+import { parseEmbeddings, searchSimilar } from './embedding-search.js';
+
+let index = null;
+let embeddings = null;
+
+self.addEventListener('message', e => {
+    const message = e.data;
+    try {
+        if (message.type === 'init') {
+            index = buildQueryIndex(hydrateProblemData(JSON.parse(message.json)));
+            embeddings = null;
+            self.postMessage({ type: 'ready', size: index.size });
+        } else if (message.type === 'list') {
+            if (!index) throw new Error('問題データが初期化されていません。');
+            const ids = queryProblemList(index, message.userState, message.query);
+            self.postMessage({ type: 'result', requestId: message.requestId, ids }, [ids.buffer]);
+        } else if (message.type === 'embeddings') {
+            embeddings = parseEmbeddings(message.buffer);
+            self.postMessage({ type: 'embeddings-ready', count: embeddings.count, dims: embeddings.dims });
+        } else if (message.type === 'similar') {
+            if (!index || !embeddings) throw new Error('埋め込みベクトルが読み込まれていません。');
+            const { middleCat, minPeriod, ...options } = message.options;
+            // middleCat を指定した場合はその中項目の問題だけ、minPeriod を指定した場合はその出題回以降の問題だけを候補にする
+            let candidates = middleCat ? (index.categoryIds.get(middleCat) || new Int32Array(0)) : null;
+            if (minPeriod !== undefined && minPeriod !== null) candidates = filterByPeriod(index, candidates, minPeriod);
+            const { ids, scores } = searchSimilar(embeddings, message.problemId, { ...options, candidates });
+            self.postMessage({ type: 'result', requestId: message.requestId, ids, scores }, [ids.buffer, scores.buffer]);
+        }
+    } catch (error) {
+        self.postMessage({ type: 'error', requestId: message.requestId, message: error.message });
+    }
+});
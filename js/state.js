@@ -2,7 +2,6 @@ import { storage } from './storage.js';
 
 export const state = {
     data: {},
-    referenceCounts: {},
     oshiCounts: {},
     likeCounts: {},
     fearCounts: {},
@@ -13,9 +12,180 @@ export const state = {
     showUntouchedOnly: false,
     showArchivedOnly: false, // アーカイブ済み問題の表示フラグ
     showFavoritesOnly: false, // お気に入り問題の表示フラグ
+    similarSincePeriod: null, // 類似問題をこの出題回（data.periods の添字）以降に絞る。null は絞り込まない
     examDate: null // 試験日
 };
 
+// --- 進捗インデックス ---
+// 保存・同期用の archivedProblemIds / favorites / problemChecks は従来どおり問題キー（文字列）で持ち、
+// 描画時の判定と集計は問題ID（data.problems の添字）で引く型付き配列から行う。
+// ティア別・中項目別の集計は変更のたびに差分で更新するため、描画時の再計算は不要。
+export const MAX_CHECKS = 4;
+const NO_CATEGORY = 0xffff;
+
+export const progress = {
+    size: 0,
+    idByKey: new Map(),
+    archived: new Uint8Array(0),
+    favorite: new Uint8Array(0),
+    checkCount: new Uint8Array(0),
+    category: new Uint16Array(0), // 問題ID -> 中項目番号（一覧に無い問題は NO_CATEGORY）
+    categoryIndex: new Map(), // 中項目名 -> 中項目番号
+    // ティア番号 = アーカイブ済みなら5 + チェック数
+    tierCounts: new Int32Array(2 * (MAX_CHECKS + 1)),
+    categoryArchivedCount: new Int32Array(0),
+    categoryArchivedChecks: new Int32Array(0),
+    categoryNonArchivedChecks: new Int32Array(0)
+};
+
+export function problemTier(id) {
+    return progress.archived[id] * (MAX_CHECKS + 1) + progress.checkCount[id];
+}
+
+function countChecked(checks) {
+    return checks ? checks.filter(c => c && c.checked).length : 0;
+}
+
+// 問題1件分の寄与を集計に加える（sign = -1 で取り除く）
+function applyContribution(id, sign) {
+    const cat = progress.category[id];
+    if (cat === NO_CATEGORY) return;
+    progress.tierCounts[problemTier(id)] += sign;
+    const checked = progress.checkCount[id];
+    if (progress.archived[id]) {
+        progress.categoryArchivedCount[cat] += sign;
+        progress.categoryArchivedChecks[cat] += sign * checked;
+    } else {
+        progress.categoryNonArchivedChecks[cat] += sign * checked;
+    }
+}
+
+export function buildProgressIndex() {
+    const problems = state.data.problems || [];
+    const categories = state.data.categories || {};
+    const size = problems.length;
+    const categoryNames = Object.keys(categories);
+
+    progress.size = size;
+    progress.idByKey = new Map();
+    problems.forEach(problem => {
+        if (problem) progress.idByKey.set(problem.key, problem.id);
+    });
+    progress.archived = new Uint8Array(size);
+    progress.favorite = new Uint8Array(size);
+    progress.checkCount = new Uint8Array(size);
+    progress.category = new Uint16Array(size).fill(NO_CATEGORY);
+    progress.categoryIndex = new Map(categoryNames.map((name, i) => [name, i]));
+    progress.tierCounts.fill(0);
+    progress.categoryArchivedCount = new Int32Array(categoryNames.length);
+    progress.categoryArchivedChecks = new Int32Array(categoryNames.length);
+    progress.categoryNonArchivedChecks = new Int32Array(categoryNames.length);
+
+    categoryNames.forEach((name, cat) => {
+        categories[name].forEach(item => {
+            progress.category[item.main_problem.id] = cat;
+        });
+    });
+
+    // データに存在しない問題キー（別バージョンのデータ由来など）は保存用の配列にだけ残る
+    for (const key of state.archivedProblemIds) {
+        const id = progress.idByKey.get(key);
+        if (id !== undefined) progress.archived[id] = 1;
+    }
+    for (const key of state.favorites) {
+        const id = progress.idByKey.get(key);
+        if (id !== undefined) progress.favorite[id] = 1;
+    }
+    for (const key in state.problemChecks) {
+        const id = progress.idByKey.get(key);
+        if (id !== undefined) progress.checkCount[id] = countChecked(state.problemChecks[key]);
+    }
+
+    for (let id = 0; id < size; id++) {
+        applyContribution(id, +1);
+    }
+}
+
+export function isArchived(id) {
+    return progress.archived[id] === 1;
+}
+
+export function isFavorite(id) {
+    return progress.favorite[id] === 1;
+}
+
+export function getCheckedCount(id) {
+    return progress.checkCount[id];
+}
+
+// 中項目単位の進捗集計（アーカイブ数、アーカイブ済み/未アーカイブのチェック数）
+export function getCategoryProgress(middleCat) {
+    const cat = progress.categoryIndex.get(middleCat);
+    if (cat === undefined) {
+        return { archivedCount: 0, archivedChecks: 0, nonArchivedChecks: 0 };
+    }
+    return {
+        archivedCount: progress.categoryArchivedCount[cat],
+        archivedChecks: progress.categoryArchivedChecks[cat],
+        nonArchivedChecks: progress.categoryNonArchivedChecks[cat]
+    };
+}
+
+// アーカイブ状態を切り替える。保存用の配列とインデックスを同時に更新し、新しい状態を返す
+export function toggleArchived(problemKey) {
+    const index = state.archivedProblemIds.indexOf(problemKey);
+    const archived = index === -1;
+    if (archived) {
+        state.archivedProblemIds.push(problemKey);
+    } else {
+        state.archivedProblemIds.splice(index, 1);
+    }
+
+    const id = progress.idByKey.get(problemKey);
+    if (id !== undefined) {
+        applyContribution(id, -1);
+        progress.archived[id] = archived ? 1 : 0;
+        applyContribution(id, +1);
+    }
+    return archived;
+}
+
+export function toggleFavorite(problemKey) {
+    const index = state.favorites.indexOf(problemKey);
+    const favorite = index === -1;
+    if (favorite) {
+        state.favorites.push(problemKey);
+    } else {
+        state.favorites.splice(index, 1);
+    }
+
+    const id = progress.idByKey.get(problemKey);
+    if (id !== undefined) progress.favorite[id] = favorite ? 1 : 0;
+    return favorite;
+}
+
+// チェック状態を切り替え、新しいチェック状態を返す
+export function toggleCheck(problemKey, checkIndex) {
+    if (!state.problemChecks[problemKey]) {
+        state.problemChecks[problemKey] = Array(MAX_CHECKS).fill(null).map(() => ({ checked: false, timestamp: null }));
+    }
+
+    const checks = state.problemChecks[problemKey];
+    const checked = !(checks[checkIndex] && checks[checkIndex].checked);
+    checks[checkIndex] = {
+        checked: checked,
+        timestamp: checked ? Date.now() : null
+    };
+
+    const id = progress.idByKey.get(problemKey);
+    if (id !== undefined) {
+        applyContribution(id, -1);
+        progress.checkCount[id] = countChecked(checks);
+        applyContribution(id, +1);
+    }
+    return checked;
+}
+
 export function initState() {
     state.currentSortOrder = storage.loadSortOrder('default');
     state.oshiCounts = storage.loadOshiCounts();
@@ -31,6 +201,8 @@ export function initState() {
     if (needsSave) {
         storage.saveChecks(state.problemChecks); // 移行が発生した場合のみ保存
     }
+
+    buildProgressIndex();
 }
 
 // 古いデータ構造（ブール値の配列）からの移行処理
@@ -1,14 +1,63 @@
 // js/storage.js
-import { saveUserData, loadUserData } from './api.js';
+import { saveUserData, loadUserData, syncUserData } from './api.js';
 
 // Generic helper functions
 let isSuppressingEvents = false; // Flag to suppress events during bulk operations
 
+// --- 書き込みキャッシュ ---
+// JSON で保存するデータ（チェック・リアクション等）はパース済みのオブジェクトをメモリに持ち、
+// 保存時は変更済み（dirty）の印を付けるだけにする。localStorage への書き込みはキーごとにまとめて、
+// アイドル時間またはページが隠れる・閉じられるときに行う。
+const FLUSH_TIMEOUT_MS = 2000; // アイドル時間が来なくてもこの時間内には書き込む
+const jsonCache = new Map();
+const dirtyKeys = new Set();
+let flushScheduled = false;
+
 function loadJSON(key, defaultValue = {}) {
+    if (jsonCache.has(key)) return jsonCache.get(key);
     const stored = localStorage.getItem(key);
-    return stored ? JSON.parse(stored) : defaultValue;
+    if (!stored) return defaultValue;
+    const value = JSON.parse(stored);
+    jsonCache.set(key, value);
+    return value;
+}
+
+// イベントを発火せずにキャッシュへ保存し、書き込みを予約する
+function writeJSON(key, value) {
+    jsonCache.set(key, value);
+    dirtyKeys.add(key);
+    scheduleFlush();
+}
+
+function scheduleFlush() {
+    if (flushScheduled) return;
+    flushScheduled = true;
+    if (typeof requestIdleCallback === 'function') {
+        requestIdleCallback(flushWrites, { timeout: FLUSH_TIMEOUT_MS });
+    } else {
+        setTimeout(flushWrites, FLUSH_TIMEOUT_MS);
+    }
+}
+
+function flushWrites() {
+    flushScheduled = false;
+    dirtyKeys.forEach(key => localStorage.setItem(key, JSON.stringify(jsonCache.get(key))));
+    dirtyKeys.clear();
 }
 
+window.addEventListener('pagehide', flushWrites);
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') flushWrites();
+});
+// 別のタブで書き換えられたキーはキャッシュを捨てて読み直す（このタブの未書き込みの変更は優先する）
+window.addEventListener('storage', e => {
+    if (e.key === null) {
+        jsonCache.forEach((value, key) => { if (!dirtyKeys.has(key)) jsonCache.delete(key); });
+    } else if (!dirtyKeys.has(e.key)) {
+        jsonCache.delete(e.key);
+    }
+});
+
 // Helper to dispatch storage change event
 function dispatchStorageChangeEvent(key) {
     if (!isSuppressingEvents) { // Only dispatch if not suppressing
@@ -18,7 +67,7 @@ function dispatchStorageChangeEvent(key) {
 }
 
 function saveJSON(key, value) {
-    localStorage.setItem(key, JSON.stringify(value));
+    writeJSON(key, value);
     dispatchStorageChangeEvent(key); // Dispatch event after saving
 }
 
@@ -38,9 +87,116 @@ function saveSilent(key, value) {
 }
 
 function remove(key) {
+    jsonCache.delete(key);
+    dirtyKeys.delete(key);
     localStorage.removeItem(key);
 }
 
+// --- 差分同期用の操作ログ ---
+// 同期対象のデータを保存するたびに前回保存した内容との差分を操作（ops）として記録し、
+// 次回の同期ではこの操作だけを送る。形式は gas/Code.js の applyOps を参照。
+// 同じエントリへの操作は最新のものだけを残し、同期に成功した分から取り除く。
+const MAP_TYPES = ['checks', 'oshi', 'like', 'fear'];
+const SET_TYPES = ['favorites', 'archived'];
+
+function pendingOpsKey() {
+    const userId = storage.getCurrentUserId();
+    return userId ? `oyo_pendingOps_${userId}` : 'oyo_pendingOps_default';
+}
+
+function loadPendingOps() {
+    return loadJSON(pendingOpsKey(), { nextSeq: 0, ops: [] });
+}
+
+function recordOps(ops) {
+    if (isSuppressingEvents || ops.length === 0) return; // クラウドから反映したデータは記録しない
+    const pending = loadPendingOps();
+    ops.forEach(op => {
+        op.seq = pending.nextSeq++;
+        pending.ops = pending.ops.filter(o => o.t !== op.t || o.k !== op.k);
+        pending.ops.push(op);
+    });
+    writeJSON(pendingOpsKey(), pending);
+}
+
+// 送信済み（seq が sentSeq 未満）の操作を取り除き、残った操作を返す
+function clearPendingOps(sentSeq) {
+    const pending = loadPendingOps();
+    pending.ops = pending.ops.filter(op => op.seq >= sentSeq);
+    writeJSON(pendingOpsKey(), pending);
+    return pending.ops;
+}
+
+function diffMap(type, oldMap, newMap) {
+    const ops = [];
+    for (const k in newMap) {
+        if (JSON.stringify(oldMap[k]) !== JSON.stringify(newMap[k])) ops.push({ t: type, k: k, v: newMap[k] ?? null });
+    }
+    for (const k in oldMap) {
+        if (!(k in newMap)) ops.push({ t: type, k: k, v: null });
+    }
+    return ops;
+}
+
+function diffSet(type, oldList, newList) {
+    const oldSet = new Set(oldList);
+    const newSet = new Set(newList);
+    const ops = [];
+    newSet.forEach(k => { if (!oldSet.has(k)) ops.push({ t: type, k: k, v: true }); });
+    oldSet.forEach(k => { if (!newSet.has(k)) ops.push({ t: type, k: k, v: false }); });
+    return ops;
+}
+
+// 同期対象のデータを保存し、変更されたエントリを操作ログに記録する。
+// changedKey が分かっていればそのエントリだけを記録し、分からなければ最後に書き込んだ内容と比較する
+function saveSyncedJSON(key, type, value, changedKey) {
+    if (!isSuppressingEvents) {
+        const isSet = SET_TYPES.includes(type);
+        const entryOp = k => ({ t: type, k: k, v: isSet ? value.includes(k) : (value[k] ?? null) });
+        if (changedKey !== undefined) {
+            recordOps([entryOp(changedKey)]);
+        } else {
+            const stored = localStorage.getItem(key);
+            const previous = stored ? JSON.parse(stored) : (isSet ? [] : {});
+            const ops = isSet ? diffSet(type, previous, value) : diffMap(type, previous, value);
+            // 未書き込みの間に記録した操作は、書き込み済みの内容に戻っていることがあるので現在の値で記録し直す
+            const diffed = new Set(ops.map(op => op.k));
+            loadPendingOps().ops.forEach(op => {
+                if (op.t === type && !diffed.has(op.k)) ops.push(entryOp(op.k));
+            });
+            recordOps(ops);
+        }
+    }
+    saveJSON(key, value);
+}
+
+function applyOps(data, ops) {
+    ops.forEach(op => {
+        if (op.t === 'examDate') {
+            data.examDate = op.v;
+        } else if (MAP_TYPES.includes(op.t)) {
+            const map = data[op.t] || {};
+            if (op.v === null || op.v === undefined) {
+                delete map[op.k];
+            } else {
+                map[op.k] = op.v;
+            }
+            data[op.t] = map;
+        } else if (SET_TYPES.includes(op.t)) {
+            const list = data[op.t] || [];
+            const index = list.indexOf(op.k);
+            if (op.v && index === -1) list.push(op.k);
+            if (!op.v && index !== -1) list.splice(index, 1);
+            data[op.t] = list;
+        }
+    });
+    return data;
+}
+
+function stripSeq(ops) {
+    return ops.map(({ seq, ...op }) => op);
+}
+
 // Specific data accessors
 export const storage = {
     // Auth
@@ -64,9 +220,20 @@ export const storage = {
         return parseInt(load('oyo_dataVersion') || '0');
     },
     set dataVersion(version) {
+        // 版だけが先に保存されてデータが書き込まれないまま閉じられると、次の差分 load でその分が返らなくなるので、
+        // 書き込み待ちのデータ・操作ログを先に書き込んでから版を進める
+        flushWrites();
         localStorage.setItem('oyo_dataVersion', version.toString()); // Direct localStorage access to prevent event loop
     },
 
+    // Payload encoding supported by the backend (see api.js)
+    get gasEncoding() {
+        return load('oyo_gasEncoding', '');
+    },
+    set gasEncoding(encoding) {
+        localStorage.setItem('oyo_gasEncoding', encoding); // Direct localStorage access to prevent event loop
+    },
+
     // Helper to get current userId
     getCurrentUserId: () => load('oyo_userId', ''), // From saveGasConfig
 
@@ -76,30 +243,30 @@ export const storage = {
         const key = userId ? `oyo_oshiCounts_${userId}` : 'oyo_oshiCounts_default';
         return loadJSON(key);
     },
-    saveOshiCounts: (counts) => {
+    saveOshiCounts: (counts, changedKey) => {
         const userId = storage.getCurrentUserId();
         const key = userId ? `oyo_oshiCounts_${userId}` : 'oyo_oshiCounts_default';
-        saveJSON(key, counts);
+        saveSyncedJSON(key, 'oshi', counts, changedKey);
     },
     loadLikeCounts: () => {
         const userId = storage.getCurrentUserId();
         const key = userId ? `oyo_likeCounts_${userId}` : 'oyo_likeCounts_default';
         return loadJSON(key);
     },
-    saveLikeCounts: (counts) => {
+    saveLikeCounts: (counts, changedKey) => {
         const userId = storage.getCurrentUserId();
         const key = userId ? `oyo_likeCounts_${userId}` : 'oyo_likeCounts_default';
-        saveJSON(key, counts);
+        saveSyncedJSON(key, 'like', counts, changedKey);
     },
     loadFearCounts: () => {
         const userId = storage.getCurrentUserId();
         const key = userId ? `oyo_fearCounts_${userId}` : 'oyo_fearCounts_default';
         return loadJSON(key);
     },
-    saveFearCounts: (counts) => {
+    saveFearCounts: (counts, changedKey) => {
         const userId = storage.getCurrentUserId();
         const key = userId ? `oyo_fearCounts_${userId}` : 'oyo_fearCounts_default';
-        saveJSON(key, counts);
+        saveSyncedJSON(key, 'fear', counts, changedKey);
     },
 
     // Favorites (ユーザーID紐付け)
@@ -108,10 +275,10 @@ export const storage = {
         const key = userId ? `oyo_favorites_${userId}` : 'oyo_favorites_default';
         return loadJSON(key, []);
     },
-    saveFavorites: (favorites) => {
+    saveFavorites: (favorites, changedKey) => {
         const userId = storage.getCurrentUserId();
         const key = userId ? `oyo_favorites_${userId}` : 'oyo_favorites_default';
-        saveJSON(key, favorites);
+        saveSyncedJSON(key, 'favorites', favorites, changedKey);
     },
 
     // Problem check state (ユーザーID紐付け)
@@ -120,10 +287,10 @@ export const storage = {
         const key = userId ? `oyo_problemChecks_${userId}` : 'oyo_problemChecks_default';
         return loadJSON(key);
     },
-    saveChecks: (checks) => {
+    saveChecks: (checks, changedKey) => {
         const userId = storage.getCurrentUserId();
         const key = userId ? `oyo_problemChecks_${userId}` : 'oyo_problemChecks_default';
-        saveJSON(key, checks);
+        saveSyncedJSON(key, 'checks', checks, changedKey);
     },
 
     // Archived problems (ユーザーID紐付け)
@@ -132,10 +299,10 @@ export const storage = {
         const key = userId ? `oyo_archivedProblemIds_${userId}` : 'oyo_archivedProblemIds_default';
         return loadJSON(key, []);
     },
-    saveArchivedProblemIds: (ids) => {
+    saveArchivedProblemIds: (ids, changedKey) => {
         const userId = storage.getCurrentUserId();
         const key = userId ? `oyo_archivedProblemIds_${userId}` : 'oyo_archivedProblemIds_default';
-        saveJSON(key, ids);
+        saveSyncedJSON(key, 'archived', ids, changedKey);
     },
 
     // UI state (ユーザーID紐付け)
@@ -155,6 +322,13 @@ export const storage = {
     saveShowArchivedOnly: (value) => saveSilent('oyo_showArchivedOnly', value), // UI状態なので同期不要
     loadShowFavoritesOnly: () => load('oyo_showFavoritesOnly') === 'true',
     saveShowFavoritesOnly: (value) => saveSilent('oyo_showFavoritesOnly', value), // UI状態なので同期不要
+    // 出題回の番号はビルドごとに変わりうるので、ラベル（例: R5春期）で保存する
+    loadSimilarSincePeriod: () => load('oyo_similarSincePeriod') || null,
+    saveSimilarSincePeriod: (label) => saveSilent('oyo_similarSincePeriod', label || ''), // UI状態なので同期不要
+
+    // 類似度の計算に使うモデル（ビルドに複数のモデルが含まれる場合）
+    loadSelectedModel: () => load('oyo_selectedModel'),
+    saveSelectedModel: (modelId) => saveSilent('oyo_selectedModel', modelId), // UI状態なので同期不要
 
     // Accordion state for major categories
     isMajorCatCollapsed: (largeCat) => load(`oyo_majorCatCollapsed-${largeCat}`) !== 'false',
@@ -169,6 +343,7 @@ export const storage = {
     saveExamDate: (date) => {
         const userId = storage.getCurrentUserId();
         const key = userId ? `oyo_examDate_${userId}` : 'oyo_examDate_default'; // User-specific key or default
+        if (load(key) !== date) recordOps([{ t: 'examDate', v: date }]);
         save(key, date);
     },
 
@@ -192,13 +367,18 @@ export const storage = {
         remove(fear_key);
         remove(fav_key);
         remove(archived_key);
+        remove(pendingOpsKey());
         remove('oyo_dataVersion'); // Also reset version
         // Keep auth and config
     },
 
+    // 未書き込みの変更をすぐに localStorage へ書き込む
+    flush: flushWrites,
+
     // Cloud Sync (GAS)
     saveGasConfig: (url, userId) => {
         const oldUserId = load('oyo_userId', ''); // Get current userId before saving new one
+        if (load('oyo_gasUrl', '') !== url) remove('oyo_gasEncoding'); // 別のバックエンドは改めて確認する
         save('oyo_gasUrl', url);
         save('oyo_userId', userId);
 
@@ -222,50 +402,95 @@ export const storage = {
     }),
 
     syncWithCloud: async () => {
-        // 1. Load current local data
-        const localData = {
-            checks: storage.loadChecks(),
-            oshi: storage.loadOshiCounts(),
-            like: storage.loadLikeCounts(),
-            fear: storage.loadFearCounts(),
-            favorites: storage.loadFavorites(),
-            archived: storage.loadArchivedProblemIds(),
-            examDate: storage.loadExamDate()
-        };
-
-        // 2. Send to GAS with current data version
-        const result = await saveUserData(localData, storage.dataVersion);
+        // サーバー側の版が分からない（初回・リセット後）ときは全体を送る
+        if (storage.dataVersion === 0) return await uploadAllData();
+
+        // 前回の同期以降の操作だけを送る（送信中に記録された操作は次回に回す）
+        const pending = loadPendingOps();
+        const sentSeq = pending.nextSeq;
+        let result;
+        try {
+            result = await syncUserData(stripSeq(pending.ops), storage.dataVersion);
+        } catch (e) {
+            // 差分同期に未対応のバックエンド、またはサーバー側に基準となるデータが無い場合は全体を送り直す
+            if (e.message === 'Invalid action' || e.message === 'ResyncRequired') {
+                return await uploadAllData();
+            }
+            throw e;
+        }
+
         if (result.success && result.version !== undefined) {
-            storage.dataVersion = result.version; // Update local version after successful save
+            const remainingOps = clearPendingOps(sentSeq);
+            // 他端末の変更が返ってきた場合はローカルに反映する（呼び出し側で state を読み直す）
+            result.merged = mergeCloudData(result, remainingOps);
+            storage.dataVersion = result.version;
             storage.saveLastSyncTime(new Date().toISOString()); // Save sync timestamp
         }
         return result;
     },
 
     loadFromCloud: async () => {
-        isSuppressingEvents = true; // Start suppressing events
-        try {
-            // 1. Fetch from GAS
-            const response = await loadUserData(); // Now returns {data, version}
-            const data = response.version !== undefined ? response.data : response; // Handle old and new API response
-            const version = response.version || 0;
-
-            // 2. Update local storage
-            if (data.checks) storage.saveChecks(data.checks);
-            if (data.oshi) storage.saveOshiCounts(data.oshi);
-            if (data.like) storage.saveLikeCounts(data.like);
-            if (data.fear) storage.saveFearCounts(data.fear);
-            if (data.favorites) storage.saveFavorites(data.favorites);
-            if (data.archived) storage.saveArchivedProblemIds(data.archived);
-            if (data.examDate !== undefined && data.examDate !== null) storage.saveExamDate(data.examDate);
-
-            storage.dataVersion = version; // Update local version after successful load
-            storage.saveLastSyncTime(new Date().toISOString()); // Save sync timestamp
+        // 1. Fetch from GAS (操作ログが残っていれば現在の版以降の差分だけが返る)
+        const response = await loadUserData(storage.dataVersion);
+        const version = response.version || 0;
+        const data = response.ops
+            ? applyOps(loadSyncedData(), response.ops)
+            : (response.version !== undefined ? response.data : response); // Handle old and new API response
 
-            return data;
-        } finally {
-            isSuppressingEvents = false; // Stop suppressing events
-            dispatchStorageChangeEvent('bulk_update'); // Dispatch one event after bulk update
-        }
+        // 2. Update local storage (まだ送っていないローカルの操作は上から適用し直す)
+        writeSyncedData(applyOps(data, loadPendingOps().ops));
+
+        storage.dataVersion = version; // Update local version after successful load
+        storage.saveLastSyncTime(new Date().toISOString()); // Save sync timestamp
+
+        return data;
+    }
+};
+
+function loadSyncedData() {
+    return {
+        checks: storage.loadChecks(),
+        oshi: storage.loadOshiCounts(),
+        like: storage.loadLikeCounts(),
+        fear: storage.loadFearCounts(),
+        favorites: storage.loadFavorites(),
+        archived: storage.loadArchivedProblemIds(),
+        examDate: storage.loadExamDate()
+    };
+}
+
+function writeSyncedData(data) {
+    isSuppressingEvents = true; // Start suppressing events
+    try {
+        if (data.checks) storage.saveChecks(data.checks);
+        if (data.oshi) storage.saveOshiCounts(data.oshi);
+        if (data.like) storage.saveLikeCounts(data.like);
+        if (data.fear) storage.saveFearCounts(data.fear);
+        if (data.favorites) storage.saveFavorites(data.favorites);
+        if (data.archived) storage.saveArchivedProblemIds(data.archived);
+        if (data.examDate !== undefined && data.examDate !== null) storage.saveExamDate(data.examDate);
+    } finally {
+        isSuppressingEvents = false; // Stop suppressing events
+        dispatchStorageChangeEvent('bulk_update'); // Dispatch one event after bulk update
     }
-};
\ No newline at end of file
+}
+
+// sync の応答に含まれる他端末の変更（ops、または操作ログが無い場合は最新の全データ）を反映する
+function mergeCloudData(result, remainingOps) {
+    if (!result.data && !(result.ops && result.ops.length > 0)) return false;
+    const data = result.data ? result.data : applyOps(loadSyncedData(), result.ops);
+    writeSyncedData(applyOps(data, remainingOps));
+    return true;
+}
+
+// ローカルの全データを送る（従来の save）。成功すれば操作ログは不要になる
+async function uploadAllData() {
+    const sentSeq = loadPendingOps().nextSeq;
+    const result = await saveUserData(loadSyncedData(), storage.dataVersion);
+    if (result.success && result.version !== undefined) {
+        clearPendingOps(sentSeq);
+        storage.dataVersion = result.version; // Update local version after successful save
+        storage.saveLastSyncTime(new Date().toISOString()); // Save sync timestamp
+    }
+    return result;
+}
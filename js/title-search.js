@@ -0,0 +1,108 @@
+// 問題名の文字 bigram の転置索引（ビルド時に 03_html_output/title_search.py が search_index として出力する）で
+// 入力のたびに問題を探す。他のモジュールには依存しない。
+//   search_index: { gram_size, grams: [bigram, ...], postings: base64 }
+//   postings は grams の順に「件数、1件目の ID + 1、以降は前の ID との差」を LEB128 可変長整数で並べたもの
+
+// near_duplicates.normalize_title と同じ正規化（全角・半角、空白、句読点の表記ゆれを吸収する）
+const IGNORED_CHARACTERS = /[\s、。，．,.・:：;；!！?？「」『』()（）\[\]【】"'“”‘’]/g;
+
+export function normalizeSearchText(text) {
+    return String(text ?? '').normalize('NFKC').replace(IGNORED_CHARACTERS, '').toLowerCase();
+}
+
+// 文字 n-gram の集合（n より短い文字列は全体を1つの要素とする）。サロゲートペアは1文字として数える
+function shingles(text, size) {
+    const chars = Array.from(text);
+    if (chars.length <= size) return chars.length > 0 ? [text] : [];
+    const grams = new Set();
+    for (let i = 0; i + size <= chars.length; i++) grams.add(chars.slice(i, i + size).join(''));
+    return [...grams];
+}
+
+function decodeBase64(text) {
+    const binary = atob(text);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) bytes[i] = binary.charCodeAt(i);
+    return bytes;
+}
+
+// cursor.pos から可変長整数を1つ読み、cursor.pos を進める
+function readVarint(bytes, cursor) {
+    let value = 0;
+    let shift = 0;
+    let byte;
+    do {
+        byte = bytes[cursor.pos++];
+        value += (byte & 0x7f) * 2 ** shift;
+        shift += 7;
+    } while (byte & 0x80);
+    return value;
+}
+
+// 索引を読み込む。各 bigram のリストの開始位置だけを求め、リストの中身は検索時に必要な分だけ展開する
+export function parseSearchIndex(searchIndex, problems) {
+    const bytes = decodeBase64(searchIndex.postings);
+    const offsets = new Map();
+    const cursor = { pos: 0 };
+    searchIndex.grams.forEach(gram => {
+        offsets.set(gram, cursor.pos);
+        const count = readVarint(bytes, cursor);
+        for (let i = 0; i < count; i++) {
+            while (bytes[cursor.pos++] & 0x80);
+        }
+    });
+    const titles = problems.map(problem => (problem ? normalizeSearchText(problem.問題名) : ''));
+    return { gramSize: searchIndex.gram_size, grams: searchIndex.grams, bytes, offsets, titles };
+}
+
+function readPostings(index, gram) {
+    if (!index.offsets.has(gram)) return new Int32Array(0);
+    const cursor = { pos: index.offsets.get(gram) };
+    const ids = new Int32Array(readVarint(index.bytes, cursor));
+    let previous = -1;
+    for (let i = 0; i < ids.length; i++) {
+        previous += readVarint(index.bytes, cursor);
+        ids[i] = previous;
+    }
+    return ids;
+}
+
+// 昇順のリスト同士の共通部分
+function intersect(a, b) {
+    const result = new Int32Array(Math.min(a.length, b.length));
+    let i = 0;
+    let j = 0;
+    let n = 0;
+    while (i < a.length && j < b.length) {
+        if (a[i] < b[j]) i++;
+        else if (a[i] > b[j]) j++;
+        else {
+            result[n++] = a[i];
+            i++;
+            j++;
+        }
+    }
+    return result.subarray(0, n);
+}
+
+// 問題名に query を含む問題IDを昇順の Int32Array で返す
+export function searchTitles(index, query) {
+    const normalized = normalizeSearchText(query);
+    if (!normalized) return new Int32Array(0);
+
+    if (Array.from(normalized).length < index.gramSize) {
+        // 1文字の検索語は、その文字を含む bigram のリストをすべて合わせる
+        const found = new Set();
+        index.grams.forEach(gram => {
+            if (gram.includes(normalized)) readPostings(index, gram).forEach(id => found.add(id));
+        });
+        return Int32Array.from(found).sort();
+    }
+
+    // 短いリストから順に共通部分を取り、最後に問題名に連続して含まれるかを確かめる
+    const lists = shingles(normalized, index.gramSize).map(gram => readPostings(index, gram))
+        .sort((a, b) => a.length - b.length);
+    let candidates = lists[0];
+    for (let i = 1; i < lists.length && candidates.length > 0; i++) candidates = intersect(candidates, lists[i]);
+    return candidates.filter(id => index.titles[id].includes(normalized));
+}
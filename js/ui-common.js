@@ -1,19 +1,6 @@
-import { state } from './state.js';
+import { state, progress, MAX_CHECKS } from './state.js';
 import { shouldHighlightProblem } from './utils.js';
 
-// Helper function to determine the tier of a problem
-function getProblemTier(problemId, problemChecks, archivedProblemIds) {
-    const isArchived = archivedProblemIds.includes(problemId);
-    const checks = problemChecks[problemId];
-    const checkedCount = checks ? checks.filter(c => c && c.checked).length : 0;
-
-    if (isArchived) {
-        return `ARCHIVED_${checkedCount}_CHECKS`;
-    } else {
-        return `NOT_ARCHIVED_${checkedCount}_CHECKS`;
-    }
-}
-
 export function renderTotalReactions() {
     const totalOshi = Object.values(state.oshiCounts).reduce((sum, count) => sum + count, 0);
     const totalLike = Object.values(state.likeCounts).reduce((sum, count) => sum + count, 0);
@@ -30,45 +17,27 @@ export function renderTotalReactions() {
 export function renderTotalProgress() {
     if (!state.data.categories) return;
 
-    let totalProblems = 0;
-    let totalAchievementPoints = 0; // New variable for achievement points
-    const archivedIds = new Set(state.archivedProblemIds);
-
-    // Initialize tier counts
-    const tierCounts = {
-        NOT_ARCHIVED_0_CHECKS: 0,
-        NOT_ARCHIVED_1_CHECK: 0,
-        NOT_ARCHIVED_2_CHECKS: 0,
-        NOT_ARCHIVED_3_CHECKS: 0,
-        NOT_ARCHIVED_4_CHECKS: 0,
-        ARCHIVED_0_CHECKS: 0,
-        ARCHIVED_1_CHECK: 0,
-        ARCHIVED_2_CHECKS: 0,
-        ARCHIVED_3_CHECKS: 0,
-        ARCHIVED_4_CHECKS: 0,
-    };
+    // ティア順は state.js の problemTier と同じ（未アーカイブ0〜4回、アーカイブ済0〜4回）
+    const tierOrder = [
+        'NOT_ARCHIVED_0_CHECKS', 'NOT_ARCHIVED_1_CHECK', 'NOT_ARCHIVED_2_CHECKS',
+        'NOT_ARCHIVED_3_CHECKS', 'NOT_ARCHIVED_4_CHECKS',
+        'ARCHIVED_0_CHECKS', 'ARCHIVED_1_CHECK', 'ARCHIVED_2_CHECKS',
+        'ARCHIVED_3_CHECKS', 'ARCHIVED_4_CHECKS',
+    ];
 
-    // Calculate counts for each tier and achievement points
-    for (const middleCat in state.data.categories) {
-        const problems = state.data.categories[middleCat];
-        totalProblems += problems.length;
-
-        for (const item of problems) {
-            const problemId = `${item.main_problem.出典}-${item.main_problem.問題番号}`;
-            const isArchived = state.archivedProblemIds.includes(problemId); // Check if problem is archived
-            const checks = state.problemChecks[problemId];
-            const checkedCount = checks ? checks.filter(c => c && c.checked).length : 0;
-
-            if (isArchived) {
-                totalAchievementPoints += 1.0; // Archived problems are 100% achieved
-            } else {
-                totalAchievementPoints += checkedCount / 4; // Each check contributes 25%
-            }
-
-            const tier = getProblemTier(problemId, state.problemChecks, state.archivedProblemIds);
-            tierCounts[tier]++;
-        }
-    }
+    // ティア別件数は進捗インデックスで差分更新されているので、ここでは読み出すだけ
+    let totalProblems = 0;
+    let totalAchievementPoints = 0;
+    const tierCounts = {};
+    tierOrder.forEach((tier, i) => {
+        const count = progress.tierCounts[i];
+        const isArchivedTier = i > MAX_CHECKS;
+        const checkedCount = i % (MAX_CHECKS + 1);
+        tierCounts[tier] = count;
+        totalProblems += count;
+        // アーカイブ済みは100%、それ以外はチェック1回につき25%
+        totalAchievementPoints += isArchivedTier ? count : count * checkedCount / MAX_CHECKS;
+    });
 
     // Calculate achievement percentage
     const totalAchievementPercentage = totalProblems > 0 ? (totalAchievementPoints / totalProblems) * 100 : 0;
@@ -99,13 +68,6 @@ export function renderTotalProgress() {
     if (container) {
         let progressBarHtml = '';
         let legendHtml = '';
-        
-        const tierOrder = [
-            'NOT_ARCHIVED_0_CHECKS', 'NOT_ARCHIVED_1_CHECK', 'NOT_ARCHIVED_2_CHECKS',
-            'NOT_ARCHIVED_3_CHECKS', 'NOT_ARCHIVED_4_CHECKS',
-            'ARCHIVED_0_CHECKS', 'ARCHIVED_1_CHECK', 'ARCHIVED_2_CHECKS',
-            'ARCHIVED_3_CHECKS', 'ARCHIVED_4_CHECKS',
-        ];
 
         const tierLabels = {
             NOT_ARCHIVED_0_CHECKS: '未着手',
@@ -154,8 +116,7 @@ export function renderTotalReviewCount() {
     let totalReviewCount = 0;
     for (const middleCat in state.data.categories) {
         for (const item of state.data.categories[middleCat]) {
-            const problemId = `${item.main_problem.出典}-${item.main_problem.問題番号}`;
-            if (shouldHighlightProblem(problemId, state.problemChecks)) {
+            if (shouldHighlightProblem(item.main_problem.key, state.problemChecks)) {
                 totalReviewCount++;
             }
         }
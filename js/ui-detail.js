@@ -1,8 +1,21 @@
-import { state } from './state.js';
+import { state, isArchived, isFavorite, toggleArchived, toggleFavorite, toggleCheck } from './state.js';
 import { storage } from './storage.js';
-import { isMobileDevice, shouldHighlightProblem, isProblemUntouched } from './utils.js';
+import { isMobileDevice, shouldHighlightProblem } from './utils.js';
+import { similarProblemsSince, topSimilarProblems } from './problem-data.js';
+import { queryProblems, hasEmbeddings, findSimilarByEmbedding } from './problem-worker-client.js';
 import { renderTotalReactions, renderTotalProgress, renderTotalReviewCount, showNotification } from './ui-common.js';
 
+// 詳細画面の問題カードは問題キーごとに使い回し、画面に近づいたものだけ中身を描画する
+const INITIAL_CARDS = 8;
+const MATERIALIZE_ROOT_MARGIN = '800px 0px';
+// 埋め込みベクトルでの検索（ビルド時の類似リストとは別に、範囲と閾値を選んでその場で探す）
+const EMBEDDING_SEARCH_LIMIT = 20;
+const EMBEDDING_SEARCH_DEFAULT_THRESHOLD = 80;
+const cardCache = { middleCat: null, cards: new Map(), items: new Map(), html: new Map() };
+let cardObserver = null;
+let detailListenersAttached = false;
+let listRequestSeq = 0;
+
 export function showDetail(middleCat, isPopState = false, scrollToProblemId = null) {
     const indexView = document.getElementById('index-view');
     const detailView = document.getElementById('detail-view');
@@ -11,15 +24,11 @@ export function showDetail(middleCat, isPopState = false, scrollToProblemId = nu
     detailView.style.display = 'block';
     document.getElementById('detail-title').textContent = middleCat;
 
-    const container = document.getElementById('detail-container');
-    container.innerHTML = '';
+    resetCardCache(middleCat);
 
     // 要件1-2: 復習項目があれば自動で「復習優先」にソート
     const problemsForCheck = state.data.categories[middleCat];
-    const hasReviewItems = problemsForCheck.some(item => {
-        const problemId = `${item.main_problem.出典}-${item.main_problem.問題番号}`;
-        return shouldHighlightProblem(problemId, state.problemChecks);
-    });
+    const hasReviewItems = problemsForCheck.some(item => shouldHighlightProblem(item.main_problem.key, state.problemChecks));
 
     const storedSortOrder = storage.loadSortOrder();
 
@@ -51,12 +60,18 @@ export function showDetail(middleCat, isPopState = false, scrollToProblemId = nu
         console.log(`[状態リセット] フィルター状態をリセットしました。`);
     }
 
-    renderProblemList(middleCat); // Call renderProblemList first
+    // 一覧は Worker の応答を待ってから描画されるので、スクロールはその後に行う
+    const rendered = renderProblemList(middleCat);
 
     // New logic: Scroll to specific problem if scrollToProblemId is provided
     if (scrollToProblemId) {
         // Delay scroll to ensure elements are rendered
-        setTimeout(() => {
+        rendered.then(() => setTimeout(() => {
+            // 目的のカードまでを描画しておき、スクロール位置がずれないようにする
+            for (const card of document.getElementById('detail-container').children) {
+                materializeCard(card.dataset.key);
+                if (card.dataset.key === scrollToProblemId) break;
+            }
             const problemCardElement = document.querySelector(`.problem-panel[data-problem-id="${scrollToProblemId}"]`);
             if (problemCardElement) {
                 problemCardElement.scrollIntoView({ behavior: 'smooth', block: 'center' });
@@ -66,7 +81,7 @@ export function showDetail(middleCat, isPopState = false, scrollToProblemId = nu
                     problemCardElement.classList.remove('highlight-problem');
                 }, 2000);
             }
-        }, 100);
+        }, 100));
     }
 
     // 「未着手のみ表示」チェックボックス
@@ -112,384 +127,462 @@ export function showDetail(middleCat, isPopState = false, scrollToProblemId = nu
         }
     });
     document.getElementById('sort-order').value = state.currentSortOrder;
+
+    setupPeriodFilter();
 }
 
-export function renderProblemList(middleCat) {
-    let problems = [...state.data.categories[middleCat]];
-    const countsForThisCat = state.referenceCounts[middleCat] || {};
+// 類似問題を出題回で絞り込むセレクト（選択肢はビルドの data.periods から作る）
+function setupPeriodFilter() {
+    const periods = state.data.periods || [];
+    const oldSelect = document.getElementById('period-filter');
+    const periodSelect = oldSelect.cloneNode(false);
+    oldSelect.replaceWith(periodSelect);
+    periodSelect.disabled = periods.length === 0;
+    periodSelect.innerHTML = '<option value="">すべての出題回</option>' +
+        periods.map(label => `<option value="${label}">${label}以降</option>`).reverse().join('');
+
+    const saved = storage.loadSimilarSincePeriod();
+    state.similarSincePeriod = saved && periods.includes(saved) ? periods.indexOf(saved) : null;
+    periodSelect.value = state.similarSincePeriod === null ? '' : periods[state.similarSincePeriod];
+
+    periodSelect.addEventListener('change', e => {
+        const label = e.target.value;
+        state.similarSincePeriod = label ? periods.indexOf(label) : null;
+        storage.saveSimilarSincePeriod(label);
+
+        // 類似問題の一覧が変わるので、描画済みのカードも作り直す
+        const currentCat = document.getElementById('detail-title').textContent;
+        if (currentCat) {
+            resetCardCache(currentCat);
+            renderProblemList(currentCat);
+        }
+    });
+}
 
-    // アーカイブフィルター
-    if (state.showArchivedOnly) {
-        problems = problems.filter(item => {
-            const problemId = `${item.main_problem.出典}-${item.main_problem.問題番号}`;
-            return state.archivedProblemIds.includes(problemId);
-        });
-    } else {
-        problems = problems.filter(item => {
-            const problemId = `${item.main_problem.出典}-${item.main_problem.問題番号}`;
-            return !state.archivedProblemIds.includes(problemId);
-        });
-    }
+export async function renderProblemList(middleCat) {
+    // 絞り込みと並べ替えは Worker に任せ、表示順の問題IDだけを受け取る
+    const requestSeq = ++listRequestSeq;
+    const ids = await queryProblems({
+        middleCat,
+        archivedOnly: state.showArchivedOnly,
+        untouchedOnly: state.showUntouchedOnly,
+        favoritesOnly: state.showFavoritesOnly,
+        sortOrder: state.currentSortOrder
+    });
+    // 応答を待つ間に別の条件で描画し直された場合は、古い結果を捨てる
+    if (requestSeq !== listRequestSeq) return;
 
-    // 未着手フィルター
-    if (state.showUntouchedOnly) {
-        problems = problems.filter(item => isProblemUntouched(item, state.problemChecks));
-    }
+    const itemsById = new Map(state.data.categories[middleCat].map(item => [item.main_problem.id, item]));
+    const problems = Array.from(ids, id => itemsById.get(id));
 
-    // お気に入りフィルター
-    if (state.showFavoritesOnly) {
-        problems = problems.filter(item => {
-            const problemId = `${item.main_problem.出典}-${item.main_problem.問題番号}`;
-            return state.favorites.includes(problemId);
-        });
+    const container = document.getElementById('detail-container');
+    if (cardCache.middleCat !== middleCat) {
+        resetCardCache(middleCat);
     }
+    attachDetailListeners(container);
+    const observer = getCardObserver();
+
+    // 一覧から外れたカードを取り除く
+    const listedKeys = new Set(problems.map(item => item.main_problem.key));
+    cardCache.cards.forEach((card, key) => {
+        if (!listedKeys.has(key)) {
+            if (observer) observer.unobserve(card);
+            card.remove();
+            cardCache.cards.delete(key);
+            cardCache.items.delete(key);
+            cardCache.html.delete(key);
+        }
+    });
 
-    // ソート
-    if (state.currentSortOrder === 'review-first') {
-        problems.sort((a, b) => {
-            const aId = `${a.main_problem.出典}-${a.main_problem.問題番号}`;
-            const bId = `${b.main_problem.出典}-${b.main_problem.問題番号}`;
-            const aNeedsReview = shouldHighlightProblem(aId, state.problemChecks);
-            const bNeedsReview = shouldHighlightProblem(bId, state.problemChecks);
+    // 既存のカードは並び順が変わったものだけ移動する。先頭以外の未描画のカードは画面に近づいてから描画する
+    let cursor = container.firstElementChild;
+    problems.forEach((item, index) => {
+        const key = item.main_problem.key;
+        cardCache.items.set(key, item);
+        let card = cardCache.cards.get(key);
+        if (!card) {
+            card = document.createElement('div');
+            card.className = 'problem-card-placeholder';
+            card.dataset.key = key;
+            cardCache.cards.set(key, card);
+        }
+        if (card === cursor) {
+            cursor = cursor.nextElementSibling;
+        } else {
+            container.insertBefore(card, cursor);
+        }
 
-            if (aNeedsReview !== bNeedsReview) {
-                return bNeedsReview - aNeedsReview;
-            }
-            return a.main_problem.問題番号 - b.main_problem.問題番号;
-        });
-    } else if (state.currentSortOrder === 'ref-desc') {
-        problems.sort((a, b) => {
-            const countA = countsForThisCat[a.main_problem.問題番号] || 0;
-            const countB = countsForThisCat[b.main_problem.問題番号] || 0;
-            return countB - countA;
-        });
-    } else if (state.currentSortOrder === 'oshi-desc') {
-        problems.sort((a, b) => {
-            const countA = state.oshiCounts[`${a.main_problem.出典}-${a.main_problem.問題番号}`] || 0;
-            const countB = state.oshiCounts[`${b.main_problem.出典}-${b.main_problem.問題番号}`] || 0;
-            return countB - countA;
-        });
-    } else if (state.currentSortOrder === 'like-desc') {
-        problems.sort((a, b) => {
-            const countA = state.likeCounts[`${a.main_problem.出典}-${a.main_problem.問題番号}`] || 0;
-            const countB = state.likeCounts[`${b.main_problem.出典}-${b.main_problem.問題番号}`] || 0;
-            return countB - countA;
-        });
-    } else if (state.currentSortOrder === 'fear-desc') {
-        problems.sort((a, b) => {
-            const countA = state.fearCounts[`${a.main_problem.出典}-${a.main_problem.問題番号}`] || 0;
-            const countB = state.fearCounts[`${b.main_problem.出典}-${b.main_problem.問題番号}`] || 0;
-            return countB - countA;
-        });
-    } else {
-        problems.sort((a, b) => {
-            return a.main_problem.問題番号 - b.main_problem.問題番号;
-        });
+        if (index < INITIAL_CARDS || !observer || cardCache.html.has(key)) {
+            materializeCard(key);
+        } else {
+            observer.observe(card);
+        }
+    });
+}
+
+function resetCardCache(middleCat) {
+    if (cardObserver) cardObserver.disconnect();
+    cardCache.middleCat = middleCat;
+    cardCache.cards.clear();
+    cardCache.items.clear();
+    cardCache.html.clear();
+    document.getElementById('detail-container').innerHTML = '';
+}
+
+function getCardObserver() {
+    if (!cardObserver && typeof IntersectionObserver !== 'undefined') {
+        cardObserver = new IntersectionObserver(entries => {
+            entries.forEach(entry => {
+                if (entry.isIntersecting) materializeCard(entry.target.dataset.key);
+            });
+        }, { rootMargin: MATERIALIZE_ROOT_MARGIN });
     }
+    return cardObserver;
+}
 
-    const container = document.getElementById('detail-container');
-    container.innerHTML = '';
-    problems.forEach(item => {
-        const main = item.main_problem;
-        let mainProblemLink = main.リンク;
-        if (isMobileDevice()) {
-            mainProblemLink = mainProblemLink.replace('https://www.ap-siken.com/', 'https://www.ap-siken.com/s/');
+// カードの中身を描画する。内容が変わっていなければ既存のDOMをそのまま使う
+function materializeCard(key) {
+    const card = cardCache.cards.get(key);
+    const item = cardCache.items.get(key);
+    if (!card || !item) return null;
+    if (cardObserver) cardObserver.unobserve(card);
+
+    const html = buildCardHtml(item);
+    if (cardCache.html.get(key) !== html) {
+        const toggle = card.querySelector('.similar-toggle');
+        const expanded = toggle && toggle.nextElementSibling.style.display === 'block';
+        card.innerHTML = html;
+        cardCache.html.set(key, html);
+        if (expanded) {
+            const newToggle = card.querySelector('.similar-toggle');
+            if (newToggle) setSimilarExpanded(newToggle, true);
         }
+    }
+    card.classList.remove('problem-card-placeholder');
+    card.classList.add('problem-card');
+    card.classList.toggle('needs-review', shouldHighlightProblem(key, state.problemChecks));
+    return card;
+}
 
-        const card = document.createElement('div');
-        const mainProblemUniqueId = `${main.出典}-${main.問題番号}`;
-        const needsReview = shouldHighlightProblem(mainProblemUniqueId, state.problemChecks);
+function buildCardHtml(item) {
+    const main = item.main_problem;
+    let mainProblemLink = main.リンク;
+    if (isMobileDevice()) {
+        mainProblemLink = mainProblemLink.replace('https://www.ap-siken.com/', 'https://www.ap-siken.com/s/');
+    }
 
-        // Checks
-        let checksHtml = '<div class="check-container">';
-        for (let i = 0; i < 4; i++) {
-            const checkData = state.problemChecks[mainProblemUniqueId]?.[i];
-            const isChecked = checkData && checkData.checked;
-            checksHtml += `<div class="check-box ${isChecked ? 'checked c' + i : ''}" data-problem-id="${mainProblemUniqueId}" data-check-index="${i}"></div>`;
-        }
-        checksHtml += '</div>';
+    const mainProblemUniqueId = main.key;
+
+    // Checks
+    let checksHtml = '<div class="check-container">';
+    for (let i = 0; i < 4; i++) {
+        const checkData = state.problemChecks[mainProblemUniqueId]?.[i];
+        const isChecked = checkData && checkData.checked;
+        checksHtml += `<div class="check-box ${isChecked ? 'checked c' + i : ''}" data-problem-id="${mainProblemUniqueId}" data-check-index="${i}"></div>`;
+    }
+    checksHtml += '</div>';
+
+    // Reactions
+    const mainOshiCount = state.oshiCounts[mainProblemUniqueId] || 0;
+    const mainLikeCount = state.likeCounts[mainProblemUniqueId] || 0;
+    const mainFearCount = state.fearCounts[mainProblemUniqueId] || 0;
+    const reactionHtml = `
+      <div class="reaction-container">
+        <button class="reaction-button" data-problem-id="${mainProblemUniqueId}" data-reaction-type="oshi">❤️</button>
+        <span class="reaction-count">${mainOshiCount}</span>
+        <button class="reaction-button" data-problem-id="${mainProblemUniqueId}" data-reaction-type="like">👍</button>
+        <span class="reaction-count">${mainLikeCount}</span>
+        <button class="reaction-button" data-problem-id="${mainProblemUniqueId}" data-reaction-type="fear">😱</button>
+        <span class="reaction-count">${mainFearCount}</span>
+      </div>`;
+
+    // Archive
+    const archiveHtml = `
+      <div class="archive-container">
+        <button class="archive-button" data-problem-id="${mainProblemUniqueId}">
+          ${isArchived(main.id) ? '↩️ 元に戻す' : '📥 アーカイブ'}
+        </button>
+      </div>
+    `;
+
+    // Star (Favorite)
+    const starHtml = `<span class="star-icon ${isFavorite(main.id) ? 'active' : ''}" data-problem-id="${mainProblemUniqueId}">★</span>`;
+
+    let html = `
+      <a href="${mainProblemLink}" target="_blank" class="problem-panel main-problem" data-problem-id="${mainProblemUniqueId}">
+        <div class="problem-number">${starHtml} 問題: ${main.問題番号}</div>
+        <div class="problem-title">${main.問題名}</div>
+        <div class="problem-source">出典: ${main.出典} ${reactionHtml}</div>
+        ${buildDuplicateNoteHtml(main)}
+        ${checksHtml}
+        ${archiveHtml}
+      </a>
+    `;
+
+    // Similar Problems（同じ問題名の再出題を1件にまとめてから上位を取る。出題回で絞り込む場合はその出題回以降の上位だけ）
+    const filteredSimilars = state.similarSincePeriod !== null
+        ? similarProblemsSince(item, state.similarSincePeriod, main)
+        : topSimilarProblems(item, main);
+
+    if (filteredSimilars.length > 0) {
+        const similarCount = filteredSimilars.length;
+        const totalSimilarity = filteredSimilars.reduce((sum, sim) => sum + sim.similarity, 0);
+        const averageSimilarity = (totalSimilarity / similarCount) * 100;
+
+        html += `
+        <div class="similar-section">
+          <div class="similar-toggle">
+            <span class="similar-title">📊 類似問題 (${similarCount}件)</span>
+            <span class="average-similarity">平均: ${averageSimilarity.toFixed(1)}%</span>
+            <span class="toggle-arrow">▼</span>
+          </div>
+          <div class="similar-content" style="display: none;">
+      `;
+        filteredSimilars.forEach(sim => {
+            const s = sim.data;
+            let similarProblemLink = s.リンク;
+            if (isMobileDevice()) {
+                similarProblemLink = similarProblemLink.replace('https://www.ap-siken.com/', 'https://www.ap-siken.com/s/');
+            }
+
+            const simProblemUniqueId = s.key;
+            let simChecksHtml = '<div class="check-container">';
+            for (let i = 0; i < 4; i++) {
+                const isChecked = state.problemChecks[simProblemUniqueId]?.[i]?.checked;
+                simChecksHtml += `<div class="check-box ${isChecked ? 'checked c' + i : ''}" data-problem-id="${simProblemUniqueId}" data-check-index="${i}"></div>`;
+            }
+            simChecksHtml += '</div>';
 
-        // Reactions
-        const mainOshiCount = state.oshiCounts[mainProblemUniqueId] || 0;
-        const mainLikeCount = state.likeCounts[mainProblemUniqueId] || 0;
-        const mainFearCount = state.fearCounts[mainProblemUniqueId] || 0;
-        const reactionHtml = `
+            const simOshiCount = state.oshiCounts[simProblemUniqueId] || 0;
+            const simLikeCount = state.likeCounts[simProblemUniqueId] || 0;
+            const simFearCount = state.fearCounts[simProblemUniqueId] || 0;
+            const simReactionHtml = `
           <div class="reaction-container">
-            <button class="reaction-button" data-problem-id="${mainProblemUniqueId}" data-reaction-type="oshi">❤️</button>
-            <span class="reaction-count">${mainOshiCount}</span>
-            <button class="reaction-button" data-problem-id="${mainProblemUniqueId}" data-reaction-type="like">👍</button>
-            <span class="reaction-count">${mainLikeCount}</span>
-            <button class="reaction-button" data-problem-id="${mainProblemUniqueId}" data-reaction-type="fear">😱</button>
-            <span class="reaction-count">${mainFearCount}</span>
+            <button class="reaction-button" data-problem-id="${simProblemUniqueId}" data-reaction-type="oshi">❤️</button>
+            <span class="reaction-count">${simOshiCount}</span>
+            <button class="reaction-button" data-problem-id="${simProblemUniqueId}" data-reaction-type="like">👍</button>
+            <span class="reaction-count">${simLikeCount}</span>
+            <button class="reaction-button" data-problem-id="${simProblemUniqueId}" data-reaction-type="fear">😱</button>
+            <span class="reaction-count">${simFearCount}</span>
           </div>`;
 
-        // Archive
-        const isArchived = state.archivedProblemIds.includes(mainProblemUniqueId);
-        const archiveHtml = `
-          <div class="archive-container">
-            <button class="archive-button" data-problem-id="${mainProblemUniqueId}">
-              ${isArchived ? '↩️ 元に戻す' : '📥 アーカイブ'}
-            </button>
-          </div>
-        `;
+            const simStarHtml = `<span class="star-icon ${isFavorite(s.id) ? 'active' : ''}" data-problem-id="${simProblemUniqueId}">★</span>`;
 
-        // Star (Favorite)
-        const isFavorite = state.favorites.includes(mainProblemUniqueId);
-        const starHtml = `<span class="star-icon ${isFavorite ? 'active' : ''}" data-problem-id="${mainProblemUniqueId}">★</span>`;
-
-        card.className = `problem-card ${needsReview ? 'needs-review' : ''}`;
-        let html = `
-          <a href="${mainProblemLink}" target="_blank" class="problem-panel main-problem" data-problem-id="${mainProblemUniqueId}">
-            <div class="problem-number">${starHtml} 問題: ${main.問題番号}</div>
-            <div class="problem-title">${main.問題名}</div>
-            <div class="problem-source">出典: ${main.出典} ${reactionHtml}</div>
-            ${checksHtml}
-            ${archiveHtml}
+            html += `
+          <a href="${similarProblemLink}" target="_blank" class="problem-panel similar-item">
+            <span class="similarity-badge">${(sim.similarity * 100).toFixed(1)}%</span>
+            <div class="problem-number">${simStarHtml} 問題: ${s.問題番号}</div>
+            <div class="problem-title">${s.問題名}</div>
+            <div class="problem-source">出典: ${s.出典} ${simReactionHtml}</div>
+            <div class="problem-meta">被参照: ${s.reference_count || 0}回</div>
+            ${sim.duplicates.length > 0 ? `<div class="problem-meta duplicate-note">🔁 同じ問題名: ${sim.duplicates.map(d => d.出典).join('、')}</div>` : ''}
+            ${simChecksHtml}
           </a>
         `;
+        });
+        if (hasEmbeddings()) html += buildEmbeddingSearchHtml(main);
+        html += `
+          </div>
+        </div>
+      `;
+    }
+    return html;
+}
 
-        // Similar Problems
-        const filteredSimilars = item.similar_problems
-            ? item.similar_problems
-                .sort((a, b) => b.similarity - a.similarity)
-                .filter((sim, index) => index < 5 || sim.similarity >= 0.9)
-            : [];
+// 問題名がほぼ同じ問題が他の試験回にもある場合の注記
+function buildDuplicateNoteHtml(main) {
+    if (main.duplicate_group === undefined || main.duplicate_group === null) return '';
+    const others = (state.data.duplicateGroups?.get(main.duplicate_group) || []).filter(p => p.id !== main.id);
+    if (others.length === 0) return '';
+    return `<div class="problem-meta duplicate-note">🔁 同じ問題名で他に${others.length}回出題: ${others.map(p => p.出典).join('、')}</div>`;
+}
 
-        if (filteredSimilars.length > 0) {
-            const similarCount = filteredSimilars.length;
-            const totalSimilarity = filteredSimilars.reduce((sum, sim) => sum + sim.similarity, 0);
-            const averageSimilarity = (totalSimilarity / similarCount) * 100;
+function buildEmbeddingSearchHtml(main) {
+    return `
+          <div class="embedding-search" data-problem-id="${main.id}">
+            <select class="embedding-search-scope">
+              <option value="category">同じ中項目</option>
+              <option value="all">全分野</option>
+            </select>
+            <label>類似度 <input type="number" class="embedding-search-threshold" min="0" max="100" step="1" value="${EMBEDDING_SEARCH_DEFAULT_THRESHOLD}">%以上</label>
+            <button type="button" class="embedding-search-button">🔍 ベクトルで探す</button>
+            <div class="embedding-search-results"></div>
+          </div>
+    `;
+}
 
-            html += `
-            <div class="similar-section">
-              <div class="similar-toggle">
-                <span class="similar-title">📊 類似問題 (${similarCount}件)</span>
-                <span class="average-similarity">平均: ${averageSimilarity.toFixed(1)}%</span>
-                <span class="toggle-arrow">▼</span>
-              </div>
-              <div class="similar-content" style="display: none;">
-          `;
-            filteredSimilars.forEach(sim => {
-                const s = sim.data;
-                let similarProblemLink = s.リンク;
-                if (isMobileDevice()) {
-                    similarProblemLink = similarProblemLink.replace('https://www.ap-siken.com/', 'https://www.ap-siken.com/s/');
-                }
-
-                const simProblemUniqueId = `${s.出典}-${s.問題番号}`;
-                let simChecksHtml = '<div class="check-container">';
-                for (let i = 0; i < 4; i++) {
-                    const isChecked = state.problemChecks[simProblemUniqueId]?.[i]?.checked;
-                    simChecksHtml += `<div class="check-box ${isChecked ? 'checked c' + i : ''}" data-problem-id="${simProblemUniqueId}" data-check-index="${i}"></div>`;
-                }
-                simChecksHtml += '</div>';
-
-                const simOshiCount = state.oshiCounts[simProblemUniqueId] || 0;
-                const simLikeCount = state.likeCounts[simProblemUniqueId] || 0;
-                const simFearCount = state.fearCounts[simProblemUniqueId] || 0;
-                const simReactionHtml = `
-              <div class="reaction-container">
-                <button class="reaction-button" data-problem-id="${simProblemUniqueId}" data-reaction-type="oshi">❤️</button>
-                <span class="reaction-count">${simOshiCount}</span>
-                <button class="reaction-button" data-problem-id="${simProblemUniqueId}" data-reaction-type="like">👍</button>
-                <span class="reaction-count">${simLikeCount}</span>
-                <button class="reaction-button" data-problem-id="${simProblemUniqueId}" data-reaction-type="fear">😱</button>
-                <span class="reaction-count">${simFearCount}</span>
-              </div>`;
-
-                const isSimFavorite = state.favorites.includes(simProblemUniqueId);
-                const simStarHtml = `<span class="star-icon ${isSimFavorite ? 'active' : ''}" data-problem-id="${simProblemUniqueId}">★</span>`;
-
-                html += `
-              <a href="${similarProblemLink}" target="_blank" class="problem-panel similar-item">
-                <span class="similarity-badge">${(sim.similarity * 100).toFixed(1)}%</span>
-                <div class="problem-number">${simStarHtml} 問題: ${s.問題番号}</div>
-                <div class="problem-title">${s.問題名}</div>
-                <div class="problem-source">出典: ${s.出典} ${simReactionHtml}</div>
-                <div class="problem-meta">被参照: ${countsForThisCat[s.問題番号] || 0}回</div>
-                ${simChecksHtml}
-              </a>
-            `;
-            });
-            html += `
-              </div>
-            </div>
-          `;
-        }
-        card.innerHTML = html;
-        container.appendChild(card);
-    });
+function buildEmbeddingResultHtml(problem, similarity) {
+    let link = problem.リンク;
+    if (isMobileDevice()) {
+        link = link.replace('https://www.ap-siken.com/', 'https://www.ap-siken.com/s/');
+    }
+    return `
+          <a href="${link}" target="_blank" class="problem-panel similar-item">
+            <span class="similarity-badge">${(similarity * 100).toFixed(1)}%</span>
+            <div class="problem-number">問題: ${problem.問題番号}</div>
+            <div class="problem-title">${problem.問題名}</div>
+            <div class="problem-source">出典: ${problem.出典}</div>
+            <div class="problem-meta">${problem.中項目}</div>
+          </a>
+    `;
+}
 
-    // Event Listeners
-    document.querySelectorAll('.similar-toggle').forEach(toggle => {
-        toggle.addEventListener('click', () => {
-            const content = toggle.nextElementSibling;
-            const arrow = toggle.querySelector('.toggle-arrow');
-            if (content.style.display === 'none' || content.style.display === '') {
-                content.style.display = 'block';
-                arrow.textContent = '▲';
-            } else {
-                content.style.display = 'none';
-                arrow.textContent = '▼';
-            }
+async function handleEmbeddingSearch(container) {
+    const problemId = parseInt(container.dataset.problemId, 10);
+    const main = state.data.problems[problemId];
+    const threshold = parseFloat(container.querySelector('.embedding-search-threshold').value);
+    const scope = container.querySelector('.embedding-search-scope').value;
+    const results = container.querySelector('.embedding-search-results');
+    results.textContent = '検索中...';
+
+    try {
+        const { ids, scores } = await findSimilarByEmbedding(problemId, {
+            k: EMBEDDING_SEARCH_LIMIT,
+            minScore: Number.isFinite(threshold) ? threshold / 100 : -Infinity,
+            middleCat: scope === 'category' ? main.中項目 : null,
+            minPeriod: state.similarSincePeriod
         });
-    });
+        results.innerHTML = ids.length > 0
+            ? Array.from(ids, (id, i) => buildEmbeddingResultHtml(state.data.problems[id], scores[i])).join('')
+            : '<div class="embedding-search-empty">条件に合う問題はありません。</div>';
+    } catch (e) {
+        console.error('[ベクトル検索] 検索に失敗しました。', e);
+        results.textContent = '検索できませんでした。';
+    }
+}
 
-    document.querySelectorAll('.check-box').forEach(box => {
-        box.addEventListener('click', e => {
-            e.preventDefault();
-            e.stopPropagation();
+function setSimilarExpanded(toggle, expanded) {
+    toggle.nextElementSibling.style.display = expanded ? 'block' : 'none';
+    toggle.querySelector('.toggle-arrow').textContent = expanded ? '▲' : '▼';
+}
 
-            // Check if in read-only mode
-            if (window.isReadOnlyMode) {
-                showNotification('ログイン処理中です。しばらくお待ちください。', 2000, 'warning');
-                return;
-            }
+// カードは作り直されるので、イベントはコンテナで一括して受け取る
+function attachDetailListeners(container) {
+    if (detailListenersAttached) return;
+    detailListenersAttached = true;
 
-            const problemId = e.target.dataset.problemId;
-            const checkIndex = parseInt(e.target.dataset.checkIndex, 10);
+    container.addEventListener('click', e => {
+        const toggle = e.target.closest('.similar-toggle');
+        if (toggle) {
+            const content = toggle.nextElementSibling;
+            setSimilarExpanded(toggle, content.style.display === 'none' || content.style.display === '');
+            return;
+        }
 
-            if (!state.problemChecks[problemId]) {
-                state.problemChecks[problemId] = Array(4).fill(null).map(() => ({ checked: false, timestamp: null }));
-            }
+        const searchButton = e.target.closest('.embedding-search-button');
+        if (searchButton) {
+            handleEmbeddingSearch(searchButton.closest('.embedding-search'));
+            return;
+        }
 
-            const currentCheck = state.problemChecks[problemId][checkIndex];
-            const newCheckedState = !currentCheck.checked;
-            const newTimestamp = newCheckedState ? Date.now() : null;
-
-            state.problemChecks[problemId][checkIndex] = {
-                checked: newCheckedState,
-                timestamp: newTimestamp
-            };
-            storage.saveChecks(state.problemChecks);
-
-            document.querySelectorAll(`.check-box[data-problem-id="${problemId}"][data-check-index="${checkIndex}"]`).forEach(boxToUpdate => {
-                if (newCheckedState) {
-                    boxToUpdate.classList.add('checked', 'c' + checkIndex);
-                } else {
-                    boxToUpdate.classList.remove('checked', 'c' + checkIndex);
-                }
-            });
+        const target = e.target.closest('.check-box, .reaction-button, .archive-button, .star-icon');
+        if (!target) return;
+        e.preventDefault();
+        e.stopPropagation();
 
-            const needsReview = shouldHighlightProblem(problemId, state.problemChecks);
-            document.querySelectorAll(`.problem-card`).forEach(card => {
-                const panel = card.querySelector(`.problem-panel[data-problem-id="${problemId}"]`);
-                if (!panel) return;
-                card.classList.toggle('needs-review', needsReview);
-            });
+        // Check if in read-only mode
+        if (window.isReadOnlyMode) {
+            showNotification('ログイン処理中です。しばらくお待ちください。', 2000, 'warning');
+            return;
+        }
 
-            renderTotalReviewCount();
-            renderTotalProgress();
-        });
+        if (target.classList.contains('check-box')) {
+            handleCheckClick(target);
+        } else if (target.classList.contains('reaction-button')) {
+            handleReactionClick(target);
+        } else if (target.classList.contains('archive-button')) {
+            handleArchiveClick(target);
+        } else {
+            handleStarClick(target);
+        }
     });
+}
 
-    document.querySelectorAll('.reaction-button').forEach(button => {
-        button.addEventListener('click', e => {
-            e.preventDefault();
-            e.stopPropagation();
-
-            // Check if in read-only mode
-            if (window.isReadOnlyMode) {
-                showNotification('ログイン処理中です。しばらくお待ちください。', 2000, 'warning');
-                return;
-            }
-
-            const problemId = e.target.dataset.problemId;
-            const reactionType = e.target.dataset.reactionType;
-
-            if (reactionType === 'oshi') {
-                state.oshiCounts[problemId] = (state.oshiCounts[problemId] || 0) + 1;
-                storage.saveOshiCounts(state.oshiCounts);
-            } else if (reactionType === 'like') {
-                state.likeCounts[problemId] = (state.likeCounts[problemId] || 0) + 1;
-                storage.saveLikeCounts(state.likeCounts);
-            } else if (reactionType === 'fear') {
-                state.fearCounts[problemId] = (state.fearCounts[problemId] || 0) + 1;
-                storage.saveFearCounts(state.fearCounts);
-            }
+function handleCheckClick(box) {
+    const problemId = box.dataset.problemId;
+    const checkIndex = parseInt(box.dataset.checkIndex, 10);
 
-            document.querySelectorAll(`.reaction-button[data-problem-id="${problemId}"][data-reaction-type="${reactionType}"]`).forEach(btnToUpdate => {
-                const countElement = btnToUpdate.nextElementSibling;
-                if (countElement && countElement.classList.contains('reaction-count')) {
-                    countElement.textContent = (reactionType === 'oshi' ? state.oshiCounts[problemId] : reactionType === 'like' ? state.likeCounts[problemId] : state.fearCounts[problemId]);
-                }
-            });
+    const newCheckedState = toggleCheck(problemId, checkIndex);
+    storage.saveChecks(state.problemChecks, problemId);
 
+    document.querySelectorAll(`.check-box[data-problem-id="${problemId}"][data-check-index="${checkIndex}"]`).forEach(boxToUpdate => {
+        if (newCheckedState) {
+            boxToUpdate.classList.add('checked', 'c' + checkIndex);
+        } else {
+            boxToUpdate.classList.remove('checked', 'c' + checkIndex);
+        }
+    });
 
-            renderTotalReactions();
-        });
+    const needsReview = shouldHighlightProblem(problemId, state.problemChecks);
+    document.querySelectorAll(`.problem-panel[data-problem-id="${problemId}"]`).forEach(panel => {
+        const card = panel.closest('.problem-card');
+        if (card) card.classList.toggle('needs-review', needsReview);
     });
 
-    document.querySelectorAll('.archive-button').forEach(button => {
-        button.addEventListener('click', e => {
-            e.preventDefault();
-            e.stopPropagation();
+    renderTotalReviewCount();
+    renderTotalProgress();
+}
 
-            // Check if in read-only mode
-            if (window.isReadOnlyMode) {
-                showNotification('ログイン処理中です。しばらくお待ちください。', 2000, 'warning');
-                return;
-            }
+function handleReactionClick(button) {
+    const problemId = button.dataset.problemId;
+    const reactionType = button.dataset.reactionType;
+
+    if (reactionType === 'oshi') {
+        state.oshiCounts[problemId] = (state.oshiCounts[problemId] || 0) + 1;
+        storage.saveOshiCounts(state.oshiCounts, problemId);
+    } else if (reactionType === 'like') {
+        state.likeCounts[problemId] = (state.likeCounts[problemId] || 0) + 1;
+        storage.saveLikeCounts(state.likeCounts, problemId);
+    } else if (reactionType === 'fear') {
+        state.fearCounts[problemId] = (state.fearCounts[problemId] || 0) + 1;
+        storage.saveFearCounts(state.fearCounts, problemId);
+    }
 
-            const problemId = e.target.dataset.problemId;
-            const index = state.archivedProblemIds.indexOf(problemId);
+    document.querySelectorAll(`.reaction-button[data-problem-id="${problemId}"][data-reaction-type="${reactionType}"]`).forEach(btnToUpdate => {
+        const countElement = btnToUpdate.nextElementSibling;
+        if (countElement && countElement.classList.contains('reaction-count')) {
+            countElement.textContent = (reactionType === 'oshi' ? state.oshiCounts[problemId] : reactionType === 'like' ? state.likeCounts[problemId] : state.fearCounts[problemId]);
+        }
+    });
 
-            if (index > -1) {
-                state.archivedProblemIds.splice(index, 1);
-                showNotification("問題を復元しました");
-            } else {
-                state.archivedProblemIds.push(problemId);
-                showNotification("問題をアーカイブしました");
-            }
+    renderTotalReactions();
+}
 
-            storage.saveArchivedProblemIds(state.archivedProblemIds);
-            window.dispatchEvent(new CustomEvent('archiveUpdated'));
+function handleArchiveClick(button) {
+    const problemId = button.dataset.problemId;
 
-            renderTotalProgress();
-            renderProblemList(document.getElementById('detail-title').textContent);
-        });
-    });
+    if (toggleArchived(problemId)) {
+        showNotification("問題をアーカイブしました");
+    } else {
+        showNotification("問題を復元しました");
+    }
 
-    // Star Icon Click Listener
-    document.querySelectorAll('.star-icon').forEach(star => {
-        star.addEventListener('click', e => {
-            e.preventDefault();
-            e.stopPropagation();
+    storage.saveArchivedProblemIds(state.archivedProblemIds, problemId);
+    window.dispatchEvent(new CustomEvent('archiveUpdated'));
 
-            // Check if in read-only mode
-            if (window.isReadOnlyMode) {
-                showNotification('ログイン処理中です。しばらくお待ちください。', 2000, 'warning');
-                return;
-            }
+    renderTotalProgress();
+    renderProblemList(document.getElementById('detail-title').textContent);
+}
 
-            const problemId = e.target.dataset.problemId;
-            const index = state.favorites.indexOf(problemId);
-
-            if (index > -1) {
-                state.favorites.splice(index, 1);
-                e.target.classList.remove('active');
-                showNotification("お気に入りから削除しました");
-            } else {
-                state.favorites.push(problemId);
-                e.target.classList.add('active');
-                showNotification("お気に入りに追加しました");
-            }
+function handleStarClick(star) {
+    const problemId = star.dataset.problemId;
+    const favorite = toggleFavorite(problemId);
 
-            storage.saveFavorites(state.favorites);
+    if (favorite) {
+        showNotification("お気に入りに追加しました");
+    } else {
+        showNotification("お気に入りから削除しました");
+    }
 
-            // Update all star icons for this problem
-            document.querySelectorAll(`.star-icon[data-problem-id="${problemId}"]`).forEach(s => {
-                if (state.favorites.includes(problemId)) {
-                    s.classList.add('active');
-                } else {
-                    s.classList.remove('active');
-                }
-            });
+    storage.saveFavorites(state.favorites, problemId);
 
-            // If showing favorites only, re-render might be needed to remove un-favorited item
-            if (state.showFavoritesOnly) {
-                renderProblemList(document.getElementById('detail-title').textContent);
-            }
-        });
+    // Update all star icons for this problem
+    document.querySelectorAll(`.star-icon[data-problem-id="${problemId}"]`).forEach(s => {
+        s.classList.toggle('active', favorite);
     });
+
+    // If showing favorites only, re-render might be needed to remove un-favorited item
+    if (state.showFavoritesOnly) {
+        renderProblemList(document.getElementById('detail-title').textContent);
+    }
 }
@@ -1,7 +1,8 @@
-import { state } from './state.js';
+import { state, isArchived, getCheckedCount, getCategoryProgress } from './state.js';
 import { storage } from './storage.js';
-import { shouldHighlightProblem, isProblemUntouched } from './utils.js';
+import { shouldHighlightProblem } from './utils.js';
 import { navigateToDetail } from './router.js';
+import { normalizeSearchText, parseSearchIndex, searchTitles } from './title-search.js';
 import { renderTotalReviewCount, renderTotalProgress, showNotification } from './ui-common.js';
 
 export function showIndex(isPopState = false) {
@@ -28,6 +29,60 @@ export function showIndex(isPopState = false) {
     }, 100);
 
     updateRandomUntouchedProblemButtonUI(); // Call the new function here
+    setupTitleSearch();
+}
+
+// --- 問題名・中項目の検索 ---
+// 問題名はビルド時の bigram 索引（data.search_index）で探し、中項目の名前は数が少ないので直接照合する
+const TITLE_SEARCH_LIMIT = 30;
+const titleSearch = { attached: false, source: null, index: null };
+
+function getTitleSearchIndex() {
+    if (titleSearch.source !== state.data) {
+        titleSearch.source = state.data;
+        titleSearch.index = state.data.search_index ? parseSearchIndex(state.data.search_index, state.data.problems) : null;
+    }
+    return titleSearch.index;
+}
+
+function setupTitleSearch() {
+    const input = document.getElementById('title-search-input');
+    const results = document.getElementById('title-search-results');
+    if (!input || !results) return;
+    // モデルを切り替えるとデータが変わるので、検索結果も作り直す
+    renderTitleSearchResults(input.value, results);
+    if (titleSearch.attached) return;
+    titleSearch.attached = true;
+
+    input.addEventListener('input', () => renderTitleSearchResults(input.value, results));
+    results.addEventListener('click', e => {
+        const result = e.target.closest('.title-search-result');
+        if (result) navigateToDetail(result.dataset.cat, result.dataset.problemKey || null);
+    });
+}
+
+function renderTitleSearchResults(query, results) {
+    const normalized = normalizeSearchText(query);
+    const index = getTitleSearchIndex();
+    if (!normalized || !index) {
+        results.innerHTML = '';
+        return;
+    }
+
+    const categoryHtml = Object.keys(state.data.categories)
+        .filter(middleCat => normalizeSearchText(middleCat).includes(normalized))
+        .map(middleCat => `<button type="button" class="title-search-result" data-cat="${middleCat}">📂 ${middleCat} <span class="title-search-meta">${state.data.categories[middleCat].length}問</span></button>`);
+
+    // 問題が1問しかない中項目は一覧に無いので除く
+    const ids = searchTitles(index, query).filter(id => state.data.categories[state.data.problems[id].中項目]);
+    const problemHtml = Array.from(ids.subarray(0, TITLE_SEARCH_LIMIT), id => {
+        const problem = state.data.problems[id];
+        return `<button type="button" class="title-search-result" data-cat="${problem.中項目}" data-problem-key="${problem.key}">${problem.問題名} <span class="title-search-meta">${problem.出典} ／ ${problem.中項目}</span></button>`;
+    });
+    const more = ids.length > TITLE_SEARCH_LIMIT ? `<div class="title-search-more">他 ${ids.length - TITLE_SEARCH_LIMIT}件（検索語を追加すると絞り込めます）</div>` : '';
+    results.innerHTML = categoryHtml.length + problemHtml.length > 0
+        ? categoryHtml.join('') + problemHtml.join('') + more
+        : '<div class="title-search-more">該当する問題はありません。</div>';
 }
 
 // Function to update the UI of the random untouched problem button
@@ -47,240 +102,297 @@ function updateRandomUntouchedProblemButtonUI() {
     }
 }
 
-export function renderIndex(categories) {
-    const categoryList = document.getElementById('category-list');
-    const randomUntouchedProblemButton = document.getElementById('random-untouched-problem-button');
-    const untouchedProblemCountSpan = document.getElementById('untouched-problem-count');
-
-    // Reset untouchedProblemIds for each render
-    state.untouchedProblemIds = [];
-
-    // 大項目でグループ化
-    const groupedByLargeCategory = {};
-    for (const [middleCat, problems] of Object.entries(categories)) {
-        if (problems.length > 0) {
-            const largeCat = problems[0].main_problem.大項目;
-            if (!groupedByLargeCategory[largeCat]) {
-                groupedByLargeCategory[largeCat] = [];
-            }
-            groupedByLargeCategory[largeCat].push({ middleCat, problems });
-
-            problems.forEach(item => {
-                // Find untouched problems
-                if (isProblemUntouched(item, state.problemChecks) && !state.archivedProblemIds.includes(`${item.main_problem.出典}-${item.main_problem.問題番号}`)) {
-                    state.untouchedProblemIds.push({
-                        problemId: `${item.main_problem.出典}-${item.main_problem.問題番号}`,
-                        middleCat: middleCat
-                    });
-                }
-            });
-        }
+// 大項目・中項目の要素はキーごとに使い回し、内容が変わったところだけ書き換える
+const indexCache = { sections: new Map(), listenersAttached: false, topicsSource: null, topicsByCategory: new Map() };
+// 中項目の行に表示する話題（ビルド時の mini-batch k-means によるサブトピック）の最大数
+const MAX_TOPICS_PER_CATEGORY = 6;
+
+// 中項目 -> 話題の一覧（問題数の多い順）。データが変わったときだけ作り直す
+function getTopicsByCategory() {
+    const topics = state.data.topics || [];
+    if (indexCache.topicsSource !== topics) {
+        indexCache.topicsSource = topics;
+        indexCache.topicsByCategory = new Map();
+        topics.forEach(topic => {
+            if (!indexCache.topicsByCategory.has(topic.中項目)) indexCache.topicsByCategory.set(topic.中項目, []);
+            indexCache.topicsByCategory.get(topic.中項目).push(topic);
+        });
+        indexCache.topicsByCategory.forEach(list => list.sort((a, b) => b.size - a.size));
     }
+    return indexCache.topicsByCategory;
+}
 
-    categoryList.innerHTML = '';
-    // 大項目のキーでソートして表示
-    Object.keys(groupedByLargeCategory).sort((a, b) => {
+function buildTopicChipsHtml(middleCat) {
+    const topics = getTopicsByCategory().get(middleCat) || [];
+    // 話題が1つだけなら中項目と同じなので表示しない
+    if (topics.length < 2) return '';
+    const chips = topics.slice(0, MAX_TOPICS_PER_CATEGORY).map(topic => {
+        const representative = state.data.problems[topic.representative];
+        if (!representative) return '';
+        return `<button type="button" class="topic-chip" data-cat="${middleCat}" data-problem-key="${representative.key}" title="${topic.label}（${topic.size}問）">${topic.label} <span class="topic-size">${topic.size}</span></button>`;
+    }).join('');
+    return `<div class="topic-chips">${chips}</div>`;
+}
+
+function sortLargeCategories(largeCats) {
+    return largeCats.sort((a, b) => {
         // "1.基礎理論"のような文字列から先頭の数字を抜き出して比較する
         const numA = parseInt(a.split('.')[0], 10);
         const numB = parseInt(b.split('.')[0], 10);
         return numA - numB;
-    }).forEach(largeCat => {
-        // --- START: New logic for large category summary ---
-        let largeCatTotalProblems = 0; // Total problems in this large category (archived + non-archived)
-        let largeCatNonArchivedCheckedCount = 0;
-        let largeCatArchivedCheckedCount = 0;
-        let largeCatArchivedProblemCount = 0; // Number of archived problems in this large category
-        let largeCatTotalReviewItems = 0;
-
-        groupedByLargeCategory[largeCat].forEach(({ problems }) => {
-            largeCatTotalProblems += problems.length; // Sum all problems for denominator
-
-            problems.forEach(item => {
-                const problemId = `${item.main_problem.出典}-${item.main_problem.問題番号}`;
-                const isArchived = state.archivedProblemIds.includes(problemId);
-                const checks = state.problemChecks[problemId];
-                const checkedCount = checks ? checks.filter(c => c && c.checked).length : 0;
-
-                if (isArchived) {
-                    largeCatArchivedProblemCount++;
-                    largeCatArchivedCheckedCount += checkedCount;
-                } else {
-                    largeCatNonArchivedCheckedCount += checkedCount;
-                }
-
-                // Calculate review items (this logic remains the same)
-                if (shouldHighlightProblem(problemId, state.problemChecks)) {
-                    largeCatTotalReviewItems++;
-                }
-            });
-        });
-
-        const largeCatNonArchivedEquivalent = largeCatNonArchivedCheckedCount / 4;
-        const largeCatArchivedEquivalent = largeCatArchivedCheckedCount / 4;
+    });
+}
 
-        const largeCatCompletedPercentage = largeCatTotalProblems > 0 ? (largeCatNonArchivedEquivalent / largeCatTotalProblems) * 100 : 0;
-        const largeCatArchivedPercentage = largeCatTotalProblems > 0 ? (largeCatArchivedProblemCount / largeCatTotalProblems) * 100 : 0;
+function buildLargeCategorySummaryHtml(groups) {
+    let largeCatTotalProblems = 0; // Total problems in this large category (archived + non-archived)
+    let largeCatNonArchivedCheckedCount = 0;
+    let largeCatArchivedProblemCount = 0; // Number of archived problems in this large category
+    let largeCatTotalReviewItems = 0;
 
-        const largeCatTotalProgressPercentage = largeCatCompletedPercentage + largeCatArchivedPercentage;
-        // --- END: New logic ---
+    groups.forEach(({ middleCat, problems }) => {
+        largeCatTotalProblems += problems.length; // Sum all problems for denominator
 
-        const largeCategorySection = document.createElement('div');
-        largeCategorySection.className = 'major-category';
+        // 中項目ごとの集計は進捗インデックスで保持されている
+        const catProgress = getCategoryProgress(middleCat);
+        largeCatArchivedProblemCount += catProgress.archivedCount;
+        largeCatNonArchivedCheckedCount += catProgress.nonArchivedChecks;
 
-        // -- Reworked majorTitle --
-        const majorTitle = document.createElement('div');
-        majorTitle.className = 'major-title';
-        majorTitle.dataset.largeCat = largeCat;
-        majorTitle.style.display = 'flex';
-        majorTitle.style.justifyContent = 'space-between';
-        majorTitle.style.alignItems = 'center';
+        // Calculate review items (depends on the current time, so it is evaluated per render)
+        problems.forEach(item => {
+            if (shouldHighlightProblem(item.main_problem.key, state.problemChecks)) {
+                largeCatTotalReviewItems++;
+            }
+        });
+    });
 
-        const titleTextEl = document.createElement('span');
-        titleTextEl.className = 'large-category-title-text';
-        // title innerHTML will be set by expand/collapse logic later
+    const largeCatNonArchivedEquivalent = largeCatNonArchivedCheckedCount / 4;
+    const largeCatCompletedPercentage = largeCatTotalProblems > 0 ? (largeCatNonArchivedEquivalent / largeCatTotalProblems) * 100 : 0;
+    const largeCatArchivedPercentage = largeCatTotalProblems > 0 ? (largeCatArchivedProblemCount / largeCatTotalProblems) * 100 : 0;
+    const largeCatTotalProgressPercentage = largeCatCompletedPercentage + largeCatArchivedPercentage;
 
-        const summaryEl = document.createElement('div');
-        summaryEl.className = 'large-category-summary';
-        summaryEl.innerHTML = `
+    return `
         <span class="progress-percentage">${largeCatTotalProgressPercentage.toFixed(0)}%</span>
         ${largeCatTotalReviewItems > 0 ? `<span class="review-count">🔥 ${largeCatTotalReviewItems}</span>` : ''}
         <span class="problem-count">${largeCatTotalProblems}問</span>
       `;
+}
 
-        majorTitle.appendChild(titleTextEl);
-        majorTitle.appendChild(summaryEl);
-        largeCategorySection.appendChild(majorTitle);
-        // -- End rework --
-
-        const middleCategoryList = document.createElement('div');
-        middleCategoryList.className = 'middle-category-list'; // クラスを追加
-        groupedByLargeCategory[largeCat].forEach(({ middleCat, problems }) => {
-            // カテゴリごとのリアクション合計を計算
-            let totalOshi = 0;
-            let totalLike = 0;
-            let totalFear = 0;
-            problems.forEach(item => {
-                const problemId = `${item.main_problem.出典}-${item.main_problem.問題番号}`;
-                totalOshi += state.oshiCounts[problemId] || 0;
-                totalLike += state.likeCounts[problemId] || 0;
-                totalFear += state.fearCounts[problemId] || 0;
-            });
-
-            // このカテゴリの進捗を計算
-            let problemsInThisCategory = problems.length; // フィルター前のこのカテゴリの問題総数
-
-            let nonArchivedCheckedCount = 0;
-            let archivedCheckedCount = 0;
-            let archivedProblemCount = 0; // このカテゴリ内のアーカイブ済み問題数
-
-            problems.forEach(item => { // このproblems配列はアーカイブ済みも含む
-                const problemId = `${item.main_problem.出典}-${item.main_problem.問題番号}`;
-                const isArchived = state.archivedProblemIds.includes(problemId);
-                const checks = state.problemChecks[problemId];
-                const checkedCount = checks ? checks.filter(c => c && c.checked).length : 0;
-
-                if (isArchived) {
-                    archivedProblemCount++;
-                    archivedCheckedCount += checkedCount;
-                } else {
-                    nonArchivedCheckedCount += checkedCount;
-                }
-            });
-
-            const nonArchivedEquivalent = nonArchivedCheckedCount / 4;
-            const archivedEquivalent = archivedCheckedCount / 4;
-
-            const completedPercentage = problemsInThisCategory > 0 ? (nonArchivedEquivalent / problemsInThisCategory) * 100 : 0;
-            const archivedPercentage = problemsInThisCategory > 0 ? (archivedProblemCount / problemsInThisCategory) * 100 : 0;
-
-            const totalCategoryProgressPercentage = completedPercentage + archivedPercentage;
-
-            const progressHtml = `<span class="progress-percentage">${totalCategoryProgressPercentage.toFixed(0)}%</span>`;
-
-
-            // このカテゴリにハイライトすべき問題があるかチェック
-            let reviewItemCount = 0;
-            for (const item of problems) {
-                const problemId = `${item.main_problem.出典}-${item.main_problem.問題番号}`;
-                if (shouldHighlightProblem(problemId, state.problemChecks)) {
-                    reviewItemCount++;
-                }
-            }
-            const hasReviewItems = reviewItemCount > 0;
+function buildMiddleCategoryHtml(middleCat, problems) {
+    // カテゴリごとのリアクション合計を計算
+    let totalOshi = 0;
+    let totalLike = 0;
+    let totalFear = 0;
+    let reviewItemCount = 0;
+    problems.forEach(item => {
+        const problemId = item.main_problem.key;
+        totalOshi += state.oshiCounts[problemId] || 0;
+        totalLike += state.likeCounts[problemId] || 0;
+        totalFear += state.fearCounts[problemId] || 0;
+        // このカテゴリにハイライトすべき問題があるかチェック
+        if (shouldHighlightProblem(problemId, state.problemChecks)) {
+            reviewItemCount++;
+        }
+    });
 
-            // 復習カウントのHTMLを生成
-            let reviewCountHtml = ''; // デフォルトは空文字列
-            if (hasReviewItems) {
-                reviewCountHtml = `<span class="review-count">🔥 ${reviewItemCount}</span>`;
-            }
+    // このカテゴリの進捗を計算（アーカイブ済みも含めた集計は進捗インデックスから取得）
+    const problemsInThisCategory = problems.length;
+    const catProgress = getCategoryProgress(middleCat);
+    const nonArchivedEquivalent = catProgress.nonArchivedChecks / 4;
+    const completedPercentage = problemsInThisCategory > 0 ? (nonArchivedEquivalent / problemsInThisCategory) * 100 : 0;
+    const archivedPercentage = problemsInThisCategory > 0 ? (catProgress.archivedCount / problemsInThisCategory) * 100 : 0;
+    const totalCategoryProgressPercentage = completedPercentage + archivedPercentage;
 
-            // 表示用のHTMLを生成
-            const reactionSummaryHtml = `
-            <div class="reaction-summary">
-              <span>❤️ ${totalOshi}</span>
-              <span>👍 ${totalLike}</span>
-              <span>😱 ${totalFear}</span>
-            </div>`;
+    const hasReviewItems = reviewItemCount > 0;
+    const reviewCountHtml = hasReviewItems ? `<span class="review-count">🔥 ${reviewItemCount}</span>` : '';
 
-            const item = document.createElement('div');
-            item.className = 'middle-category-item';
-            item.innerHTML = `
+    return `
             <a href="#" class="middle-category-link ${hasReviewItems ? 'has-review-items' : ''}" data-cat="${middleCat}">
               <span class="category-name">${middleCat}</span>
               <div class="category-meta">
-                ${progressHtml}
+                <span class="progress-percentage">${totalCategoryProgressPercentage.toFixed(0)}%</span>
                 ${reviewCountHtml}
-                ${reactionSummaryHtml}
+                <div class="reaction-summary">
+                  <span>❤️ ${totalOshi}</span>
+                  <span>👍 ${totalLike}</span>
+                  <span>😱 ${totalFear}</span>
+                </div>
                 <span class="problem-count">${problems.length}問</span>
                 <span class="arrow">›</span>
               </div>
-            </a>`;
-            middleCategoryList.appendChild(item);
-        });
-        largeCategorySection.appendChild(middleCategoryList);
-        categoryList.appendChild(largeCategorySection);
+            </a>
+            ${buildTopicChipsHtml(middleCat)}`;
+}
+
+function createLargeCategorySection(largeCat) {
+    const element = document.createElement('div');
+    element.className = 'major-category';
+
+    const majorTitle = document.createElement('div');
+    majorTitle.className = 'major-title';
+    majorTitle.dataset.largeCat = largeCat;
+    majorTitle.style.display = 'flex';
+    majorTitle.style.justifyContent = 'space-between';
+    majorTitle.style.alignItems = 'center';
+
+    const titleText = document.createElement('span');
+    titleText.className = 'large-category-title-text';
+    const summary = document.createElement('div');
+    summary.className = 'large-category-summary';
+    majorTitle.appendChild(titleText);
+    majorTitle.appendChild(summary);
+
+    const list = document.createElement('div');
+    list.className = 'middle-category-list';
+    element.appendChild(majorTitle);
+    element.appendChild(list);
+
+    return { element, titleText, summary, list, groups: [], items: new Map(), html: new Map(), summaryHtml: null, stale: true };
+}
+
+// 中項目の行を作成・更新する。閉じている大項目は開かれるまで更新を後回しにする
+function renderMiddleCategories(section) {
+    const middleCats = new Set(section.groups.map(group => group.middleCat));
+    section.items.forEach((item, middleCat) => {
+        if (!middleCats.has(middleCat)) {
+            item.remove();
+            section.items.delete(middleCat);
+            section.html.delete(middleCat);
+        }
     });
 
-    // --- Reworked event listeners ---
-    // 大項目の開閉機能を追加
-    document.querySelectorAll('.major-title').forEach(titleEl => {
-        const largeCat = titleEl.dataset.largeCat;
-        const titleTextEl = titleEl.querySelector('.large-category-title-text');
-        const listEl = titleEl.nextElementSibling; // middle-category-listを指す
-        // storageから開閉状態を復元。指定がなければ閉じた状態がデフォルト
-        let isCollapsed = storage.isMajorCatCollapsed(largeCat);
-        if (isCollapsed) {
-            listEl.style.display = 'none';
-            titleTextEl.innerHTML = `▶ ${largeCat}`; // 閉じた状態の矢印
+    let cursor = section.list.firstElementChild;
+    section.groups.forEach(({ middleCat, problems }) => {
+        let item = section.items.get(middleCat);
+        if (!item) {
+            item = document.createElement('div');
+            item.className = 'middle-category-item';
+            section.items.set(middleCat, item);
+        }
+        const html = buildMiddleCategoryHtml(middleCat, problems);
+        if (section.html.get(middleCat) !== html) {
+            item.innerHTML = html;
+            section.html.set(middleCat, html);
+        }
+        if (item === cursor) {
+            cursor = cursor.nextElementSibling;
         } else {
-            listEl.style.display = ''; // デフォルト表示
-            titleTextEl.innerHTML = `▼ ${largeCat}`; // 開いた状態の矢印
+            section.list.insertBefore(item, cursor);
         }
-
-        titleEl.addEventListener('click', () => {
-            const currentlyCollapsed = listEl.style.display === 'none';
-            if (currentlyCollapsed) {
-                listEl.style.display = ''; // 表示
-                titleTextEl.innerHTML = `▼ ${largeCat}`;
-                storage.setMajorCatCollapsed(largeCat, false);
-            } else {
-                listEl.style.display = 'none'; // 非表示
-                titleTextEl.innerHTML = `▶ ${largeCat}`;
-                storage.setMajorCatCollapsed(largeCat, true);
-            }
-        });
     });
+    section.stale = false;
+}
+
+function setSectionCollapsed(section, largeCat, isCollapsed) {
+    section.list.style.display = isCollapsed ? 'none' : '';
+    section.titleText.innerHTML = isCollapsed ? `▶ ${largeCat}` : `▼ ${largeCat}`;
+    if (!isCollapsed && section.stale) {
+        renderMiddleCategories(section);
+    }
+}
+
+function attachIndexListeners(categoryList) {
+    if (indexCache.listenersAttached) return;
+    indexCache.listenersAttached = true;
+
+    categoryList.addEventListener('click', e => {
+        // 大項目の開閉
+        const titleEl = e.target.closest('.major-title');
+        if (titleEl) {
+            const largeCat = titleEl.dataset.largeCat;
+            const section = indexCache.sections.get(largeCat);
+            const isCollapsed = section.list.style.display !== 'none';
+            setSectionCollapsed(section, largeCat, isCollapsed);
+            storage.setMajorCatCollapsed(largeCat, isCollapsed);
+            return;
+        }
+
+        // 話題を選ぶと、その話題の代表的な問題の位置に移動する
+        const chip = e.target.closest('.topic-chip');
+        if (chip) {
+            navigateToDetail(chip.dataset.cat, chip.dataset.problemKey);
+            return;
+        }
 
-    // イベント設定
-    document.querySelectorAll('.middle-category-link').forEach(link => {
-        link.addEventListener('click', e => {
+        const link = e.target.closest('.middle-category-link');
+        if (link) {
             e.preventDefault();
-            const cat = e.currentTarget.dataset.cat;
+            const cat = link.dataset.cat;
             console.log(`[カテゴリクリック] カテゴリ「${cat}」がクリックされました。`);
 
             console.log(`[画面遷移] navigateToDetail('${cat}') を呼び出します。`);
             navigateToDetail(cat);
-        });
+        }
+    });
+}
+
+export function renderIndex(categories) {
+    const categoryList = document.getElementById('category-list');
+
+    // Reset untouchedProblemIds for each render
+    state.untouchedProblemIds = [];
+
+    // 大項目でグループ化
+    const groupedByLargeCategory = {};
+    for (const [middleCat, problems] of Object.entries(categories)) {
+        if (problems.length > 0) {
+            const largeCat = problems[0].main_problem.大項目;
+            if (!groupedByLargeCategory[largeCat]) {
+                groupedByLargeCategory[largeCat] = [];
+            }
+            groupedByLargeCategory[largeCat].push({ middleCat, problems });
+
+            problems.forEach(item => {
+                // Find untouched problems
+                const id = item.main_problem.id;
+                if (getCheckedCount(id) === 0 && !isArchived(id)) {
+                    state.untouchedProblemIds.push({
+                        problemId: item.main_problem.key,
+                        middleCat: middleCat
+                    });
+                }
+            });
+        }
+    }
+
+    attachIndexListeners(categoryList);
+
+    // データに無くなった大項目を取り除く
+    indexCache.sections.forEach((section, largeCat) => {
+        if (!groupedByLargeCategory[largeCat]) {
+            section.element.remove();
+            indexCache.sections.delete(largeCat);
+        }
+    });
+
+    // 大項目のキーでソートして表示
+    let cursor = categoryList.firstElementChild;
+    sortLargeCategories(Object.keys(groupedByLargeCategory)).forEach(largeCat => {
+        let section = indexCache.sections.get(largeCat);
+        if (!section || !categoryList.contains(section.element)) {
+            section = createLargeCategorySection(largeCat);
+            indexCache.sections.set(largeCat, section);
+        }
+        section.groups = groupedByLargeCategory[largeCat];
+
+        const summaryHtml = buildLargeCategorySummaryHtml(section.groups);
+        if (section.summaryHtml !== summaryHtml) {
+            section.summary.innerHTML = summaryHtml;
+            section.summaryHtml = summaryHtml;
+        }
+
+        // storageから開閉状態を復元。指定がなければ閉じた状態がデフォルト
+        // 初回は閉じていても中項目の行を作っておき、以降の更新は開いたときに行う
+        const isCollapsed = storage.isMajorCatCollapsed(largeCat);
+        section.stale = true;
+        if (!isCollapsed || section.items.size === 0) {
+            renderMiddleCategories(section);
+        }
+        setSectionCollapsed(section, largeCat, isCollapsed);
+        if (section.element === cursor) {
+            cursor = cursor.nextElementSibling;
+        } else {
+            categoryList.insertBefore(section.element, cursor);
+        }
     });
     console.log("renderIndex completed"); // Debug log
 }
@@ -43,17 +43,3 @@ export function shouldHighlightProblem(problemId, problemChecks) {
     // 経過時間が指定の間隔を超えていればハイライト対象
     return shouldHighlight;
 }
-
-export function isProblemUntouched(item, problemChecks) {
-    const problemId = `${item.main_problem.出典}-${item.main_problem.問題番号}`;
-    const checks = problemChecks[problemId];
-
-    // チェック情報が存在しない場合は未着手
-    if (!checks) return true;
-
-    // checks配列のいずれかのcheckedプロパティがtrueであれば着手済み
-    const isTouched = checks.some(c => c && c.checked);
-
-    // isTouchedがtrueなら着手済みなので、その逆（false）を返す
-    return !isTouched;
-}
@@ -0,0 +1,492 @@
+"""gas/Code.js と同じ doPost プロトコルを SQLite 上で提供するローカルサーバー
+
+開発・テスト時に oyo_gasUrl として http://localhost:8001 を設定すると、
+Google Apps Script の代わりにこのサーバーで認証と同期を行える。
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORT = 8001
+DEFAULT_DB_FILENAME = 'local_gas.sqlite3'
+
+# トークンの有効期限は gas/Code.js と同じ
+ACCESS_TOKEN_TTL = 60 * 60  # 1時間
+REFRESH_TOKEN_TTL = 60 * 24 * 60 * 60  # 60日
+BUSY_TIMEOUT_MS = 10000  # LockService.waitLock(10000) 相当
+
+UNAUTHORIZED = {'error': 'Unauthorized or Access Token Expired'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL,
+    access_token TEXT,
+    access_token_expiry REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_access_token ON users(access_token);
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    token TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL REFERENCES users(user_id),
+    expiry REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user ON refresh_tokens(user_id);
+CREATE TABLE IF NOT EXISTS user_data (
+    user_id TEXT PRIMARY KEY REFERENCES users(user_id),
+    json_data TEXT NOT NULL,
+    last_updated TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    last_edited_by TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_ops (
+    user_id TEXT NOT NULL REFERENCES users(user_id),
+    version INTEGER NOT NULL,
+    ops TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (user_id, version)
+);
+"""
+
+# ペイロードの圧縮形式（gas/Code.js の Payload Encoding と同じ）
+PAYLOAD_ENCODING = 'gzip+base64'
+SUPPORTED_ENCODINGS = [PAYLOAD_ENCODING]
+RESPONSE_COMPRESSION_THRESHOLD = 2048
+CELL_ENCODING_PREFIX = 'gz64:'
+
+# 差分同期の操作ログ（gas/Code.js の Ops シートと同じ扱い）
+OPS_COMPACTION_THRESHOLD = 20
+MAP_FIELDS = ('checks', 'oshi', 'like', 'fear')
+SET_FIELDS = ('favorites', 'archived')
+
+
+def hash_password(password):
+    return hashlib.sha256(password.encode('utf-8')).hexdigest()
+
+
+def iso_now(now):
+    return datetime.fromtimestamp(now, tz=timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+class LocalGasBackend:
+    """Code.js の各アクションを SQLite で実装したもの。
+
+    接続はスレッドごとに持ち、更新系のアクションは BEGIN IMMEDIATE で直列化する。
+    clock はテストでトークンの期限切れを再現するために差し替えられる。
+    """
+
+    def __init__(self, db_path, clock=time.time):
+        self.db_path = db_path
+        self.clock = clock
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        return conn
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def handle(self, params):
+        """doPost と同じく action で振り分け、結果の dict を返す"""
+        try:
+            params = decode_request(params)
+        except Exception as e:
+            return {'error': str(e)}
+        result = self._dispatch(params)
+        # 認証系の応答で対応している圧縮形式を知らせる
+        if params.get('action') in ('login', 'validate', 'refresh') and 'error' not in result:
+            result['encodings'] = SUPPORTED_ENCODINGS
+        return encode_response(result, params.get('acceptEncoding'))
+
+    def _dispatch(self, params):
+        action = params.get('action')
+        handlers = {
+            'register': lambda: self.register(params.get('userId'), params.get('password')),
+            'login': lambda: self.login(params.get('userId'), params.get('password')),
+            'validate': lambda: self.validate(params.get('accessToken')),
+            'refresh': lambda: self.refresh(params.get('refreshToken')),
+            'save': lambda: self.save(params.get('accessToken'), params.get('data'), params.get('version')),
+            'load': lambda: self.load(params.get('accessToken'), params.get('sinceVersion')),
+            'sync': lambda: self.sync(params.get('accessToken'), params.get('ops'), params.get('version')),
+            'clear': lambda: self.clear(params.get('accessToken')),
+        }
+        handler = handlers.get(action)
+        if handler is None:
+            return {'error': 'Invalid action'}
+        try:
+            return handler()
+        except sqlite3.OperationalError as e:
+            if 'locked' in str(e):
+                return {'error': 'Server is busy. Please try again.'}
+            return {'error': str(e)}
+        except Exception as e:
+            return {'error': str(e)}
+
+    def _write(self):
+        """書き込みトランザクション（LockService のスクリプトロック相当）"""
+        return _ImmediateTransaction(self.conn)
+
+    # --- Auth ---
+
+    def register(self, user_id, password):
+        if not user_id or not password:
+            return {'error': 'Missing userId or password'}
+        with self._write() as conn:
+            if conn.execute('SELECT 1 FROM users WHERE user_id = ?', (user_id,)).fetchone():
+                return {'error': 'User already exists'}
+            conn.execute('INSERT INTO users (user_id, password_hash) VALUES (?, ?)',
+                         (user_id, hash_password(password)))
+        return {'success': True, 'message': 'User registered successfully'}
+
+    def login(self, user_id, password):
+        if not user_id or not password:
+            return {'error': 'Missing userId or password'}
+        now = self.clock()
+        with self._write() as conn:
+            row = conn.execute('SELECT password_hash FROM users WHERE user_id = ?', (user_id,)).fetchone()
+            if row is None:
+                return {'error': 'User not found'}
+            if row[0] != hash_password(password):
+                return {'error': 'Invalid password'}
+
+            access_token = str(uuid.uuid4())
+            refresh_token = str(uuid.uuid4())
+            conn.execute('UPDATE users SET access_token = ?, access_token_expiry = ? WHERE user_id = ?',
+                         (access_token, now + ACCESS_TOKEN_TTL, user_id))
+            # 期限切れのリフレッシュトークンを捨てて新しいものを追加（複数端末対応）
+            conn.execute('DELETE FROM refresh_tokens WHERE user_id = ? AND expiry <= ?', (user_id, now))
+            conn.execute('INSERT INTO refresh_tokens (token, user_id, expiry) VALUES (?, ?, ?)',
+                         (refresh_token, user_id, now + REFRESH_TOKEN_TTL))
+        return {
+            'success': True,
+            'accessToken': access_token,
+            'refreshToken': refresh_token,
+            'userId': user_id
+        }
+
+    def validate(self, access_token):
+        if not access_token:
+            return {'valid': False}
+        user_id = self._user_by_access_token(access_token)
+        if user_id:
+            return {'valid': True, 'userId': user_id}
+        return {'valid': False}
+
+    def refresh(self, refresh_token):
+        if not refresh_token:
+            return {'error': 'No refresh token provided.'}
+        now = self.clock()
+        with self._write() as conn:
+            row = conn.execute('SELECT user_id FROM refresh_tokens WHERE token = ? AND expiry > ?',
+                               (refresh_token, now)).fetchone()
+            if row is None:
+                return {'error': 'Invalid or expired refresh token.'}
+            user_id = row[0]
+            access_token = str(uuid.uuid4())
+            conn.execute('UPDATE users SET access_token = ?, access_token_expiry = ? WHERE user_id = ?',
+                         (access_token, now + ACCESS_TOKEN_TTL, user_id))
+        return {'success': True, 'accessToken': access_token, 'userId': user_id}
+
+    # --- Data ---
+
+    def save(self, access_token, json_data, client_version):
+        user_id = self._user_by_access_token(access_token)
+        if not user_id:
+            return UNAUTHORIZED
+        now = self.clock()
+        with self._write() as conn:
+            row = conn.execute('SELECT version, last_edited_by FROM user_data WHERE user_id = ?',
+                               (user_id,)).fetchone()
+            stored_version = row[0] if row else 0
+            last_edited_by = row[1] if row else ''
+
+            # 楽観的ロック（最終更新者が同じユーザーなら競合としない）
+            if row and client_version is not None and last_edited_by != user_id and client_version != stored_version:
+                return {'error': 'ConflictError', 'currentVersion': stored_version, 'lastEditedBy': last_edited_by}
+
+            new_version = stored_version + 1
+            conn.execute(
+                'INSERT INTO user_data (user_id, json_data, last_updated, version, last_edited_by) '
+                'VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(user_id) DO UPDATE SET json_data = excluded.json_data, '
+                'last_updated = excluded.last_updated, version = excluded.version, '
+                'last_edited_by = excluded.last_edited_by',
+                (user_id, encode_cell_data(json_data), iso_now(now), new_version, user_id))
+            # 全体を保存したので、それまでの操作ログは不要
+            conn.execute('DELETE FROM user_ops WHERE user_id = ?', (user_id,))
+        return {'success': True, 'version': new_version}
+
+    def load(self, access_token, since_version=None):
+        user_id = self._user_by_access_token(access_token)
+        if not user_id:
+            return UNAUTHORIZED
+        conn = self.conn
+        conn.execute('BEGIN')
+        try:
+            row = conn.execute('SELECT json_data, version FROM user_data WHERE user_id = ?',
+                               (user_id,)).fetchone()
+            entries = self._read_ops(conn, user_id) if row else []
+        finally:
+            conn.execute('COMMIT')
+        if row is None:
+            return {'data': {}, 'version': 0}
+
+        stored_version = row[1]
+        # クライアントの版以降の操作ログが揃っていれば差分だけを返す
+        if isinstance(since_version, int) and since_version <= stored_version:
+            missed = replayable_ops(entries, since_version, stored_version)
+            if missed is not None:
+                return {'ops': missed, 'version': stored_version, 'delta': True}
+        return {'data': apply_ops(decode_cell_data(row[0]), flatten_ops(entries)), 'version': stored_version}
+
+    def sync(self, access_token, ops, client_version):
+        """前回の同期以降に変更されたエントリ（ops）だけを受け取り、操作ログに追記する"""
+        user_id = self._user_by_access_token(access_token)
+        if not user_id:
+            return UNAUTHORIZED
+        if not isinstance(ops, list):
+            return {'error': 'Missing ops'}
+        now = self.clock()
+        with self._write() as conn:
+            row = conn.execute('SELECT json_data, version, last_edited_by FROM user_data WHERE user_id = ?',
+                               (user_id,)).fetchone()
+            # 基準となるスナップショットが無い、またはクライアントの版の方が新しい場合は全体の送り直しを求める
+            if row is None or client_version is None or client_version > row[1]:
+                return {'error': 'ResyncRequired'}
+            snapshot_json, stored_version, last_edited_by = row
+
+            # 楽観的ロックは save と同じ規則
+            if last_edited_by != user_id and client_version != stored_version:
+                return {'error': 'ConflictError', 'currentVersion': stored_version, 'lastEditedBy': last_edited_by}
+
+            entries = self._read_ops(conn, user_id)
+            # このクライアントがまだ受け取っていない他端末の変更
+            missed = replayable_ops(entries, client_version, stored_version)
+
+            new_version = stored_version
+            if ops:
+                new_version = stored_version + 1
+                conn.execute('INSERT INTO user_ops (user_id, version, ops, created_at) VALUES (?, ?, ?, ?)',
+                             (user_id, new_version, json.dumps(ops, ensure_ascii=False), iso_now(now)))
+                conn.execute('UPDATE user_data SET last_updated = ?, version = ?, last_edited_by = ? '
+                             'WHERE user_id = ?', (iso_now(now), new_version, user_id, user_id))
+                entries.append((new_version, ops))
+
+            snapshot = None
+            if len(entries) >= OPS_COMPACTION_THRESHOLD or missed is None:
+                snapshot = apply_ops(decode_cell_data(snapshot_json), flatten_ops(entries))
+            if len(entries) >= OPS_COMPACTION_THRESHOLD:
+                conn.execute('UPDATE user_data SET json_data = ? WHERE user_id = ?',
+                             (encode_cell_data(snapshot), user_id))
+                conn.execute('DELETE FROM user_ops WHERE user_id = ?', (user_id,))
+
+        if missed is not None:
+            return {'success': True, 'version': new_version, 'ops': missed}
+        # 圧縮や全体保存で途中の操作ログが残っていない場合は、最新の状態をまるごと返す
+        return {'success': True, 'version': new_version, 'data': snapshot}
+
+    def clear(self, access_token):
+        user_id = self._user_by_access_token(access_token)
+        if not user_id:
+            return UNAUTHORIZED
+        with self._write() as conn:
+            conn.execute('DELETE FROM user_data WHERE user_id = ?', (user_id,))
+            conn.execute('DELETE FROM user_ops WHERE user_id = ?', (user_id,))
+        return {'success': True, 'message': f'Data for user {user_id} cleared.'}
+
+    # --- Helpers ---
+
+    @staticmethod
+    def _read_ops(conn, user_id):
+        """ユーザーの操作ログを版の昇順で (version, ops) のリストとして返す"""
+        rows = conn.execute('SELECT version, ops FROM user_ops WHERE user_id = ? ORDER BY version',
+                            (user_id,)).fetchall()
+        return [(version, json.loads(ops)) for version, ops in rows]
+
+    def _user_by_access_token(self, access_token):
+        if not access_token:
+            return None
+        row = self.conn.execute('SELECT user_id, access_token_expiry FROM users WHERE access_token = ?',
+                                (access_token,)).fetchone()
+        if row is None or row[1] is None or row[1] <= self.clock():
+            return None
+        return row[0]
+
+
+def gzip_base64(text):
+    return base64.b64encode(gzip.compress(text.encode('utf-8'))).decode('ascii')
+
+
+def gunzip_base64(encoded):
+    return gzip.decompress(base64.b64decode(encoded)).decode('utf-8')
+
+
+def decode_request(params):
+    """encoding 付きのリクエストは payload を展開して残りのパラメータに戻す"""
+    encoding = params.get('encoding')
+    if not encoding:
+        return params
+    if encoding not in SUPPORTED_ENCODINGS:
+        raise ValueError(f'Unsupported encoding: {encoding}')
+    decoded = {key: value for key, value in params.items() if key not in ('encoding', 'payload')}
+    decoded.update(json.loads(gunzip_base64(params['payload'])))
+    return decoded
+
+
+def encode_response(result, accept_encoding):
+    text = json.dumps(result, ensure_ascii=False)
+    if accept_encoding != PAYLOAD_ENCODING or len(text) < RESPONSE_COMPRESSION_THRESHOLD:
+        return result
+    return {'encoding': PAYLOAD_ENCODING, 'payload': gzip_base64(text)}
+
+
+def encode_cell_data(json_data):
+    """JSON_Data を圧縮形式で保存する（SQLite にはセルの文字数上限が無いので分割はしない）"""
+    return f"{CELL_ENCODING_PREFIX}1:{gzip_base64(json.dumps(json_data, ensure_ascii=False))}"
+
+
+def decode_cell_data(text):
+    """圧縮形式と旧形式（非圧縮の JSON）の両方を読む"""
+    if not text.startswith(CELL_ENCODING_PREFIX):
+        return json.loads(text)
+    return json.loads(gunzip_base64(text[len(CELL_ENCODING_PREFIX):].split(':', 1)[1]))
+
+
+def apply_ops(data, ops):
+    """gas/Code.js の applyOps と同じ規則で操作をデータに適用する"""
+    for op in ops:
+        kind = op.get('t')
+        if kind == 'examDate':
+            data['examDate'] = op.get('v')
+        elif kind in MAP_FIELDS:
+            mapping = data.get(kind) or {}
+            if op.get('v') is None:
+                mapping.pop(op['k'], None)
+            else:
+                mapping[op['k']] = op['v']
+            data[kind] = mapping
+        elif kind in SET_FIELDS:
+            items = data.get(kind) or []
+            if op.get('v') and op['k'] not in items:
+                items.append(op['k'])
+            if not op.get('v') and op['k'] in items:
+                items.remove(op['k'])
+            data[kind] = items
+    return data
+
+
+def flatten_ops(entries):
+    return [op for _, ops in entries for op in ops]
+
+
+def replayable_ops(entries, from_version, to_version):
+    """from_version より後、to_version までの操作がすべて残っていればそれを返す（欠けていれば None）"""
+    missed = [(version, ops) for version, ops in entries if from_version < version <= to_version]
+    if len(missed) != to_version - from_version:
+        return None
+    return flatten_ops(missed)
+
+
+class _ImmediateTransaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+
+class GasRequestHandler(BaseHTTPRequestHandler):
+    """GAS ウェブアプリと同じく、text/plain の JSON ボディを受け取り JSON を返す"""
+
+    backend = None  # make_server で設定する
+
+    def _send_json(self, result):
+        body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.end_headers()
+
+    def do_GET(self):
+        self._send_json({'status': 'active', 'message': 'GAS Backend is running'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            params = json.loads(self.rfile.read(length).decode('utf-8'))
+        except ValueError as e:
+            self._send_json({'error': str(e)})
+            return
+        self._send_json(self.backend.handle(params))
+
+    def log_message(self, format, *args):
+        # 負荷試験でログ出力がボトルネックにならないよう、リクエストごとのログは出さない
+        pass
+
+
+def make_server(db_path, host='', port=PORT, clock=time.time):
+    handler = type('BoundGasRequestHandler', (GasRequestHandler,), {'backend': LocalGasBackend(db_path, clock)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GASバックエンドのローカル代替サーバー（SQLite）を起動します。")
+    parser.add_argument('--port', type=int, default=PORT, help='待ち受けポート')
+    parser.add_argument('--db', type=str, default=DEFAULT_DB_FILENAME, help='SQLiteデータベースのパス')
+    args = parser.parse_args()
+
+    db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), args.db)
+    httpd = make_server(db_path, port=args.port)
+
+    print(f"Local GAS backend at http://localhost:{args.port} (db: {db_path})")
+    print("Set this URL as the GAS Web App URL in the sync settings.")
+    print("Press Ctrl+C to stop the server.")
+
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+    finally:
+        httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
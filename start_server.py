@@ -1,28 +1,461 @@
-import http.server
-import socketserver
+"""アプリの静的ファイルを配信する開発・運用兼用のサーバー
+
+    py start_server.py              # http://localhost:8000
+    py start_server.py --verbose    # リクエストごとにログを出す
+
+- リクエストはスレッドごとに処理する（遅いクライアントが他のリクエストを止めない）
+- 03_html_output/generate_html.py が出力した圧縮済みファイル（.br / .gz）があれば、Accept-Encoding に応じてそれを返す
+- ETag / If-None-Match に 304 で応答し、Range リクエスト（1範囲）に 206 で応答する
+- ハッシュ付きのファイル（problem_data.<hash>.json など）は内容が変わらないので immutable としてキャッシュさせる
+- 本文は socket.sendfile で送る（対応する OS ではカーネル内でコピーされる）
+- ルートごとのリクエスト数・送信バイト数・処理時間を集計し、/metrics で Prometheus のテキスト形式で返す
+"""
+
+import argparse
+import bisect
+import email.utils
 import os
+import re
+import threading
+import time
+from functools import partial
+from http import HTTPStatus
+from http.server import HTTPServer, SimpleHTTPRequestHandler, ThreadingHTTPServer
 
 PORT = 8000
 
-class MyHandler(http.server.SimpleHTTPRequestHandler):
+# 内容のハッシュがファイル名に入っているビルド成果物（generate_html.py の出力）
+HASHED_ASSET_PATTERN = re.compile(r'\.[0-9a-f]{16}\.(json|bin)$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# それ以外（index.html・sw.js・js/*.js など）は毎回 ETag で確認させる
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+# 優先する順。元のファイルより古い圧縮ファイルは使わない
+PRECOMPRESSED_ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+METRICS_PATH = '/metrics'
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# 処理時間のヒストグラムの区切り（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+HASH_IN_PATH_PATTERN = re.compile(r'\.[0-9a-f]{16}\.')
+
+
+def accepted_encodings(header):
+    """Accept-Encoding から受け付ける（q=0 でない）エンコーディングの集合を返す"""
+    accepted = set()
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def make_etag(stat, encoding):
+    suffix = f"-{encoding}" if encoding else ''
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}{suffix}"'
+
+
+def etag_matches(header, etag):
+    if header is None:
+        return False
+    if header.strip() == '*':
+        return True
+    # 弱い比較（W/ の有無は問わない）
+    candidates = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return etag in candidates
+
+
+def parse_range(header, size):
+    """Range ヘッダーから (開始, 長さ) を返す。対応しない形式なら None、範囲外なら ValueError"""
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if start == '' and end == '':
+        return None
+    if start == '':
+        # 末尾から end バイト
+        length = min(int(end), size)
+        if length == 0:
+            raise ValueError('unsatisfiable range')
+        return size - length, length
+    start = int(start)
+    end = size - 1 if end == '' else min(int(end), size - 1)
+    if start >= size or end < start:
+        raise ValueError('unsatisfiable range')
+    return start, end - start + 1
+
+
+# リクエスト行やヘッダーが不正だったときの応答。パスが読めていないか信用できないので1つのルートにまとめる
+INVALID_REQUEST_STATUSES = {HTTPStatus.BAD_REQUEST, HTTPStatus.REQUEST_URI_TOO_LONG,
+                            HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, HTTPStatus.HTTP_VERSION_NOT_SUPPORTED}
+
+
+def route_label(path, status):
+    """メトリクスのルート名。ハッシュ部分はまとめ、存在しないパスや不正なリクエストは1つにまとめて種類が増えすぎないようにする"""
+    if path is None or status in INVALID_REQUEST_STATUSES:
+        return 'invalid'
+    if status == HTTPStatus.NOT_FOUND:
+        return 'unmatched'
+    path = path.split('?', 1)[0].split('#', 1)[0]
+    return HASH_IN_PATH_PATTERN.sub('.{hash}.', path)
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def estimate_quantile(q, bucket_counts, total):
+    """ヒストグラムから分位点を線形補間で推定する（Prometheus の histogram_quantile と同じ考え方）"""
+    if total == 0:
+        return float('nan')
+    rank = q * total
+    cumulative = 0
+    for index, count in enumerate(bucket_counts):
+        if cumulative + count >= rank and count > 0:
+            if index == len(LATENCY_BUCKETS):
+                # 最大の区切りを超えた分は、その区切りの値とする
+                return LATENCY_BUCKETS[-1]
+            lower = LATENCY_BUCKETS[index - 1] if index > 0 else 0.0
+            upper = LATENCY_BUCKETS[index]
+            return lower + (upper - lower) * (rank - cumulative) / count
+        cumulative += count
+    return LATENCY_BUCKETS[-1]
+
+
+class RouteStats:
+    __slots__ = ('statuses', 'bytes_sent', 'bucket_counts', 'latency_sum', 'count')
+
+    def __init__(self):
+        self.statuses = {}
+        self.bytes_sent = 0
+        # 区切りごとの件数（累積ではない）。最後の要素は最大の区切りを超えたもの
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.count = 0
+
+
+class ServerMetrics:
+    """リクエストの集計。記録は1回のロックと数回の加算だけにして、配信の邪魔にならないようにする"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._in_flight = 0
+        self.started_at = time.time()
+
+    def request_started(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def request_done(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def request_finished(self, route, status, bytes_sent, seconds):
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = RouteStats()
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.bytes_sent += bytes_sent
+            stats.bucket_counts[bucket] += 1
+            stats.latency_sum += seconds
+            stats.count += 1
+
+    def render(self):
+        """Prometheus のテキスト形式（version 0.0.4）"""
+        with self._lock:
+            in_flight = self._in_flight
+            routes = {route: (dict(stats.statuses), stats.bytes_sent, list(stats.bucket_counts), stats.latency_sum, stats.count)
+                      for route, stats in self._routes.items()}
+
+        lines = [
+            '# HELP http_requests_total Number of HTTP requests by route and status.',
+            '# TYPE http_requests_total counter',
+        ]
+        for route, (statuses, *_rest) in sorted(routes.items()):
+            for status, count in sorted(statuses.items()):
+                lines.append(f'http_requests_total{{route="{escape_label(route)}",status="{status}"}} {count}')
+
+        lines += [
+            '# HELP http_response_bytes_total Response body bytes sent by route.',
+            '# TYPE http_response_bytes_total counter',
+        ]
+        for route, (_, bytes_sent, *_rest) in sorted(routes.items()):
+            lines.append(f'http_response_bytes_total{{route="{escape_label(route)}"}} {bytes_sent}')
+
+        lines += [
+            '# HELP http_request_duration_seconds Time spent handling requests by route.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for route, (_, _, bucket_counts, latency_sum, count) in sorted(routes.items()):
+            label = escape_label(route)
+            cumulative = 0
+            for upper, bucket_count in zip(LATENCY_BUCKETS, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'http_request_duration_seconds_bucket{{route="{label}",le="{upper}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_bucket{{route="{label}",le="+Inf"}} {count}')
+            lines.append(f'http_request_duration_seconds_sum{{route="{label}"}} {latency_sum:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{route="{label}"}} {count}')
+
+        lines += [
+            '# HELP http_request_duration_quantile_seconds Request duration quantiles estimated from the histogram.',
+            '# TYPE http_request_duration_quantile_seconds gauge',
+        ]
+        for route, (_, _, bucket_counts, _, count) in sorted(routes.items()):
+            for q in LATENCY_QUANTILES:
+                value = estimate_quantile(q, bucket_counts, count)
+                lines.append(f'http_request_duration_quantile_seconds{{route="{escape_label(route)}",quantile="{q}"}} {value:.6f}')
+
+        lines += [
+            '# HELP http_requests_in_flight Requests currently being handled.',
+            '# TYPE http_requests_in_flight gauge',
+            f'http_requests_in_flight {in_flight}',
+            '# HELP process_start_time_seconds Start time of the server since unix epoch in seconds.',
+            '# TYPE process_start_time_seconds gauge',
+            f'process_start_time_seconds {self.started_at:.3f}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+class StaticFileHandler(SimpleHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    verbose = False
+    metrics = None
+    extensions_map = {
+        **SimpleHTTPRequestHandler.extensions_map,
+        # Windows ではレジストリの設定で .js が text/plain になることがあり、モジュールとして読み込めなくなる
+        '.js': 'text/javascript',
+        '.mjs': 'text/javascript',
+        '.json': 'application/json',
+        '.bin': 'application/octet-stream',
+    }
+
+    # --- メトリクス: リクエスト行を読んでから応答を送り終えるまでを測る ---
+    def handle_one_request(self):
+        self._started = None
+        self._status = None
+        self._content_length = None
+        self._body_bytes = None
+        try:
+            super().handle_one_request()
+        finally:
+            if self._started is not None and self.metrics is not None:
+                # 記録に失敗しても処理中の数は必ず戻す
+                try:
+                    self.record_request()
+                finally:
+                    self.metrics.request_done()
+
+    def record_request(self):
+        status = self._status or 0
+        body_bytes = self._body_bytes
+        if body_bytes is None:
+            # 標準の処理（エラーやディレクトリ一覧）の本文は Content-Length の分だけ送られている
+            no_body = self.command == 'HEAD' or status in (HTTPStatus.NO_CONTENT, HTTPStatus.NOT_MODIFIED)
+            body_bytes = 0 if no_body or self._content_length is None else self._content_length
+        # リクエスト行が不正だと path は設定されない
+        self.metrics.request_finished(route_label(getattr(self, 'path', None), status), status, body_bytes,
+                                      time.perf_counter() - self._started)
+
+    def parse_request(self):
+        self._started = time.perf_counter()
+        if self.metrics is not None:
+            self.metrics.request_started()
+        return super().parse_request()
+
+    def send_response(self, code, message=None):
+        self._status = int(code)
+        super().send_response(code, message)
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'content-length':
+            self._content_length = int(value)
+        super().send_header(keyword, value)
+
     def do_GET(self):
-        # リクエストされたパスをログに出力
-        print(f"Serving: {self.path}")
-        return http.server.SimpleHTTPRequestHandler.do_GET(self)
-
-# 現在のスクリプトのディレクトリをWebサーバーのルートにする
-web_dir = os.path.join(os.path.dirname(__file__))
-os.chdir(web_dir)
-
-Handler = MyHandler
-httpd = socketserver.TCPServer(("", PORT), Handler)
-
-print(f"Serving at http://localhost:{PORT}")
-print("Press Ctrl+C to stop the server.")
-
-try:
-    httpd.serve_forever()
-except KeyboardInterrupt:
-    print("\nServer stopped.")
-    httpd.shutdown()
-    socketserver.TCPServer.server_close(httpd)
+        if self.metrics is not None and self.path.split('?', 1)[0] == METRICS_PATH:
+            self.send_metrics()
+            return
+        self.serve_file(send_body=True)
+
+    def send_metrics(self):
+        body = self.metrics.render().encode('utf-8')
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', METRICS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.serve_file(send_body=False)
+
+    def serve_file(self, send_body):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            index = os.path.join(path, 'index.html')
+            if not self.path.split('?', 1)[0].endswith('/') or not os.path.isfile(index):
+                # 末尾 / へのリダイレクトやディレクトリ一覧は標準の処理に任せる
+                return super().do_GET() if send_body else super().do_HEAD()
+            path = index
+        if not os.path.isfile(path):
+            self.send_error(HTTPStatus.NOT_FOUND, 'File not found')
+            return
+
+        range_header = self.headers.get('Range')
+        encoding, file_path, has_variants = self.select_variant(path, allow_compressed=range_header is None)
+        try:
+            f = open(file_path, 'rb')
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, 'File not found')
+            return
+
+        with f:
+            stat = os.fstat(f.fileno())
+            etag = make_etag(stat, encoding)
+            offset, length = 0, stat.st_size
+            status = HTTPStatus.OK
+
+            if self.not_modified(etag, stat):
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_validators(path, etag, stat, has_variants)
+                self.end_headers()
+                return
+
+            if range_header and self.if_range_matches(etag, stat):
+                try:
+                    requested = parse_range(range_header, stat.st_size)
+                except ValueError:
+                    self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                    self.send_header('Content-Range', f'bytes */{stat.st_size}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if requested:
+                    offset, length = requested
+                    status = HTTPStatus.PARTIAL_CONTENT
+
+            self.send_response(status)
+            self.send_header('Content-Type', self.guess_type(path))
+            self.send_header('Content-Length', str(length))
+            if status == HTTPStatus.PARTIAL_CONTENT:
+                self.send_header('Content-Range', f'bytes {offset}-{offset + length - 1}/{stat.st_size}')
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            self.send_validators(path, etag, stat, has_variants)
+            self.end_headers()
+
+            if send_body and length > 0:
+                self.wfile.flush()
+                try:
+                    self._body_bytes = self.connection.sendfile(f, offset, length)
+                except (BrokenPipeError, ConnectionResetError):
+                    # 途中でクライアントが切断した
+                    self._body_bytes = 0
+                    self.close_connection = True
+
+    def select_variant(self, path, allow_compressed):
+        """(エンコーディング, 送るファイル, 圧縮版があるか) を返す"""
+        variants = []
+        original_mtime = os.stat(path).st_mtime_ns
+        for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+            try:
+                if os.stat(path + suffix).st_mtime_ns >= original_mtime:
+                    variants.append((encoding, path + suffix))
+            except OSError:
+                continue
+        if allow_compressed and variants:
+            accepted = accepted_encodings(self.headers.get('Accept-Encoding'))
+            for encoding, variant_path in variants:
+                if encoding in accepted:
+                    return encoding, variant_path, True
+        return None, path, bool(variants)
+
+    def send_validators(self, path, etag, stat, has_variants):
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', self.date_time_string(stat.st_mtime))
+        self.send_header('Accept-Ranges', 'bytes')
+        hashed = HASHED_ASSET_PATTERN.search(os.path.basename(path))
+        self.send_header('Cache-Control', IMMUTABLE_CACHE_CONTROL if hashed else REVALIDATE_CACHE_CONTROL)
+        if has_variants:
+            self.send_header('Vary', 'Accept-Encoding')
+
+    def not_modified(self, etag, stat):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return etag_matches(if_none_match, etag)
+        return self.not_modified_since(self.headers.get('If-Modified-Since'), stat)
+
+    def if_range_matches(self, etag, stat):
+        if_range = self.headers.get('If-Range')
+        if if_range is None:
+            return True
+        if if_range.strip().startswith(('"', 'W/')):
+            return if_range.strip() == etag
+        return self.not_modified_since(if_range, stat)
+
+    @staticmethod
+    def not_modified_since(header, stat):
+        if not header:
+            return False
+        try:
+            since = email.utils.parsedate_to_datetime(header)
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+        return since is not None and int(stat.st_mtime) <= since.timestamp()
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(root, host='', port=PORT, threaded=True, verbose=False, metrics=True):
+    """metrics=False で /metrics と集計を無効にする（ServerMetrics を渡せばそれに集計する）"""
+    if metrics is True:
+        metrics = ServerMetrics()
+    handler = type('BoundStaticFileHandler', (StaticFileHandler,), {'verbose': verbose, 'metrics': metrics or None})
+    server_class = ThreadingHTTPServer if threaded else HTTPServer
+    return server_class((host, port), partial(handler, directory=root))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='アプリの静的ファイルを配信します。')
+    parser.add_argument('--port', type=int, default=PORT, help='待ち受けるポート')
+    parser.add_argument('--host', type=str, default='', help='待ち受けるアドレス（既定: すべて）')
+    parser.add_argument('--single_thread', action='store_true', help='リクエストを1つずつ処理する（以前の動作）')
+    parser.add_argument('--verbose', action='store_true', help='リクエストごとにログを出す')
+    parser.add_argument('--no_metrics', action='store_true', help=f'リクエストの集計と {METRICS_PATH} を無効にする')
+    args = parser.parse_args()
+
+    # 現在のスクリプトのディレクトリをWebサーバーのルートにする
+    web_dir = os.path.dirname(os.path.abspath(__file__))
+    httpd = make_server(web_dir, args.host, args.port, threaded=not args.single_thread, verbose=args.verbose,
+                        metrics=not args.no_metrics)
+
+    print(f"Serving at http://localhost:{args.port}")
+    if not args.no_metrics:
+        print(f"Metrics at http://localhost:{args.port}{METRICS_PATH}")
+    print("Press Ctrl+C to stop the server.")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+    finally:
+        httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
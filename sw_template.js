@@ -0,0 +1,51 @@
+// Service Worker: 静的ファイルをビルドごとのキャッシュに保存し、2回目以降やオフラインでも起動できるようにする
+// 03_html_output/generate_html.py がビルドのバージョンとキャッシュするファイルの一覧を埋め込んで sw.js を生成する。
+// 問題データ本体と埋め込みベクトルは IndexedDB（js/offline-cache.js）に保存するので、ここではキャッシュしない。
+const BUILD_VERSION = '__BUILD_VERSION__';
+const PRECACHE_URLS = __PRECACHE_URLS__;
+const CACHE_PREFIX = 'oyo-static-';
+const CACHE_NAME = CACHE_PREFIX + BUILD_VERSION;
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(CACHE_NAME)
+            .then(cache => cache.addAll(PRECACHE_URLS))
+            .then(() => self.skipWaiting())
+    );
+});
+
+// 以前のビルドのキャッシュを削除する
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(keys
+                .filter(key => key.startsWith(CACHE_PREFIX) && key !== CACHE_NAME)
+                .map(key => caches.delete(key))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+    // GAS との通信（POST・別オリジン）と問題データ・埋め込みベクトル（IndexedDB 側で管理）はそのまま通す
+    if (request.method !== 'GET' || url.origin !== self.location.origin || url.pathname.endsWith('.json') || url.pathname.endsWith('.bin')) {
+        return;
+    }
+
+    if (request.mode === 'navigate') {
+        // index.html は新しいビルドに気付けるようネットワークを優先し、つながらない場合だけキャッシュを使う
+        event.respondWith(
+            fetch(request).catch(() => caches.open(CACHE_NAME)
+                .then(cache => cache.match(request, { ignoreSearch: true }).then(cached => cached || cache.match('index.html'))))
+        );
+        return;
+    }
+
+    // それ以外の静的ファイルはビルドごとに固定なのでキャッシュを優先する（?v=1 などのクエリは無視）
+    event.respondWith(
+        caches.open(CACHE_NAME)
+            .then(cache => cache.match(request, { ignoreSearch: true }))
+            .then(cached => cached || fetch(request))
+    );
+});
@@ -1,7 +1,13 @@
+import importlib.util
 import pytest
+import subprocess
 import sys
 import os
 import time
+import threading
+
+import numpy as np
+import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
@@ -11,6 +17,7 @@ from selenium.webdriver.support import expected_conditions as EC
 # Add root directory to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import test_config
+import local_gas_server
 
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
@@ -38,15 +45,27 @@ def wait(driver):
 def base_url():
     return test_config.BASE_URL
 
+@pytest.fixture(scope="session")
+def gas_url(tmp_path_factory):
+    """Returns TEST_GAS_URL, or starts the local SQLite backend when it is not configured."""
+    if test_config.TEST_GAS_URL:
+        yield test_config.TEST_GAS_URL
+        return
+
+    db_path = tmp_path_factory.mktemp("local_gas") / "gas.sqlite3"
+    httpd = local_gas_server.make_server(str(db_path), host="127.0.0.1", port=0)
+    # Same credentials as the login_user fixture
+    httpd.RequestHandlerClass.backend.register("testuser", "password123")
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://localhost:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
 @pytest.fixture(scope="function")
-def setup_gas_url(driver, base_url):
-    """Sets the GAS URL in localStorage if configured."""
+def setup_gas_url(driver, base_url, gas_url):
+    """Sets the GAS URL in localStorage (configured test URL or the local backend)."""
     driver.get(base_url)
     
-    # Use configured URL or a fallback mock to ensure app loads
-    gas_url = test_config.TEST_GAS_URL if test_config.TEST_GAS_URL else "http://mock-url"
-    
-    
     driver.execute_script(f"localStorage.setItem('oyo_gasUrl', '{gas_url}');")
     driver.execute_script("localStorage.setItem('oyo_userId', '');")
     driver.execute_script("localStorage.removeItem('oyo_accessToken');")
@@ -54,7 +73,7 @@ def setup_gas_url(driver, base_url):
     driver.refresh()
 
 @pytest.fixture(scope="function")
-def auto_login_mock(driver, base_url, setup_gas_url):
+def auto_login_mock(driver, base_url, setup_gas_url, gas_url):
     """Injects mock fetch and tokens to simulate a logged-in state."""
     # This new approach avoids multiple refreshes which can cause timing issues.
     # 1. Go to a blank page to ensure a clean state.
@@ -62,7 +81,12 @@ def auto_login_mock(driver, base_url, setup_gas_url):
 
     # 2. Inject a mock fetch script that will run on the *next* page load.
     mock_fetch_script = """
+    const originalFetch = window.fetch;
     window.fetch = async (url, options) => {
+        // Static files such as the problem dataset are fetched with GET and go to the real server
+        if (!options || !options.method || options.method === 'GET') {
+            return originalFetch(url, options);
+        }
         console.log("Mock fetch called for", url);
         // Handle validation
         if (options && options.body && options.body.includes('validate')) {
@@ -91,7 +115,6 @@ def auto_login_mock(driver, base_url, setup_gas_url):
     driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": mock_fetch_script})
 
     # 3. Set all necessary localStorage items BEFORE navigating to the app.
-    gas_url = test_config.TEST_GAS_URL if test_config.TEST_GAS_URL else "http://mock-url"
     driver.execute_script(f"localStorage.setItem('oyo_gasUrl', '{gas_url}');")
     driver.execute_script("localStorage.setItem('oyo_userId', 'testuser_mock');")
     driver.execute_script("localStorage.setItem('oyo_accessToken', 'mock_token');")
@@ -194,3 +217,38 @@ def login_user(driver, base_url, wait, setup_gas_url):
         wait.until(EC.invisibility_of_element_located((By.ID, "login-modal")))
     except Exception as e:
         print(f"Login failed or timed out: {e}")
+
+
+# --- 03_html_output のビルドスクリプトのテスト用 ---
+HTML_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '03_html_output')
+MAIN_PATH = os.path.join(HTML_OUTPUT_DIR, 'main.py')
+LOOKUP_PATH = os.path.join(HTML_OUTPUT_DIR, 'lookup.py')
+
+
+def load_build_module():
+    # main.py は同じディレクトリの neighbor_store.py を import する
+    if HTML_OUTPUT_DIR not in sys.path:
+        sys.path.insert(0, HTML_OUTPUT_DIR)
+    spec = importlib.util.spec_from_file_location('html_output_main', MAIN_PATH)
+    module = importlib.util.module_from_spec(spec)
+    # モデル別の計算はサブプロセスで行うので、関数を名前で引けるよう登録しておく
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_embeddings(count=40):
+    rng = np.random.default_rng(0)
+    rows = []
+    for i in range(count):
+        base = rng.random(8)
+        rows.append({'問題ID': i, '大項目': '1.基礎理論', '中項目': f'中項目{i % 2}', '問題番号': i % 10 + 1,
+                     '問題名': f'問題{i}', 'リンク': 'https://www.ap-siken.com/', '出典': f'R{i}春期 問{i}',
+                     'embedding': base.tolist(),
+                     'vector_copy_of_gemma': base.tolist(),
+                     'vector_random': rng.random(8).tolist()})
+    return pd.DataFrame(rows)
+
+
+def run_lookup(*args):
+    return subprocess.run([sys.executable, LOOKUP_PATH, *args], capture_output=True, text=True, encoding='utf-8')
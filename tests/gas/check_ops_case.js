@@ -0,0 +1,36 @@
+// 大文字・小文字だけが違うユーザーID（Alice / alice）の操作ログ（Ops シート）が混ざらないことを確かめる。
+// 使い方: node tests/gas/check_ops_case.js  （失敗すると assert で終了コードが 0 以外になる）
+const assert = require('assert');
+const { loadBackend } = require('./gas_mock');
+
+const { post, spreadsheet } = loadBackend();
+const login = userId => {
+    assert.ok(post({ action: 'register', userId: userId, password: 'password123' }).success);
+    return post({ action: 'login', userId: userId, password: 'password123' }).accessToken;
+};
+const upper = login('Alice');
+const lower = login('alice');
+
+// 両方のユーザーが版1から差分を送る
+assert.deepStrictEqual(post({ action: 'save', accessToken: upper, data: { favorites: ['A'] }, version: 0 }), { success: true, version: 1 });
+assert.deepStrictEqual(post({ action: 'save', accessToken: lower, data: { favorites: ['a'] }, version: 0 }), { success: true, version: 1 });
+assert.deepStrictEqual(post({ action: 'sync', accessToken: upper, ops: [{ t: 'oshi', k: 'A', v: 1 }], version: 1 }),
+    { success: true, version: 2, ops: [] });
+assert.deepStrictEqual(post({ action: 'sync', accessToken: lower, ops: [{ t: 'oshi', k: 'a', v: 2 }], version: 1 }),
+    { success: true, version: 2, ops: [] });
+
+// 差分の読み込みには自分の操作だけが返る
+assert.deepStrictEqual(post({ action: 'load', accessToken: lower, sinceVersion: 1 }),
+    { ops: [{ t: 'oshi', k: 'a', v: 2 }], version: 2, delta: true });
+assert.deepStrictEqual(post({ action: 'load', accessToken: upper, sinceVersion: 1 }),
+    { ops: [{ t: 'oshi', k: 'A', v: 1 }], version: 2, delta: true });
+
+// 片方の全体保存・クリアで、もう片方の操作ログは消えない
+assert.ok(post({ action: 'save', accessToken: upper, data: { favorites: ['B'] }, version: 2 }).success);
+assert.ok(post({ action: 'clear', accessToken: upper }).success);
+assert.deepStrictEqual(post({ action: 'load', accessToken: lower, sinceVersion: 1 }),
+    { ops: [{ t: 'oshi', k: 'a', v: 2 }], version: 2, delta: true });
+const opsUsers = spreadsheet.getSheetByName('Ops').rows.slice(1).map(row => row[0]);
+assert.deepStrictEqual(opsUsers, ['alice']);
+
+console.log(JSON.stringify({ ok: true }));
@@ -0,0 +1,105 @@
+// 合成ユーザーを大量に入れたモックのスプレッドシートで gas/Code.js を動かし、
+// 1リクエストあたりに読むセル数がユーザー数に依存しないこと、索引が外れても正しく引けること、
+// 索引に無いトークンで索引全体を作り直さないことを確かめる。
+// 使い方: node tests/gas/check_row_index.js [ユーザー数...]  （結果を JSON で標準出力に出す）
+const assert = require('assert');
+const { loadBackend, stats } = require('./gas_mock');
+
+const PASSWORD = 'password123';
+const SAMPLED_USERS = 50;
+
+function populate(backend, userCount) {
+    const usersSheet = backend.spreadsheet.insertSheet('Users');
+    usersSheet.appendRow(['UserId', 'PasswordHash', 'AccessToken', 'AccessTokenExpiry', 'RefreshTokens']);
+    const dataSheet = backend.spreadsheet.insertSheet('Data');
+    dataSheet.appendRow(['UserId', 'JSON_Data', 'LastUpdated', 'Version', 'LastEditedBy']);
+
+    const passwordHash = backend.hashPassword(PASSWORD);
+    const now = new Date().toISOString();
+    for (let i = 0; i < userCount; i++) {
+        const userId = `user${i}`;
+        usersSheet.appendRow([userId, passwordHash, '', '', '[]']);
+        // 旧形式（非圧縮の JSON）の行
+        dataSheet.appendRow([userId, JSON.stringify({ favorites: [userId] }), now, 1, userId]);
+    }
+}
+
+function run(userCount) {
+    const backend = loadBackend();
+    const { post } = backend;
+    populate(backend, userCount);
+
+    // 初回は索引が無いのでシートを走査して作る
+    stats.cellsRead = 0;
+    const first = post({ action: 'login', userId: 'user0', password: PASSWORD });
+    assert.ok(first.success);
+    assert.strictEqual(post({ action: 'load', accessToken: first.accessToken }).version, 1);
+    const rebuildCells = stats.cellsRead;
+
+    const step = Math.max(1, Math.floor(userCount / SAMPLED_USERS));
+    const sampled = [];
+    for (let i = 0; i < userCount && sampled.length < SAMPLED_USERS; i += step) sampled.push(`user${i}`);
+
+    // 索引作成後は、ログイン（索引に載っていない新しいトークンの登録を含む）・保存・読み込みともシートを走査しない
+    sampled.forEach(userId => post({ action: 'login', userId: userId, password: PASSWORD }));
+    stats.cellsRead = 0;
+    let requests = 0;
+    const tokens = {};
+    sampled.forEach(userId => {
+        const login = post({ action: 'login', userId: userId, password: PASSWORD });
+        tokens[userId] = login.accessToken;
+        assert.deepStrictEqual(post({ action: 'load', accessToken: login.accessToken }),
+            { data: { favorites: [userId] }, version: 1 });
+        const saved = post({ action: 'save', accessToken: login.accessToken, data: { favorites: [userId, 'X'] }, version: 1 });
+        assert.deepStrictEqual(saved, { success: true, version: 2 });
+        const synced = post({ action: 'sync', accessToken: login.accessToken, ops: [{ t: 'oshi', k: 'X', v: 1 }], version: 2 });
+        assert.deepStrictEqual(synced, { success: true, version: 3, ops: [] });
+        requests += 4;
+    });
+    const cellsPerRequest = stats.cellsRead / requests;
+
+    // 別の端末のログインで置き換えられたトークンは、シートを走査せず索引も作り直さずに拒否する
+    const replaced = sampled[0];
+    const oldToken = tokens[replaced];
+    tokens[replaced] = post({ action: 'login', userId: replaced, password: PASSWORD }).accessToken;
+    stats.cellsRead = 0;
+    stats.cacheWrites = 0;
+    assert.strictEqual(post({ action: 'validate', accessToken: oldToken }).valid, false);
+    const supersededCells = stats.cellsRead;
+    const supersededCacheWrites = stats.cacheWrites;
+
+    // 不正なトークンは1回目だけ走査し（索引は作り直さない）、2回目以降は走査しない
+    stats.cellsRead = 0;
+    stats.cacheWrites = 0;
+    assert.strictEqual(post({ action: 'validate', accessToken: 'bogus-token' }).valid, false);
+    const missCacheWrites = stats.cacheWrites;
+    stats.cellsRead = 0;
+    assert.strictEqual(post({ action: 'validate', accessToken: 'bogus-token' }).valid, false);
+    const repeatedMissCells = stats.cellsRead;
+
+    // 途中の行を削除して後続の行番号がずれても、照合で外れて作り直される
+    const middle = sampled[Math.floor(sampled.length / 2)];
+    assert.ok(post({ action: 'clear', accessToken: tokens[middle] }).success);
+    sampled.filter(userId => userId !== middle).forEach(userId => {
+        assert.deepStrictEqual(post({ action: 'load', accessToken: tokens[userId] }),
+            { data: { favorites: [userId, 'X'], oshi: { X: 1 } }, version: 3 });
+    });
+    assert.deepStrictEqual(post({ action: 'load', accessToken: tokens[middle] }), { data: {}, version: 0 });
+
+    // キャッシュが追い出されても引き直せる。無効なトークンは従来どおり拒否する
+    backend.cache.clear();
+    assert.strictEqual(post({ action: 'validate', accessToken: tokens[sampled[1]] }).valid, true);
+    assert.strictEqual(post({ action: 'validate', accessToken: 'no-such-token' }).valid, false);
+    const refreshed = post({ action: 'refresh', refreshToken: first.refreshToken });
+    assert.ok(refreshed.success && refreshed.userId === 'user0');
+    assert.deepStrictEqual(post({ action: 'register', userId: sampled[2], password: 'x' }), { error: 'User already exists' });
+
+    return {
+        users: userCount, rebuildCells: rebuildCells, requests: requests, cellsPerRequest: cellsPerRequest,
+        supersededCells: supersededCells, supersededCacheWrites: supersededCacheWrites,
+        missCacheWrites: missCacheWrites, repeatedMissCells: repeatedMissCells
+    };
+}
+
+const counts = process.argv.slice(2).map(Number);
+console.log(JSON.stringify((counts.length ? counts : [100, 5000]).map(run)));
@@ -0,0 +1,221 @@
+// gas/Code.js を Node 上で動かすための Spreadsheet / Cache などの Apps Script API の簡易モック
+// シートはメモリ上の2次元配列で、getValues で読んだセル数を stats.cellsRead に、
+// キャッシュに書き込んだキーの数を stats.cacheWrites に数える。
+const crypto = require('crypto');
+const fs = require('fs');
+const path = require('path');
+const vm = require('vm');
+const zlib = require('zlib');
+
+const stats = { cellsRead: 0, cacheWrites: 0 };
+
+class MockRange {
+    constructor(sheet, row, column, numRows, numColumns) {
+        this.sheet = sheet;
+        this.row = row;
+        this.column = column;
+        this.numRows = numRows;
+        this.numColumns = numColumns;
+    }
+
+    getRow() {
+        return this.row;
+    }
+
+    getValues() {
+        stats.cellsRead += this.numRows * this.numColumns;
+        const values = [];
+        for (let r = 0; r < this.numRows; r++) {
+            const source = this.sheet.rows[this.row - 1 + r] || [];
+            const row = [];
+            for (let c = 0; c < this.numColumns; c++) {
+                const value = source[this.column - 1 + c];
+                row.push(value === undefined ? '' : value);
+            }
+            values.push(row);
+        }
+        return values;
+    }
+
+    setValue(value) {
+        this.setValues([[value]]);
+    }
+
+    setValues(values) {
+        values.forEach((rowValues, r) => {
+            const rowIndex = this.row - 1 + r;
+            while (this.sheet.rows.length <= rowIndex) this.sheet.rows.push([]);
+            rowValues.forEach((value, c) => {
+                this.sheet.rows[rowIndex][this.column - 1 + c] = value;
+            });
+        });
+    }
+
+    // Apps Script と同じく、既定では大文字・小文字を区別せず、セルの一部に含まれていれば一致とする
+    createTextFinder(text) {
+        const range = this;
+        let matchCase = false;
+        let entireCell = false;
+        return {
+            matchCase(value) {
+                matchCase = value;
+                return this;
+            },
+            matchEntireCell(value) {
+                entireCell = value;
+                return this;
+            },
+            findAll() {
+                const found = [];
+                const target = matchCase ? text : text.toLowerCase();
+                range.getValues().forEach((row, r) => {
+                    row.forEach((value, c) => {
+                        const cell = matchCase ? String(value) : String(value).toLowerCase();
+                        if (entireCell ? cell === target : cell.includes(target)) {
+                            found.push(new MockRange(range.sheet, range.row + r, range.column + c, 1, 1));
+                        }
+                    });
+                });
+                // TextFinder はサーバー側で検索するので、読んだセル数には含めない
+                stats.cellsRead -= range.numRows * range.numColumns;
+                return found;
+            }
+        };
+    }
+}
+
+class MockSheet {
+    constructor(name) {
+        this.name = name;
+        this.rows = [];
+    }
+
+    getName() {
+        return this.name;
+    }
+
+    getLastRow() {
+        return this.rows.length;
+    }
+
+    getLastColumn() {
+        return this.rows.reduce((max, row) => Math.max(max, row.length), 0);
+    }
+
+    getRange(row, column, numRows = 1, numColumns = 1) {
+        return new MockRange(this, row, column, numRows, numColumns);
+    }
+
+    getDataRange() {
+        return new MockRange(this, 1, 1, this.getLastRow(), this.getLastColumn());
+    }
+
+    appendRow(values) {
+        this.rows.push(values.slice());
+    }
+
+    deleteRow(rowNumber) {
+        this.rows.splice(rowNumber - 1, 1);
+    }
+}
+
+class MockSpreadsheet {
+    constructor() {
+        this.sheets = new Map();
+    }
+
+    getId() {
+        return 'mock-spreadsheet';
+    }
+
+    getSheetByName(name) {
+        return this.sheets.get(name) || null;
+    }
+
+    insertSheet(name) {
+        const sheet = new MockSheet(name);
+        this.sheets.set(name, sheet);
+        return sheet;
+    }
+}
+
+class MockCache {
+    constructor() {
+        this.entries = new Map();
+    }
+
+    get(key) {
+        return this.entries.has(key) ? this.entries.get(key) : null;
+    }
+
+    put(key, value) {
+        stats.cacheWrites += 1;
+        this.entries.set(key, String(value));
+    }
+
+    putAll(values) {
+        Object.keys(values).forEach(key => this.put(key, values[key]));
+    }
+
+    remove(key) {
+        this.entries.delete(key);
+    }
+
+    // キャッシュの追い出しを再現する
+    clear() {
+        this.entries.clear();
+    }
+}
+
+function toSignedBytes(buffer) {
+    return Array.from(buffer, b => (b > 127 ? b - 256 : b));
+}
+
+function newBlob(data) {
+    const buffer = typeof data === 'string' ? Buffer.from(data, 'utf-8') : Buffer.from(data.map(b => b & 0xff));
+    return {
+        getBytes: () => toSignedBytes(buffer),
+        getDataAsString: () => buffer.toString('utf-8')
+    };
+}
+
+const Utilities = {
+    DigestAlgorithm: { SHA_256: 'sha256' },
+    getUuid: () => crypto.randomUUID(),
+    computeDigest: (algorithm, text) => toSignedBytes(crypto.createHash(algorithm).update(text, 'utf-8').digest()),
+    newBlob: newBlob,
+    gzip: blob => newBlob(toSignedBytes(zlib.gzipSync(Buffer.from(blob.getBytes().map(b => b & 0xff))))),
+    ungzip: blob => newBlob(toSignedBytes(zlib.gunzipSync(Buffer.from(blob.getBytes().map(b => b & 0xff))))),
+    base64Encode: bytes => Buffer.from(bytes.map(b => b & 0xff)).toString('base64'),
+    base64Decode: text => toSignedBytes(Buffer.from(text, 'base64'))
+};
+
+// Code.js を新しいモック環境に読み込み、doPost を呼べる状態で返す
+function loadBackend() {
+    const spreadsheet = new MockSpreadsheet();
+    const cache = new MockCache();
+    const context = vm.createContext({
+        console: console,
+        SpreadsheetApp: {
+            openById: () => spreadsheet,
+            getActiveSpreadsheet: () => spreadsheet
+        },
+        PropertiesService: {
+            getScriptProperties: () => ({ getProperty: () => spreadsheet.getId() })
+        },
+        CacheService: { getScriptCache: () => cache },
+        LockService: { getScriptLock: () => ({ waitLock() {}, releaseLock() {} }) },
+        ContentService: {
+            MimeType: { JSON: 'application/json' },
+            createTextOutput: text => ({ setMimeType() { return this; }, getContent: () => text })
+        },
+        Utilities: Utilities
+    });
+    const code = fs.readFileSync(path.join(__dirname, '..', '..', 'gas', 'Code.js'), 'utf-8');
+    vm.runInContext(code, context);
+
+    const post = params => JSON.parse(context.doPost({ postData: { contents: JSON.stringify(params) } }).getContent());
+    return { context, spreadsheet, cache, post, hashPassword: context.hashPassword };
+}
+
+module.exports = { loadBackend, stats };
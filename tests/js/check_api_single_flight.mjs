@@ -0,0 +1,66 @@
+// js/api.js の postToGas を、期限切れを返す偽の GAS に対して同時に呼ぶ。
+// 使い方: node tests/js/check_api_single_flight.mjs
+//   バックエンドへの呼び出し回数と各呼び出しの結果を JSON で標準出力に出す
+const values = new Map();
+globalThis.localStorage = {
+    getItem: key => (values.has(key) ? values.get(key) : null),
+    setItem: (key, value) => values.set(key, String(value)),
+    removeItem: key => values.delete(key)
+};
+globalThis.window = globalThis;
+globalThis.addEventListener = () => {};
+globalThis.dispatchEvent = () => true;
+globalThis.document = { addEventListener: () => {}, getElementById: () => null, visibilityState: 'visible' };
+
+// 偽の GAS: アクセストークンは refresh のたびに新しくなり、古いトークンには Expired を返す
+const calls = [];
+let currentToken = 'token-0';
+let refreshCount = 0;
+const respond = (body, delay) => new Promise(resolve => setTimeout(() => resolve({
+    ok: true,
+    json: async () => body
+}), delay));
+globalThis.fetch = async (url, options) => {
+    const body = JSON.parse(options.body);
+    calls.push(body.action);
+    if (body.action === 'refresh') {
+        refreshCount += 1;
+        currentToken = `token-${refreshCount}`;
+        return respond({ success: true, accessToken: currentToken }, 30);
+    }
+    if (body.accessToken !== currentToken) return respond({ error: 'Expired' }, 5);
+    if (body.action === 'load') return respond({ version: 3, data: { checks: { a: [true] } } }, 20);
+    return respond({ success: true, action: body.action, token: body.accessToken }, 5);
+};
+
+const { storage } = await import(new URL('../../js/storage.js', import.meta.url));
+const api = await import(new URL('../../js/api.js', import.meta.url));
+storage.saveGasConfig('https://example.invalid/exec', 'user1');
+storage.accessToken = 'expired-token';
+storage.refreshToken = 'refresh-token';
+
+// 期限切れのトークンで保存と同期を同時に送る
+const results = await Promise.all([
+    api.saveUserData({}, 1),
+    api.syncUserData([], 1),
+    api.clearUserData()
+]);
+const afterAuth = calls.length;
+
+// 同じ load を同時に3回呼ぶ
+const loads = await Promise.all([api.loadUserData(3), api.loadUserData(3), api.loadUserData(3)]);
+loads[0].data.checks.a.push('changed');
+const afterLoads = calls.length;
+await api.loadUserData(3);
+
+process.stdout.write(JSON.stringify({
+    calls,
+    refreshCount,
+    tokens: results.map(result => result.token),
+    storedToken: storage.accessToken,
+    authCalls: afterAuth,
+    loadCalls: afterLoads - afterAuth,
+    loadsShared: loads.every(load => load.version === 3),
+    loadsIndependent: loads[1].data.checks.a.length === 1,
+    loadCallsAfterSettled: calls.length - afterLoads
+}));
@@ -0,0 +1,23 @@
+// js/embedding-search.js で、main.py が出力した埋め込みベクトルのバイナリを読み込んで検索する。
+// 使い方: node tests/js/check_embedding_search.mjs <embeddings.bin> <queries.json>
+//   queries.json: [{ problemId, k（null で上限なし）, minScore, candidates }]
+//   結果を [{ ids, scores }] の JSON で標準出力に出す
+import fs from 'fs';
+
+const source = fs.readFileSync(new URL('../../js/embedding-search.js', import.meta.url), 'utf-8');
+const { parseEmbeddings, searchSimilar } = await import(`data:text/javascript,${encodeURIComponent(source)}`);
+
+const [binaryPath, queriesPath] = process.argv.slice(2);
+const bytes = fs.readFileSync(binaryPath);
+const embeddings = parseEmbeddings(bytes.buffer.slice(bytes.byteOffset, bytes.byteOffset + bytes.byteLength));
+const queries = JSON.parse(fs.readFileSync(queriesPath, 'utf-8'));
+
+const results = queries.map(({ problemId, k, minScore, candidates }) => {
+    const { ids, scores } = searchSimilar(embeddings, problemId, {
+        k: k === null ? Infinity : k,
+        minScore: minScore === null ? -Infinity : minScore,
+        candidates: candidates ? Int32Array.from(candidates) : null
+    });
+    return { ids: Array.from(ids), scores: Array.from(scores) };
+});
+console.log(JSON.stringify({ count: embeddings.count, dims: embeddings.dims, results }));
@@ -0,0 +1,17 @@
+// js/problem-data.js の similarProblemsSince で、main.py が出力した problem_data.js を出題回で絞り込む。
+// 使い方: node tests/js/check_period_neighbors.mjs <problem_data.json>
+//   結果を { 問題ID: [出題回ごとの上位の問題IDのリスト（重複をまとめた後。data.periods の添字順）] } の JSON で標準出力に出す
+import fs from 'fs';
+
+const source = fs.readFileSync(new URL('../../js/problem-data.js', import.meta.url), 'utf-8');
+const { hydrateProblemData, similarProblemsSince } = await import(`data:text/javascript,${encodeURIComponent(source)}`);
+
+const data = hydrateProblemData(JSON.parse(fs.readFileSync(process.argv[2], 'utf-8')));
+const results = {};
+for (const middleCat in data.categories) {
+    data.categories[middleCat].forEach(item => {
+        results[item.main_problem.id] = data.periods.map((_, minPeriod) =>
+            similarProblemsSince(item, minPeriod, item.main_problem).map(sim => sim.id));
+    });
+}
+process.stdout.write(JSON.stringify(results));
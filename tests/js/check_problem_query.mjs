@@ -0,0 +1,101 @@
+// js/problem-query.js の絞り込み・並べ替えが、従来の renderProblemList（問題オブジェクトと問題キーで比較）と
+// 同じ順序を返すことを合成データで確かめる。
+// 使い方: node tests/js/check_problem_query.mjs  （結果を JSON で標準出力に出す）
+import assert from 'assert';
+import fs from 'fs';
+
+// js/ はブラウザ向けの ES モジュールなので、依存の無いこのモジュールは data: URL として読み込む
+const source = fs.readFileSync(new URL('../../js/problem-query.js', import.meta.url), 'utf-8');
+const { buildQueryIndex, queryProblemList } = await import(`data:text/javascript,${encodeURIComponent(source)}`);
+
+const CATEGORIES = 6;
+const PROBLEMS = 3000;
+
+let seed = 1;
+const random = () => {
+    seed = (seed * 1103515245 + 12345) % 2147483648;
+    return seed / 2147483648;
+};
+const pick = n => Math.floor(random() * n);
+
+const problems = [];
+const categories = {};
+for (let id = 0; id < PROBLEMS; id++) {
+    const problem = { id, key: `R${pick(7)}春期 問 ${id}-${id}`, 問題番号: pick(80) + 1, reference_count: pick(4), centrality: pick(3) / 2 };
+    problems.push(problem);
+    const middleCat = `中項目${id % CATEGORIES}`;
+    (categories[middleCat] = categories[middleCat] || []).push({ main_problem: problem, similar_problems: [] });
+}
+const data = { problems, categories };
+
+const userState = {
+    archived: new Uint8Array(PROBLEMS),
+    favorite: new Uint8Array(PROBLEMS),
+    checkCount: new Uint8Array(PROBLEMS),
+    reviewDue: new Uint8Array(PROBLEMS),
+    oshi: new Int32Array(PROBLEMS),
+    like: new Int32Array(PROBLEMS),
+    fear: new Int32Array(PROBLEMS)
+};
+for (let id = 0; id < PROBLEMS; id++) {
+    userState.archived[id] = random() < 0.1 ? 1 : 0;
+    userState.favorite[id] = random() < 0.2 ? 1 : 0;
+    userState.checkCount[id] = random() < 0.5 ? pick(5) : 0;
+    userState.reviewDue[id] = userState.checkCount[id] > 0 && random() < 0.3 ? 1 : 0;
+    userState.oshi[id] = pick(3);
+    userState.like[id] = pick(3);
+    userState.fear[id] = pick(3);
+}
+
+// 従来の renderProblemList の絞り込み・並べ替え
+function legacyList(query) {
+    const byKey = field => Object.fromEntries(problems.map(p => [p.key, userState[field][p.id]]));
+    const counts = { oshi: byKey('oshi'), like: byKey('like'), fear: byKey('fear') };
+    let items = [...categories[query.middleCat]];
+    items = items.filter(item => (userState.archived[item.main_problem.id] === 1) === query.archivedOnly);
+    if (query.untouchedOnly) items = items.filter(item => userState.checkCount[item.main_problem.id] === 0);
+    if (query.favoritesOnly) items = items.filter(item => userState.favorite[item.main_problem.id] === 1);
+
+    const needsReview = item => userState.reviewDue[item.main_problem.id] === 1;
+    if (query.sortOrder === 'review-first') {
+        items.sort((a, b) => {
+            if (needsReview(a) !== needsReview(b)) return needsReview(b) - needsReview(a);
+            return a.main_problem.問題番号 - b.main_problem.問題番号;
+        });
+    } else if (query.sortOrder === 'ref-desc') {
+        items.sort((a, b) => (b.main_problem.reference_count || 0) - (a.main_problem.reference_count || 0));
+    } else if (query.sortOrder === 'central-desc') {
+        items.sort((a, b) => (b.main_problem.centrality - a.main_problem.centrality) || (a.main_problem.問題番号 - b.main_problem.問題番号));
+    } else if (['oshi-desc', 'like-desc', 'fear-desc'].includes(query.sortOrder)) {
+        const field = counts[query.sortOrder.split('-')[0]];
+        items.sort((a, b) => (field[b.main_problem.key] || 0) - (field[a.main_problem.key] || 0));
+    } else {
+        items.sort((a, b) => a.main_problem.問題番号 - b.main_problem.問題番号);
+    }
+    return items.map(item => item.main_problem.id);
+}
+
+const index = buildQueryIndex(data);
+const sortOrders = ['default', 'review-first', 'ref-desc', 'central-desc', 'oshi-desc', 'like-desc', 'fear-desc'];
+let queries = 0;
+for (const middleCat of Object.keys(categories)) {
+    for (const sortOrder of sortOrders) {
+        for (let flags = 0; flags < 8; flags++) {
+            const query = { middleCat, sortOrder, archivedOnly: !!(flags & 1), untouchedOnly: !!(flags & 2), favoritesOnly: !!(flags & 4) };
+            const ids = queryProblemList(index, userState, query);
+            assert.ok(ids instanceof Int32Array);
+            assert.deepStrictEqual(Array.from(ids), legacyList(query), JSON.stringify(query));
+            queries++;
+        }
+    }
+}
+assert.strictEqual(queryProblemList(index, userState, { middleCat: '存在しない中項目', sortOrder: 'default' }).length, 0);
+
+const started = performance.now();
+const rounds = 200;
+for (let i = 0; i < rounds; i++) {
+    queryProblemList(index, userState, { middleCat: '中項目0', sortOrder: sortOrders[i % sortOrders.length], archivedOnly: false });
+}
+const msPerQuery = (performance.now() - started) / rounds;
+
+console.log(JSON.stringify({ queries, problemsPerCategory: PROBLEMS / CATEGORIES, msPerQuery }));
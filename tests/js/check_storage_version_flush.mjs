@@ -0,0 +1,44 @@
+// js/storage.js の loadFromCloud / syncWithCloud の直後に、書き込みを待たずにタブが落ちた場合を再現する。
+// 使い方: node tests/js/check_storage_version_flush.mjs
+//   それぞれの直後に localStorage に残っている版とデータを JSON で標準出力に出す
+const values = new Map();
+globalThis.localStorage = {
+    getItem: key => (values.has(key) ? values.get(key) : null),
+    setItem: (key, value) => values.set(key, String(value)),
+    removeItem: key => values.delete(key)
+};
+globalThis.window = globalThis;
+globalThis.addEventListener = () => {};
+globalThis.dispatchEvent = () => true;
+globalThis.document = { addEventListener: () => {}, getElementById: () => null, visibilityState: 'visible' };
+// アイドル時の書き込みは実行されない（その前にタブが落ちる）
+globalThis.requestIdleCallback = () => 0;
+
+// 偽の GAS: load は版5の全データ、sync は他端末の変更を含む版7を返す
+globalThis.fetch = async (url, options) => {
+    const body = JSON.parse(options.body);
+    const result = body.action === 'load'
+        ? { version: 5, data: { checks: { remote1: [true] } } }
+        : { success: true, version: 7, ops: [{ t: 'checks', k: 'remote2', v: [true] }] };
+    return { ok: true, json: async () => result };
+};
+
+const { storage } = await import(new URL('../../js/storage.js', import.meta.url));
+storage.saveGasConfig('https://example.invalid/exec', 'user1');
+storage.accessToken = 'token';
+
+// タブが落ちた時点で localStorage に残っている版とチェック
+const persisted = () => ({
+    version: parseInt(localStorage.getItem('oyo_dataVersion') || '0'),
+    checks: Object.keys(JSON.parse(localStorage.getItem('oyo_problemChecks_user1') || '{}')).sort(),
+    pendingOps: JSON.parse(localStorage.getItem('oyo_pendingOps_user1') || '{"ops": []}').ops.length
+});
+
+await storage.loadFromCloud();
+const afterLoad = persisted();
+
+storage.saveChecks({ ...storage.loadChecks(), local1: [true] }, 'local1');
+await storage.syncWithCloud();
+const afterSync = persisted();
+
+process.stdout.write(JSON.stringify({ afterLoad, afterSync }));
@@ -0,0 +1,20 @@
+// js/title-search.js で、main.py が出力した search_index から問題名を検索する。
+// 使い方: node tests/js/check_title_search.mjs <problem_data.json> <queries.json>
+//   結果を { results: [[問題ID, ...], ...], msPerQuery } の JSON で標準出力に出す
+import fs from 'fs';
+
+const source = fs.readFileSync(new URL('../../js/title-search.js', import.meta.url), 'utf-8');
+const { parseSearchIndex, searchTitles } = await import(`data:text/javascript,${encodeURIComponent(source)}`);
+
+const [dataPath, queriesPath] = process.argv.slice(2);
+const data = JSON.parse(fs.readFileSync(dataPath, 'utf-8'));
+const queries = JSON.parse(fs.readFileSync(queriesPath, 'utf-8'));
+
+const index = parseSearchIndex(data.search_index, data.problems);
+const results = queries.map(query => Array.from(searchTitles(index, query)));
+
+const started = performance.now();
+const repeat = 20;
+for (let r = 0; r < repeat; r++) queries.forEach(query => searchTitles(index, query));
+const msPerQuery = (performance.now() - started) / (repeat * queries.length);
+process.stdout.write(JSON.stringify({ results, msPerQuery }));
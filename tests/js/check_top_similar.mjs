@@ -0,0 +1,16 @@
+// js/problem-data.js の topSimilarProblems で、main.py が出力した problem_data.js の類似問題を重複をまとめて絞り込む。
+// 使い方: node tests/js/check_top_similar.mjs <problem_data.json>
+//   結果を { 問題ID: [表示する類似問題の問題IDのリスト] } の JSON で標準出力に出す
+import fs from 'fs';
+
+const source = fs.readFileSync(new URL('../../js/problem-data.js', import.meta.url), 'utf-8');
+const { hydrateProblemData, topSimilarProblems } = await import(`data:text/javascript,${encodeURIComponent(source)}`);
+
+const data = hydrateProblemData(JSON.parse(fs.readFileSync(process.argv[2], 'utf-8')));
+const results = {};
+for (const middleCat in data.categories) {
+    data.categories[middleCat].forEach(item => {
+        results[item.main_problem.id] = topSimilarProblems(item, item.main_problem).map(sim => sim.id);
+    });
+}
+process.stdout.write(JSON.stringify(results));
@@ -0,0 +1,24 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'js', 'check_api_single_flight.mjs')
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='Node.js is required to run js/api.js')
+def test_concurrent_expired_calls_share_one_refresh_and_loads_are_coalesced():
+    """同時に期限切れになった呼び出しはトークン更新を1回だけ行い、同じ load は1回の通信にまとめる"""
+    result = subprocess.run(['node', SCRIPT], capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    summary = json.loads(result.stdout)
+
+    assert summary['refreshCount'] == 1
+    assert summary['calls'].count('refresh') == 1
+    assert summary['tokens'] == ['token-1'] * 3 and summary['storedToken'] == 'token-1'
+    assert summary['authCalls'] == 7  # 3件の失敗、更新1回、3件の再送
+    assert summary['loadCalls'] == 1 and summary['loadsShared'] and summary['loadsIndependent']
+    # 応答が返った後の load はまとめずに送る
+    assert summary['loadCallsAfterSettled'] == 1
@@ -0,0 +1,92 @@
+import importlib.util
+import json
+import os
+import sys
+
+import numpy as np
+
+from .conftest import HTML_OUTPUT_DIR, make_embeddings
+
+
+def load_benchmark_module():
+    # benchmark.py は同じディレクトリの main.py を import する
+    if HTML_OUTPUT_DIR not in sys.path:
+        sys.path.insert(0, HTML_OUTPUT_DIR)
+    spec = importlib.util.spec_from_file_location('html_output_benchmark', os.path.join(HTML_OUTPUT_DIR, 'benchmark.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_grouped(count=60, dims=32):
+    rng = np.random.default_rng(0)
+    return {f'中項目{c}': (list(range(c * count, (c + 1) * count)), rng.normal(size=(count, dims)))
+            for c in range(2)}
+
+
+def test_ground_truth_is_cached_by_input_vectors(tmp_path):
+    """正解の近傍は一度だけ計算し、同じ入力ならキャッシュを使う。入力が変われば計算し直す"""
+    bench = load_benchmark_module()
+    grouped = make_grouped()
+
+    truth, cached = bench.load_or_compute_ground_truth(grouped, 'embedding', 10, str(tmp_path))
+    assert not cached
+    again, cached = bench.load_or_compute_ground_truth(grouped, 'embedding', 10, str(tmp_path))
+    assert cached
+    assert truth.keys() == again.keys()
+    for problem_id, (ids, scores) in truth.items():
+        assert list(again[problem_id][0]) == list(ids)
+        assert np.allclose(again[problem_id][1], scores)
+
+    grouped['中項目0'][1][0] += 1.0
+    _, cached = bench.load_or_compute_ground_truth(grouped, 'embedding', 10, str(tmp_path))
+    assert not cached
+
+
+def test_benchmark_measures_each_setup(tmp_path):
+    """厳密な設定は recall 1.0・誤差ほぼ0、精度や次元を落とした設定はその分の損失と成果物サイズが表に出る"""
+    bench = load_benchmark_module()
+    grouped = make_grouped()
+    ks = [1, 5, 10]
+    truth, _ = bench.load_or_compute_ground_truth(grouped, 'embedding', max(ks), str(tmp_path))
+
+    setups = [
+        {"name": "exact", "dtype": "float64", "dims": None, "top_k": 10, "min_score": 0.9},
+        {"name": "int8", "dtype": "int8", "dims": None, "top_k": 10, "min_score": 0.9},
+        {"name": "dims4", "dtype": "float32", "dims": 4, "top_k": 10, "min_score": 0.9},
+        {"name": "top5", "dtype": "float64", "dims": None, "top_k": 5, "min_score": 0.99},
+    ]
+    results = {r['name']: r for r in bench.run_benchmark(grouped, truth, setups, ks, queries=20)}
+
+    assert results['exact']['recall'] == {'1': 1.0, '5': 1.0, '10': 1.0}
+    assert results['exact']['score_mae'] < 1e-12
+    assert results['int8']['score_mae'] > 0
+    assert results['dims4']['recall']['10'] < results['exact']['recall']['10']
+    # 上位5件だけを残す規則では recall@10 が下がり、成果物は小さくなる
+    assert results['top5']['recall']['5'] == 1.0 and results['top5']['recall']['10'] <= 0.5
+    assert results['top5']['artifact_bytes'] < results['exact']['artifact_bytes']
+    assert results['int8']['vector_bytes'] * 8 == results['exact']['vector_bytes']
+    assert set(results['exact']['query_latency_ms']) == {'p50', 'p95', 'p99'}
+
+    recommended = bench.recommend(list(results.values()), 5, 0.99)
+    assert recommended in ('exact', 'int8', 'top5')
+    table = bench.format_table(list(results.values()), ks, recommended)
+    assert '(推奨)' in table and table.count('\n') == len(setups) + 1
+
+
+def test_main_fills_problem_ids_from_registry(tmp_path, monkeypatch):
+    """問題ID列の無い埋め込みでも、main.py と同じくレジストリから補完して比較できる"""
+    bench = load_benchmark_module()
+
+    df = make_embeddings()
+    registry = {'key': '出典', 'ids': {source: int(i) for i, source in zip(df['問題ID'], df['出典'])}}
+    (tmp_path / 'embeddings.json').write_text(df.drop(columns=['問題ID']).to_json(orient='records', force_ascii=False),
+                                              encoding='utf-8')
+    (tmp_path / 'registry.json').write_text(json.dumps(registry, ensure_ascii=False), encoding='utf-8')
+
+    monkeypatch.setattr('sys.argv', ['benchmark.py', '--input_json', str(tmp_path / 'embeddings.json'),
+                                     '--registry', str(tmp_path / 'registry.json'), '--queries', '5',
+                                     '--cache_dir', str(tmp_path / 'cache'), '--output_dir', str(tmp_path / 'out')])
+    bench.main()
+    with open(tmp_path / 'out' / 'benchmark_results.json', encoding='utf-8') as f:
+        assert json.load(f)['problems'] == len(df)
@@ -0,0 +1,138 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+import pandas as pd
+
+from .conftest import load_build_module, make_embeddings
+
+
+def load_classify_module():
+    load_build_module()
+    import classify_new
+    return classify_new
+
+
+def brute_force(queries, corpus, k, allowed=None):
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    expected = []
+    for q, query in enumerate(queries):
+        candidates = [i for i in range(len(corpus)) if allowed is None or allowed(q, i)]
+        candidates.sort(key=lambda i: (-float(query @ corpus[i]), i))
+        expected.append(candidates[:k])
+    return expected
+
+
+def test_nearest_neighbors_matches_brute_force(monkeypatch):
+    """行列積と部分ソートによる上位k件は、1件ずつ比べた結果と一致する（中項目の絞り込み・同じ出典の除外を含む）"""
+    classify_new = load_classify_module()
+    # 問い合わせの分割をまたぐ場合も確かめる
+    monkeypatch.setattr(classify_new, 'QUERY_CHUNK_SIZE', 7)
+    corpus_df = make_embeddings()
+    corpus = np.asarray(corpus_df['embedding'].tolist())
+    rng = np.random.default_rng(1)
+    queries = rng.random((20, corpus.shape[1]))
+
+    indices, scores = classify_new.nearest_neighbors(queries, corpus, 5)
+    assert indices.tolist() == brute_force(queries, corpus, 5)
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+    query_categories = np.array([f'中項目{q % 3}' for q in range(20)])
+    corpus_categories = corpus_df['中項目'].to_numpy()
+    query_keys = [corpus_df['出典'][q] for q in range(20)]
+    indices, scores = classify_new.nearest_neighbors(
+        queries, corpus, 5, query_categories=query_categories, corpus_categories=corpus_categories,
+        query_keys=query_keys, corpus_keys=corpus_df['出典'].tolist())
+    for q in range(20):
+        if query_categories[q] == '中項目2':
+            # 過去問に無い中項目は候補が無い
+            assert indices[q].tolist() == [-1] * 5 and np.isnan(scores[q]).all()
+        else:
+            allowed = lambda q, i: corpus_categories[i] == query_categories[q] and i != q
+            assert indices[q].tolist() == brute_force(queries[q:q + 1], corpus, 5, lambda _, i: allowed(q, i))[0]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    batches = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        FakeOllamaHandler.batches.append(body['input'])
+        payload = json.dumps({'embeddings': [[len(text), 1.0] for text in body['input']]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_embed_texts_sends_batches_to_ollama():
+    """Ollama には batch_size 件ずつまとめて送り、入力の順にベクトルを返す"""
+    classify_new = load_classify_module()
+    server = HTTPServer(('127.0.0.1', 0), FakeOllamaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        FakeOllamaHandler.batches = []
+        texts = ['あ' * n for n in range(1, 8)]
+        vectors = classify_new.embed_texts(texts, {'name': 'embeddinggemma', 'type': 'ollama'}, 3,
+                                           f'http://127.0.0.1:{server.server_address[1]}')
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert [len(batch) for batch in FakeOllamaHandler.batches] == [3, 3, 1]
+    assert vectors[:, 0].tolist() == list(range(1, 8))
+
+
+def test_report_groups_neighbors_per_query(tmp_path):
+    """レポートは CSV（問い合わせ × 順位）と JSON（問い合わせごとの一覧）の両方に出力する"""
+    classify_new = load_classify_module()
+    corpus_df = make_embeddings()
+    corpus = np.asarray(corpus_df['embedding'].tolist())
+    queries = pd.DataFrame([{'出典': '令和8年春期 問1', '問題名': '新問題1', '中項目': '中項目0'},
+                            {'出典': '令和8年春期 問2', '問題名': '新問題2', '中項目': '中項目1'}])
+    indices, scores = classify_new.nearest_neighbors(corpus[[3, 8]] + 0.01, corpus, 3)
+
+    rows = classify_new.build_report(queries, corpus_df.to_dict('records'), indices, scores)
+    csv_path, json_path = classify_new.write_report(rows, queries, str(tmp_path / 'report.csv'))
+
+    report_csv = pd.read_csv(csv_path, encoding='utf-8-sig')
+    assert len(report_csv) == 6
+    assert report_csv['問題ID'].tolist()[::3] == [3, 8]
+    with open(json_path, encoding='utf-8') as f:
+        report = json.load(f)
+    assert [q['出典'] for q in report] == ['令和8年春期 問1', '令和8年春期 問2']
+    assert [n['順位'] for n in report[0]['neighbors']] == [1, 2, 3]
+    assert report[1]['neighbors'][0]['問題ID'] == 8
+
+
+def test_main_fills_problem_ids_from_registry(tmp_path, monkeypatch):
+    """問題ID列の無い過去問の埋め込みでも、main.py と同じくレジストリから補完して検索できる"""
+    classify_new = load_classify_module()
+    corpus_df = make_embeddings()
+    registry = {'key': '出典', 'ids': {source: int(i) + 100 for i, source in zip(corpus_df['問題ID'], corpus_df['出典'])}}
+    corpus = corpus_df.drop(columns=['問題ID'])
+    (tmp_path / 'corpus.json').write_text(corpus.to_json(orient='records', force_ascii=False), encoding='utf-8')
+    (tmp_path / 'registry.json').write_text(json.dumps(registry, ensure_ascii=False), encoding='utf-8')
+    queries = [{'出典': '令和8年春期 問1', '問題名': '新問題1', '中項目': '中項目1', 'embedding': corpus_df['embedding'][3]}]
+    (tmp_path / 'queries.json').write_text(json.dumps(queries, ensure_ascii=False), encoding='utf-8')
+
+    monkeypatch.setattr('sys.argv', ['classify_new.py', '--query_json', str(tmp_path / 'queries.json'),
+                                     '--corpus_json', str(tmp_path / 'corpus.json'),
+                                     '--registry', str(tmp_path / 'registry.json'),
+                                     '--top_k', '1', '--output', str(tmp_path / 'report')])
+    classify_new.main()
+    with open(tmp_path / 'report.json', encoding='utf-8') as f:
+        report = json.load(f)
+    assert report[0]['neighbors'][0]['問題ID'] == 103
+
+    # レジストリにも無ければ、main.py と同じメッセージで止まる
+    del registry['ids'][corpus_df['出典'][5]]
+    (tmp_path / 'registry.json').write_text(json.dumps(registry, ensure_ascii=False), encoding='utf-8')
+    (tmp_path / 'report.json').unlink()
+    classify_new.main()
+    assert not (tmp_path / 'report.json').exists()
@@ -0,0 +1,61 @@
+import json
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from .conftest import load_build_module
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'js', 'check_embedding_search.mjs')
+
+
+def exact_top(vectors, valid, problem_id, k, min_score, candidates):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    pool = [i for i in (candidates if candidates is not None else range(len(vectors)))
+            if i != problem_id and valid[i]]
+    scored = sorted(((float(normalized[problem_id] @ normalized[i]), i) for i in pool), reverse=True)
+    scored = [(score, i) for score, i in scored if min_score is None or score >= min_score]
+    return scored if k is None else scored[:k]
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='Node.js is required to run js/embedding-search.js')
+def test_client_search_matches_exact_cosine(tmp_path):
+    """float16 のバイナリを使ったクライアントの上位k件が、元のベクトルでの厳密なコサイン類似度と一致すること"""
+    build = load_build_module()
+    rng = np.random.default_rng(0)
+    size, dims = 120, 48
+    vectors = rng.normal(size=(size, dims))
+    # 問題ID 7 と 50 はベクトルが無い（欠番）
+    valid = np.ones(size, dtype=bool)
+    valid[[7, 50]] = False
+    category_a = [i for i in range(size) if valid[i] and i % 2 == 0]
+    category_b = [i for i in range(size) if valid[i] and i % 2 == 1]
+    grouped = {'中項目A': (category_a, vectors[category_a]), '中項目B': (category_b, vectors[category_b])}
+
+    binary = tmp_path / 'problem_data.embeddings.bin'
+    build.write_embeddings_binary(str(binary), grouped, size)
+    assert binary.stat().st_size == 16 + size * dims * 2
+
+    queries = [
+        {'problemId': 0, 'k': 5, 'minScore': None, 'candidates': None},
+        {'problemId': 3, 'k': 10, 'minScore': None, 'candidates': category_b},
+        {'problemId': 4, 'k': None, 'minScore': 0.1, 'candidates': None},
+        {'problemId': 7, 'k': 5, 'minScore': None, 'candidates': None},
+    ]
+    queries_path = tmp_path / 'queries.json'
+    queries_path.write_text(json.dumps(queries), encoding='utf-8')
+
+    result = subprocess.run(['node', SCRIPT, str(binary), str(queries_path)], capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    output = json.loads(result.stdout)
+    assert (output['count'], output['dims']) == (size, dims)
+
+    for query, actual in zip(queries, output['results']):
+        if not valid[query['problemId']]:
+            assert actual == {'ids': [], 'scores': []}
+            continue
+        expected = exact_top(vectors, valid, query['problemId'], query['k'], query['minScore'], query['candidates'])
+        assert actual['ids'] == [i for _, i in expected]
+        assert np.allclose(actual['scores'], [score for score, _ in expected], atol=2e-3)
@@ -0,0 +1,145 @@
+import json
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from .conftest import load_build_module, make_embeddings, run_lookup
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'js', 'check_period_neighbors.mjs')
+PERIOD_LABELS = ['H22秋期', 'H23特別', 'H23秋期', 'H31春期', 'R元秋期', 'R3春期', 'R5春期', 'R5秋期']
+
+
+def load_module():
+    load_build_module()
+    import exam_periods
+    return exam_periods
+
+
+def build_results(count=120):
+    """出題回が重なり、同じ問題名の再出題（重複グループ）を含むビルド結果（埋め込みベクトルの行列も返す）"""
+    build = load_build_module()
+    df = make_embeddings(count=count)
+    rng = np.random.default_rng(3)
+    df['embedding'] = [rng.normal(size=16).tolist() for _ in range(count)]
+    df['問題名'] = [f'問題{i % (count // 3)}' for i in range(count)]
+    df['出典'] = [f'{PERIOD_LABELS[rng.integers(len(PERIOD_LABELS))]} 問{i}' for i in range(count)]
+    results = build.compute_similarities(df, 'embedding')
+    build.attach_problem_scores(results)
+    grouped = build.group_vectors(df.to_dict('records'), 'embedding')
+    build.attach_period_neighbors(results, grouped)
+    return results, np.array(df['embedding'].tolist())
+
+
+def brute_force_since(results, vectors, main_id, min_period, k, collapse=False):
+    """同じ中項目で出題回が min_period 以降の全問題から求めた上位k件
+
+    collapse=True ならアプリと同じく、問題と同じ重複グループを除き、各グループの先頭だけを数える。
+    """
+    problems = results['problems']
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    candidates = [p['id'] for p in problems if p['id'] != main_id and p['中項目'] == problems[main_id]['中項目']
+                  and p['period'] >= min_period]
+    ranked = sorted(candidates, key=lambda x: -float(normalized[main_id] @ normalized[x]))
+    if collapse:
+        seen = {problems[main_id].get('duplicate_group')} - {None}
+        heads = []
+        for x in ranked:
+            group = problems[x].get('duplicate_group')
+            if group is None or group not in seen:
+                heads.append(x)
+            if group is not None:
+                seen.add(group)
+        ranked = heads
+    return ranked[:k]
+
+
+def test_period_labels_sort_chronologically():
+    """出典から出題回を取り出し、H23特別・平成31年・令和元年を含めて古い順に並べる"""
+    exam_periods = load_module()
+    assert exam_periods.period_label('R5春期 問1') == 'R5春期'
+    assert exam_periods.period_label('令和5年春期 問1') is None
+    problems = [{'id': i, '出典': f'{label} 問1'} for i, label in enumerate(reversed(PERIOD_LABELS))] + [None]
+    assert exam_periods.attach_periods(problems) == PERIOD_LABELS
+    assert [problems[i]['period'] for i in range(len(PERIOD_LABELS))] == list(reversed(range(len(PERIOD_LABELS))))
+
+
+def test_skyline_matches_brute_force_for_every_period():
+    """出題回で絞り込んだ上位k件は、全候補から絞り込んだ結果と一致する"""
+    exam_periods = load_module()
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        scores = rng.random(60)
+        periods = rng.integers(-1, 8, size=60)
+        kept = exam_periods.period_skyline(scores, periods, k=5)
+        for min_period in range(8):
+            allowed = np.flatnonzero(periods >= min_period)
+            expected = allowed[np.argsort(-scores[allowed], kind='stable')][:5]
+            assert list(kept[periods[kept] >= min_period][:5]) == list(expected)
+
+
+def test_skyline_matches_brute_force_after_collapsing_duplicates():
+    """重複グループを1件にまとめてから取る上位k件も、全候補から求めた結果と一致する"""
+    exam_periods = load_module()
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        scores = rng.random(60)
+        periods = rng.integers(-1, 8, size=60)
+        groups = np.where(rng.random(60) < 0.5, rng.integers(0, 10, size=60), -1)
+        main_group = int(rng.integers(-1, 10))
+        kept = exam_periods.period_skyline(scores, periods, 5, groups, main_group)
+        for min_period in range(8):
+            for candidates in (np.arange(60), kept):
+                allowed = candidates[periods[candidates] >= min_period]
+                ranked = allowed[np.argsort(-scores[allowed], kind='stable')]
+                seen = {main_group} - {-1}
+                heads = []
+                for x in ranked:
+                    if groups[x] < 0 or groups[x] not in seen:
+                        heads.append(x)
+                    seen.add(groups[x])
+                if candidates is kept:
+                    assert heads[:5] == expected
+                else:
+                    expected = heads[:5]
+
+
+def test_sqlite_neighbors_since_period(tmp_path):
+    """SQLite の neighbors(min_period=) と lookup.py --since は、出題回で絞り込んだ全組比較と一致する"""
+    results, vectors = build_results()
+    import neighbor_store
+
+    db_path = str(tmp_path / 'problem_data.sqlite3')
+    neighbor_store.write_neighbor_store(db_path, results)
+    with neighbor_store.NeighborStore(db_path) as store:
+        assert store.periods() == PERIOD_LABELS
+        assert store.period_index('R5春期') == PERIOD_LABELS.index('R5春期')
+        for main_id in range(0, len(results['problems']), 7):
+            for min_period in range(len(PERIOD_LABELS)):
+                found = [n['id'] for n in store.neighbors(main_id, limit=5, min_period=min_period)]
+                assert found == brute_force_since(results, vectors, main_id, min_period, 5)
+
+    completed = run_lookup('7', '--db', db_path, '--since', 'R5春期', '--limit', '5', '--json')
+    assert completed.returncode == 0, completed.stderr
+    neighbors = json.loads(completed.stdout)['neighbors']
+    assert [n['id'] for n in neighbors] == brute_force_since(results, vectors, 7, PERIOD_LABELS.index('R5春期'), 5)
+    assert all(n['出典'].startswith(('R5春期', 'R5秋期')) for n in neighbors)
+    assert run_lookup('7', '--db', db_path, '--since', 'R9春期').returncode == 1
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='Node.js is required to run js/problem-data.js')
+def test_client_filter_matches_brute_force(tmp_path):
+    """problem_data.js の similar_problems と period_neighbors から、ブラウザ側でも同じ結果を求められる"""
+    results, vectors = build_results()
+    data_path = tmp_path / 'problem_data.json'
+    data_path.write_text(json.dumps(results, ensure_ascii=False), encoding='utf-8')
+
+    completed = subprocess.run(['node', SCRIPT, str(data_path)], capture_output=True, text=True, timeout=120)
+    assert completed.returncode == 0, completed.stderr
+    found = json.loads(completed.stdout)
+    assert any(p.get('duplicate_group') is not None for p in results['problems'])
+    for main_id, by_period in found.items():
+        for min_period, ids in enumerate(by_period):
+            assert ids == brute_force_since(results, vectors, int(main_id), min_period, 5, collapse=True)
@@ -0,0 +1,45 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gas', 'check_row_index.js')
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='Node.js is required to run gas/Code.js against the mock')
+def test_row_index_cost_is_independent_of_user_count():
+    """gas/Code.js を Spreadsheet / Cache のモック上で動かし、索引が効いていることを確かめる"""
+    result = subprocess.run(['node', SCRIPT, '100', '5000'], capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    small, large = json.loads(result.stdout)
+
+    print(f"\n{small['users']} users: {small['cellsPerRequest']:.1f} cells/request, "
+          f"{large['users']} users: {large['cellsPerRequest']:.1f} cells/request "
+          f"(index rebuild: {large['rebuildCells']} cells)")
+    # 索引作成後の1リクエストあたりの読み込み量はユーザー数に依存しない
+    assert large['cellsPerRequest'] == small['cellsPerRequest']
+    assert large['cellsPerRequest'] < 100
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='Node.js is required to run gas/Code.js against the mock')
+def test_unknown_tokens_do_not_rebuild_the_index():
+    """置き換えられた古いトークンや不正なトークンで、ユーザー数に比例する索引の作り直しをしない"""
+    result = subprocess.run(['node', SCRIPT, '5000'], capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    (summary,) = json.loads(result.stdout)
+
+    # 置き換えられたトークンは見出し行だけを読んで拒否する
+    assert summary['supersededCells'] < 100 and summary['supersededCacheWrites'] == 0
+    # 不正なトークンは走査しても、書き込むのはそのキーの「存在しない」印だけで、2回目以降は走査しない
+    assert summary['missCacheWrites'] == 1
+    assert summary['repeatedMissCells'] < 100
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='Node.js is required to run gas/Code.js against the mock')
+def test_ops_rows_are_matched_case_sensitively():
+    """大文字・小文字だけが違うユーザーIDの操作ログを、読み込み・保存・クリアで取り違えない"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gas', 'check_ops_case.js')
+    result = subprocess.run(['node', script], capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,184 @@
+import base64
+import gzip
+import json
+import sqlite3
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import local_gas_server
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def server_url(tmp_path, clock):
+    """テストごとに空のDBでローカルGASサーバーを起動する"""
+    httpd = local_gas_server.make_server(str(tmp_path / 'gas.sqlite3'), host='127.0.0.1', port=0, clock=clock)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def post(url, action, **payload):
+    """js/api.js の postToGas と同じ形式（text/plain の JSON）で送る"""
+    body = json.dumps({'action': action, **payload}).encode('utf-8')
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'text/plain;charset=utf-8'})
+    with urllib.request.urlopen(request) as response:
+        assert response.headers['Access-Control-Allow-Origin'] == '*'
+        return json.loads(response.read().decode('utf-8'))
+
+
+def register_and_login(url, user_id, password='password123'):
+    assert post(url, 'register', userId=user_id, password=password)['success']
+    return post(url, 'login', userId=user_id, password=password)
+
+
+def test_register_and_login(server_url):
+    assert post(server_url, 'register', userId='alice', password='') == {'error': 'Missing userId or password'}
+    res = register_and_login(server_url, 'alice')
+    assert res['success'] and res['userId'] == 'alice'
+    assert res['accessToken'] and res['refreshToken']
+
+    assert post(server_url, 'register', userId='alice', password='x') == {'error': 'User already exists'}
+    assert post(server_url, 'login', userId='alice', password='wrong') == {'error': 'Invalid password'}
+    assert post(server_url, 'login', userId='bob', password='x') == {'error': 'User not found'}
+    assert post(server_url, 'unknown') == {'error': 'Invalid action'}
+
+
+def test_token_expiry_and_refresh(server_url, clock):
+    tokens = register_and_login(server_url, 'alice')
+    encodings = local_gas_server.SUPPORTED_ENCODINGS
+    assert post(server_url, 'validate', accessToken=tokens['accessToken']) == {'valid': True, 'userId': 'alice',
+                                                                               'encodings': encodings}
+
+    # アクセストークンは1時間で失効し、リフレッシュトークンで再発行できる
+    clock.now += local_gas_server.ACCESS_TOKEN_TTL + 1
+    assert post(server_url, 'validate', accessToken=tokens['accessToken']) == {'valid': False, 'encodings': encodings}
+    assert post(server_url, 'load', accessToken=tokens['accessToken']) == local_gas_server.UNAUTHORIZED
+
+    refreshed = post(server_url, 'refresh', refreshToken=tokens['refreshToken'])
+    assert refreshed['success'] and refreshed['userId'] == 'alice'
+    assert post(server_url, 'validate', accessToken=refreshed['accessToken'])['valid']
+
+    clock.now += local_gas_server.REFRESH_TOKEN_TTL
+    assert post(server_url, 'refresh', refreshToken=tokens['refreshToken']) == {'error': 'Invalid or expired refresh token.'}
+
+
+def test_save_load_clear(server_url):
+    token = register_and_login(server_url, 'alice')['accessToken']
+    assert post(server_url, 'load', accessToken=token) == {'data': {}, 'version': 0}
+
+    data = {'checks': {'R7秋期 問 1-1': [{'checked': True, 'timestamp': 1}]}, 'favorites': ['R7秋期 問 1-1']}
+    assert post(server_url, 'save', accessToken=token, data=data, version=0) == {'success': True, 'version': 1}
+    assert post(server_url, 'save', accessToken=token, data=data, version=1) == {'success': True, 'version': 2}
+    assert post(server_url, 'load', accessToken=token) == {'data': data, 'version': 2}
+
+    assert post(server_url, 'clear', accessToken=token)['success']
+    assert post(server_url, 'load', accessToken=token) == {'data': {}, 'version': 0}
+
+
+def test_delta_sync(server_url):
+    """sync は差分の操作だけを受け取り、他端末の変更を ops として返す"""
+    token = register_and_login(server_url, 'alice')['accessToken']
+    assert post(server_url, 'sync', accessToken=token, ops=[], version=0) == {'error': 'ResyncRequired'}
+
+    base = {'checks': {'A': [True]}, 'favorites': ['A']}
+    assert post(server_url, 'save', accessToken=token, data=base, version=0)['version'] == 1
+
+    ops_a = [{'t': 'checks', 'k': 'B', 'v': [True]}, {'t': 'favorites', 'k': 'A', 'v': False}]
+    assert post(server_url, 'sync', accessToken=token, ops=ops_a, version=1) == {'success': True, 'version': 2, 'ops': []}
+
+    # 版1のままの別端末には、自分の変更に加えて版2の操作が返る
+    ops_b = [{'t': 'oshi', 'k': 'A', 'v': 3}, {'t': 'examDate', 'v': '2026-04-19'}]
+    assert post(server_url, 'sync', accessToken=token, ops=ops_b, version=1) == {'success': True, 'version': 3, 'ops': ops_a}
+    assert post(server_url, 'load', accessToken=token, sinceVersion=1) == {'ops': ops_a + ops_b, 'version': 3, 'delta': True}
+
+    expected = {'checks': {'A': [True], 'B': [True]}, 'favorites': [], 'oshi': {'A': 3}, 'examDate': '2026-04-19'}
+    assert post(server_url, 'load', accessToken=token) == {'data': expected, 'version': 3}
+    assert post(server_url, 'sync', accessToken=token, ops=[], version=5) == {'error': 'ResyncRequired'}
+
+
+def test_delta_sync_compaction(server_url):
+    token = register_and_login(server_url, 'alice')['accessToken']
+    post(server_url, 'save', accessToken=token, data={}, version=0)
+    for version in range(1, local_gas_server.OPS_COMPACTION_THRESHOLD + 1):
+        res = post(server_url, 'sync', accessToken=token, ops=[{'t': 'like', 'k': str(version), 'v': 1}], version=version)
+        assert res == {'success': True, 'version': version + 1, 'ops': []}
+
+    # 圧縮後は途中の操作ログが無いので、古い版からの同期・読み込みには全データが返る
+    likes = {str(v): 1 for v in range(1, local_gas_server.OPS_COMPACTION_THRESHOLD + 1)}
+    last = local_gas_server.OPS_COMPACTION_THRESHOLD + 1
+    assert post(server_url, 'load', accessToken=token, sinceVersion=1) == {'data': {'like': likes}, 'version': last}
+    res = post(server_url, 'sync', accessToken=token, ops=[{'t': 'like', 'k': '1', 'v': None}], version=1)
+    del likes['1']
+    assert res == {'success': True, 'version': last + 1, 'data': {'like': likes}}
+
+
+def test_compressed_payloads(server_url, tmp_path):
+    """gzip+base64 で圧縮したリクエスト・レスポンスと、旧形式（非圧縮）で保存された行の読み込み"""
+    token = register_and_login(server_url, 'alice')['accessToken']
+    data = {'checks': {f'R7秋期 問 {i}-{i}': [{'checked': True, 'timestamp': i}] for i in range(200)}}
+    payload = base64.b64encode(gzip.compress(json.dumps({'data': data, 'version': 0}).encode('utf-8'))).decode('ascii')
+    assert post(server_url, 'save', accessToken=token, encoding='gzip+base64', payload=payload) == {'success': True, 'version': 1}
+    assert post(server_url, 'save', accessToken=token, encoding='br', payload='') == {'error': 'Unsupported encoding: br'}
+
+    res = post(server_url, 'load', accessToken=token, acceptEncoding='gzip+base64')
+    assert res['encoding'] == 'gzip+base64'
+    assert json.loads(gzip.decompress(base64.b64decode(res['payload']))) == {'data': data, 'version': 1}
+    # 小さな応答は圧縮しない
+    assert post(server_url, 'sync', accessToken=token, ops=[], version=1, acceptEncoding='gzip+base64') == \
+        {'success': True, 'version': 1, 'ops': []}
+
+    with sqlite3.connect(tmp_path / 'gas.sqlite3') as conn:
+        stored = conn.execute("SELECT json_data FROM user_data WHERE user_id = 'alice'").fetchone()[0]
+        assert stored.startswith(local_gas_server.CELL_ENCODING_PREFIX)
+        conn.execute("UPDATE user_data SET json_data = ? WHERE user_id = 'alice'", (json.dumps({'favorites': ['A']}),))
+    assert post(server_url, 'load', accessToken=token) == {'data': {'favorites': ['A']}, 'version': 1}
+
+
+def test_concurrent_sync_load(server_url):
+    """複数ユーザーが同時に save / load を繰り返しても、取りこぼしなくバージョンが進むこと"""
+    users = 16
+    rounds = 20
+    latencies = []
+    lock = threading.Lock()
+
+    def session(i):
+        token = register_and_login(server_url, f'user{i}')['accessToken']
+        for version in range(rounds):
+            started = time.perf_counter()
+            saved = post(server_url, 'save', accessToken=token, data={'round': version}, version=version)
+            loaded = post(server_url, 'load', accessToken=token)
+            with lock:
+                latencies.append(time.perf_counter() - started)
+            assert saved == {'success': True, 'version': version + 1}
+            assert loaded == {'data': {'round': version}, 'version': version + 1}
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        list(executor.map(session, range(users)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    requests = users * (2 + rounds * 2)
+    print(f"\n{requests} requests in {elapsed:.2f}s ({requests / elapsed:.0f} req/s), "
+          f"save+load p50={latencies[len(latencies) // 2] * 1000:.1f}ms "
+          f"p95={latencies[int(len(latencies) * 0.95)] * 1000:.1f}ms")
+    assert len(latencies) == users * rounds
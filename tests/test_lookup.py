@@ -0,0 +1,72 @@
+import json
+import subprocess
+import sys
+import time
+
+from .conftest import HTML_OUTPUT_DIR, LOOKUP_PATH, load_build_module, make_embeddings, run_lookup
+
+HEAVY_MODULES = ['pandas', 'numpy', 'sklearn', 'tqdm']
+# 起動にかけてよい時間（何もしない python の起動時間に上乗せする分。遅いCIでも通る程度の余裕を持たせる）
+STARTUP_BUDGET_SECONDS = 0.3
+
+
+def build_outputs(tmp_path):
+    build = load_build_module()
+    df = make_embeddings()
+    results = build.compute_similarities(df, 'embedding')
+    results['model'] = 'embeddinggemma'
+    build.attach_problem_scores(results)
+    js_path = str(tmp_path / 'problem_data.js')
+    build.write_outputs(js_path, results, grouped=build.group_vectors(df.to_dict('records'), 'embedding'))
+    return results, str(tmp_path / 'problem_data.sqlite3')
+
+
+def test_lookup_prints_precomputed_neighbors(tmp_path):
+    """出典や問題IDから、problem_data.js と同じ類似問題を引ける"""
+    results, db_path = build_outputs(tmp_path)
+    items = {item['main_problem']: item for items in results['categories'].values() for item in items}
+
+    completed = run_lookup('--source', 'R3春期 問3', '--db', db_path, '--limit', '3', '--json')
+    assert completed.returncode == 0, completed.stderr
+    output = json.loads(completed.stdout)
+    assert output['problem']['id'] == 3
+    expected = items[3]['similar_problems'][:3]
+    assert [(n['id'], n['similarity']) for n in output['neighbors']] == [(s['id'], s['similarity']) for s in expected]
+    assert all(n['中項目'] == '中項目1' for n in output['neighbors'])
+
+    completed = run_lookup('3', '--db', db_path, '--vector', '--all_categories', '--limit', '5', '--json')
+    assert completed.returncode == 0, completed.stderr
+    neighbors = json.loads(completed.stdout)['neighbors']
+    assert len(neighbors) == 5 and 3 not in [n['id'] for n in neighbors]
+    assert [n['similarity'] for n in neighbors] == sorted((n['similarity'] for n in neighbors), reverse=True)
+
+    completed = run_lookup('999', '--db', db_path)
+    assert completed.returncode == 1 and '見つかりません' in completed.stderr
+
+
+def test_lookup_starts_without_heavy_imports(tmp_path):
+    """類似問題を引くだけなら pandas・numpy などを読み込まず、起動が python 本体とほぼ同じ時間で済む"""
+    _, db_path = build_outputs(tmp_path)
+    probe = (
+        'import sys, io, contextlib\n'
+        f'sys.path.insert(0, {HTML_OUTPUT_DIR!r})\n'
+        'import lookup\n'
+        'with contextlib.redirect_stdout(io.StringIO()):\n'
+        f'    assert lookup.main(["5", "--db", {db_path!r}]) == 0\n'
+        f'print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n'
+    )
+    completed = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True)
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.strip() == ''
+
+    def fastest(command, repeat=5):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            subprocess.run(command, check=True, capture_output=True)
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    baseline = fastest([sys.executable, '-c', 'pass'])
+    elapsed = fastest([sys.executable, LOOKUP_PATH, '5', '--db', db_path])
+    assert elapsed - baseline < STARTUP_BUDGET_SECONDS, f'lookup.py took {elapsed:.3f}s (python itself: {baseline:.3f}s)'
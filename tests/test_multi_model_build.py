@@ -0,0 +1,62 @@
+import json
+import os
+
+from .conftest import load_build_module, make_embeddings
+
+
+def read_problem_data_js(path):
+    with open(path, encoding='utf-8') as f:
+        content = f.read()
+    return json.loads(content[content.find('{'):content.rfind('}') + 1])
+
+
+def test_multi_model_build_writes_per_model_artifacts_and_agreement(tmp_path):
+    """複数モデルを1回で計算し、モデル別の成果物とモデル間の一致度レポートを出力する"""
+    build = load_build_module()
+    df = make_embeddings()
+    models = build.discover_models(df)
+    assert [m['name'] for m in models] == ['embeddinggemma', 'copy_of_gemma', 'random']
+
+    default_path = tmp_path / 'problem_data.js'
+    build.run_multi_model(df, models, str(tmp_path), str(default_path), workers=2)
+
+    # 既定のデータは単一モデルで作った場合と同じ
+    single = build.compute_similarities(df, 'embedding')
+    single['model'] = 'embeddinggemma'
+    build.attach_problem_scores(single)
+    grouped = build.group_vectors(df.to_dict('records'), 'embedding')
+    build.attach_topics(single, grouped)
+    build.attach_period_neighbors(single, grouped)
+    assert read_problem_data_js(default_path) == json.loads(json.dumps(single))
+
+    gemma = read_problem_data_js(tmp_path / 'problem_data_embeddinggemma.js')
+    copy = read_problem_data_js(tmp_path / 'problem_data_copy_of_gemma.js')
+    assert copy['model'] == 'copy_of_gemma'
+    assert copy['categories'] == gemma['categories']
+
+    with open(tmp_path / 'model_agreement.json', encoding='utf-8') as f:
+        report = json.load(f)
+    pairs = {tuple(pair['models']): pair for pair in report['pairs']}
+    assert len(pairs) == 3
+    same = pairs[('embeddinggemma', 'copy_of_gemma')]
+    assert same['problems'] == 40
+    assert same['jaccard_at_5'] == 1.0 and same['top1_agreement'] == 1.0
+    assert pairs[('embeddinggemma', 'random')]['jaccard_at_5'] < 1.0
+
+
+def test_multi_model_build_writes_each_model_once(tmp_path, monkeypatch):
+    """既定のデータは最初のモデルの成果物の複製で、同じ内容を2回書き出さない"""
+    build = load_build_module()
+    df = make_embeddings()
+    models = build.discover_models(df)[:2]
+    written = []
+    write_outputs = build.write_outputs
+    monkeypatch.setattr(build, 'write_outputs', lambda js_path, *args: written.append(js_path) or write_outputs(js_path, *args))
+
+    default_path = tmp_path / 'problem_data.js'
+    build.run_multi_model(df, models, str(tmp_path), str(default_path), workers=1, write_embeddings=True)
+
+    assert [os.path.basename(path) for path in written] == ['problem_data_embeddinggemma.js', 'problem_data_copy_of_gemma.js']
+    for suffix in ('.js', '.sqlite3', '.embeddings.bin'):
+        assert (tmp_path / f'problem_data{suffix}').read_bytes() == \
+            (tmp_path / f'problem_data_embeddinggemma{suffix}').read_bytes()
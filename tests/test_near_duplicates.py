@@ -0,0 +1,108 @@
+import itertools
+import json
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from .conftest import load_build_module, make_embeddings
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'js', 'check_top_similar.mjs')
+
+
+def load_module():
+    load_build_module()
+    import near_duplicates
+    return near_duplicates
+
+
+def brute_force_groups(near_duplicates, titles, threshold):
+    """全組の Jaccard 係数を比べてつないだグループ（LSH の検算用）"""
+    sets = [near_duplicates.shingles(near_duplicates.normalize_title(t)) for t in titles]
+    parent = list(range(len(titles)))
+
+    def find(x):
+        while parent[x] != x:
+            x = parent[x]
+        return x
+
+    for i, j in itertools.combinations(range(len(titles)), 2):
+        if sets[i] and sets[j] and near_duplicates.jaccard(sets[i], sets[j]) >= threshold:
+            parent[max(find(i), find(j))] = min(find(i), find(j))
+    groups = {}
+    for row in range(len(titles)):
+        groups.setdefault(find(row), []).append(row)
+    return sorted(sorted(g) for g in groups.values() if len(g) > 1)
+
+
+def test_groups_match_all_pairs_comparison():
+    """表記ゆれを吸収して再出題をまとめ、結果は全組比較と一致する"""
+    near_duplicates = load_module()
+    topics = ['M/M/1の待ち行列モデル', 'アローダイアグラムによる日程計画', 'カルノー図と等価な論理式',
+              'ハッシュ表の探索時間', 'SQLインジェクション対策', '逆ポーランド表記法で表された式']
+    titles = []
+    for i, topic in enumerate(topics):
+        titles += [topic, topic.replace('の', 'の ') + '。', f'{topic}（{i}）' if i % 2 else topic.upper()]
+    titles += [f'関係のない問題{i:03d}について' for i in range(200)] + ['', None]
+
+    groups = sorted(sorted(g) for g in near_duplicates.find_duplicate_groups(titles))
+    assert groups == brute_force_groups(near_duplicates, titles, near_duplicates.DUPLICATE_THRESHOLD)
+    for t in range(len(topics)):
+        assert [3 * t, 3 * t + 1, 3 * t + 2] in groups
+    assert near_duplicates.normalize_title('ＳＱＬ インジェクション、対策') == 'sqlインジェクション対策'
+
+
+def test_build_marks_duplicate_groups_by_smallest_id(tmp_path):
+    """問題テーブルには重複グループ（最小の問題ID）を付け、重複の無い問題には付けない"""
+    build = load_build_module()
+    import neighbor_store
+
+    df = make_embeddings()
+    df.loc[[3, 17, 30], '問題名'] = ['稼働率の計算', '稼働率の計算。', '稼働率 の計算']
+    results = build.compute_similarities(df, 'embedding')
+    build.attach_problem_scores(results)
+    problems = results['problems']
+    assert [p.get('duplicate_group') for p in problems if 'duplicate_group' in p] == [3, 3, 3]
+    assert [p['id'] for p in problems if 'duplicate_group' in p] == [3, 17, 30]
+
+    db_path = str(tmp_path / 'problem_data.sqlite3')
+    neighbor_store.write_neighbor_store(db_path, results)
+    with neighbor_store.NeighborStore(db_path) as store:
+        assert [p['id'] for p in store.duplicates(17)] == [3, 30]
+        assert store.duplicates(5) == []
+        assert store.problem(30) == problems[30]
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='Node.js is required to run js/problem-data.js')
+def test_client_collapses_duplicates_before_taking_top_five(tmp_path):
+    """同じ問題名の再出題をまとめた後も類似問題は5件そろい、全候補からまとめて選んだ上位5件と一致する"""
+    build = load_build_module()
+    df = make_embeddings(count=120)
+    rng = np.random.default_rng(5)
+    vectors = rng.normal(size=(120, 16))
+    df['embedding'] = vectors.tolist()
+    df['問題名'] = [f'問題{i % 40}' for i in range(120)]
+    results = build.compute_similarities(df, 'embedding')
+    data_path = tmp_path / 'problem_data.json'
+    data_path.write_text(json.dumps(results, ensure_ascii=False), encoding='utf-8')
+
+    completed = subprocess.run(['node', SCRIPT, str(data_path)], capture_output=True, text=True, timeout=120)
+    assert completed.returncode == 0, completed.stderr
+    found = json.loads(completed.stdout)
+
+    problems = results['problems']
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    for main_id, ids in found.items():
+        main = problems[int(main_id)]
+        ranked = sorted((p['id'] for p in problems if p['id'] != main['id'] and p['中項目'] == main['中項目']),
+                        key=lambda x: -float(normalized[main['id']] @ normalized[x]))
+        seen = {main['duplicate_group']}
+        heads = []
+        for x in ranked:
+            if problems[x]['duplicate_group'] not in seen:
+                heads.append(x)
+                seen.add(problems[x]['duplicate_group'])
+        assert ids == heads[:5]
+
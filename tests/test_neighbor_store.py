@@ -0,0 +1,72 @@
+import threading
+
+from .conftest import load_build_module, make_embeddings
+
+
+def build_store(tmp_path):
+    build = load_build_module()
+    import neighbor_store
+
+    results = build.compute_similarities(make_embeddings(), 'embedding')
+    results['model'] = 'embeddinggemma'
+    build.attach_problem_scores(results)
+    db_path = str(tmp_path / 'problem_data.sqlite3')
+    neighbor_store.write_neighbor_store(db_path, results)
+    return neighbor_store, results, db_path
+
+
+def test_store_matches_problem_data(tmp_path):
+    """SQLite 版から引いた問題と類似問題は problem_data.js の内容と一致する"""
+    neighbor_store, results, db_path = build_store(tmp_path)
+    items = {item['main_problem']: item for items in results['categories'].values() for item in items}
+
+    with neighbor_store.NeighborStore(db_path) as store:
+        assert store.metadata() == {'model': 'embeddinggemma', 'problem_count': '40'}
+        assert [c['name'] for c in store.categories()] == ['中項目0', '中項目1']
+        assert all(c['problem_count'] == 20 and c['大項目'] == '1.基礎理論' for c in store.categories())
+
+        for problem in results['problems']:
+            assert store.problem(problem['id']) == problem
+            expected = items[problem['id']]['similar_problems']
+            neighbors = store.neighbors(problem['id'])
+            assert [(n['id'], n['similarity']) for n in neighbors] == [(s['id'], s['similarity']) for s in expected]
+            assert [n['rank'] for n in neighbors] == list(range(1, len(expected) + 1))
+
+        assert store.problem(999) is None
+        assert [p['id'] for p in store.problems([5, 999, 3])] == [5, 3]
+        assert [p['id'] for p in store.problems_in_id_range(10, 14)] == [10, 11, 12, 13]
+        assert [p['id'] for p in store.problems_in_category('中項目1')] == list(range(1, 40, 2))
+
+
+def test_store_range_queries(tmp_path):
+    """類似度の範囲・上位件数・逆引きで絞り込める"""
+    neighbor_store, results, db_path = build_store(tmp_path)
+    pairs = [(item['main_problem'], sim['id'], sim['similarity'])
+             for items in results['categories'].values() for item in items for sim in item['similar_problems']]
+
+    with neighbor_store.NeighborStore(db_path) as store:
+        assert len(store.neighbors(0, limit=3)) == 3
+        assert all(n['similarity'] >= 0.8 for n in store.neighbors(0, min_score=0.8))
+
+        in_range = store.pairs_in_score_range(0.8, 0.9)
+        assert len(in_range) == sum(1 for _, _, score in pairs if 0.8 <= score <= 0.9)
+        scores = [p['similarity'] for p in in_range]
+        assert scores == sorted(scores, reverse=True)
+        assert len(store.pairs_in_score_range(0.0, limit=5)) == 5
+
+        referrers = store.referrers(4)
+        assert sorted(r['id'] for r in referrers) == sorted(pid for pid, nid, _ in pairs if nid == 4)
+        assert len(store.referrers(4, min_score=0.8)) == results['problems'][4]['reference_count']
+
+
+def test_store_reuses_one_connection_per_thread(tmp_path):
+    neighbor_store, _, db_path = build_store(tmp_path)
+    store = neighbor_store.NeighborStore(db_path)
+    assert store.conn is store.conn
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append((store.conn, store.problem(1)['id'])))
+    thread.start()
+    thread.join()
+    assert other[0][0] is not store.conn and other[0][1] == 1
+    store.close()
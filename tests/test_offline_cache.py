@@ -0,0 +1,163 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlparse
+
+import pytest
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def is_listening(host, port):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.settimeout(0.5)
+        return sock.connect_ex((host, port)) == 0
+
+
+class StaticServer:
+    """start_server.py をサブプロセスで起動・停止する（BASE_URL で既に起動している場合はそれを使う）"""
+
+    def __init__(self, base_url):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.process = None
+
+    @property
+    def owned(self):
+        return self.process is not None
+
+    def start(self):
+        self.process = subprocess.Popen([sys.executable, 'start_server.py'], cwd=PROJECT_ROOT,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for _ in range(50):
+            if is_listening(self.host, self.port):
+                return
+            time.sleep(0.1)
+        raise RuntimeError('start_server.py did not start')
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+        # Keep owned=True so that the test can start it again
+        while is_listening(self.host, self.port):
+            time.sleep(0.1)
+
+
+@pytest.fixture(scope="module")
+def static_server(base_url):
+    with open(os.path.join(PROJECT_ROOT, 'index.html'), encoding='utf-8') as f:
+        if 'id="build-manifest"' not in f.read():
+            pytest.skip('index.html has no build manifest; run 03_html_output/generate_html.py first')
+
+    server = StaticServer(base_url)
+    if not is_listening(server.host, server.port):
+        if server.port != 8000:
+            pytest.skip('start_server.py serves on port 8000 only')
+        server.start()
+    yield server
+    if server.owned:
+        server.stop()
+
+
+def wait_for_app(driver):
+    WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.CLASS_NAME, "middle-category-link")))
+
+
+def build_manifest(driver):
+    return driver.execute_script("return JSON.parse(document.getElementById('build-manifest').textContent);")
+
+
+def stored_dataset_hashes(driver):
+    return driver.execute_async_script("""
+        const done = arguments[arguments.length - 1];
+        const request = indexedDB.open('oyo_problem_data');
+        request.onerror = () => done(null);
+        request.onsuccess = () => {
+            const db = request.result;
+            if (!db.objectStoreNames.contains('datasets')) { db.close(); done([]); return; }
+            const keys = db.transaction('datasets').objectStore('datasets').getAllKeys();
+            keys.onsuccess = () => { db.close(); done(keys.result); };
+        };
+    """)
+
+
+def dataset_source(driver):
+    return driver.execute_async_script("""
+        const done = arguments[arguments.length - 1];
+        import('./js/offline-cache.js').then(m => done(m.getDatasetSource()));
+    """)
+
+
+def fetched_dataset(driver, data_url):
+    return driver.execute_script(
+        "return performance.getEntriesByType('resource').some(e => e.name.endsWith(arguments[0]));", data_url)
+
+
+def test_dataset_is_stored_by_content_hash(driver, base_url, static_server):
+    """初回は問題データを取得して IndexedDB にハッシュで保存し、2回目以降はダウンロードしない"""
+    driver.get(base_url)
+    wait_for_app(driver)
+    manifest = build_manifest(driver)
+
+    WebDriverWait(driver, 10).until(lambda d: stored_dataset_hashes(d) == [manifest['dataHash']])
+
+    driver.refresh()
+    wait_for_app(driver)
+    assert dataset_source(driver) == 'indexeddb'
+    assert not fetched_dataset(driver, manifest['dataUrl'])
+
+    # ハッシュが変わった（別ビルドの）データしか無い場合は取得し直して入れ替える
+    driver.execute_async_script("""
+        const done = arguments[arguments.length - 1];
+        const request = indexedDB.open('oyo_problem_data');
+        request.onsuccess = () => {
+            const db = request.result;
+            const tx = db.transaction('datasets', 'readwrite');
+            tx.objectStore('datasets').clear();
+            tx.objectStore('datasets').put({ hash: 'previous-build', json: '{}', savedAt: 0 });
+            tx.oncomplete = () => { db.close(); done(); };
+        };
+    """)
+    driver.refresh()
+    wait_for_app(driver)
+    assert dataset_source(driver) == 'network'
+    assert fetched_dataset(driver, manifest['dataUrl'])
+    WebDriverWait(driver, 10).until(lambda d: stored_dataset_hashes(d) == [manifest['dataHash']])
+
+
+def test_service_worker_serves_app_offline(driver, base_url, static_server):
+    """Service Worker がキャッシュした静的ファイルと IndexedDB のデータで、サーバー停止中も起動できる"""
+    if not static_server.owned:
+        pytest.skip('the server at BASE_URL was not started by this test and cannot be stopped')
+
+    driver.get(base_url)
+    wait_for_app(driver)
+    version = build_manifest(driver)['version']
+    driver.execute_async_script("""
+        const done = arguments[arguments.length - 1];
+        navigator.serviceWorker.ready.then(() => done());
+    """)
+    # 登録後に開いたページから Service Worker の管理下に入る
+    driver.refresh()
+    wait_for_app(driver)
+    assert driver.execute_script("return navigator.serviceWorker.controller !== null;")
+    cache_names = driver.execute_async_script("""
+        const done = arguments[arguments.length - 1];
+        caches.keys().then(done);
+    """)
+    assert f'oyo-static-{version}' in cache_names
+
+    static_server.stop()
+    try:
+        driver.refresh()
+        wait_for_app(driver)
+        assert dataset_source(driver) == 'indexeddb'
+        assert len(driver.find_elements(By.CLASS_NAME, "middle-category-link")) > 0
+    finally:
+        static_server.start()
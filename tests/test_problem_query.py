@@ -0,0 +1,20 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'js', 'check_problem_query.mjs')
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='Node.js is required to run js/problem-query.js')
+def test_problem_query_matches_legacy_ordering():
+    """Worker で使う絞り込み・並べ替えが、従来の renderProblemList と同じ並びを返すこと"""
+    result = subprocess.run(['node', SCRIPT], capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    summary = json.loads(result.stdout)
+
+    print(f"\n{summary['queries']} queries checked, "
+          f"{summary['msPerQuery']:.3f} ms/query for {summary['problemsPerCategory']:.0f} problems")
+    assert summary['queries'] > 0
@@ -0,0 +1,77 @@
+import numpy as np
+
+from .conftest import load_build_module, make_embeddings
+
+
+def make_results(edges, size, missing=()):
+    """edges: {問題ID: [(類似問題ID, 類似度), ...]} から compute_similarities と同じ形の結果を作る"""
+    problems = [None if i in missing else {'id': i, '中項目': '中項目0'} for i in range(size)]
+    items = [{'main_problem': i, 'similar_problems': [{'id': j, 'similarity': s} for j, s in edges.get(i, [])]}
+             for i in range(size) if i not in missing]
+    return {'problems': problems, 'categories': {'中項目0': items}}
+
+
+def dense_pagerank(edges, nodes, damping=0.85):
+    """密行列で連立方程式を解いた PageRank（疎行列版の検算用）"""
+    size = len(nodes)
+    weights = np.zeros((size, size))
+    for i, sims in edges.items():
+        for j, s in sims:
+            weights[i, j] = s
+    teleport = nodes / nodes.sum()
+    transition = np.zeros((size, size))
+    for i in range(size):
+        total = weights[i].sum()
+        transition[i] = weights[i] / total if total > 0 else (teleport if nodes[i] else 0)
+    # rank = damping * rank @ P + (1 - damping) * teleport
+    return np.linalg.solve(np.eye(size) - damping * transition.T, (1 - damping) * teleport)
+
+
+def test_graph_scores_match_dense_reference():
+    """疎行列で求めた代表度・成分が、密行列での計算や手で数えた値と一致する"""
+    build = load_build_module()
+    import similarity_graph
+
+    # 0-1-2-3 は 3 を中心とする成分、5-6 は別の成分、4 は欠番、7 は孤立、8 は閾値未満の辺だけ
+    edges = {0: [(3, 0.95)], 1: [(3, 0.9), (2, 0.85)], 2: [(3, 0.88), (1, 0.85)], 3: [(0, 0.95)],
+             5: [(6, 0.9)], 6: [(5, 0.9)], 8: [(0, 0.5)]}
+    results = make_results(edges, 9, missing={4})
+    summary = similarity_graph.attach_graph_scores(results, 0.8)
+    problems = {p['id']: p for p in results['problems'] if p is not None}
+
+    nodes = np.array([p is not None for p in results['problems']])
+    kept = {i: [(j, s) for j, s in sims if s >= 0.8] for i, sims in edges.items()}
+    expected = dense_pagerank(kept, nodes) * nodes.sum()
+    for i, problem in problems.items():
+        assert abs(problem['centrality'] - expected[i]) < 1e-3
+    assert abs(sum(p['centrality'] for p in problems.values()) - len(problems)) < 1e-2
+    assert max(problems, key=lambda i: problems[i]['centrality']) == 3
+
+    assert [problems[i]['component'] for i in (0, 1, 2, 3)] == [0] * 4
+    assert problems[5]['component'] == problems[6]['component'] == 1
+    assert {problems[7]['component'], problems[8]['component']} == {2, 3}
+    assert [problems[i]['component_size'] for i in (0, 5, 7)] == [4, 2, 1]
+    assert summary == {'threshold': 0.8, 'edges': 8, 'components': 4, 'largest_component': 4}
+
+
+def test_build_attaches_graph_scores_next_to_reference_counts():
+    """ビルドでは被参照数（グラフの入次数）と同じ辺から代表度を求めて問題テーブルに付ける"""
+    build = load_build_module()
+    results = build.compute_similarities(make_embeddings(), 'embedding')
+    build.attach_problem_scores(results)
+
+    in_degree = np.zeros(len(results['problems']), dtype=int)
+    for items in results['categories'].values():
+        for item in items:
+            for sim in item['similar_problems']:
+                if sim['similarity'] >= build.REFERENCE_SIMILARITY_THRESHOLD:
+                    in_degree[sim['id']] += 1
+    for problem in results['problems']:
+        assert problem['reference_count'] == in_degree[problem['id']]
+        assert problem['centrality'] > 0
+        assert 0 <= problem['component'] < len(results['problems'])
+    # 類似リストは中項目の中でしか作らないので、成分は中項目をまたがない
+    by_component = {}
+    for problem in results['problems']:
+        by_component.setdefault(problem['component'], set()).add(problem['中項目'])
+    assert all(len(names) == 1 for names in by_component.values())
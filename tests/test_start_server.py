@@ -0,0 +1,176 @@
+import gzip
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from start_server import (IMMUTABLE_CACHE_CONTROL, LATENCY_BUCKETS, REVALIDATE_CACHE_CONTROL, estimate_quantile,
+                          make_server)
+
+INDEX_HTML = ('<html>' + 'よく出る問題 ' * 2000 + '</html>').encode('utf-8')
+DATA_JSON = b'{"problems": [1, 2, 3]}'
+
+
+@pytest.fixture
+def server(tmp_path):
+    (tmp_path / 'index.html').write_bytes(INDEX_HTML)
+    (tmp_path / 'index.html.gz').write_bytes(gzip.compress(INDEX_HTML))
+    (tmp_path / 'problem_data.0123456789abcdef.json').write_bytes(DATA_JSON)
+    httpd = make_server(str(tmp_path), '127.0.0.1', 0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield tmp_path, f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def fetch(url, headers=None, method='GET'):
+    request = urllib.request.Request(url, headers=headers or {}, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def test_serves_precompressed_sibling_by_accept_encoding(server):
+    root, base = server
+    status, headers, body = fetch(base + '/', {'Accept-Encoding': 'br, gzip'})
+    assert status == 200
+    assert headers['Content-Encoding'] == 'gzip'
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert headers['Content-Type'].startswith('text/html')
+    assert gzip.decompress(body) == INDEX_HTML
+
+    status, headers, body = fetch(base + '/index.html', {'Accept-Encoding': 'identity'})
+    assert headers['Content-Encoding'] is None and body == INDEX_HTML
+
+    # 元のファイルより古い圧縮ファイルは使わない
+    os.utime(root / 'index.html.gz', (0, 0))
+    status, headers, body = fetch(base + '/index.html', {'Accept-Encoding': 'gzip'})
+    assert headers['Content-Encoding'] is None and body == INDEX_HTML
+
+
+def test_etag_and_cache_control(server):
+    _, base = server
+    status, headers, _ = fetch(base + '/index.html')
+    assert headers['Cache-Control'] == REVALIDATE_CACHE_CONTROL
+    etag = headers['ETag']
+
+    status, headers, body = fetch(base + '/index.html', {'If-None-Match': etag})
+    assert status == 304 and body == b'' and headers['ETag'] == etag
+    # 圧縮版は別の表現なので ETag も別になる
+    status, headers, _ = fetch(base + '/index.html', {'If-None-Match': etag, 'Accept-Encoding': 'gzip'})
+    assert status == 200 and headers['ETag'] != etag
+
+    status, headers, body = fetch(base + '/problem_data.0123456789abcdef.json')
+    assert status == 200 and body == DATA_JSON
+    assert headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert headers['Content-Type'] == 'application/json'
+
+    status, headers, body = fetch(base + '/problem_data.0123456789abcdef.json', method='HEAD')
+    assert status == 200 and body == b'' and headers['Content-Length'] == str(len(DATA_JSON))
+
+
+def test_range_requests(server):
+    _, base = server
+    url = base + '/problem_data.0123456789abcdef.json'
+    status, headers, body = fetch(url, {'Range': 'bytes=2-9', 'Accept-Encoding': 'gzip'})
+    assert status == 206 and body == DATA_JSON[2:10]
+    assert headers['Content-Range'] == f'bytes 2-9/{len(DATA_JSON)}'
+
+    status, _, body = fetch(url, {'Range': 'bytes=-5'})
+    assert status == 206 and body == DATA_JSON[-5:]
+
+    status, headers, _ = fetch(url, {'Range': f'bytes={len(DATA_JSON)}-'})
+    assert status == 416 and headers['Content-Range'] == f'bytes */{len(DATA_JSON)}'
+
+    # If-Range の ETag が古ければ全体を返す
+    status, _, body = fetch(url, {'Range': 'bytes=2-9', 'If-Range': '"stale"'})
+    assert status == 200 and body == DATA_JSON
+
+
+def test_slow_client_does_not_block_others(server):
+    _, base = server
+    host, port = base.removeprefix('http://').split(':')
+    slow = socket.create_connection((host, int(port)))
+    try:
+        slow.sendall(b'GET /index.html HTTP/1.1\r\nHost: localhost\r\n')  # ヘッダーを送り終えない
+        started = time.monotonic()
+        status, _, _ = fetch(base + '/problem_data.0123456789abcdef.json')
+        assert status == 200
+        assert time.monotonic() - started < 2
+    finally:
+        slow.close()
+
+
+def metric_value(text, line_prefix):
+    for line in text.splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    raise AssertionError(f'{line_prefix} not found in metrics')
+
+
+def test_metrics_endpoint_reports_routes_bytes_and_latency(server):
+    _, base = server
+    for _ in range(3):
+        fetch(base + '/problem_data.0123456789abcdef.json')
+    fetch(base + '/problem_data.0123456789abcdef.json', {'Range': 'bytes=0-3'})
+    fetch(base + '/missing.js')
+
+    status, headers, body = fetch(base + '/metrics')
+    assert status == 200
+    assert headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    text = body.decode('utf-8')
+
+    route = 'route="/problem_data.{hash}.json"'
+    assert metric_value(text, f'http_requests_total{{{route},status="200"}}') == 3
+    assert metric_value(text, f'http_requests_total{{{route},status="206"}}') == 1
+    assert metric_value(text, 'http_requests_total{route="unmatched",status="404"}') == 1
+    assert metric_value(text, f'http_response_bytes_total{{{route}}}') == 3 * len(DATA_JSON) + 4
+    assert metric_value(text, f'http_request_duration_seconds_count{{{route}}}') == 4
+    assert metric_value(text, f'http_request_duration_seconds_bucket{{{route},le="+Inf"}}') == 4
+    p50 = metric_value(text, f'http_request_duration_quantile_seconds{{{route},quantile="0.5"}}')
+    p99 = metric_value(text, f'http_request_duration_quantile_seconds{{{route},quantile="0.99"}}')
+    assert 0 < p50 <= p99
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert metric_value(text, 'http_requests_in_flight') == 1  # /metrics 自身
+
+
+def send_raw(base, data):
+    host, port = base.rsplit('/', 1)[1].split(':')
+    with socket.create_connection((host, int(port)), timeout=5) as sock:
+        sock.sendall(data)
+        response = b''
+        while chunk := sock.recv(4096):
+            response += chunk
+    return response
+
+
+def test_malformed_requests_are_counted_without_leaking_in_flight(server, capsys):
+    """不正なリクエスト行も1つのルートにまとめて数え、処理中の数は元に戻る"""
+    _, base = server
+    # バージョンが読めないリクエストは HTTP/0.9 として扱われ、ステータス行の無いエラーページだけが返る
+    assert b'400' in send_raw(base, b'GARBAGE\r\n\r\n')
+    assert b'400' in send_raw(base, b'GET\r\n\r\n')
+    assert b'505' in send_raw(base, b'GET /x HTTP/9.9\r\n\r\n')
+
+    _, _, body = fetch(base + '/metrics')
+    text = body.decode('utf-8')
+    assert metric_value(text, 'http_requests_total{route="invalid",status="400"}') == 2
+    assert metric_value(text, 'http_requests_total{route="invalid",status="505"}') == 1
+    assert metric_value(text, 'http_requests_in_flight') == 1  # /metrics 自身
+    assert 'Traceback' not in capsys.readouterr().err
+
+
+def test_quantile_estimate_from_histogram():
+    counts = [0] * (len(LATENCY_BUCKETS) + 1)
+    # 0.001〜0.0025 秒の区切りに 100 件
+    counts[2] = 100
+    assert estimate_quantile(0.5, counts, 100) == pytest.approx(0.00175)
+    counts[-1] = 100
+    assert estimate_quantile(0.99, counts, 200) == LATENCY_BUCKETS[-1]
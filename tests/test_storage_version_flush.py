@@ -0,0 +1,20 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'js', 'check_storage_version_flush.mjs')
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='Node.js is required to run js/storage.js')
+def test_data_version_is_never_persisted_ahead_of_the_data():
+    """クラウドの版を保存した時点で、その版のデータと操作ログの整理も localStorage に書き込まれている"""
+    result = subprocess.run(['node', SCRIPT], capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    summary = json.loads(result.stdout)
+
+    assert summary['afterLoad'] == {'version': 5, 'checks': ['remote1'], 'pendingOps': 0}
+    # 送信済みの操作は取り除かれ、他端末の変更も反映された状態で版が進む
+    assert summary['afterSync'] == {'version': 7, 'checks': ['local1', 'remote1', 'remote2'], 'pendingOps': 0}
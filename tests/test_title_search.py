@@ -0,0 +1,77 @@
+import json
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from .conftest import load_build_module, make_embeddings
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'js', 'check_title_search.mjs')
+WORDS = ['稼働率', 'ハッシュ表', 'SQL', 'インジェクション', '待ち行列', 'ＴＣＰ／ＩＰ', 'キャッシュメモリ', '𠮷野家', 'の', '計算']
+QUERIES = ['稼働', '稼働率の', 'sql', 'ＳＱＬ インジェクション', 'の', '率', '𠮷', '𠮷野', 'tcp/ip', '存在しない語', '', '。']
+
+
+def load_module():
+    load_build_module()
+    import title_search
+    return title_search
+
+
+def make_problems(count=300, seed=0):
+    rng = np.random.default_rng(seed)
+    problems = []
+    for i in range(count):
+        words = rng.choice(WORDS, size=rng.integers(1, 4))
+        problems.append({'id': i, '問題名': ''.join(words), '中項目': '中項目0'})
+    problems[5] = None
+    problems[7]['問題名'] = '率'
+    return problems
+
+
+def brute_force(title_search, problems, query):
+    query = title_search.normalize_title(query)
+    return [p['id'] for p in problems if p is not None and query and query in title_search.normalize_title(p['問題名'])]
+
+
+def test_postings_round_trip_and_search_matches_substring_scan():
+    """差分・可変長整数で符号化した索引から、問題名の部分一致と同じ結果を返す"""
+    title_search = load_module()
+    problems = make_problems()
+    index = title_search.build_search_index(problems)
+    postings = title_search.decode_search_index(index)
+
+    assert index['grams'] == sorted(index['grams'])
+    for gram, ids in postings.items():
+        assert ids == sorted(ids) and all(gram in title_search.normalize_title(problems[x]['問題名']) for x in ids)
+    for query in QUERIES:
+        assert title_search.search_titles(postings, problems, query) == brute_force(title_search, problems, query)
+
+    data = bytearray()
+    title_search.encode_varint(300, data)
+    assert bytes(data) == b'\xac\x02' and title_search.decode_varint(data, 0) == (300, 2)
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='Node.js is required to run js/title-search.js')
+def test_client_search_matches_build(tmp_path):
+    """ビルドが出力した search_index を js/title-search.js で引くと、Python 側と同じ結果になる"""
+    title_search = load_module()
+    build = load_build_module()
+    df = make_embeddings(count=300)
+    df['問題名'] = [p['問題名'] if p else '' for p in make_problems(seed=1)]
+    results = build.compute_similarities(df, 'embedding')
+    problems = results['problems']
+    postings = title_search.decode_search_index(results['search_index'])
+
+    data_path = tmp_path / 'problem_data.json'
+    data_path.write_text(json.dumps(results, ensure_ascii=False), encoding='utf-8')
+    queries_path = tmp_path / 'queries.json'
+    queries_path.write_text(json.dumps(QUERIES, ensure_ascii=False), encoding='utf-8')
+
+    completed = subprocess.run(['node', SCRIPT, str(data_path), str(queries_path)], capture_output=True, text=True, timeout=120)
+    assert completed.returncode == 0, completed.stderr
+    summary = json.loads(completed.stdout)
+    print(f"\n{summary['msPerQuery']:.4f} ms/query for {len(problems)} problems")
+    for query, found in zip(QUERIES, summary['results']):
+        assert found == title_search.search_titles(postings, problems, query) == brute_force(title_search, problems, query)
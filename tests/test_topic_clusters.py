@@ -0,0 +1,71 @@
+import numpy as np
+
+from .conftest import load_build_module, make_embeddings
+
+
+def load_module():
+    load_build_module()
+    import topic_clusters
+    return topic_clusters
+
+
+def make_clustered_vectors(topics=4, per_topic=50, dims=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(topics, dims))
+    truth = np.repeat(np.arange(topics), per_topic)
+    return centers[truth] + rng.normal(scale=0.3, size=(len(truth), dims)), truth
+
+
+def test_minibatch_kmeans_recovers_separated_topics():
+    """はっきり分かれた話題は、1つの話題が1つのクラスタにまとまる"""
+    topic_clusters = load_module()
+    vectors, truth = make_clustered_vectors()
+    centroids, labels = topic_clusters.minibatch_kmeans(topic_clusters.normalize_rows(vectors), 4, batch_size=64)
+
+    assert np.allclose(np.linalg.norm(centroids, axis=1), 1.0, atol=1e-5)
+    for topic in range(4):
+        assert len(set(labels[truth == topic])) == 1
+    assert len(set(labels)) == 4
+
+
+def test_prefiltered_neighbors_against_exact():
+    """話題による絞り込みは、全話題を調べれば全組比較と一致し、近い話題だけでもほぼ同じ結果になる"""
+    topic_clusters = load_module()
+    vectors, _ = make_clustered_vectors(topics=5, per_topic=40, seed=1)
+    centroids, labels = topic_clusters.cluster_category(vectors)
+    exact = topic_clusters.exact_neighbors(vectors, 5)
+
+    everything = topic_clusters.prefiltered_neighbors(vectors, centroids, labels, 5, probe=len(centroids))
+    assert (everything == exact).all()
+    nearest = topic_clusters.prefiltered_neighbors(vectors, centroids, labels, 5, probe=2)
+    assert topic_clusters.recall_at_k(nearest, exact) >= 0.95
+
+
+def test_build_attaches_topics_and_stores_centroids(tmp_path):
+    """ビルドでは全問題に話題を付け、話題の一覧を JS に、中心ベクトルを SQLite に出力する"""
+    build = load_build_module()
+    import neighbor_store
+
+    df = make_embeddings(count=200)
+    results = build.compute_similarities(df, 'embedding')
+    build.attach_problem_scores(results)
+    grouped = build.group_vectors(df.to_dict('records'), 'embedding')
+    centroids = build.attach_topics(results, grouped)
+
+    topics = results['topics']
+    assert [t['id'] for t in topics] == list(range(len(topics))) and len(topics) == len(centroids)
+    assert {t['中項目'] for t in topics} == {'中項目0', '中項目1'}
+    for topic in topics:
+        members = [p for p in results['problems'] if p['topic'] == topic['id']]
+        assert len(members) == topic['size']
+        assert all(p['中項目'] == topic['中項目'] for p in members)
+        assert results['problems'][topic['representative']]['topic'] == topic['id']
+
+    db_path = str(tmp_path / 'problem_data.sqlite3')
+    neighbor_store.write_neighbor_store(db_path, results, centroids)
+    with neighbor_store.NeighborStore(db_path) as store:
+        stored = store.topics('中項目1')
+        assert [t['id'] for t in stored] == [t['id'] for t in topics if t['中項目'] == '中項目1']
+        assert np.array_equal(np.frombuffer(stored[0]['centroid'], dtype='<f4'), centroids[stored[0]['id']])
+        assert len(store.problems_in_topic(0)) == topics[0]['size']
+        assert store.problem(7) == results['problems'][7]